@@ -60,6 +60,7 @@ class ClientConfig:
 
     llm_enabled = True          # 是否启用 LLM 润色功能，需要配置 LLM/ 目录下的角色文件
     llm_stop_key = 'esc'        # 中断 LLM 输出的快捷键
+    record_abandon_key = 'esc'  # 录音过程中放弃本次录音的快捷键（服务端同时中止识别），留空则禁用
 
     enable_tray = True          # 客户端默认启用托盘图标功能
 
@@ -76,6 +77,8 @@ class ClientConfig:
     file_save_txt = True        # 转录文件时是否保存 txt 文本（按标点切分后的）
     file_save_json = True       # 转录文件时是否保存 json 结果（含原始时间戳）
     file_save_merge = False      # 转录文件时是否保存 merge.txt（未切分的段落长文本）
+    file_delta_results = True   # 转录文件时请求增量结果（服务端只推送变化部分，长文件可显著减少传输与解析开销）
+    file_flow_control = True    # 转录文件时按服务端下发的额度发送音频（服务端积压过多时暂停读取，内存占用有上界）
 
     udp_broadcast = False               # 是否启用 UDP 广播输出结果
     udp_broadcast_targets = [           # UDP 广播目标地址列表，格式: (地址, 端口)
@@ -26,6 +26,34 @@ class ServerConfig:
     log_level = 'DEBUG'        # 日志级别：'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
     aligner_idle_timeout = 10  # 对齐引擎空闲多少秒后自动释放显存 (0 表示不释放)
 
+    # 麦克风中间结果：LLM 解码过程中，把已稳定的文字提前推送给客户端
+    partial_results = True      # 是否推送中间结果
+    partial_interval = 0.15     # 两次推送之间的最小间隔（秒）
+
+    # 识别进程池：同一会话的片段固定由同一进程处理，新会话派发给负载最低的进程
+    # 每个进程各自加载模型（GGUF 权重以 mmap 方式加载，多进程共享系统页缓存），
+    # 适合多核 CPU 推理；GPU 推理时显存占用成倍增加，一般保持 1
+    recognizer_workers = 1
+
+    # 识别任务调度：'deadline_fair' 麦克风按截止时间严格优先、文件之间加权公平；'latest' 旧版，总是处理最新会话
+    scheduler_policy = 'deadline_fair'
+    mic_deadline = 1.0                  # 麦克风片段的排队时限（秒），超时次数计入调度统计
+    file_aging = 0.5                    # 文件片段老化系数：每等待 1 秒，公平队列中的排序提前的音频秒数
+    scheduler_report_interval = 60      # 调度统计（各类任务排队等待 p50/p99）输出到日志的间隔（秒）
+
+    # 多会话批量解码：有其它麦克风会话在进行时，等待一个短窗口收集它们的就绪片段，
+    # 在同一次 LLM 解码中合并推理（仅 qwen_asr / fun_asr_nano，最大序列数见各模型的 n_seq_max）
+    # 合并解码以单请求时延换总吞吐：核心数少时吞吐提升有限，时延随序列数近似线性增长，
+    # 因此默认关闭（n_seq_max = 1，此时也不等待收集窗口），多核 CPU 或 GPU 上按需开启
+    batch_window = 0.03                 # 批量收集窗口（秒），0 表示不等待、只合并已就绪的片段
+
+    # 文件上传流控（仅对请求流控的 v2 客户端生效）
+    file_credit_window = 240    # 所有文件任务合计允许在服务端积压的音频秒数，决定内存上界
+
+    # 进程间音频传输：音频片段经共享内存交给识别子进程，槽位用尽或片段过长时自动回退为队列传输
+    shm_audio_slabs = 8             # 共享内存槽位数量 (0 表示禁用)
+    shm_audio_slab_seconds = 72     # 每个槽位可容纳的音频秒数，应大于 分段长度 + 2 × 重叠
+
     # GPU 预加速配置（有识别任务时，提前调高显存频率，降低延迟，需管理员权限运行）
     gpu_boost_enabled = False                   # 总开关，默认关闭
     gpu_boost_cmd = 'nvidia-smi -lmc 9000'      # GPU 预加速命令，锁定显存频率到9000MHz（根据实际 GPU 调整）
@@ -130,6 +158,11 @@ class FunASRNanoGGUFArgs:
     # 模型细节
     enable_ctc = True           # 是否启用 CTC 热词检索
     n_predict = 512             # LLM 最大生成 token 数
+    n_seq_max = 1               # 多个会话的麦克风片段合并解码的最大序列数（1 表示不合并），各序列共用 2048 的上下文
+    speculative = False         # 以 CTC 识别文本为草稿投机解码，每次前向验证多个 token（需启用 CTC，合并解码时不生效）
+    draft_chunk = 8             # 投机解码每次前向验证的最大草稿 token 数
+    embd_cache_mb = 64          # 提示词 Embedding 反量化结果的行缓存（MB），0 表示不缓存
+    embd_fp16_table = False     # 预先把整张 Embedding 表反量化为 fp16，存到模型旁并内存映射，之后启动即用
     n_threads = None            # 线程数，None 表示自动
     similar_threshold = 0.6     # 热词相似度阈值，超过阈值的热词会被传入 llm decoder 的上下文
     max_hotwords = 20           # 传入上下文的热词数量上限
@@ -151,6 +184,10 @@ class Qwen3ASRGGUFArgs:
     
     # 模型细节
     n_ctx = 2048                # 上下文窗口大小
+    kv_reuse = True             # 复用与上次请求相同的提示词前缀 KV，只预填充不同的部分
+    n_seq_max = 1               # 多个会话的麦克风片段合并解码的最大序列数（1 表示不合并），各序列共用 n_ctx
+    embd_cache_mb = 64          # 提示词 Embedding 反量化结果的行缓存（MB），0 表示不缓存
+    embd_fp16_table = False     # 预先把整张 Embedding 表反量化为 fp16，存到模型旁并内存映射，之后启动即用
     chunk_size = 80.0           # 分段长度（秒）
     memory_num = 1              # 记忆段数
     dml_pad_to = 30             # 开启 DirectML 加速时，短音频统一填充到指定长度，有加速效果
@@ -9,7 +9,6 @@
 from __future__ import annotations
 
 import asyncio
-import base64
 import uuid
 from typing import TYPE_CHECKING, Optional
 
@@ -53,6 +52,7 @@ class AudioRecorder:
         self._start_time: float = 0.0
         self._duration: float = 0.0
         self._cache: list = []
+        self._sent: bool = False    # 是否已有音频发往服务端
 
     @property
     def state(self) -> ClientState:
@@ -64,8 +64,8 @@ class AudioRecorder:
         """快捷访问桥接到 app.ws"""
         return self.app.ws
     
-    async def _send_message(self, message: AudioMessage) -> None:
-        """发送消息到服务端"""
+    async def _send_message(self, message: AudioMessage, data: bytes = b'') -> None:
+        """发送消息及音频数据到服务端"""
         if not self._ws_manager.is_connected:
             if message.is_final:
                 self.state.pop_audio_file(message.task_id)
@@ -74,7 +74,7 @@ class AudioRecorder:
             return
         
         # 使用 WebSocketManager 发送协议消息
-        success = await self._ws_manager.send(message)
+        success = await self._ws_manager.send_audio(message, data)
         if not success and message.is_final:
             self.state.pop_audio_file(message.task_id)
             # 具体错误日志由 WebSocketManager 记录
@@ -94,6 +94,7 @@ class AudioRecorder:
             self._start_time = 0.0
             self._duration = 0.0
             self._cache = []
+            self._sent = False
             
             # 音频文件管理
             file_path = None
@@ -139,9 +140,7 @@ class AudioRecorder:
                     message = AudioMessage(
                         task_id=self.task_id,
                         source='mic',
-                        data=base64.b64encode(
-                            np.mean(data[::3], axis=1).tobytes()
-                        ).decode('utf-8'),
+                        data='',
                         is_final=False,
                         time_start=self._start_time,
                         seg_duration=Config.mic_seg_duration,
@@ -149,7 +148,9 @@ class AudioRecorder:
                         context=Config.context,
                         language=Config.language,
                     )
-                    asyncio.create_task(self._send_message(message))
+                    pcm = np.mean(data[::3], axis=1).tobytes()
+                    asyncio.create_task(self._send_message(message, pcm))
+                    self._sent = True
                     
                 elif task['type'] == 'finish':
                     # 如果有缓存的数据未发送，先发送缓存
@@ -164,9 +165,7 @@ class AudioRecorder:
                         message = AudioMessage(
                             task_id=self.task_id,
                             source='mic',
-                            data=base64.b64encode(
-                                np.mean(data[::3], axis=1).tobytes()
-                            ).decode('utf-8'),
+                            data='',
                             is_final=False,
                             time_start=self._start_time,
                             seg_duration=Config.mic_seg_duration,
@@ -174,7 +173,8 @@ class AudioRecorder:
                             context=Config.context,
                             language=Config.language,
                         )
-                        asyncio.create_task(self._send_message(message))
+                        pcm = np.mean(data[::3], axis=1).tobytes()
+                        asyncio.create_task(self._send_message(message, pcm))
 
                     # 完成写入本地文件
                     if Config.save_audio and self._file_manager:
@@ -199,6 +199,16 @@ class AudioRecorder:
                     )
                     asyncio.create_task(self._send_message(message))
                     break
+
+        except asyncio.CancelledError:
+            # 录音被取消（按键过短或用户放弃）：已发出的音频通知服务端丢弃并中止识别
+            if self._sent:
+                asyncio.create_task(self._ws_manager.send_cancel(self.task_id))
+                self.state.pop_audio_file(self.task_id)
+                if Config.save_audio and self._file_manager:
+                    self._file_manager.finish()
+                logger.info(f"录音任务已放弃，任务ID: {self.task_id}, 时长: {self._duration:.2f}s")
+            raise
                     
         except Exception as e:
             logger.error(f"录音任务错误: {e}", exc_info=True)
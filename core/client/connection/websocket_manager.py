@@ -4,18 +4,24 @@ WebSocket 连接管理模块
 
 提供 WebSocketManager 类用于管理与服务端的 WebSocket 连接，
 包括连接建立、重连、消息发送和连接状态检查。
+v2 协议下还负责记录服务端下发的文件发送额度（CreditMessage）。
 """
 
 from __future__ import annotations
 
+import base64
 import json
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Dict, Optional
 
 import websockets
 from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
 
 from config_client import ClientConfig as Config
-from core.protocol import AudioMessage, RecognitionMessage
+from core.protocol import (
+    AudioMessage, AudioFrame, CancelMessage, CreditMessage, RecognitionMessage, SessionMessage,
+    SUBPROTOCOLS, SUBPROTOCOL_BINARY_AUDIO,
+)
+from core.constants import AudioFormat
 from ..state import console
 from .. import logger
 import asyncio
@@ -52,6 +58,10 @@ class WebSocketManager:
         """
         self.app = app
         self._connect_fail_logged = False  # 断联后只记一次失败日志
+        self._audio_offsets: Dict[str, int] = {}  # v2 协议下各任务已发送的字节数
+        self._send_lock = asyncio.Lock()          # 保证会话元信息先于音频帧发出
+        self._credits: Dict[str, float] = {}      # 流控任务的累计额度（秒）
+        self._credit_event = asyncio.Event()      # 收到新额度或连接断开时置位
 
     @property
     def state(self) -> ClientState:
@@ -62,6 +72,12 @@ class WebSocketManager:
     def is_connected(self) -> bool:
         """检查是否已连接"""
         return self.state.is_connected
+
+    @property
+    def binary_audio(self) -> bool:
+        """服务端是否支持二进制音频帧（v2 协议）"""
+        ws = self.state.websocket
+        return ws is not None and ws.subprotocol == SUBPROTOCOL_BINARY_AUDIO
     
     async def connect(self) -> bool:
         """
@@ -88,7 +104,7 @@ class WebSocketManager:
 
             kwargs = dict(
                 uri=url,
-                subprotocols=["binary"],
+                subprotocols=SUBPROTOCOLS,
                 max_size=None,
                 max_queue=None,  # 防止文件过大时，只发送，来不及消费结果，接收队列填满导致 pause_reading
             )
@@ -98,6 +114,9 @@ class WebSocketManager:
                 kwargs["proxy"] = None  
             
             self.state.websocket = await websockets.connect(**kwargs)
+            self._audio_offsets.clear()
+            self._credits.clear()
+            logger.debug(f"协商的子协议: {self.state.websocket.subprotocol}")
 
             console.print(f'[bold green]已连接服务端: {url}[/bold green]\n')
             logger.info(f"WebSocket 建立成功: {url}")
@@ -139,10 +158,157 @@ class WebSocketManager:
             
         except Exception as e:
             raise CommunicationError(f"发送消息时发生未知错误: {e}")
+
+    async def send_audio(self, message: AudioMessage, data: bytes) -> bool:
+        """
+        发送音频数据到服务端
+
+        若服务端支持 v2 协议，任务首包前发送一次 SessionMessage，
+        之后以二进制帧发送原始 PCM；否则回退为 JSON + Base64。
+
+        Args:
+            message: 携带任务元信息的 AudioMessage（data 字段将被忽略）
+            data: 原始音频数据 (float32, 16kHz, mono)
+
+        Returns:
+            发送是否成功
+        """
+        if not self.binary_audio:
+            message.data = base64.b64encode(data).decode('utf-8')
+            return await self.send(message)
+
+        try:
+            async with self._send_lock:
+                websocket = self.state.websocket
+                offset = self._audio_offsets.get(message.task_id)
+                if offset is None:
+                    await websocket.send(SessionMessage.from_audio_message(message).to_json())
+                    self._audio_offsets[message.task_id] = offset = 0
+
+                if message.is_final:
+                    self._audio_offsets.pop(message.task_id, None)
+                else:
+                    self._audio_offsets[message.task_id] = offset + len(data)
+
+                frame = AudioFrame(
+                    task_id=message.task_id,
+                    offset=offset,
+                    data=data,
+                    is_final=message.is_final,
+                )
+                await websocket.send(frame.to_bytes())
+            return True
+
+        except (websockets.exceptions.ConnectionClosedError, websockets.exceptions.ConnectionClosedOK):
+            self.state.websocket = None
+            raise CommunicationError("发送失败：连接已断开")
+
+        except Exception as e:
+            raise CommunicationError(f"发送音频时发生未知错误: {e}")
+
+    async def send_cancel(self, task_id: str) -> bool:
+        """
+        通知服务端放弃任务
+
+        服务端丢弃该任务已接收的音频，并中止正在进行的识别，不再返回结果。
+        连接已断开时无需发送：服务端会中止该连接的全部任务。
+
+        Returns:
+            发送是否成功
+        """
+        self._audio_offsets.pop(task_id, None)
+        self.release_credit(task_id)
+        if not self.is_connected:
+            return False
+
+        try:
+            async with self._send_lock:
+                await self.state.websocket.send(CancelMessage(task_id=task_id).to_json())
+            logger.info(f"已通知服务端取消任务，任务ID: {task_id}")
+            return True
+
+        except (websockets.exceptions.ConnectionClosedError, websockets.exceptions.ConnectionClosedOK):
+            self.state.websocket = None
+            logger.warning(f"取消任务时连接已断开，任务ID: {task_id}")
+            return False
+
+    async def open_session(self, message: AudioMessage) -> bool:
+        """
+        仅发送任务的会话元信息（v2 协议），不携带音频
+
+        请求流控的任务需先登记会话，服务端才会下发初始额度。
+
+        Returns:
+            发送是否成功
+        """
+        if not self.binary_audio:
+            return False
+
+        if message.flow_control:
+            self._credits[message.task_id] = 0.0
+
+        try:
+            async with self._send_lock:
+                if message.task_id not in self._audio_offsets:
+                    await self.state.websocket.send(SessionMessage.from_audio_message(message).to_json())
+                    self._audio_offsets[message.task_id] = 0
+            return True
+
+        except (websockets.exceptions.ConnectionClosedError, websockets.exceptions.ConnectionClosedOK):
+            self.state.websocket = None
+            raise CommunicationError("发送失败：连接已断开")
+
+        except Exception as e:
+            raise CommunicationError(f"发送会话信息时发生未知错误: {e}")
+
+    async def acquire_credit(self, task_id: str, bytes_sent: int) -> int:
+        """
+        等待发送额度
+
+        额度用尽时挂起，直到 receive() 收到新的 CreditMessage。
+        调用方需同时运行 receive() 循环，额度消息才会被处理。
+
+        Args:
+            task_id: 任务唯一标识
+            bytes_sent: 该任务已发送的字节数
+
+        Returns:
+            当前还可以发送的字节数（按采样点对齐，大于 0）
+        """
+        while True:
+            if not self.is_connected:
+                raise CommunicationError("等待发送额度失败：连接已断开")
+            if task_id not in self._credits:
+                raise CommunicationError("等待发送额度失败：任务已结束")
+            granted = AudioFormat.seconds_to_bytes(self._credits[task_id])
+            available = granted - bytes_sent
+            available -= available % AudioFormat.BYTES_PER_SAMPLE
+            if available > 0:
+                return available
+            self._credit_event.clear()
+            await self._credit_event.wait()
+
+    def release_credit(self, task_id: str) -> None:
+        """任务结束后丢弃其额度记录，并唤醒仍在等待的发送方"""
+        self._credits.pop(task_id, None)
+        self._credit_event.set()
+
+    def _on_credit(self, credit: CreditMessage) -> None:
+        """记录服务端下发的额度，唤醒等待中的发送方"""
+        if credit.task_id not in self._credits:
+            return
+        self._credits[credit.task_id] = max(self._credits[credit.task_id], credit.granted)
+        self._credit_event.set()
+        logger.debug(
+            f"收到发送额度，任务ID: {credit.task_id}, 额度: {credit.granted:.1f}s, "
+            f"服务端积压: {credit.backlog:.1f}s"
+        )
     
     async def receive(self) -> Optional[RecognitionMessage]:
         """
         接收服务端消息
+
+        额度消息在此处理并跳过，只返回识别结果。
         
         Returns:
             解析后的 RecognitionMessage 对象，如果失败返回 None
@@ -152,12 +318,17 @@ class WebSocketManager:
             return None
         
         try:
-            raw_message = await self.state.websocket.recv()
-            data = json.loads(raw_message)
-            return RecognitionMessage.from_dict(data)
+            while True:
+                raw_message = await self.state.websocket.recv()
+                data = json.loads(raw_message)
+                if data.get('type') == 'credit':
+                    self._on_credit(CreditMessage.from_dict(data))
+                    continue
+                return RecognitionMessage.from_dict(data)
             
         except (websockets.exceptions.ConnectionClosedError, websockets.exceptions.ConnectionClosedOK):
             self.state.websocket = None
+            self._credit_event.set()
             raise CommunicationError("接收失败：连接已断开")
             
         except json.JSONDecodeError as e:
@@ -2,15 +2,20 @@
 """
 音素处理算法
 
-提供文本到音素序列的转换功能。
+提供文本到音素序列的转换功能，以及热词音素的持久化缓存。
 """
 
+import os
 import re
+import json
 import unicodedata
-from typing import List, Tuple, Literal
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple, Literal
 from dataclasses import dataclass
 from . import logger
 from pypinyin import pinyin, Style
+from pypinyin import __version__ as PYPINYIN_VERSION
 
 
 @dataclass(frozen=True)
@@ -292,6 +297,134 @@ def _process_en_num(text: str, pos: int, seq: List[Phoneme], split_char: bool) -
     return end_pos
 
 
+class PhonemeCache:
+    """
+    热词音素缓存
+
+    以文本为键缓存 get_phoneme_info 的结果，热词重载时只为新出现的文本调用 pypinyin。
+    指定 path 时持久化到磁盘：JSON Lines 格式，首行记录缓存格式与 pypinyin 版本，
+    二者任一变化则整体失效；新条目追加写入，调用方可用 prune 清理不再使用的条目。
+    多个识别子进程共用同一文件：写入时持有文件锁，发现文件已被其他进程改写则整体重写。
+
+    Args:
+        path: 缓存文件路径，None 表示只缓存在内存中
+    """
+
+    FORMAT = 1
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self.entries: Dict[str, List[Phoneme]] = {}
+        self._pending: List[str] = []     # 尚未写入磁盘的文本
+        self._rewrite = True              # 下次保存时整体重写（文件缺失、失效或损坏）
+        self._size = -1                   # 本进程上次读写后的文件大小，用于发现其他进程的写入
+        self._load()
+
+    @property
+    def header(self) -> dict:
+        return {'format': self.FORMAT, 'pypinyin': PYPINYIN_VERSION}
+
+    def _load(self) -> None:
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                if json.loads(f.readline()) != self.header:
+                    logger.debug(f"音素缓存版本不一致，将重新生成: {self.path}")
+                    return
+                # 相同的音素对象（不可变）在各热词间共享，省去大量重复构造
+                pool: Dict[tuple, Phoneme] = {}
+                for line in f:
+                    text, items = json.loads(line)
+                    phonemes = []
+                    for item in map(tuple, items):
+                        p = pool.get(item)
+                        if p is None:
+                            p = pool[item] = Phoneme(*item)
+                        phonemes.append(p)
+                    self.entries[text] = phonemes
+                self._size = os.fstat(f.fileno()).st_size
+            self._rewrite = False
+        except (OSError, ValueError, TypeError) as e:
+            # 保留已读出的条目，下次保存时重写整个文件
+            logger.warning(f"音素缓存读取失败，将重新生成: {e}")
+
+    def get(self, text: str) -> List[Phoneme]:
+        """取文本的音素序列，未缓存时计算并记为待写入"""
+        phonemes = self.entries.get(text)
+        if phonemes is None:
+            phonemes = self.entries[text] = get_phoneme_info(text)
+            self._pending.append(text)
+        return phonemes
+
+    def prune(self, keep: Set[str]) -> None:
+        """只保留 keep 中的条目，下次保存时重写文件"""
+        self.entries = {t: self.entries[t] for t in keep if t in self.entries}
+        self._rewrite = True
+
+    def save(self) -> None:
+        """把新条目追加写入磁盘（文件失效或 prune 之后整体重写）"""
+        if not self.path or not (self._pending or self._rewrite):
+            self._pending.clear()
+            return
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with _file_lock(self.path.with_name(self.path.name + '.lock')):
+                # 其他进程在本进程读取之后写过文件：整体重写，避免各进程重复追加相同条目
+                size = self.path.stat().st_size if self.path.exists() else -1
+                if size != self._size:
+                    self._rewrite = True
+                if self._rewrite:
+                    tmp = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+                    with open(tmp, 'w', encoding='utf-8') as f:
+                        f.write(json.dumps(self.header) + '\n')
+                        f.writelines(self._dumps(t) for t in self.entries)
+                    os.replace(tmp, self.path)
+                    self._rewrite = False
+                else:
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.writelines(self._dumps(t) for t in self._pending)
+                self._size = self.path.stat().st_size
+        except OSError as e:
+            logger.warning(f"音素缓存写入失败: {e}")
+        self._pending.clear()
+
+    def _dumps(self, text: str) -> str:
+        items = [
+            (p.value, p.lang, p.is_word_start, p.is_word_end, p.char_start, p.char_end)
+            for p in self.entries[text]
+        ]
+        return json.dumps([text, items], ensure_ascii=False) + '\n'
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """进程间互斥的文件锁（阻塞等待），Windows 用 msvcrt，其他平台用 fcntl"""
+    with open(path, 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:     # LK_LOCK 重试约 10 秒后仍未拿到锁会抛出
+                    pass
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
 if __name__ == "__main__":
     # Setup UTF-8 output for Windows
     import sys
@@ -13,9 +13,9 @@ from typing import List, Tuple, Dict, Set, Optional, NamedTuple
 from collections import defaultdict
 from pathlib import Path
 
-from .algo_phoneme import get_phoneme_info, Phoneme
+from .algo_phoneme import get_phoneme_info, Phoneme, PhonemeCache
 from .rag_fast_batch import FastRAG
-from .algo_calc import fuzzy_substring_search_constrained
+from .algo_calc import fuzzy_substring_search_batch
 
 # 使用统一的 logger（从 __init__.py 导入）
 from . import logger
@@ -28,6 +28,14 @@ class MatchResult(NamedTuple):
     hotword: str
 
 
+class HotwordEntry(NamedTuple):
+    """热词文件中一行的解析结果"""
+    target: str                         # 替换目标（首个词）
+    parts: List[str]                    # 目标及其别名
+    phoneme_lists: List[List[Phoneme]]  # 各别名的音素序列
+    blacklist: Set[str]                 # 黑名单词
+
+
 class CorrectionResult(NamedTuple):
     """纠错结果，包含纠错后的文本和匹配的热词列表"""
     text: str                           # 纠错后的文本
@@ -47,9 +55,14 @@ class PhonemeCorrector:
     并将相似度超过阈值的片段替换为热词。
     """
 
-    def __init__(self, threshold: float = 0.85, similar_threshold: float = None):
+    def __init__(self, threshold: float = 0.85, similar_threshold: float = None, cache_path: Optional[Path] = None):
         """
         初始化拼音纠错器
+
+        Args:
+            threshold: 替换阈值
+            similar_threshold: 相似热词阈值
+            cache_path: 热词音素缓存文件路径，None 表示只缓存在内存中
         """
         self.threshold = threshold
         self.similar_threshold = similar_threshold if similar_threshold is not None else threshold - 0.2
@@ -57,48 +70,115 @@ class PhonemeCorrector:
         self.hotwords: Dict[str, List[List[Phoneme]]] = {}
         self.blacklists: Dict[str, Set[str]] = {}
         self.fast_rag = FastRAG(threshold=min(self.threshold, self.similar_threshold) - 0.1)
+        self.phoneme_cache = PhonemeCache(cache_path)
+        # 上次加载的逐行解析结果 {行: 解析结果}，以及各热词来自哪些行
+        self._entries: Dict[str, Optional[HotwordEntry]] = {}
+        self._target_lines: Dict[str, Set[str]] = defaultdict(set)
+        self._dup_targets: Set[str] = set()     # 出现在多行中的热词，以最后一行为准
+        self._position: Dict[str, int] = {}     # {行: 行序}
         self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def _parse_line(self, line: str) -> Optional[HotwordEntry]:
+        """解析一行热词：热词 | 别名 ... ~~~ 黑名单词 | ..."""
+        if '~~~' in line:
+            hotword_part, blacklist_part = line.split('~~~', 1)
+        else:
+            hotword_part, blacklist_part = line, ""
+
+        parts = [p.strip() for p in hotword_part.split('|') if p.strip()]
+        if not parts:
+            return None
+
+        phoneme_lists = []
+        for part in parts:
+            phons = self.phoneme_cache.get(part)
+            if phons:
+                phoneme_lists.append(phons)
+        if not phoneme_lists:
+            return None
+
+        blacklist_words = set(p.strip() for p in blacklist_part.split('|') if p.strip())
+        return HotwordEntry(parts[0], parts, phoneme_lists, blacklist_words)
 
     def update_hotwords(self, hotword_text: str) -> int:
-        """更新纠错热词库 (线程安全)"""
+        """
+        更新纠错热词库 (线程安全)
+
+        与上次加载的内容逐行比对，只解析新增的行（音素取自音素缓存），
+        FastRAG 只移除、添加有变化的热词，不整体重建索引。
+        """
         start_time = time.time()
         
         # 预析取有效行
-        lines = [line.strip() for line in hotword_text.splitlines() if line.strip() and not line.strip().startswith('#')]
+        lines = [line for line in map(str.strip, hotword_text.splitlines()) if line and line[0] != '#']
         
-        new_hotwords: Dict[str, List[List[Phoneme]]] = {}
-        new_blacklists: Dict[str, Set[str]] = {}
-        for line in lines:
-            if '~~~' in line:
-                hotword_part, blacklist_part = line.split('~~~', 1)
-            else:
-                hotword_part, blacklist_part = line, ""
-
-            parts = [p.strip() for p in hotword_part.split('|') if p.strip()]
-            if not parts:
-                continue
-            target = parts[0]
-            
-            phoneme_lists = []
-            for part in parts:
-                phons = get_phoneme_info(part)
-                if phons:
-                    phoneme_lists.append(phons)
-            
-            blacklist_words = set(p.strip() for p in blacklist_part.split('|') if p.strip())
-            
-            if phoneme_lists:
-                new_hotwords[target] = phoneme_lists
-                new_blacklists[target] = blacklist_words
+        with self._update_lock:
+            entries = self._entries
+            line_set = set(lines)
+            removed_lines = entries.keys() - line_set
+            parsed = {line: self._parse_line(line) for line in line_set.difference(entries)}
+
+            if len(self.phoneme_cache.entries) > 2 * len(line_set) + 1024:
+                # 缓存中不再使用的条目过多，清理后重写缓存文件
+                live = [e for e in entries.values() if e] + [e for e in parsed.values() if e]
+                self.phoneme_cache.prune({part for entry in live for part in entry.parts})
+            self.phoneme_cache.save()
+
+            with self._lock:
+                # 1. 更新逐行解析结果，收集受影响的热词
+                affected = set(self._dup_targets)
+                for line in removed_lines:
+                    entry = entries.pop(line)
+                    if entry:
+                        self._target_lines[entry.target].discard(line)
+                        affected.add(entry.target)
+                for line, entry in parsed.items():
+                    entries[line] = entry
+                    if entry:
+                        self._target_lines[entry.target].add(line)
+                        affected.add(entry.target)
+                self._position = dict(zip(lines, range(len(lines))))
+
+                # 2. 重新确定受影响热词的解析结果（同一热词出现在多行时以最后一行为准）
+                removed, added = [], {}
+                for target in affected:
+                    target_lines = self._target_lines.get(target)
+                    if not target_lines:
+                        self._target_lines.pop(target, None)
+                        self._dup_targets.discard(target)
+                        if target in self.hotwords:
+                            removed.append(target)
+                            del self.hotwords[target]
+                            del self.blacklists[target]
+                        continue
+
+                    if len(target_lines) > 1:
+                        self._dup_targets.add(target)
+                        entry = entries[max(target_lines, key=self._position.__getitem__)]
+                    else:
+                        self._dup_targets.discard(target)
+                        entry = entries[next(iter(target_lines))]
+                    self.blacklists[target] = entry.blacklist
+                    if self.hotwords.get(target) is not entry.phoneme_lists:
+                        if target in self.hotwords:
+                            removed.append(target)
+                        added[target] = self.hotwords[target] = entry.phoneme_lists
+
+                # 3. 原地更新索引
+                self.fast_rag.remove_hotwords(removed)
+                self.fast_rag.add_hotwords(added)
+                num = len(self.hotwords)
         
-        with self._lock:
-            self.hotwords = new_hotwords
-            self.blacklists = new_blacklists
-            self.fast_rag = FastRAG(threshold=min(self.threshold, self.similar_threshold) - 0.1)
-            self.fast_rag.add_hotwords(new_hotwords)
-        
-        logger.debug(f"PhonemeCorrector 已更新 {len(new_hotwords)} 个热词，耗时 {time.time() - start_time:.3f}s")
-        return len(new_hotwords)
+        logger.debug(
+            f"PhonemeCorrector 已更新 {num} 个热词（新增 {len(parsed)} 行，删除 {len(removed_lines)} 行），"
+            f"耗时 {time.time() - start_time:.3f}s"
+        )
+        return num
+
+    def _rank(self, hotword: str) -> int:
+        """热词在文件中首次出现的行序，匹配分数相同时靠前的热词优先"""
+        return min(map(self._position.__getitem__, self._target_lines[hotword]))
 
     def _find_matches(self, text: str, fast_results: List, input_processed: List[Tuple]) -> Tuple[List[MatchResult], List[Tuple[str, str, float]]]:
         """精细匹配逻辑：边界约束的模糊搜索"""
@@ -116,42 +196,44 @@ class PhonemeCorrector:
 
         search_threshold = min(self.threshold, self.similar_threshold) - 0.1
 
-        # 对每个目标遍历其所有出现位置
+        # 对每个目标遍历其所有出现位置，收集 (热词, 搜索窗口) 组合
+        tasks = []  # [(hw, hw_compare, window_start, window_end), ...]
         for hw, approx_end_indices in seen_targets.items():
+            hw_compares = [[p.info[:5] for p in hw_phonemes] for hw_phonemes in self.hotwords[hw]]
             for approx_end_idx in approx_end_indices:
-                for hw_phonemes in self.hotwords[hw]:
-                    hw_compare = [p.info[:5] for p in hw_phonemes]
-
+                for hw_compare in hw_compares:
                     # [性能优化] 仅在 FastRAG 预测的结束位置附近进行搜索
                     # 窗口大小：热词长度 + 左右各 5 个音素的缓冲
                     window_size = len(hw_compare) + 10
                     window_start = max(0, approx_end_idx - window_size)
                     window_end = min(len(input_processed), approx_end_idx + 5)
+                    tasks.append((hw, hw_compare, window_start, window_end))
 
-                    local_input = input_processed[window_start:window_end]
-
-                    # 搜索匹配
-                    found_segments = fuzzy_substring_search_constrained(hw_compare, local_input, threshold=search_threshold)
+        # 所有组合一次批量搜索
+        found = fuzzy_substring_search_batch(
+            input_processed, [(hw_compare, start, end) for _, hw_compare, start, end in tasks], threshold=search_threshold
+        )
 
-                    for score, start_phon_idx, end_phon_idx in found_segments:
-                        # 转换回全局索引
-                        global_start_idx = window_start + start_phon_idx
-                        global_end_idx = window_start + end_phon_idx
+        for (hw, _, window_start, _), found_segments in zip(tasks, found):
+            for score, start_phon_idx, end_phon_idx in found_segments:
+                # 转换回全局索引
+                global_start_idx = window_start + start_phon_idx
+                global_end_idx = window_start + end_phon_idx
 
-                        # 从 input_processed 直接拿 char 索引
-                        char_start = input_processed[global_start_idx][5]
-                        char_end = input_processed[global_end_idx-1][6]
+                # 从 input_processed 直接拿 char 索引
+                char_start = input_processed[global_start_idx][5]
+                char_end = input_processed[global_end_idx-1][6]
 
-                        res = MatchResult(char_start, char_end, score, hw)
-                        origin_val = text[char_start:char_end]
+                res = MatchResult(char_start, char_end, score, hw)
+                origin_val = text[char_start:char_end]
 
-                        # 分类到 matches 和 similars
-                        if score >= self.threshold:
-                            matches.append(res)
+                # 分类到 matches 和 similars
+                if score >= self.threshold:
+                    matches.append(res)
 
-                        # 所有超过相似度阈值的都记入 similars（用于提示）
-                        if score >= self.similar_threshold:
-                            similars.append((origin_val, hw, score))
+                # 所有超过相似度阈值的都记入 similars（用于提示）
+                if score >= self.similar_threshold:
+                    similars.append((origin_val, hw, score))
 
         # 潜在热词去重与排序 (不再简单按 seen_hw 排重，而是按分数和覆盖范围排序)
         # 为潜在建议列表保留前 k 个最相关的不同热词
@@ -211,10 +293,10 @@ class PhonemeCorrector:
                 return True
         return False
 
-    def _resolve_and_replace(self, text: str, matches: List[MatchResult], window: int) -> Tuple[str, List[Tuple[str, float]], List[Tuple[str, float]]]:
+    def _resolve_and_replace(self, text: str, matches: List[MatchResult], window: int, ranks: Dict[str, int]) -> Tuple[str, List[Tuple[str, float]], List[Tuple[str, float]]]:
         """冲突去重与文本替换"""
-        # 分数优先 > 长度优先
-        matches.sort(key=lambda x: (x.score, x.end - x.start), reverse=True)
+        # 分数优先 > 长度优先 > 热词在文件中靠前优先
+        matches.sort(key=lambda x: (-x.score, x.start - x.end, ranks[x.hotword]))
         
         final_matches = []
         all_matched_info = []
@@ -289,9 +371,10 @@ class PhonemeCorrector:
 
             # 精筛
             matches, similars = self._find_matches(text, fast_results, input_processed)
+            ranks = {m.hotword: self._rank(m.hotword) for m in matches}
 
         # 3. 冲突解决与替换
-        new_text, final_hw_info, all_hw_info = self._resolve_and_replace(text, matches, window)
+        new_text, final_hw_info, all_hw_info = self._resolve_and_replace(text, matches, window, ranks)
         
         # similars 已经是 [(origin, hw, score), ...] 的元组列表
         return CorrectionResult(text=new_text, matches=final_hw_info, similars=similars[:k])
@@ -452,3 +535,117 @@ VsCode
 
     print(f"\n平均耗时: {pc_time:.2f}ms / iter")
     print("="*70)
+
+    # =====================================================================
+    # 精筛测试：10000 热词，粗筛与精筛分别计时
+    # =====================================================================
+    print("\n" + "="*70)
+    print("【性能测试】10000 热词粗筛 / 精筛耗时")
+    print("="*70)
+
+    import random
+    from .algo_calc import _info_cost
+
+    def per_cell_search(hw_info, input_info, threshold):
+        """批量化之前的逐格 DP（原 fuzzy_substring_search_constrained），作为正确性参照"""
+        n, m = len(hw_info), len(input_info)
+        dp = [[float('inf')] * (m + 1) for _ in range(n + 1)]
+        path = [[(0, 0)] * (m + 1) for _ in range(n + 1)]
+        for j in range(m + 1):
+            if j == 0 or (j < m and input_info[j][2]):
+                dp[0][j] = 0.0
+                path[0][j] = (0, j)
+        for i in range(1, n + 1):
+            row_min = float('inf')
+            for j in range(1, m + 1):
+                cost = _info_cost(
+                    (hw_info[i-1][0], hw_info[i-1][1], hw_info[i-1][4]),
+                    (input_info[j-1][0], input_info[j-1][1], input_info[j-1][4]),
+                )
+                dist_match = dp[i-1][j-1] + cost
+                dist_del = dp[i-1][j] + 1.0
+                dist_ins = dp[i][j-1] + 1.0
+                if dist_match <= dist_del and dist_match <= dist_ins:
+                    dp[i][j], path[i][j] = dist_match, path[i-1][j-1]
+                elif dist_del <= dist_ins and dist_del < dist_match:
+                    dp[i][j], path[i][j] = dist_del, path[i-1][j]
+                else:
+                    dp[i][j], path[i][j] = dist_ins, path[i][j-1]
+                row_min = min(row_min, dp[i][j])
+            if row_min > n * (1.0 - threshold) + 2:
+                break
+        results = []
+        for j in range(1, m + 1):
+            if not input_info[j-1][3] or dp[n][j] >= n * 0.8:
+                continue
+            score = 1.0 - (dp[n][j] / n)
+            if score >= threshold:
+                results.append((score, path[n][j][1], j))
+        results.sort(key=lambda x: x[0], reverse=True)
+        used_ends = {}
+        for score, st, e in results:
+            if e not in used_ends or score > used_ends[e][0]:
+                used_ends[e] = (score, st, e)
+        return sorted(used_ends.values(), key=lambda x: x[0], reverse=True)
+
+    random.seed(0)
+    chars = '的一是不了在人有我他这个们中来上大为和国地到以说时要就出会可也你对生能而子那得于着下自之年过发后作里如等'
+    many = PhonemeCorrector(threshold=0.85, similar_threshold=0.6)
+    many.update_hotwords('\n'.join(''.join(random.choice(chars) for _ in range(random.randint(2, 4))) for _ in range(10000)))
+    sentences = [''.join(random.choice(chars) for _ in range(30)) for _ in range(10)]
+
+    t_fast = t_fine = 0.0
+    n_tasks = 0
+    for sentence in sentences:
+        input_processed = [p.info for p in get_phoneme_info(sentence)]
+        start = time.time()
+        fast_results = many.fast_rag.search(get_phoneme_info(sentence), top_k=0)
+        t_fast += time.time() - start
+        start = time.time()
+        many._find_matches(sentence, fast_results, input_processed)
+        t_fine += time.time() - start
+        n_tasks += len(fast_results)
+
+    # 抽查：批量 DP 与批量化之前的逐格 DP 结果逐位一致（最后一句的全部候选，在整句中搜索）
+    compare = [[p.info[:5] for p in many.hotwords[hw][0]] for hw, *_ in fast_results]
+    batch = fuzzy_substring_search_batch(input_processed, [(hw, 0, len(input_processed)) for hw in compare], 0.5)
+    same = batch == [per_cell_search(hw, input_processed, 0.5) for hw in compare]
+
+    print(f"粗筛: {t_fast / len(sentences) * 1000:.1f}ms / 句")
+    print(f"精筛: {t_fine / len(sentences) * 1000:.1f}ms / 句 (平均 {n_tasks // len(sentences)} 个候选)")
+    print(f"批量 DP 与逐格 DP 一致: {same} ({len(compare)} 个热词, {sum(map(len, batch))} 个匹配)")
+    print("="*70)
+
+    # =====================================================================
+    # 重载测试：50000 行热词文件改动一行
+    # =====================================================================
+    print("\n" + "="*70)
+    print("【性能测试】50000 行热词文件改动一行后重载")
+    print("="*70)
+
+    import tempfile
+
+    random.seed(0)
+    big_lines = [''.join(random.choice(chars) for _ in range(random.randint(2, 5))) for _ in range(50000)]
+    big_text = '\n'.join(big_lines)
+    edited_text = '\n'.join(big_lines[:-1] + ['康辉撒贝宁'])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = Path(tmp) / 'hot.phonemes.jsonl'
+        big = PhonemeCorrector(threshold=0.8, cache_path=cache_path)
+
+        start = time.time()
+        n = big.update_hotwords(big_text)
+        print(f"首次加载（无缓存）: {time.time() - start:.3f}s, {n} 个热词")
+
+        start = time.time()
+        big.update_hotwords(edited_text)
+        print(f"改动一行后重载:     {(time.time() - start) * 1000:.1f}ms")
+
+        start = time.time()
+        restarted = PhonemeCorrector(threshold=0.8, cache_path=cache_path)
+        restarted.update_hotwords(edited_text)
+        print(f"重启后加载（磁盘缓存）: {time.time() - start:.3f}s")
+
+        print(f"纠错结果一致: {big.correct(long_text) == restarted.correct(long_text)}")
+    print("="*70)
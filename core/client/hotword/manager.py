@@ -70,8 +70,10 @@ class HotwordManager:
         self.threshold = threshold
         self.similar_threshold = similar_threshold
 
-        # 初始化各个组件
-        self.phoneme_corrector = PhonemeCorrector(threshold=threshold, similar_threshold=similar_threshold)
+        # 初始化各个组件（热词音素缓存放在热词文件旁的 __pycache__ 中）
+        hot_path = self.files.get('hot')
+        cache_path = hot_path.parent / '__pycache__' / f'{hot_path.stem}.phonemes.jsonl' if hot_path else None
+        self.phoneme_corrector = PhonemeCorrector(threshold=threshold, similar_threshold=similar_threshold, cache_path=cache_path)
         self.rule_corrector = RuleCorrector()
         
         self._observer: Optional[Observer] = None
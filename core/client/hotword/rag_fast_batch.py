@@ -2,16 +2,17 @@
 """
 RapidFuzz 全局批量加速版 FastRAG (掩码剥离版)
 
-与 rag_fast.py 接口一致（FastRAG 类），利用 rapidfuzz.process.extract
-在 C++ 层一次性对所有热词进行滑动匹配，彻底干掉倒排索引、锚点扫描以及 Python 层的匹配循环。
-并在匹配成功的候选上使用掩码剥离机制支持多位置匹配召回。
+与 rag_fast.py 接口一致（FastRAG 类），先用 rag_fast.PhonemeIndex 的三元组倒排索引
+按长度与共有三元组数剪枝（短热词按前两个音素保留），再利用 rapidfuzz.process.extract
+在 C++ 层一次性对剩余候选进行滑动匹配。并在匹配成功的候选上使用掩码剥离机制支持多位置匹配召回。
 """
-from typing import List, Dict, Tuple
+from typing import Iterable, List, Dict, Tuple
+from collections import defaultdict
 import time
 from . import logger
 
 from .algo_phoneme import Phoneme
-from .rag_fast import PhonemeEncoder
+from .rag_fast import PhonemeIndex
 import rapidfuzz.fuzz as _fuzz
 import rapidfuzz.distance.OSA as _OSA
 import rapidfuzz.process as _process
@@ -22,11 +23,20 @@ class FastRAG:
     RapidFuzz 全局批量加速版 RAG 检索器
     """
 
-    def __init__(self, threshold: float = 0.6):
+    def __init__(self, threshold: float = 0.6, max_candidates: int = 0):
+        """
+        Args:
+            threshold: 相似度阈值
+            max_candidates: 每次检索交给 rapidfuzz 匹配的三元组候选数上限（0 表示不限制，设置后召回不再无损）
+        """
         self.threshold = threshold
-        self.encoder = PhonemeEncoder()
+        self.max_candidates = max_candidates
+        self.index = PhonemeIndex()
+        self.encoder = self.index.encoder
         # {(hw, tuple_codes): codes}
         self.hotwords: Dict[Tuple[str, Tuple[int, ...]], List[int]] = {}
+        # {hw: [(hw, tuple_codes), ...]}，用于原地移除
+        self.keys: Dict[str, List[Tuple[str, Tuple[int, ...]]]] = defaultdict(list)
         self.hotword_count = 0
 
     def add_hotwords(self, hotwords: Dict[str, List[List[Phoneme]]]):
@@ -36,8 +46,21 @@ class FastRAG:
                 if phonemes:
                     phoneme_strs = [p.value for p in phonemes]
                     codes = self.encoder.encode_sequence(phoneme_strs)
-                    self.hotwords[(hw, tuple(codes))] = codes
-                    self.hotword_count += 1
+                    key = (hw, tuple(codes))
+                    if key not in self.hotwords:
+                        self.keys[hw].append(key)
+                        self.index.add_codes(hw, codes)
+                        self.hotword_count += 1
+                    self.hotwords[key] = codes
+
+    def remove_hotwords(self, hotwords: Iterable[str]):
+        """批量移除热词（同一热词的全部音素序列一并移除）"""
+        hotwords = set(hotwords)
+        self.index.remove(hotwords)
+        for hw in hotwords:
+            for key in self.keys.pop(hw, ()):
+                del self.hotwords[key]
+                self.hotword_count -= 1
 
     def search(self, input_phonemes: List[Phoneme], top_k: int = 0) -> List[Tuple[str, float, int]]:
         """检索相关热词（top_k <= 0 时不限制，返回全部）"""
@@ -49,11 +72,19 @@ class FastRAG:
         input_list = self.encoder.encode_sequence(phoneme_strs)
         pr_cutoff = self.threshold * 100
 
+        t_step0_start = time.perf_counter()
+        # 倒排索引剪枝：OSA 距离超过 osa_cutoff 的序列不会进入结果，按同样的编辑次数上限筛选
+        choices = {}
+        for seq_id in self.index.candidate_ids(input_list, self.threshold, True, self.max_candidates):
+            key = (self.index.hotwords[seq_id], tuple(self.index.sequence(seq_id)))
+            choices[key] = self.hotwords[key]
+
         t_step1_start = time.perf_counter()
+        step0_ms = (t_step1_start - t_step0_start) * 1000
         # 一次性调用 C++ 批量匹配，过滤 99.9% 绝不可能匹配的候选词
         matches = _process.extract(
             input_list,
-            self.hotwords,
+            choices,
             scorer=_fuzz.partial_ratio,
             score_cutoff=pr_cutoff,
             limit=None
@@ -113,6 +144,7 @@ class FastRAG:
         # 输出每次检索各阶段的时间细节，便于协调分析
         logger.debug(
             f"FastRAG_batch.search - "
+            f"剪枝 耗时: {step0_ms:.2f}ms, 剩余: {len(choices)}/{self.hotword_count} | "
             f"第一步(extract 粗筛) 耗时: {step1_ms:.2f}ms, 候选数: {len(matches)} | "
             f"第二步(对齐+掩码) 耗时: {step2_ms:.2f}ms, 最终匹配数: {len(results)}"
         )
@@ -48,7 +48,7 @@ class FastRAG:
 
         t0 = time.perf_counter()
         input_codes = self.index.encode_input(input_phonemes)
-        candidates = self.index.get_candidates(input_codes)
+        candidates = self.index.get_candidates(input_codes, self.threshold, transpositions=True)
         t1 = time.perf_counter()
         logger.debug(f"FastRAG_rf.get_candidates: {(t1-t0)*1000:.0f}ms, {len(candidates)} 候选")
 
@@ -167,5 +167,5 @@ if __name__ == "__main__":
 
     print(f"  检索耗时: {elapsed*1000:.1f}ms")
     print(f"  热词总数: {rag.hotword_count}")
-    print(f"  候选数量: {len(rag.index.get_candidates(rag.index.encode_input(input_phonemes)))}")
+    print(f"  候选数量: {len(rag.index.get_candidates(rag.index.encode_input(input_phonemes), rag.threshold, transpositions=True))}")
     print(f"  结果: {results[:5]}")
@@ -1,5 +1,6 @@
 # coding: utf-8
 from __future__ import annotations
+import asyncio
 from pathlib import Path
 from . import logger
 from config_client import ClientConfig as Config, __version__
@@ -48,8 +49,8 @@ class FileRunner:
                 else:
                     transcriber = FileTranscriber(self.app, file)
                     if await transcriber.check():
-                        await transcriber.send()
-                        await transcriber.receive()
+                        # 并发收发：流控额度随识别结果一起下发
+                        await asyncio.gather(transcriber.send(), transcriber.receive())
                         await transcriber.close()
                 
                 logger.info(f"文件处理完成: {file}")
@@ -183,6 +183,15 @@ class ResultProcessor:
         if message is None:
             return
 
+        if message.error:
+            logger.error(f"服务端识别失败: {message.error}")
+            console.print(f'[red]识别失败：{message.error}')
+            return
+
+        # 中间结果：只在控制台滚动显示末尾文字，等待最终结果再输出
+        if message.is_partial:
+            console.print(f'\033[K    实时结果：[bright_black]{message.text[-40:]}', end='\r')
+            return
 
         # 使用 text 字段（简单拼接结果，用于语音输入）
         text = message.text
@@ -226,7 +235,7 @@ class ResultProcessor:
 
         # 控制台输出：时延 + 热词时延合并到一行
         hotword_label = f'  热词时延: {hotword_elapsed:.2f}s' if Config.hot else ''
-        console.print(f'    转录时延：{delay:.2f}s{hotword_label}')
+        console.print(f'\033[K    转录时延：{delay:.2f}s{hotword_label}')
 
         # 先显示原始识别结果
         original_text_stripped = TextOutput.strip_punc(original_text)
@@ -80,6 +80,13 @@ class ShortcutEventHandler:
             logger.debug(f"[{key_name}] 安排异步补发按键")
             self.pool.submit(self.emulator.emulate_key, key_name)
 
+    def handle_abandon(self, key_name) -> None:
+        """处理放弃键：取消所有正在录音的任务，已发送的音频由服务端丢弃"""
+        for task in self.tasks.values():
+            if task.is_recording:
+                logger.info(f"[{key_name}] 放弃录音: {task.shortcut.key}")
+                task.cancel()
+
     def _count_down(self, task) -> None:
         """倒计时（单击模式）"""
         time.sleep(task.threshold)
@@ -7,6 +7,7 @@
 2. 防止不同按键互相干扰
 3. restore 功能的防自捕获逻辑
 4. hold_mode 和 click_mode 支持
+5. 录音过程中按放弃键（默认 Esc）放弃本次录音
 """
 from __future__ import annotations
 import time
@@ -64,6 +65,10 @@ class ShortcutManager:
         # 按键恢复状态追踪
         self._restoring_keys = set()
 
+        # 放弃录音的按键（与某个快捷键相同时以快捷键为准）
+        from config_client import ClientConfig as Config
+        self._abandon_key = (Config.record_abandon_key or '').lower().strip()
+
         # 事件处理器
         self._event_handler = ShortcutEventHandler(self.tasks, self._pool, self._emulator)
 
@@ -106,6 +111,12 @@ class ShortcutManager:
             if self._check_restoring(key_name, msg):
                 return True
 
+            # 录音中按下放弃键：放弃所有进行中的录音
+            if key_name == self._abandon_key and key_name not in self.tasks:
+                if msg in KEY_DOWN_MESSAGES:
+                    self._event_handler.handle_abandon(key_name)
+                return True
+
             # 查找匹配的快捷键
             if key_name not in self.tasks:
                 return True
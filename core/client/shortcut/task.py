@@ -98,15 +98,17 @@ class ShortcutTask:
         )
 
     def cancel(self) -> None:
-        """取消录音任务（时间过短）"""
-        logger.debug(f"[{self.shortcut.key}] 取消录音任务（时间过短）")
+        """取消录音任务（时间过短或用户放弃）"""
+        logger.debug(f"[{self.shortcut.key}] 取消录音任务")
 
         self.is_recording = False
         self.state.stop_recording()
         self._status.stop()
 
-        self.task.cancel()
-        self.task = None
+        # 放弃键取消后，单击模式的倒计时仍会再调用一次 cancel
+        if self.task:
+            self.task.cancel()
+            self.task = None
 
     def finish(self) -> None:
         """完成录音任务"""
@@ -8,7 +8,6 @@
 from __future__ import annotations
 
 import asyncio
-import base64
 import json
 import time
 import uuid
@@ -18,7 +17,7 @@ from typing import TYPE_CHECKING, Optional
 from config_client import ClientConfig as Config
 from core.client.state import console
 from core.client.connection import WebSocketManager
-from core.protocol import AudioMessage, RecognitionMessage
+from core.protocol import AudioMessage, DeltaDecoder, RecognitionMessage
 from .media_tool import MediaTool
 from .result_handler import ResultHandler
 from . import logger
@@ -36,8 +35,10 @@ class FileTranscriber:
     协调转录流程：
     1. 检查环境与文件
     2. 调用 MediaTool 提取音频
-    3. 通过 WebSocket 发送数据
+    3. 通过 WebSocket 发送数据（启用流控时按服务端额度暂停读取）
     4. 调用 ResultHandler 处理结果
+
+    send() 与 receive() 需并发运行：流控额度随识别结果一同由 receive() 接收。
     """
     
     def __init__(self, app: CapsWriterClient, file: Path):
@@ -98,6 +99,9 @@ class FileTranscriber:
         
         # 2. 启动 FFmpeg 进程
         ffmpeg_cmd = MediaTool.build_ffmpeg_cmd(self.file)
+
+        # 流控依赖 v2 协议的会话登记，旧版服务端不启用
+        flow_control = Config.file_flow_control and self._ws_manager.binary_audio
         
         try:
             process = await asyncio.create_subprocess_exec(
@@ -109,9 +113,18 @@ class FileTranscriber:
             # 分块大小：1分钟音频 (16000 * 4 * 60 bytes)
             chunk_size = 16000 * 4 * 60
             bytes_sent = 0
+
+            if flow_control:
+                # 先登记会话，服务端据此下发初始额度
+                await self._ws_manager.open_session(self._build_message(False, flow_control))
             
             while True:
-                data = await process.stdout.read(chunk_size)
+                read_size = chunk_size
+                if flow_control:
+                    # 额度用尽时在此挂起，ffmpeg 因管道写满而随之暂停
+                    available = await self._ws_manager.acquire_credit(self.task_id, bytes_sent)
+                    read_size = min(chunk_size, available)
+                data = await process.stdout.read(read_size)
                 if not data:
                     break
                 
@@ -123,33 +136,13 @@ class FileTranscriber:
                     prog_str = f'    发送进度：{progress:.2f}s'
                 console.print(prog_str, end='\r')
 
-                message = AudioMessage(
-                    task_id=self.task_id,
-                    source='file',
-                    data=base64.b64encode(data).decode('utf-8'),
-                    is_final=False,
-                    time_start=time.time(),
-                    seg_duration=Config.file_seg_duration,
-                    seg_overlap=Config.file_seg_overlap,
-                    context=Config.context,
-                    language=Config.language,
-                )
-                if not await self._ws_manager.send(message):
+                message = self._build_message(False, flow_control)
+                if not await self._ws_manager.send_audio(message, data):
                     raise ConnectionError("消息发送失败，连接可能已断开")
 
             # 发送结束标志
-            final_message = AudioMessage(
-                task_id=self.task_id,
-                source='file',
-                data='',
-                is_final=True,
-                time_start=time.time(),
-                seg_duration=Config.file_seg_duration,
-                seg_overlap=Config.file_seg_overlap,
-                context=Config.context,
-                language=Config.language,
-            )
-            if not await self._ws_manager.send(final_message):
+            final_message = self._build_message(True, flow_control)
+            if not await self._ws_manager.send_audio(final_message, b''):
                 raise ConnectionError("结束标志发送失败")
             await process.wait()
             
@@ -169,15 +162,38 @@ class FileTranscriber:
             if 'process' in locals() and process.returncode is None:
                 process.terminate()
             return
+
+    def _build_message(self, is_final: bool, flow_control: bool) -> AudioMessage:
+        """构造携带任务元信息的 AudioMessage（音频数据由 send_audio 另行发送）"""
+        return AudioMessage(
+            task_id=self.task_id,
+            source='file',
+            data='',
+            is_final=is_final,
+            time_start=time.time(),
+            seg_duration=Config.file_seg_duration,
+            seg_overlap=Config.file_seg_overlap,
+            context=Config.context,
+            language=Config.language,
+            delta=Config.file_delta_results,
+            flow_control=flow_control,
+        )
     
     async def receive(self) -> None:
         """接收转录结果"""
         
+        # 增量模式下按 splice 索引还原完整结果
+        decoder = DeltaDecoder()
         try:
             while True:
                 msg = await self._ws_manager.receive()
                 if not msg:
                     break
+                msg = decoder.apply(msg)
+                if msg.error:
+                    logger.error(f"服务端识别失败: {msg.error}, 文件: {self.file}")
+                    console.print(f'\n    [red]识别失败：{msg.error}')
+                    return
                 
                 console.print(f'    转录进度: {msg.duration:.2f}s', end='\r')
                 if msg.is_final:
@@ -189,6 +205,10 @@ class FileTranscriber:
         except Exception as e:
             logger.error(f"接收消息错误: {e}")
             return
+        finally:
+            # 结束后释放额度，避免发送方仍在等待
+            if self.task_id:
+                self._ws_manager.release_credit(self.task_id)
 
         # 应用热词并同步 tokens
         self._apply_hotwords(message)
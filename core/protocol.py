@@ -4,12 +4,32 @@
 
 定义客户端与服务端之间的消息协议数据类。
 这些类同时用于服务端和客户端，确保消息格式一致。
+
+协议版本：
+    v1 (子协议 'binary')：每个音频包都是 JSON，音频以 Base64 编码放在 data 字段。
+    v2 (子协议 'capswriter.v2')：握手时通过 WebSocket 子协议协商。
+        每个任务先发送一条 JSON 的 SessionMessage（元信息只发一次），
+        之后的音频以二进制帧 AudioFrame 发送（定长头部 + 原始 PCM）。
+        文件任务可在 SessionMessage 中请求流控，服务端以 CreditMessage
+        按秒下发发送额度，客户端用尽额度后暂停读取音频。
+    服务端同时支持两种格式，旧版客户端无需改动。
+
+    两种协议下，客户端都可以发送 CancelMessage 放弃一个任务，
+    服务端丢弃其未处理的片段并中止正在进行的解码，不再返回结果。
 """
 
 from __future__ import annotations
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, asdict, replace
 from typing import List, Literal, Optional
 import json
+import struct
+import uuid
+
+
+# WebSocket 子协议，客户端按优先级依次列出，服务端选取双方都支持的第一个
+SUBPROTOCOL_BINARY_AUDIO = 'capswriter.v2'   # 二进制音频帧
+SUBPROTOCOL_LEGACY = 'binary'                # 旧版 JSON + Base64
+SUBPROTOCOLS = [SUBPROTOCOL_BINARY_AUDIO, SUBPROTOCOL_LEGACY]
 
 
 @dataclass
@@ -20,11 +40,14 @@ class AudioMessage:
     Attributes:
         task_id: 任务唯一标识
         source: 音频来源 ('mic' 麦克风 或 'file' 文件)
-        data: Base64 编码的音频数据 (float32, 16kHz, mono)
+        data: Base64 编码的音频数据 (float32, 16kHz, mono)，仅用于 v1 协议
         is_final: 是否为当前任务的最后一个数据包
         time_start: 录音/音频开始时间戳
         seg_duration: 分段时长（秒）
         seg_overlap: 重叠时长（秒）
+        delta: 是否请求增量结果（RecognitionMessage 只携带相对上一条消息的变化）
+        final_snapshot: 增量模式下，最终结果是否仍发送完整快照
+        flow_control: 是否请求基于额度的流控（仅 v2 协议的文件任务有效）
     """
     task_id: str
     source: Literal['mic', 'file']
@@ -35,6 +58,9 @@ class AudioMessage:
     seg_overlap: float = 2.0
     context: str = ''
     language: str = 'auto'
+    delta: bool = False
+    final_snapshot: bool = True
+    flow_control: bool = False
 
     def to_json(self) -> str:
         """序列化为 JSON 字符串"""
@@ -53,9 +79,202 @@ class AudioMessage:
             seg_overlap=data.get('seg_overlap', 2.0),
             context=data.get('context', ''),
             language=data.get('language', 'auto'),
+            delta=data.get('delta', False),
+            final_snapshot=data.get('final_snapshot', True),
+            flow_control=data.get('flow_control', False),
         )
 
 
+@dataclass
+class SessionMessage:
+    """
+    客户端 -> 服务端：任务会话元信息（v2 协议）
+
+    每个任务在发送第一个 AudioFrame 之前发送一次，
+    服务端据此还原出完整的 AudioMessage 参数。
+    """
+    task_id: str
+    source: Literal['mic', 'file']
+    time_start: float
+    seg_duration: float = 15.0
+    seg_overlap: float = 2.0
+    context: str = ''
+    language: str = 'auto'
+    delta: bool = False
+    final_snapshot: bool = True
+    flow_control: bool = False
+    type: Literal['session'] = 'session'
+
+    def to_json(self) -> str:
+        """序列化为 JSON 字符串"""
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> SessionMessage:
+        """从字典创建实例"""
+        return cls(
+            task_id=data['task_id'],
+            source=data['source'],
+            time_start=data['time_start'],
+            seg_duration=data.get('seg_duration', 15.0),
+            seg_overlap=data.get('seg_overlap', 2.0),
+            context=data.get('context', ''),
+            language=data.get('language', 'auto'),
+            delta=data.get('delta', False),
+            final_snapshot=data.get('final_snapshot', True),
+            flow_control=data.get('flow_control', False),
+        )
+
+    @classmethod
+    def from_audio_message(cls, msg: AudioMessage) -> SessionMessage:
+        """从 AudioMessage 提取会话元信息"""
+        return cls(
+            task_id=msg.task_id,
+            source=msg.source,
+            time_start=msg.time_start,
+            seg_duration=msg.seg_duration,
+            seg_overlap=msg.seg_overlap,
+            context=msg.context,
+            language=msg.language,
+            delta=msg.delta,
+            final_snapshot=msg.final_snapshot,
+            flow_control=msg.flow_control,
+        )
+
+    def to_audio_message(self, is_final: bool) -> AudioMessage:
+        """还原为不含音频数据的 AudioMessage"""
+        return AudioMessage(
+            task_id=self.task_id,
+            source=self.source,
+            data='',
+            is_final=is_final,
+            time_start=self.time_start,
+            seg_duration=self.seg_duration,
+            seg_overlap=self.seg_overlap,
+            context=self.context,
+            language=self.language,
+            delta=self.delta,
+            final_snapshot=self.final_snapshot,
+            flow_control=self.flow_control,
+        )
+
+
+@dataclass
+class AudioFrame:
+    """
+    客户端 -> 服务端：二进制音频帧（v2 协议）
+
+    帧格式（小端）：
+        version  u8     协议版本
+        flags    u8     标志位，bit0 = is_final
+        reserved u16    保留
+        task_id  16s    任务 UUID 的 16 字节表示
+        offset   u64    本帧数据在任务音频流中的字节偏移
+        payload  ...    原始 PCM (float32, 16kHz, mono)
+
+    Attributes:
+        task_id: 任务唯一标识（必须是 UUID 字符串）
+        offset: 本帧数据在任务音频流中的字节偏移
+        data: 原始音频数据
+        is_final: 是否为当前任务的最后一帧
+    """
+    VERSION = 2
+    FLAG_FINAL = 0x01
+    HEADER = struct.Struct('<BBH16sQ')
+
+    task_id: str
+    offset: int
+    data: bytes
+    is_final: bool = False
+
+    def to_bytes(self) -> bytes:
+        """序列化为二进制帧"""
+        flags = self.FLAG_FINAL if self.is_final else 0
+        header = self.HEADER.pack(
+            self.VERSION, flags, 0, uuid.UUID(self.task_id).bytes, self.offset
+        )
+        return header + self.data
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> AudioFrame:
+        """
+        从二进制帧解析
+
+        返回的 data 是原始帧的 memoryview 切片，不复制音频数据。
+        """
+        if len(raw) < cls.HEADER.size:
+            raise ValueError(f"音频帧长度不足: {len(raw)} bytes")
+        version, flags, _, task_bytes, offset = cls.HEADER.unpack_from(raw)
+        if version != cls.VERSION:
+            raise ValueError(f"不支持的音频帧版本: {version}")
+        return cls(
+            task_id=str(uuid.UUID(bytes=task_bytes)),
+            offset=offset,
+            data=memoryview(raw)[cls.HEADER.size:],
+            is_final=bool(flags & cls.FLAG_FINAL),
+        )
+
+
+@dataclass
+class CreditMessage:
+    """
+    服务端 -> 客户端：发送额度消息（v2 协议流控）
+
+    额度是累计值：客户端在该任务上发送的音频总时长不得超过 granted。
+    服务端每收到一个片段的识别结果，就把 granted 推进到 processed + 窗口，
+    因此服务端积压的音频始终不超过一个窗口。
+
+    Attributes:
+        task_id: 任务唯一标识
+        granted: 累计允许发送的音频时长（秒）
+        received: 服务端已接收的音频时长（秒）
+        processed: 服务端已识别完成的音频时长（秒）
+        backlog: 已接收但尚未识别的音频时长（秒）
+    """
+    task_id: str
+    granted: float
+    received: float = 0.0
+    processed: float = 0.0
+    backlog: float = 0.0
+    type: Literal['credit'] = 'credit'
+
+    def to_json(self) -> str:
+        """序列化为 JSON 字符串"""
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> CreditMessage:
+        """从字典创建实例"""
+        return cls(
+            task_id=data['task_id'],
+            granted=data['granted'],
+            received=data.get('received', 0.0),
+            processed=data.get('processed', 0.0),
+            backlog=data.get('backlog', 0.0),
+        )
+
+
+@dataclass
+class CancelMessage:
+    """
+    客户端 -> 服务端：取消任务（例如用户按 Esc 放弃录音）
+
+    Attributes:
+        task_id: 要取消的任务唯一标识
+    """
+    task_id: str
+    type: Literal['cancel'] = 'cancel'
+
+    def to_json(self) -> str:
+        """序列化为 JSON 字符串"""
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> CancelMessage:
+        """从字典创建实例"""
+        return cls(task_id=data['task_id'])
+
+
 @dataclass
 class RecognitionMessage:
     """
@@ -73,6 +292,13 @@ class RecognitionMessage:
         text_accu: 精确输出 - 基于时间戳去重的拼接结果（用于字幕生成）
         tokens: 字级 token 列表（与 timestamps 对应）
         timestamps: 字级时间戳列表（秒）
+        is_partial: 是否为解码过程中的中间结果（仅含 text，可能被后续结果修正）
+        error: 识别失败原因（如服务端识别进程崩溃），为空表示正常
+
+        delta: 是否为增量消息，为 True 时以下字段均相对上一条消息：
+        splice_at: tokens / timestamps 从该索引起被替换为本消息携带的内容
+        text_splice_at: text 从该字符位置起被替换
+        text_accu_splice_at: text_accu 从该字符位置起被替换
     """
     task_id: str
     is_final: bool
@@ -88,6 +314,14 @@ class RecognitionMessage:
     text_accu: str = ''
     tokens: List[str] = field(default_factory=list)
     timestamps: List[float] = field(default_factory=list)
+    is_partial: bool = False
+    error: str = ''
+
+    # 增量模式
+    delta: bool = False
+    splice_at: int = 0
+    text_splice_at: int = 0
+    text_accu_splice_at: int = 0
     
     def to_json(self) -> str:
         """序列化为 JSON 字符串"""
@@ -111,4 +345,117 @@ class RecognitionMessage:
             text_accu=data.get('text_accu', ''),
             tokens=data.get('tokens', []),
             timestamps=data.get('timestamps', []),
+            is_partial=data.get('is_partial', False),
+            error=data.get('error', ''),
+            delta=data.get('delta', False),
+            splice_at=data.get('splice_at', 0),
+            text_splice_at=data.get('text_splice_at', 0),
+            text_accu_splice_at=data.get('text_accu_splice_at', 0),
+        )
+
+
+def common_prefix_len(a, b, block: int = 4096) -> int:
+    """
+    求两个序列（str / list）的公共前缀长度
+
+    先按块做切片比较（在 C 层完成），再在首个不一致的块内逐个比较。
+    """
+    n = min(len(a), len(b))
+    i = 0
+    while i < n:
+        j = min(i + block, n)
+        if a[i:j] != b[i:j]:
+            break
+        i = j
+    else:
+        return n
+    while a[i] == b[i]:
+        i += 1
+    return i
+
+
+class DeltaEncoder:
+    """
+    增量结果编码器（服务端）
+
+    记录上一条发给客户端的完整结果，把新结果转为只含变化部分的增量消息。
+    中间结果 (is_partial) 不参与增量编码。
+    """
+
+    def __init__(self, final_snapshot: bool = True):
+        self.final_snapshot = final_snapshot
+        self._tokens: List[str] = []
+        self._timestamps: List[float] = []
+        self._text = ''
+        self._text_accu = ''
+
+    def encode(self, msg: RecognitionMessage) -> RecognitionMessage:
+        """将完整消息编码为增量消息"""
+        if msg.is_partial or (msg.is_final and self.final_snapshot):
+            return msg
+
+        splice_at = min(
+            common_prefix_len(self._tokens, msg.tokens),
+            common_prefix_len(self._timestamps, msg.timestamps),
+        )
+        text_splice_at = common_prefix_len(self._text, msg.text)
+        text_accu_splice_at = common_prefix_len(self._text_accu, msg.text_accu)
+
+        self._tokens, self._timestamps = msg.tokens, msg.timestamps
+        self._text, self._text_accu = msg.text, msg.text_accu
+
+        return replace(
+            msg,
+            text=msg.text[text_splice_at:],
+            text_accu=msg.text_accu[text_accu_splice_at:],
+            tokens=msg.tokens[splice_at:],
+            timestamps=msg.timestamps[splice_at:],
+            delta=True,
+            splice_at=splice_at,
+            text_splice_at=text_splice_at,
+            text_accu_splice_at=text_accu_splice_at,
+        )
+
+
+class DeltaDecoder:
+    """
+    增量结果解码器（客户端）
+
+    按 splice 索引把增量消息还原为完整消息；非增量消息原样返回并作为新的基准。
+    返回消息中的 tokens / timestamps 列表归解码器所有，调用方不应修改。
+    """
+
+    def __init__(self):
+        self._tokens: List[str] = []
+        self._timestamps: List[float] = []
+        self._text = ''
+        self._text_accu = ''
+
+    def apply(self, msg: RecognitionMessage) -> RecognitionMessage:
+        """应用一条消息，返回还原后的完整消息"""
+        if msg.is_partial:
+            return msg
+
+        if not msg.delta:
+            self._tokens, self._timestamps = list(msg.tokens), list(msg.timestamps)
+            self._text, self._text_accu = msg.text, msg.text_accu
+            return msg
+
+        del self._tokens[msg.splice_at:]
+        del self._timestamps[msg.splice_at:]
+        self._tokens.extend(msg.tokens)
+        self._timestamps.extend(msg.timestamps)
+        self._text = self._text[:msg.text_splice_at] + msg.text
+        self._text_accu = self._text_accu[:msg.text_accu_splice_at] + msg.text_accu
+
+        return replace(
+            msg,
+            text=self._text,
+            text_accu=self._text_accu,
+            tokens=self._tokens,
+            timestamps=self._timestamps,
+            delta=False,
+            splice_at=0,
+            text_splice_at=0,
+            text_accu_splice_at=0,
         )
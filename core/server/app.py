@@ -103,6 +103,9 @@ class CapsWriterServer:
         # 拉起识别子进程
         self.process_manager.start()
         
+        # 巡检识别子进程，崩溃时只中止其上的会话并重新拉起
+        self.loop.create_task(self.process_manager.monitor())
+
         # 开启网络服务监听 (接管当前线程直至退出)
         try:
             self.loop.run_until_complete(self.socket_manager.start()) 
@@ -0,0 +1,138 @@
+# coding: utf-8
+"""
+共享内存音频池 (AudioSlabPool)
+
+主进程与识别子进程之间传递音频片段的共享内存分配器。
+
+- 主进程在 ws_recv 中把片段音频写入一个空闲槽位（slab），
+  Task 只携带 AudioHandle（槽位号、偏移、长度），不再经队列 pickle 整段音频
+- 子进程直接以只读 memoryview 读取槽位，处理完成后归还槽位
+- 空闲槽位只由主进程分配；子进程归还的槽位号经 SimpleQueue 传回，
+  主进程在下次分配时批量回收
+- 片段超过槽位大小或槽位用尽时，回退为 Task.data 内联传输
+"""
+
+from __future__ import annotations
+
+import os
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing import SimpleQueue
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class AudioHandle:
+    """
+    共享内存中一段音频的句柄
+
+    Attributes:
+        slab_id: 槽位编号
+        offset: 在共享内存块中的字节偏移
+        length: 音频字节数
+    """
+    slab_id: int
+    offset: int
+    length: int
+
+
+class AudioSlabPool:
+    """
+    定长槽位的共享内存音频池
+
+    在主进程创建，作为 Process 参数传给子进程后自动重新挂载同一块共享内存。
+    """
+
+    def __init__(self, n_slabs: int, slab_size: int):
+        """
+        创建共享内存池（仅在主进程调用）
+
+        Args:
+            n_slabs: 槽位数量
+            slab_size: 每个槽位的字节数
+        """
+        self.n_slabs = n_slabs
+        self.slab_size = slab_size
+        self._shm = SharedMemory(create=True, size=n_slabs * slab_size)
+        self._owner_pid = os.getpid()
+        self._free = deque(range(n_slabs))  # 主进程本地的空闲槽位
+        self._released = SimpleQueue()      # 子进程归还的槽位
+
+    def __getstate__(self) -> dict:
+        return {
+            'name': self._shm.name,
+            'n_slabs': self.n_slabs,
+            'slab_size': self.slab_size,
+            'owner_pid': self._owner_pid,
+            'released': self._released,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.n_slabs = state['n_slabs']
+        self.slab_size = state['slab_size']
+        self._owner_pid = state['owner_pid']
+        self._free = deque()
+        self._released = state['released']
+        try:
+            # Python 3.13+：子进程不登记资源追踪，避免退出时误删共享内存
+            self._shm = SharedMemory(name=state['name'], track=False)
+        except TypeError:
+            self._shm = SharedMemory(name=state['name'])
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def put(self, *parts) -> Optional[AudioHandle]:
+        """
+        将音频写入一个空闲槽位
+
+        Args:
+            parts: 一段或多段 bytes / memoryview，按顺序拼接写入
+
+        Returns:
+            成功返回 AudioHandle；片段过大或没有空闲槽位时返回 None
+        """
+        length = sum(memoryview(part).nbytes for part in parts)
+        if length > self.slab_size:
+            return None
+        while not self._released.empty():
+            self._free.append(self._released.get())
+        if not self._free:
+            return None
+
+        slab_id = self._free.popleft()
+
+        offset = slab_id * self.slab_size
+        pos = offset
+        for part in parts:
+            n = memoryview(part).nbytes
+            self._shm.buf[pos:pos + n] = part
+            pos += n
+        return AudioHandle(slab_id=slab_id, offset=offset, length=length)
+
+    def view(self, handle: AudioHandle) -> memoryview:
+        """
+        获取槽位中音频的只读视图（不拷贝）
+
+        视图仅在 release() 之前有效，槽位归还后会被主进程覆写。
+        """
+        return self._shm.buf[handle.offset:handle.offset + handle.length].toreadonly()
+
+    def release(self, handle: AudioHandle) -> None:
+        """归还槽位（可在任意进程调用）"""
+        self._released.put(handle.slab_id)
+
+    def close(self) -> None:
+        """断开共享内存；由创建进程调用时同时销毁共享内存"""
+        try:
+            self._shm.close()
+        except BufferError:
+            # 仍有视图未释放，交由进程退出时回收
+            return
+        if os.getpid() == self._owner_pid:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
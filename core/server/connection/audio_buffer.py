@@ -0,0 +1,173 @@
+# coding: utf-8
+"""
+音频环形缓冲区模块
+
+为服务端 AudioCache 提供预分配、可增长的环形字节缓冲区：
+- 写入追加到写指针处，到达末尾后回绕到头部继续写，消费只移动读指针
+- 分段时以 memoryview 读取：片段跨越末尾时分成两段视图，
+  只有在提交 Task 时才拷贝（写入共享内存池或拼成 bytes）
+- 未消费数据超过容量时才扩容，扩容时把数据按顺序搬到新缓冲区（均摊 O(1)）
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+from core.constants import AudioFormat
+
+
+class AudioRingBuffer:
+    """
+    可增长的音频环形缓冲区
+
+    Attributes:
+        capacity: 当前已分配的字节数
+    """
+
+    def __init__(self, capacity: int = AudioFormat.BYTES_PER_SECOND * 120):
+        """
+        初始化缓冲区
+
+        Args:
+            capacity: 初始预分配字节数，默认 120 秒音频
+        """
+        self._initial_capacity = capacity
+        self._buf = bytearray(capacity)
+        self._head = 0      # 读指针
+        self._size = 0      # 未消费的字节数
+
+    def __len__(self) -> int:
+        """未消费的字节数"""
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buf)
+
+    def write(self, data) -> None:
+        """
+        追加数据到尾部
+
+        Args:
+            data: bytes / bytearray / memoryview
+        """
+        with memoryview(data) as src:
+            src = src.cast('B')
+            n = src.nbytes
+            if not n:
+                return
+            if self._size + n > len(self._buf):
+                self._grow(self._size + n)
+            cap = len(self._buf)
+            tail = (self._head + self._size) % cap
+            first = min(n, cap - tail)
+            self._buf[tail:tail + first] = src[:first]
+            if first < n:
+                self._buf[:n - first] = src[first:]
+            self._size += n
+
+    def views(self, length: int = -1, start: int = 0) -> Tuple[memoryview, ...]:
+        """
+        获取未消费数据的只读视图（不拷贝）
+
+        数据跨越缓冲区末尾时返回两段视图，按顺序拼接即为完整数据。
+        视图指向当前缓冲区，用完应及时释放；扩容会换用新的缓冲区，旧视图不再更新。
+
+        Args:
+            length: 视图长度，-1 表示到末尾
+            start: 相对读指针的起始偏移
+        """
+        start = min(start, self._size)
+        end = self._size if length < 0 else min(start + length, self._size)
+        cap = len(self._buf)
+        begin = (self._head + start) % cap
+        n = end - start
+        mv = memoryview(self._buf).toreadonly()
+        if begin + n <= cap:
+            return (mv[begin:begin + n],)
+        return mv[begin:], mv[:begin + n - cap]
+
+    def read(self, length: int = -1, start: int = 0) -> bytes:
+        """读取数据并拷贝为 bytes（不移动读指针）"""
+        parts = self.views(length, start)
+        data = b''.join(parts)
+        for part in parts:
+            part.release()
+        return data
+
+    def consume(self, length: int) -> None:
+        """丢弃头部 length 字节"""
+        length = min(length, self._size)
+        self._size -= length
+        self._head = (self._head + length) % len(self._buf) if self._size else 0
+
+    def clear(self) -> None:
+        """清空数据，过度扩容时收缩回初始容量"""
+        self._head = self._size = 0
+        if len(self._buf) > self._initial_capacity * 4:
+            self._buf = bytearray(self._initial_capacity)
+
+    def _grow(self, need: int) -> None:
+        """扩容到至少 need 字节，未消费数据按顺序搬到新缓冲区头部"""
+        new_buf = bytearray(max(len(self._buf) * 2, need * 2))
+        pos = 0
+        for part in self.views():
+            with part:
+                new_buf[pos:pos + part.nbytes] = part
+                pos += part.nbytes
+        self._buf = new_buf
+        self._head = 0
+
+
+if __name__ == '__main__':
+    import time
+
+    print('-------------音频缓冲区基准测试---------------')
+
+    seg_duration, seg_overlap = 60, 4
+    segment_bytes = AudioFormat.seconds_to_bytes(seg_duration + seg_overlap)
+    stride_bytes = AudioFormat.seconds_to_bytes(seg_duration)
+    threshold = AudioFormat.seconds_to_bytes(seg_duration + seg_overlap * 2)
+
+    def bench_bytes(chunk: bytes, n_chunks: int) -> float:
+        """旧实现：bytes 拼接 + 切片"""
+        chunks = b''
+        n_bytes = 0
+        start = time.perf_counter()
+        for _ in range(n_chunks):
+            chunks += chunk
+            while len(chunks) >= threshold:
+                n_bytes += len(chunks[:segment_bytes])
+                chunks = chunks[stride_bytes:]
+        return time.perf_counter() - start
+
+    def bench_ring(chunk: bytes, n_chunks: int) -> float:
+        """新实现：AudioRingBuffer，片段拷贝为 bytes（与提交 Task 时相同）"""
+        buffer = AudioRingBuffer()
+        n_bytes = 0
+        start = time.perf_counter()
+        for _ in range(n_chunks):
+            buffer.write(chunk)
+            while len(buffer) >= threshold:
+                n_bytes += len(buffer.read(segment_bytes))
+                buffer.consume(stride_bytes)
+        return time.perf_counter() - start
+
+    cases = [
+        ('2 小时文件, 1 分钟分块', 7200, 60.0),
+        ('2 小时文件, 1 秒分块', 7200, 1.0),
+        ('10 分钟麦克风, 50ms 分块', 600, 0.05),
+    ]
+    for name, total_seconds, chunk_seconds in cases:
+        chunk = bytes(AudioFormat.seconds_to_bytes(chunk_seconds))
+        n_chunks = int(total_seconds / chunk_seconds)
+        total_mb = n_chunks * len(chunk) / 1024 / 1024
+
+        t_old = bench_bytes(chunk, n_chunks)
+        t_new = bench_ring(chunk, n_chunks)
+        print(f'\n{name} ({total_mb:.0f} MB)')
+        print(f'  bytes 拼接:     {t_old:.3f}s  ({total_mb / t_old:.0f} MB/s)')
+        print(f'  AudioRingBuffer: {t_new:.3f}s  ({total_mb / t_new:.0f} MB/s)')
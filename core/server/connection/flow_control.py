@@ -0,0 +1,178 @@
+# coding: utf-8
+"""
+文件上传流控模块
+
+服务端按「秒」为单位给文件任务下发发送额度（CreditMessage）：
+- 所有文件任务共用一个窗口：各任务可能积压的音频（已授予但未识别）
+  加上识别子进程中其他任务排队的音频，合计不超过窗口
+- 任务开始时、每收到一个片段的识别结果时推进该任务的额度，
+  不超过窗口的剩余空间，也不超过按任务数均分的份额
+- 窗口用尽时每个任务仍保有切出下一个片段所需的保底额度，保证都能推进
+- 客户端额度用尽时暂停读取 ffmpeg 输出，直到收到新的额度
+
+已授予的额度不收回：新任务加入时只拿到保底额度，先到的任务随识别推进
+逐步让出空间。无论同时上传多少个文件、文件多长，积压合计最终不超过
+max(窗口, 各任务保底额度之和)，新任务加入后短暂多出的不超过其保底额度。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from core import get_logger
+from core.protocol import CreditMessage
+
+# core.server 初始化时经 state 导入本模块，不能反向从 core.server 取 logger
+logger = get_logger('server')
+
+
+@dataclass
+class TaskFlow:
+    """
+    单个任务的流控状态（单位均为秒）
+
+    Attributes:
+        task_id: 任务唯一标识
+        socket_id: 所属连接
+        reserve: 保底额度，已识别时长之外至少允许的积压（切出下一个片段所需的音频）
+        received: 已接收的音频时长
+        processed: 已识别完成的音频时长
+        granted: 已授予的累计额度
+    """
+    task_id: str
+    socket_id: str
+    reserve: float
+    received: float = 0.0
+    processed: float = 0.0
+    granted: float = 0.0
+    overrun_logged: bool = False
+
+    @property
+    def backlog(self) -> float:
+        """已接收但尚未识别的音频时长"""
+        return max(0.0, self.received - self.processed)
+
+    @property
+    def committed(self) -> float:
+        """可能积压的最大音频时长：已授予（或超额接收）但尚未识别的部分"""
+        return max(self.granted, self.received) - self.processed
+
+    def credit(self) -> CreditMessage:
+        """生成当前额度消息"""
+        return CreditMessage(
+            task_id=self.task_id,
+            granted=self.granted,
+            received=self.received,
+            processed=self.processed,
+            backlog=self.backlog,
+        )
+
+
+class FlowController:
+    """
+    文件任务额度管理器（主进程）
+
+    ws_recv 登记任务、累计接收量；ws_send 根据识别进度推进额度。
+    两者运行在同一个事件循环中，无需加锁。
+    调用方传入的 queued 是识别子进程中非流控任务（麦克风、旧版客户端的文件）
+    已派发未返回的音频秒数，见 TaskDispatcher.queued_seconds。
+    """
+
+    def __init__(self, window: float):
+        """
+        Args:
+            window: 所有文件任务共用的积压上限（秒）
+        """
+        self.window = window
+        self._flows: Dict[str, TaskFlow] = {}
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._flows
+
+    def open(self, task_id: str, socket_id: str, seg_duration: float, seg_overlap: float,
+             queued: float = 0.0) -> CreditMessage:
+        """
+        登记流控任务，返回初始额度
+
+        保底额度为分段阈值（再留 1 秒余量）：缓冲区攒够阈值才会切出片段，
+        额度少于此值时该任务永远等不到识别结果，也就不会再获得额度。
+        """
+        reserve = seg_duration + seg_overlap * 2 + 1.0
+        flow = TaskFlow(task_id=task_id, socket_id=socket_id, reserve=reserve)
+        self._flows[task_id] = flow
+        flow.granted = self._grant(flow, queued)
+        logger.debug(
+            f"登记流控任务，任务ID: {task_id}, 初始额度: {flow.granted:.1f}s, "
+            f"全部积压: {self.total_backlog(queued):.1f}s"
+        )
+        return flow.credit()
+
+    def on_receive(self, task_id: str, seconds: float) -> None:
+        """累计接收的音频时长"""
+        flow = self._flows.get(task_id)
+        if flow is None:
+            return
+        flow.received += seconds
+        if flow.received > flow.granted + 1.0 and not flow.overrun_logged:
+            flow.overrun_logged = True
+            logger.warning(
+                f"客户端超额发送，任务ID: {task_id}, "
+                f"已接收: {flow.received:.1f}s, 额度: {flow.granted:.1f}s"
+            )
+
+    def on_result(self, task_id: str, processed: float, is_final: bool,
+                  queued: float = 0.0) -> Optional[CreditMessage]:
+        """
+        根据识别进度与窗口剩余空间推进额度
+
+        Args:
+            task_id: 任务唯一标识
+            processed: 该任务已识别完成的音频总时长（Result.duration）
+            is_final: 是否为最终结果，最终结果后注销任务
+            queued: 识别子进程中非流控任务排队的音频秒数
+
+        Returns:
+            额度有推进时返回新的 CreditMessage，否则返回 None
+        """
+        flow = self._flows.get(task_id)
+        if flow is None:
+            return None
+        if is_final:
+            self._flows.pop(task_id, None)
+            return None
+
+        flow.processed = max(flow.processed, processed)
+        granted = self._grant(flow, queued)
+        if granted <= flow.granted:
+            return None
+        flow.granted = granted
+        logger.debug(
+            f"推进发送额度，任务ID: {task_id}, 额度: {granted:.1f}s, "
+            f"积压: {flow.backlog:.1f}s, 全部积压: {self.total_backlog(queued):.1f}s"
+        )
+        return flow.credit()
+
+    def _grant(self, flow: TaskFlow, queued: float) -> float:
+        """本任务可用的空间：窗口的剩余空间与均分份额中较小者，不低于保底额度"""
+        others = sum(f.committed for f in self._flows.values() if f is not flow)
+        spare = self.window - queued - others
+        share = (self.window - queued) / len(self._flows)
+        return flow.processed + max(flow.reserve, min(spare, share))
+
+    def close(self, task_id: str) -> None:
+        """注销任务"""
+        self._flows.pop(task_id, None)
+
+    def backlog(self, task_id: str) -> float:
+        """任务当前积压的音频时长（秒），未登记的任务返回 0"""
+        flow = self._flows.get(task_id)
+        return flow.backlog if flow else 0.0
+
+    def backlogs(self) -> Dict[str, float]:
+        """所有流控任务当前积压的音频时长，以 task_id 为键"""
+        return {task_id: flow.backlog for task_id, flow in self._flows.items()}
+
+    def total_backlog(self, queued: float = 0.0) -> float:
+        """服务端积压的音频总时长（秒）：全部流控任务，加上其他任务排队的 queued"""
+        return queued + sum(self.backlogs().values())
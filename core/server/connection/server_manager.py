@@ -10,6 +10,7 @@ import asyncio
 import functools
 import websockets
 from config_server import ServerConfig as Config
+from core.protocol import SUBPROTOCOLS
 from .ws_recv import ws_recv
 from .ws_send import ws_send
 from .. import logger # Server module logger
@@ -66,7 +67,7 @@ class SocketManager:
             handler,
             Config.addr,
             Config.port,
-            subprotocols=["binary"],
+            subprotocols=SUBPROTOCOLS,
             max_size=None
         ) as server:
             self._server = server  # 保存 server 引用，用于外部关闭
@@ -3,20 +3,28 @@
 WebSocket 接收处理模块
 
 处理客户端发送的音频数据，进行分段和缓冲，提交到识别队列。
+同时支持 v1（JSON + Base64）与 v2（SessionMessage + 二进制 AudioFrame）两种格式。
+v2 文件任务可请求流控：登记会话时下发初始额度，之后由 ws_send 按识别进度推进。
+客户端可随时发送 cancel 消息放弃任务：丢弃缓冲音频，并通知识别子进程中止解码。
 """
 
 import json
 import time
 from base64 import b64decode
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
 
 import websockets
 
 from ..state import console
 from ..schema import Task
+from ..audio_pool import AudioHandle
 from config_server import ServerConfig as Config
-from core.protocol import AudioMessage
+from core.protocol import AudioMessage, AudioFrame, SessionMessage, CancelMessage, DeltaEncoder
 from core.constants import AudioFormat
 from core.tools.my_status import Status
+from .audio_buffer import AudioRingBuffer
+from ..registry import MAX_CANCELLED
 from .. import logger
 
 
@@ -31,9 +39,10 @@ class AudioCache:
     用于缓存接收到的音频数据，直到达到分段阈值后提交处理。
     """
     def __init__(self):
-        self.chunks: bytes = b''    # 音频数据缓冲
-        self.offset: float = 0.0    # 当前偏移时间（秒）
-        self.byte_count: int = 0    # 累计接收字节数
+        self.chunks = AudioRingBuffer()     # 音频数据缓冲
+        self.offset: float = 0.0            # 当前偏移时间（秒）
+        self.byte_count: int = 0            # 累计接收字节数
+        self.task_id: Optional[str] = None  # 正在缓冲的任务
 
     @property
     def duration(self) -> float:
@@ -47,18 +56,118 @@ class AudioCache:
 
     def reset(self) -> None:
         """重置缓冲区"""
-        self.chunks = b''
+        self.chunks.clear()
         self.offset = 0.0
         self.byte_count = 0
+        self.task_id = None
 
 
-async def message_handler(websocket, msg: AudioMessage, cache: AudioCache, app) -> None:
+def pack_segment(app, cache: AudioCache, length: int = -1) -> Tuple[bytes, Optional[AudioHandle]]:
+    """
+    取出缓冲区头部的片段音频
+
+    优先写入共享内存音频池，只在 Task 中携带句柄；
+    池未启用、槽位不足或片段过长时回退为内联 bytes。
+
+    Returns:
+        (内联音频数据, 共享内存句柄)，二者只有一个有效
+    """
+    pool = app.state.audio_pool
+    views = cache.chunks.views(length)
+    try:
+        handle = pool.put(*views) if pool is not None else None
+        if handle is not None:
+            return b'', handle
+        return b''.join(views), None
+    finally:
+        for view in views:
+            view.release()
+
+
+def parse_message(
+    raw_message, sessions: Dict[str, SessionMessage], cache: AudioCache, cancelled: OrderedDict
+) -> Union[None, SessionMessage, CancelMessage, Tuple[AudioMessage, bytes]]:
+    """
+    解析客户端消息
+
+    Args:
+        raw_message: WebSocket 收到的原始消息（str 为 JSON，bytes 为二进制音频帧）
+        sessions: 本连接的会话元信息，以 task_id 为键
+        cache: 本连接的音频缓冲区，用于校验帧偏移
+        cancelled: 本连接已取消的任务，取消后仍在途的音频直接忽略，收到其最后一帧后移除
+
+    Returns:
+        (音频消息, 音频数据)；会话元信息返回登记的 SessionMessage；
+        取消消息返回 CancelMessage；已取消任务的音频返回 None
+    """
+    # v2 二进制音频帧
+    if isinstance(raw_message, (bytes, bytearray)):
+        frame = AudioFrame.from_bytes(raw_message)
+        if frame.task_id in cancelled:
+            if frame.is_final:
+                cancelled.pop(frame.task_id, None)
+            return None
+        session = sessions.get(frame.task_id)
+        if session is None:
+            raise ValueError(f"收到未登记任务的音频帧，任务ID: {frame.task_id}")
+        if frame.offset != cache.byte_count:
+            logger.warning(
+                f"音频帧偏移不连续，任务ID: {frame.task_id}, "
+                f"期望: {cache.byte_count}, 实际: {frame.offset}"
+            )
+        if frame.is_final:
+            sessions.pop(frame.task_id, None)
+        return session.to_audio_message(frame.is_final), frame.data
+
+    data = json.loads(raw_message)
+
+    # v2 会话元信息
+    if data.get('type') == 'session':
+        session = SessionMessage.from_dict(data)
+        sessions[session.task_id] = session
+        logger.debug(f"登记任务会话，任务ID: {session.task_id}, 来源: {session.source}")
+        return session
+
+    # 取消任务
+    if data.get('type') == 'cancel':
+        return CancelMessage.from_dict(data)
+
+    # v1 JSON 音频消息（base64 解码音频数据，float32, 16kHz, mono）
+    msg = AudioMessage.from_dict(data)
+    if msg.task_id in cancelled:
+        if msg.is_final:
+            cancelled.pop(msg.task_id, None)
+        return None
+    return msg, b64decode(msg.data)
+
+
+def cancel_task(app, task_id: str, socket_id: str, cache: AudioCache, sessions: Dict[str, SessionMessage]) -> None:
+    """
+    取消任务：丢弃本连接缓冲的音频，解除派发，并通知识别子进程中止解码
+
+    子进程中正在处理该任务的解码会在下一次检查取消标志时中止，
+    缓冲区与输入队列中该任务的片段被直接丢弃，之后不会再返回结果。
+    """
+    state = app.state
+    if cache.task_id == task_id:
+        cache.reset()
+        status_mic.stop()
+    sessions.pop(task_id, None)
+    state.dispatcher.cancel(task_id)
+    state.connections.cancel(task_id)
+    state.flow.close(task_id)
+    state.delta_encoders.pop(task_id, None)
+    console.print(f'[yellow]任务已取消: {task_id[:8]}[/yellow]')
+    logger.info(f"客户端取消任务，任务ID: {task_id}, 客户端ID: {socket_id}")
+
+
+async def message_handler(websocket, msg: AudioMessage, data: bytes, cache: AudioCache, app) -> None:
     """
     处理客户端发送的音频消息
 
     根据消息中的分段参数，将音频数据分段后提交到识别队列。
     """
-    queue_in = app.state.queue_in
+    dispatcher = app.state.dispatcher
 
     global status_mic
     is_start = not bool(cache.chunks)
@@ -66,7 +175,7 @@ async def message_handler(websocket, msg: AudioMessage, cache: AudioCache, app)
 
     # 麦克风首次消息 → GPU 加速
     if is_start and msg.source == 'mic' and Config.gpu_boost_enabled:
-        queue_in.put(Task(
+        dispatcher.put(Task(
             type='cmd',
             task_id='gpu_boost',
             data=b'', offset=0, overlap=0,
@@ -79,10 +188,10 @@ async def message_handler(websocket, msg: AudioMessage, cache: AudioCache, app)
     seg_threshold = msg.seg_duration + msg.seg_overlap * 2
 
     try:
-        # base64 解码音频数据（float32, 16kHz, mono）
-        data = b64decode(msg.data)
-        cache.chunks += data
+        cache.task_id = msg.task_id
+        cache.chunks.write(data)
         cache.byte_count += len(data)
+        app.state.flow.on_receive(msg.task_id, AudioFormat.bytes_to_seconds(len(data)))
 
         if not msg.is_final:
             # 打印状态消息
@@ -97,12 +206,14 @@ async def message_handler(websocket, msg: AudioMessage, cache: AudioCache, app)
             stride_bytes = AudioFormat.seconds_to_bytes(msg.seg_duration)
 
             while cache.duration >= seg_threshold:
-                segment_data = cache.chunks[:segment_bytes]
-                cache.chunks = cache.chunks[stride_bytes:]
+                # 仅在提交任务时才拷贝出片段数据
+                segment_data, shm = pack_segment(app, cache, segment_bytes)
+                cache.chunks.consume(stride_bytes)
 
                 task = Task(
                     type=msg.source,
                     data=segment_data,
+                    shm=shm,
                     offset=cache.offset,
                     task_id=msg.task_id,
                     socket_id=socket_id,
@@ -114,7 +225,7 @@ async def message_handler(websocket, msg: AudioMessage, cache: AudioCache, app)
                     language=msg.language,
                 )
                 cache.offset += msg.seg_duration
-                queue_in.put(task)
+                dispatcher.put(task)
                 logger.debug(
                     f"提交音频片段，任务ID: {msg.task_id}, "
                     f"偏移: {cache.offset}s, 缓冲区: {len(cache.chunks)} bytes"
@@ -129,9 +240,11 @@ async def message_handler(websocket, msg: AudioMessage, cache: AudioCache, app)
                 logger.info(f"音频文件接收完毕，任务ID: {msg.task_id}, 时长: {cache.total_duration:.2f}s")
 
             # 提交最终片段
+            segment_data, shm = pack_segment(app, cache)
             task = Task(
                 type=msg.source,
-                data=cache.chunks,
+                data=segment_data,
+                shm=shm,
                 offset=cache.offset,
                 task_id=msg.task_id,
                 socket_id=socket_id,
@@ -142,7 +255,7 @@ async def message_handler(websocket, msg: AudioMessage, cache: AudioCache, app)
                 context=msg.context,
                 language=msg.language,
             )
-            queue_in.put(task)
+            dispatcher.put(task)
             logger.debug(f"提交最终片段，任务ID: {msg.task_id}, 数据大小: {len(cache.chunks)} bytes")
 
             # 重置缓冲区
@@ -164,26 +277,54 @@ async def ws_recv(websocket, app) -> None:
     # 登记 socket 到连接池
     state = app.state
     sockets = state.sockets
-    sockets_id = state.sockets_id
+    connections = state.connections
+    flow = state.flow
     socket_id = str(websocket.id)
     sockets[socket_id] = websocket
-    sockets_id.append(socket_id)
+    connections.connect(socket_id)
     remote = websocket.remote_address
     console.print(f'[bold green]客户端已连接: {remote[0]}:{remote[1]}[/bold green]\n')
     logger.info(f"新客户端连接: {websocket}, ID: {socket_id}")
 
-    # 创建音频缓冲区
+    # 创建音频缓冲区与会话元信息表
     cache = AudioCache()
+    sessions: Dict[str, SessionMessage] = {}
+    delta_tasks = set()     # 本连接请求增量结果的任务
+    flow_tasks = set()      # 本连接请求流控的任务
+    cancelled = OrderedDict()   # 本连接已取消的任务，最后一帧到达后移除，最多保留 MAX_CANCELLED 个
+    logger.debug(f"协商的子协议: {websocket.subprotocol}, 客户端ID: {socket_id}")
 
     # 接收并处理消息
     try:
         async for raw_message in websocket:
             # 使用协议类解析消息
             try:
-                data = json.loads(raw_message)
-                msg = AudioMessage.from_dict(data)
+                parsed = parse_message(raw_message, sessions, cache, cancelled)
+                if parsed is None:
+                    continue
+                if isinstance(parsed, CancelMessage):
+                    cancelled[parsed.task_id] = None
+                    if len(cancelled) > MAX_CANCELLED:
+                        cancelled.popitem(last=False)
+                    cancel_task(app, parsed.task_id, socket_id, cache, sessions)
+                    continue
+                if isinstance(parsed, SessionMessage):
+                    # 文件任务请求流控：下发初始额度
+                    if parsed.flow_control and parsed.source == 'file':
+                        flow_tasks.add(parsed.task_id)
+                        credit = flow.open(
+                            parsed.task_id, socket_id, parsed.seg_duration, parsed.seg_overlap,
+                            state.dispatcher.queued_seconds(exclude=flow),
+                        )
+                        await websocket.send(credit.to_json())
+                    continue
+                msg, data = parsed
+                # 登记增量结果编码器
+                if msg.delta and msg.task_id not in delta_tasks:
+                    delta_tasks.add(msg.task_id)
+                    state.delta_encoders[msg.task_id] = DeltaEncoder(msg.final_snapshot)
                 # 处理音频数据
-                await message_handler(websocket, msg, cache, app)
+                await message_handler(websocket, msg, data, cache, app)
             except Exception as e:
                 logger.error(f"消息解析失败: {str(e)}")
                 continue
@@ -204,11 +345,15 @@ async def ws_recv(websocket, app) -> None:
         status_mic.stop()
         status_mic.on = False
         sockets.pop(socket_id, None)
-        if socket_id in sockets_id:
-            sockets_id.remove(socket_id)
+        connections.disconnect(socket_id)
+        state.dispatcher.release_socket(socket_id)
+        for task_id in delta_tasks:
+            state.delta_encoders.pop(task_id, None)
+        for task_id in flow_tasks:
+            flow.close(task_id)
 
         console.print(f'[bold red]客户端已断开: {remote[0]}:{remote[1]}[/bold red]\n')
 
         # 注意：session 清理由 TaskHandler 在子进程中定期执行
-        # （通过检查 sockets_id 判断客户端是否已断开）
+        # （通过 connections 收到的断开事件判断客户端是否已断开）
         logger.debug(f"客户端资源已清理: {socket_id}")
@@ -15,6 +15,9 @@ async def ws_send(app):
     state = app.state
     queue_out = state.queue_out
     sockets = state.sockets
+    delta_encoders = state.delta_encoders
+    flow = state.flow
+    dispatcher = state.dispatcher
 
     logger.info("WebSocket 发送任务已启动")
 
@@ -28,6 +31,11 @@ async def ws_send(app):
                 logger.info("收到退出通知，停止发送任务")
                 return
 
+            # 扣减识别进程负载，已取消任务的结果不再下发
+            if not dispatcher.on_result(result):
+                logger.debug(f"丢弃已取消任务的结果，任务ID: {result.task_id}")
+                continue
+
             # 1. 将内部 Result 转换为标准的协议消息对象
             msg = RecognitionMessage(
                 task_id=result.task_id,
@@ -39,7 +47,9 @@ async def ws_send(app):
                 text=result.text,
                 text_accu=result.text_accu,
                 tokens=result.tokens,
-                timestamps=result.timestamps
+                timestamps=result.timestamps,
+                is_partial=result.is_partial,
+                error=result.error,
             )
 
             # 获得 socket
@@ -52,15 +62,36 @@ async def ws_send(app):
                 logger.warning(f"客户端 {result.socket_id} 不存在，跳过发送结果，任务ID: {result.task_id}")
                 continue
 
+            # 增量模式：只发送相对上一条消息的变化
+            encoder = delta_encoders.get(result.task_id)
+            if encoder is not None:
+                msg = encoder.encode(msg)
+                if result.is_final:
+                    delta_encoders.pop(result.task_id, None)
+
             # 发送消息
             await websocket.send(msg.to_json())
             logger.debug(f"发送识别结果，任务ID: {result.task_id}, 文本长度: {len(result.text)}")
 
-            if result.type == 'mic':
+            # 流控：片段识别完成后按全局积压推进该任务的发送额度
+            queued = dispatcher.queued_seconds(exclude=flow)
+            credit = flow.on_result(result.task_id, result.duration, result.is_final, queued)
+            backlog = flow.total_backlog(queued)
+            if credit is not None:
+                await websocket.send(credit.to_json())
+
+            if result.error:
+                logger.error(f"识别失败，任务ID: {result.task_id}: {result.error}")
+            elif result.is_partial:
+                logger.debug(f"麦克风中间结果: {result.text}")
+            elif result.type == 'mic':
                 logger.info(f"麦克风识别结果: {result.text}")
             elif result.type == 'file':
-                console.print(f'    转录进度：{result.duration:.2f}s', end='\r')
-                logger.debug(f"文件转录进度: {result.duration:.2f}s")
+                console.print(f'    转录进度：{result.duration:.2f}s，服务端积压：{backlog:.0f}s', end='\r')
+                logger.debug(
+                    f"文件转录进度: {result.duration:.2f}s, 任务积压: {flow.backlog(result.task_id):.1f}s, "
+                    f"服务端积压: {backlog:.1f}s"
+                )
                 if result.is_final:
                     console.print('\n    [green]转录完成')
                     logger.info(f"文件转录完成，任务ID: {result.task_id}, 总时长: {result.duration:.2f}s")
@@ -0,0 +1,230 @@
+# coding: utf-8
+"""
+识别任务分发器 (TaskDispatcher)
+
+主进程把音频片段分发给多个识别子进程：
+- 同一 task_id 的所有片段固定派发到同一个子进程
+  （会话的拼接状态保存在该子进程的 WorkerState.sessions 中）
+- 新会话派发给负载最低的就绪子进程，负载 = 已派发但尚未返回结果的音频秒数
+- 某个子进程崩溃时，只有派发到它的会话失败，其余子进程不受影响
+- 客户端取消的会话解除派发绑定，之后返回的结果不再下发
+"""
+
+from __future__ import annotations
+
+import queue
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from multiprocessing import Event, Process, Queue
+from typing import Container, Deque, Dict, List, Optional, Set
+
+from core.server.schema import Task, Result
+from core.server.audio_pool import AudioSlabPool
+from core.server.registry import ConnectionRegistry, MAX_CANCELLED
+
+
+@dataclass
+class WorkerSlot:
+    """
+    一个识别子进程的派发槽位
+
+    Attributes:
+        index: 槽位编号
+        queue_in: 该子进程的任务输入队列
+        ready: 子进程模型加载完成后置位
+        process: 子进程句柄
+        connections: 该子进程订阅的连接登记表
+        load: 已派发但尚未返回结果的音频秒数
+        task_ids: 固定派发到该子进程的会话
+        restarts: 崩溃后被重新拉起的次数
+    """
+    index: int
+    queue_in: Queue = field(default_factory=Queue)
+    ready: Event = field(default_factory=Event)
+    process: Optional[Process] = None
+    connections: Optional[ConnectionRegistry] = None
+    load: float = 0.0
+    task_ids: Set[str] = field(default_factory=set)
+    restarts: int = 0
+
+    @property
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class TaskDispatcher:
+    """
+    多识别子进程的任务分发器（主进程）
+
+    ws_recv 调用 put() 提交任务，ws_send 调用 on_result() 回报完成，
+    二者运行在同一个事件循环中，无需加锁。
+    """
+
+    def __init__(self):
+        self.slots: List[WorkerSlot] = []
+        self.audio_pool: Optional[AudioSlabPool] = None
+        self._affinity: Dict[str, WorkerSlot] = {}
+        self._pending: Dict[str, Deque[float]] = {}    # 各会话已派发未返回结果的片段时长
+        self._owners: Dict[str, Task] = {}             # 各会话最近一个片段，用于构造失败结果
+        self._failed: Set[str] = set()                 # 子进程崩溃而失败的会话，后续片段直接丢弃
+        self._cancelled: OrderedDict[str, None] = OrderedDict()  # 客户端取消的会话，结果不再下发
+
+    def add_slot(self) -> WorkerSlot:
+        """新增一个派发槽位"""
+        slot = WorkerSlot(index=len(self.slots))
+        self.slots.append(slot)
+        return slot
+
+    def put(self, task: Task) -> None:
+        """派发任务：已有会话发往原子进程，新会话发往负载最低的子进程"""
+        if task.type == 'cmd':
+            self._pick().queue_in.put(task)
+            return
+
+        tid = task.task_id
+        if tid in self._cancelled:
+            self._release_audio(task)
+            return
+        if tid in self._failed:
+            self._release_audio(task)
+            if task.is_final:
+                self._failed.discard(tid)
+            return
+
+        slot = self._affinity.get(tid)
+        if slot is None:
+            slot = self._pick()
+            self._affinity[tid] = slot
+            slot.task_ids.add(tid)
+
+        seconds = task.duration
+        self._pending.setdefault(tid, deque()).append(seconds)
+        self._owners[tid] = task
+        slot.load += seconds
+        slot.queue_in.put(task)
+
+    def _pick(self) -> WorkerSlot:
+        """选出负载最低的子进程，优先已就绪的"""
+        candidates = (
+            [s for s in self.slots if s.is_alive and s.ready.is_set()]
+            or [s for s in self.slots if s.is_alive]
+            or self.slots
+        )
+        return min(candidates, key=lambda s: (s.load, len(s.task_ids)))
+
+    def on_result(self, result: Result) -> bool:
+        """
+        识别结果返回后，扣减对应子进程的负载
+
+        Returns:
+            是否应把结果发送给客户端（已取消会话的结果丢弃）
+        """
+        tid = result.task_id
+        if tid in self._cancelled:
+            return False
+        if result.is_partial:
+            return True
+        slot = self._affinity.get(tid)
+        if slot is None:
+            return True
+        pending = self._pending.get(tid)
+        if pending:
+            slot.load -= pending.popleft()
+        if result.is_final:
+            self._forget(tid)
+        return True
+
+    def queued_seconds(self, exclude: Container[str] = ()) -> float:
+        """已派发但尚未返回结果的音频秒数（全部子进程合计），不计 exclude 中的会话"""
+        return sum(sum(pending) for tid, pending in self._pending.items() if tid not in exclude)
+
+    def cancel(self, tid: str) -> None:
+        """
+        客户端取消会话：解除派发绑定，之后的片段与结果直接丢弃
+
+        子进程经由 ConnectionRegistry.cancel() 得知取消，自行丢弃缓冲任务并中止解码。
+        """
+        self._forget(tid)
+        self._failed.discard(tid)
+        self._cancelled[tid] = None
+        if len(self._cancelled) > MAX_CANCELLED:
+            self._cancelled.popitem(last=False)
+
+    def release_socket(self, socket_id: str) -> None:
+        """客户端断开后，解除其会话的派发绑定（子进程会自行丢弃缓冲任务）"""
+        for tid, task in list(self._owners.items()):
+            if task.socket_id == socket_id:
+                self._forget(tid)
+                self._failed.discard(tid)
+
+    def _forget(self, tid: str) -> None:
+        """解除会话绑定并扣除其剩余负载"""
+        slot = self._affinity.pop(tid, None)
+        pending = self._pending.pop(tid, None)
+        self._owners.pop(tid, None)
+        if slot is not None:
+            slot.task_ids.discard(tid)
+            if pending:
+                slot.load -= sum(pending)
+            if not slot.task_ids:
+                slot.load = 0.0
+
+    def fail_slot(self, slot: WorkerSlot) -> List[Result]:
+        """
+        子进程崩溃后，让派发到它的会话失败
+
+        回收输入队列中尚未被取走的任务的共享内存槽位，并为该子进程换上新的输入队列。
+        正在处理中的片段无法确定是否已归还槽位，不做回收（音频池用尽时会回退为内联传输）。
+
+        Returns:
+            每个失败会话一条最终结果（error 字段说明原因）
+        """
+        old_queue, slot.queue_in = slot.queue_in, Queue()
+        slot.ready = Event()
+        # 在事件循环中调用，只取已到达的任务，不阻塞等待
+        while True:
+            try:
+                task = old_queue.get_nowait()
+            except (queue.Empty, OSError, EOFError):
+                break
+            if task is not None:
+                self._release_audio(task)
+
+        results = []
+        now = time.time()
+        for tid in list(slot.task_ids):
+            task = self._owners.get(tid)
+            self._forget(tid)
+            if task is None:
+                continue
+            if not task.is_final:
+                self._failed.add(tid)
+            results.append(Result(
+                task_id=tid,
+                socket_id=task.socket_id,
+                type=task.type,
+                time_start=task.time_start,
+                time_submit=task.time_submit,
+                time_complete=now,
+                is_final=True,
+                error=f'识别子进程 #{slot.index} 崩溃，会话已中止',
+            ))
+        slot.task_ids.clear()
+        slot.load = 0.0
+        return results
+
+    def _release_audio(self, task: Task) -> None:
+        """归还被丢弃任务占用的共享内存槽位"""
+        if task.shm is not None and self.audio_pool is not None:
+            self.audio_pool.release(task.shm)
+            task.shm = None
+
+    def stop(self) -> None:
+        """通知所有子进程优雅退出"""
+        for slot in self.slots:
+            slot.queue_in.put(None)
+
+    def loads(self) -> Dict[int, float]:
+        """各子进程当前负载（音频秒数），以槽位编号为键"""
+        return {slot.index: slot.load for slot in self.slots}
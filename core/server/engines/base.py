@@ -2,10 +2,14 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum, auto
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Dict
 import numpy as np
 
 
+class TaskCancelled(Exception):
+    """识别过程中任务被取消（客户端发送 cancel 或断开连接）"""
+
+
 class EngineCapabilities(Enum):
     """引擎能力声明类型"""
     ASR = auto()            # 基础 ASR 能力
@@ -13,6 +17,7 @@ class EngineCapabilities(Enum):
     TIMESTAMPS = auto()     # 自带时间戳
     STREAMING = auto()      # 支持真实流式推理
     HOTWORDS = auto()       # 支持动态热词
+    BATCHING = auto()       # 支持多个识别流在同一次 LLM 解码中批量推理 (decode_streams)
 
 
 @dataclass
@@ -69,9 +74,46 @@ class BaseASREngine(ABC):
         context: Optional[str] = None,
         **kwargs
     ):
-        """执行推理并更新 stream.result"""
+        """
+        执行推理并更新 stream.result
+
+        支持逐 token 生成的引擎可接受 on_partial 关键字参数：
+        解码过程中以当前已稳定的文本回调，用于向客户端推送中间结果。
+
+        支持中途中止的引擎可接受 cancel 关键字参数（提供 is_set() 的对象）：
+        置位后尽快停止推理并抛出 TaskCancelled。
+        """
         pass
 
+    @property
+    def max_batch_size(self) -> int:
+        """decode_streams 单次最多合并的识别流数量（支持 BATCHING 的引擎覆盖）"""
+        return 1
+
+    def decode_streams(self, streams: List[RecognitionStream], requests: List[Dict[str, Any]]) -> List[Optional[TaskCancelled]]:
+        """
+        批量解码多个相互独立的识别流（不同会话的片段）
+
+        Args:
+            streams: 识别流列表
+            requests: 与 streams 一一对应的 decode_stream 关键字参数
+                      （context / language / on_partial / cancel 等）
+
+        Returns:
+            与 streams 一一对应，被取消的识别流为 TaskCancelled，其余为 None。
+            其它异常直接抛出。
+
+        默认逐个调用 decode_stream；支持 BATCHING 的引擎覆盖为单次批量解码。
+        """
+        errors = []
+        for stream, kwargs in zip(streams, requests):
+            try:
+                self.decode_stream(stream, **kwargs)
+                errors.append(None)
+            except TaskCancelled as e:
+                errors.append(e)
+        return errors
+
     def update_hotwords(self, hotwords: List[str]):
         """更新引擎内部的热词表（如果支持）"""
         pass
@@ -4,7 +4,7 @@ from typing import List, Optional
 
 from .inference.aligner import QwenForcedAligner as InternalAligner
 from .inference.schema import AlignerConfig, ForcedAlignResult
-from ..base import BaseAlignEngine
+from ..base import BaseAlignEngine, TaskCancelled
 from ..language import get_language, ENGINE_ALIGNER
 
 
@@ -37,12 +37,17 @@ class QwenForceAligner(BaseAlignEngine):
         # 语言映射：统一代码 → Aligner 英文明称，默认中文
         mapped = get_language(ENGINE_ALIGNER, language) if language else None
 
-        return self.engine.align(
+        cancel = kwargs.get('cancel')
+        res = self.engine.align(
             audio=audio,
             text=text,
             language=mapped or "Chinese",
-            offset_sec=offset_sec
+            offset_sec=offset_sec,
+            cancel=cancel,
         )
+        if res is None and cancel is not None and cancel.is_set():
+            raise TaskCancelled("对齐中任务已取消")
+        return res
 
     def cleanup(self):
         """释放资源"""
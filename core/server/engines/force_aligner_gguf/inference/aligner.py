@@ -238,6 +238,7 @@ class QwenForcedAligner:
         self.model = llama.LlamaModel(llm_gguf, n_gpu_layers=-1, use_gpu=config.llm_use_gpu)
         self.embedding_table = llama.get_token_embeddings_gguf(llm_gguf)
         self.ctx = llama.LlamaContext(self.model, n_ctx=config.n_ctx, n_batch=config.n_ctx, embeddings=False)
+        self.batch_pool = llama.LlamaBatchPool(config.n_ctx)  # 批次复用，容量与上下文一致
         
         self.processor = AlignerProcessor()
         self.ID_AUDIO_START = self.model.token_to_id("<|audio_start|>")
@@ -245,8 +246,12 @@ class QwenForcedAligner:
         self.ID_TIMESTAMP = self.model.token_to_id("<timestamp>")
         self.STEP_MS = 80.0
 
-    def align(self, audio: np.ndarray, text: str, language: str = "Chinese", offset_sec: float = 0.0) -> ForcedAlignResult:
-        """执行强制对齐，支持起始偏移量叠加"""
+    def align(self, audio: np.ndarray, text: str, language: str = "Chinese", offset_sec: float = 0.0,
+              cancel=None) -> Optional[ForcedAlignResult]:
+        """执行强制对齐，支持起始偏移量叠加
+
+        cancel: 取消标志（提供 is_set()），置位后中止编码之后的各阶段并返回 None
+        """
         # 语言归一化与校验
         if language:
             language = normalize_language_name(language)
@@ -256,6 +261,8 @@ class QwenForcedAligner:
         
         # 1. 编码 (Encoder Stage) - 使用统一编码器
         audio_embd, t_enc = self.encoder.encode(audio)
+        if cancel is not None and cancel.is_set():
+            return None
 
         # 2. 分词与构建 Prompt (必须完整注入音频序列)
         words = self.processor.tokenize(text, language)
@@ -294,12 +301,20 @@ class QwenForcedAligner:
         t_dec_start = time.time()
         pos_base = np.arange(n_total, dtype=np.int32)
         pos_arr = np.concatenate([pos_base, pos_base, pos_base, np.zeros(n_total, dtype=np.int32)])
-        batch = llama.LlamaBatch(n_total * 4, embd_dim=1024)
+        batch = self.batch_pool.get(n_total, self.model.n_embd, pos_planes=4)
         batch.set_embd(full_embd, pos=pos_arr)
         for idx in ts_positions: batch.logits[idx] = 1 # 只计算 timestamp 处的 logits 以提速
         
         self.ctx.clear_kv_cache()
-        self.ctx.decode(batch)
+        if cancel is not None:
+            self.ctx.abortable(cancel)
+        try:
+            self.ctx.decode(batch)
+        finally:
+            if cancel is not None:
+                self.ctx.abortable(None)
+        if cancel is not None and cancel.is_set():
+            return None
         t_dec = time.time() - t_dec_start
         
         # 4. 解析结果
@@ -2,7 +2,6 @@
 import os
 import time
 import re
-import codecs
 import dataclasses
 import numpy as np
 from pathlib import Path
@@ -53,6 +52,7 @@ class QwenASREngine:
         # 3. 加载识别 LLM
         self.model = llama.LlamaModel(llm_gguf, use_gpu=config.llm_use_gpu)
         self.embedding_table = llama.get_token_embeddings_gguf(llm_gguf)
+        self.model.vocab_bytes  # 预先构建（或读取缓存）词表字节表，避免首个请求承担
         self.ctx = llama.LlamaContext(self.model, n_ctx=config.n_ctx, n_batch=4096, embeddings=False)
 
         # 缓存 Token ID
@@ -121,7 +121,8 @@ class QwenASREngine:
         display_queue = deque()
         stable_tokens = []
         stable_text_acc = ""
-        text_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        text_decoder = llama.TokenTextDecoder(self.model.vocab_bytes)
+        recent = llama.RepeatWindow(15)
         
         # 每次解码使用新的随机种子
         seed = int(np.random.randint(0, 2**31 - 1))
@@ -138,14 +139,15 @@ class QwenASREngine:
             if len(display_queue) > rollback_num:
                 ready_token = display_queue.popleft()
                 stable_tokens.append(ready_token)
-                piece = text_decoder.decode(self.model.token_to_bytes(ready_token))
+                recent.push(ready_token)
+                piece = text_decoder.decode(ready_token)
                 if piece:
                     if streaming: print(re.sub(r'([，。？！：,\.])', r'\1\n', piece), end='', flush=True)
                     stable_text_acc += piece
             
             # 熔断检查：检测重复循环
             if len(stable_tokens) > 15:
-                if len(set(stable_tokens[-15:])) <= 3:
+                if recent.distinct <= 3:
                     result.is_aborted = True
                     break
             
@@ -160,11 +162,11 @@ class QwenASREngine:
             while display_queue:
                 t = display_queue.popleft()
                 stable_tokens.append(t)
-                piece = text_decoder.decode(self.model.token_to_bytes(t))
+                piece = text_decoder.decode(t)
                 if piece:
                     if streaming: print(re.sub(r'([，。？！：,\.])', r'\1\n', piece), end="", flush=True)
                     stable_text_acc += piece
-            final_p = text_decoder.decode(b"", final=True)
+            final_p = text_decoder.flush()
             if final_p: 
                 if streaming: print(final_p, end='', flush=True)
                 stable_text_acc += final_p
@@ -64,6 +64,7 @@ from .inference.schema import (
     Timings,
     ASREngineConfig,
     Statistics,
+    SpeculativeStats,
 )
 
 __all__ = [
@@ -84,6 +85,7 @@ __all__ = [
     'Timings',
     'ASREngineConfig',
     'Statistics',
+    'SpeculativeStats',
 
     'console', 
 ]
@@ -1,14 +1,17 @@
 # coding: utf-8
 import os
 import time
-from typing import Optional, List, Dict, Any
+from typing import Callable, Optional, List, Dict, Any
 
-from .inference.schema import ASREngineConfig, TranscriptionResult, RecognitionResult as InternalResult, DecodeResult, Statistics
+from .inference.schema import ASREngineConfig, TranscriptionResult, RecognitionResult as InternalResult, DecodeResult, Statistics, SpeculativeStats
 from .inference.models import Models
 from .inference.pipeline import InferencePipeline
 from .inference.transcriber import AudioTranscriber
-from ..base import BaseASREngine, RecognitionStream, EngineCapabilities, RecognitionResult
+from ..base import BaseASREngine, RecognitionStream, EngineCapabilities, RecognitionResult, TaskCancelled
 from ..language import get_language, ENGINE_FUN_ASR_NANO
+from core import get_logger
+
+logger = get_logger('server')
 
 
 class FunASRStream(RecognitionStream):
@@ -37,16 +40,24 @@ class FunASREngine(BaseASREngine):
         # 初始化底层组件 (迁移自原本的 Facade)
         self.models = Models(self.config)
         self.pipeline = InferencePipeline(self.models)
+        self.speculative = SpeculativeStats()     # 投机解码累计统计
 
     @property
     def capabilities(self) -> List[EngineCapabilities]:
         """声明 nano 引擎的全能属性"""
-        return [
+        caps = [
             EngineCapabilities.ASR, 
             EngineCapabilities.TIMESTAMPS, 
             EngineCapabilities.HOTWORDS, 
             EngineCapabilities.PUNC
         ]
+        if self.max_batch_size > 1:
+            caps.append(EngineCapabilities.BATCHING)
+        return caps
+
+    @property
+    def max_batch_size(self) -> int:
+        return max(1, self.config.n_seq_max)
 
     def create_stream(self, hotwords: Optional[str] = None) -> FunASRStream:
         """创建包装后的识别流"""
@@ -57,14 +68,59 @@ class FunASREngine(BaseASREngine):
         stream: FunASRStream,
         context: Optional[str] = None,
         language: Optional[str] = None,
+        on_partial: Optional[Callable[[str], None]] = None,
+        cancel=None,
         **kwargs
     ):
-        """解码识别流并同步结果"""
+        """解码识别流并同步结果
+
+        on_partial: 解码过程中的中间结果回调，参数为当前已生成的文本
+        cancel: 取消标志（提供 is_set()），置位后中止解码并抛出 TaskCancelled
+        """
         # 语言映射：统一代码 → FunASR 中文文本
         mapped_lang = get_language(ENGINE_FUN_ASR_NANO, language) if language else None
-        self.pipeline.decode_stream(stream.internal_stream, context=context, language=mapped_lang)
+        res = self.pipeline.decode_stream(
+            stream.internal_stream, context=context, language=mapped_lang,
+            on_partial=on_partial, cancel=cancel
+        )
+        if res.is_cancelled:
+            raise TaskCancelled("解码中任务已取消")
+        self._record_speculative(res)
         
         # 2. 同步结果到标准 RecognitionResult
+        self._sync_result(stream)
+
+    def decode_streams(self, streams: List[FunASRStream], requests: List[Dict[str, Any]]) -> List[Optional[TaskCancelled]]:
+        """批量解码多个识别流：LLM 部分在同一次 llama_decode 中多序列生成"""
+        outputs = self.pipeline.decode_streams(
+            [s.internal_stream for s in streams],
+            languages=[
+                get_language(ENGINE_FUN_ASR_NANO, r['language']) if r.get('language') else None
+                for r in requests
+            ],
+            contexts=[r.get('context') for r in requests],
+            on_partials=[r.get('on_partial') for r in requests],
+            cancels=[r.get('cancel') for r in requests],
+        )
+        errors: List[Optional[TaskCancelled]] = []
+        for stream, res in zip(streams, outputs):
+            if res.is_cancelled:
+                errors.append(TaskCancelled("解码中任务已取消"))
+                continue
+            self._record_speculative(res)
+            self._sync_result(stream)
+            errors.append(None)
+        return errors
+
+    def _record_speculative(self, res: DecodeResult):
+        """累计投机解码统计，便于按部署评估是否开启"""
+        if not res.speculative.n_draft:
+            return
+        self.speculative += res.speculative
+        logger.debug(f"投机解码 本段: {res.speculative}；累计: {self.speculative}")
+
+    @staticmethod
+    def _sync_result(stream: FunASRStream):
         res = stream.internal_stream.result
         stream.result.text = res.text
         stream.result.tokens = list(res.tokens)
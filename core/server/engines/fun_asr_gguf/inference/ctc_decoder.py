@@ -65,7 +65,10 @@ class CTCDecoder:
         self._load_tokens()
         
         # 音素热词、CTC热词
-        self.corrector = PhonemeCorrector(threshold=1.0, similar_threshold=similar_threshold)
+        self.corrector = PhonemeCorrector(
+            threshold=1.0, similar_threshold=similar_threshold,
+            cache_path=Path(model_path).parent / 'hotword_phonemes.jsonl',
+        )
         self.radar = HotwordRadar([], self.tokenizer)
         self.integrator = ResultIntegrator()
         self.update_hotwords(hotwords)
@@ -4,7 +4,11 @@ RAG 核心算法模块
 
 提供基于音素的模糊编辑距离计算功能。
 """
-from typing import List, Tuple
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
 from .algo_phoneme import Phoneme
 
 # 相似音素集合（模糊匹配权重 0.5）
@@ -34,6 +38,15 @@ SIMILAR_PHONEMES = [
     {'k', 'g'},
 ]
 
+# 相似音素对（含自身），查表代替逐个集合判断
+SIMILAR_PAIRS = frozenset((a, b) for s in SIMILAR_PHONEMES for a in s for b in s)
+
+
+def _is_similar_phoneme(a: str, b: str) -> bool:
+    """检查两个音素是否属于同一个相似音素集"""
+    return (a, b) in SIMILAR_PAIRS
+
+
 def lcs_length(s1: str, s2: str) -> int:
     """
     计算两个字符串的最长公共子序列 (LCS) 长度
@@ -127,11 +140,8 @@ def get_phoneme_cost(p1: Phoneme, p2: Phoneme) -> float:
         return 0.0
 
     # 中文音素：检查相似音素
-    if p1.lang == 'zh' and p2.lang == 'zh':
-        pair = {p1.value, p2.value}
-        for s in SIMILAR_PHONEMES:
-            if pair.issubset(s):
-                return 0.5
+    if p1.lang == 'zh' and p2.lang == 'zh' and _is_similar_phoneme(p1.value, p2.value):
+        return 0.5
 
     # 英文单词：使用 LCS 计算相似度
     if p1.lang == 'en' and p2.lang == 'en':
@@ -382,6 +392,67 @@ def _get_tuple_cost(t1: Tuple, t2: Tuple) -> float:
     return 1.0
 
 
+class PhonemeCostTable:
+    """
+    音素匹配代价表
+
+    把音素 (值, 语言, 是否声调) 编码为整数 id，并缓存任意两个音素之间的匹配代价
+    （规则同 fuzzy_substring_search_constrained：热词音素在前，输入音素在后），
+    DP 时按 id 整块查表，不再逐格判断相似音素。新音素出现时按需扩表。
+    """
+
+    def __init__(self):
+        self.ids: Dict[Tuple[str, str, bool], int] = {}
+        self.keys: List[Tuple[str, str, bool]] = []
+        self.matrix = np.zeros((0, 0))
+        self._lock = threading.Lock()
+
+    def encode(self, infos: List[Tuple]) -> List[int]:
+        """把 info 元组序列编码为 id 列表"""
+        ids = self.ids
+        keys = [(t[0], t[1], t[4]) for t in infos]
+        if any(k not in ids for k in keys):
+            with self._lock:
+                for k in keys:
+                    if k not in ids:
+                        ids[k] = len(self.keys)
+                        self.keys.append(k)
+        return [ids[k] for k in keys]
+
+    def costs(self) -> np.ndarray:
+        """取代价矩阵 [热词音素 id, 输入音素 id]，只为新增的 id 补算代价"""
+        n_old, n_new = len(self.matrix), len(self.keys)
+        if n_old < n_new:
+            with self._lock:
+                n_old, keys = len(self.matrix), self.keys[:]
+                matrix = np.empty((len(keys), len(keys)))
+                matrix[:n_old, :n_old] = self.matrix
+                for h in range(len(keys)):
+                    for i in range(n_old if h < n_old else 0, len(keys)):
+                        matrix[h, i] = _info_cost(keys[h], keys[i])
+                self.matrix = matrix
+        return self.matrix
+
+
+def _info_cost(h: Tuple[str, str, bool], i: Tuple[str, str, bool]) -> float:
+    """热词音素 h 与输入音素 i 的匹配代价，h、i 为 (值, 语言, 是否声调)"""
+    h_v, h_l, h_p = h
+    i_v, i_l, _ = i
+    if h_l != i_l:
+        return 1.0
+    if h_v == i_v:
+        return 0.0
+    if h_l == 'zh':
+        return 0.5 if h_p or _is_similar_phoneme(h_v, i_v) else 1.0
+    if h_l == 'en':
+        lcs = lcs_length(h_v, i_v)
+        return 1.0 - (lcs / max(len(h_v), len(i_v)))
+    return 1.0
+
+
+_COST_TABLE = PhonemeCostTable()
+
+
 def fuzzy_substring_search_constrained(hw_info: List[Tuple], input_info: List[Tuple], threshold: float = 0.6) -> List[Tuple[float, int, int]]:
     """
     在输入序列中搜索热词的最佳匹配片段（边界约束版）
@@ -389,7 +460,7 @@ def fuzzy_substring_search_constrained(hw_info: List[Tuple], input_info: List[Tu
     使用 DP 计算局部相似度，要求：
     1. 起始位置必须是原句的词起始 (is_word_start)
     2. 结束位置必须是原句的词结束 (is_word_end)
-    3. 允许长度在一定范围内缩放，不再死磕等长
+    3. 允许长度在一定范围内缩放
 
     参数:
         hw_info: 热词音素 info 元组列表 (值, 语言, 字始, 字终, 声调, ...)
@@ -399,135 +470,102 @@ def fuzzy_substring_search_constrained(hw_info: List[Tuple], input_info: List[Tu
     返回:
         List[(score, start_idx, end_idx)] - 匹配结果列表（按分数降序）
     """
-    n = len(hw_info)
-    m = len(input_info)
-    if n == 0 or m == 0:
-        return []
-
-    # DP 矩阵: [n+1][m+1]
-    # dp[i][j] 表示 hw 前 i 个音素匹配以 input[j-1] 结尾的某个片段的最小距离
-    dp = [[float('inf')] * (m + 1) for _ in range(n + 1)]
-
-    # 路径记录，用于找起始点: (prev_i, prev_j)
-    path = [[(0, 0)] * (m + 1) for _ in range(n + 1)]
-
-    # 初始化第一行：允许从任何词起始边界开始匹配
-    # 如果 input_info[j] 是词起始，则我们可以在索引 j 处开始匹配 hw[0]
-    # 对应的 DP 状态是 dp[1][j+1]，其依赖于 dp[0][j]
-    for j in range(m + 1):
-        if j == 0:
-            dp[0][j] = 0.0
-            path[0][j] = (0, j)
-        elif j < m and input_info[j][2]:  # is_word_start
-            dp[0][j] = 0.0
-            path[0][j] = (0, j)
+    return fuzzy_substring_search_batch(input_info, [(hw_info, 0, len(input_info))], threshold)[0]
 
-    # [性能优化] 预提取 input 信息，减少循环内索引/解包开销
-    # input_info 元素是 (值, 语言, 字始, 字终, 是调, 始位, 终位)
-    input_vals = [t[0] for t in input_info]
-    input_langs = [t[1] for t in input_info]
-    input_starts = [t[2] for t in input_info]
-    input_ends = [t[3] for t in input_info]
-    input_phones = [t[4] for t in input_info]
 
-    hw_vals = [t[0] for t in hw_info]
-    hw_langs = [t[1] for t in hw_info]
-    hw_phones = [t[4] for t in hw_info]
-
-    # 初始化第一行：允许从任何词起始边界开始匹配
-    for j in range(m + 1):
-        if j == 0 or (j < m and input_starts[j]):
-            dp[0][j] = 0.0
-            path[0][j] = (0, j)
-
-    # 填充 DP
-    for i in range(1, n + 1):
-        h_v, h_l, h_p = hw_vals[i-1], hw_langs[i-1], hw_phones[i-1]
-        row_min = float('inf')
-        
-        for j in range(1, m + 1):
-            # 获取 cost 的优化版
-            # --- Inline _get_tuple_cost start ---
-            i_v, i_l, i_p = input_vals[j-1], input_langs[j-1], input_phones[j-1]
-            if h_l != i_l: cost = 1.0
-            elif h_v == i_v: cost = 0.0
-            elif h_l == 'zh':
-                if h_p: cost = 0.5
-                else:
-                    pair = {h_v, i_v}
-                    cost = 1.0
-                    for s in SIMILAR_PHONEMES:
-                        if pair.issubset(s):
-                            cost = 0.5
-                            break
-            elif h_l == 'en':
-                lcs = _lcs_length(h_v, i_v)
-                cost = 1.0 - (lcs / max(len(h_v), len(i_v)))
-            else: cost = 1.0
-            # --- Inline _get_tuple_cost end ---
-
-            dist_match = dp[i-1][j-1] + cost
-            dist_del = dp[i-1][j] + 1.0
-            dist_ins = dp[i][j-1] + 1.0
-
-            if dist_match <= dist_del:
-                if dist_match <= dist_ins:
-                    dp[i][j] = dist_match
-                    path[i][j] = path[i-1][j-1]
-                else:
-                    dp[i][j] = dist_ins
-                    path[i][j] = path[i][j-1]
-            else:
-                if dist_del <= dist_ins:
-                    dp[i][j] = dist_del
-                    path[i][j] = path[i-1][j]
-                else:
-                    dp[i][j] = dist_ins
-                    path[i][j] = path[i][j-1]
-            
-            if dp[i][j] < row_min: row_min = dp[i][j]
-        
-        # [性能优化] Early Exit：如果这一行的最小值已经超过了阈值允许的最大差异
-        if row_min > n * (1.0 - threshold) + 2: # 稍微放宽一点点
-            break
-
-    # 收集结果
-    results = []
-    seen_ranges = set()
+def fuzzy_substring_search_batch(input_info: List[Tuple], tasks: List[Tuple[List[Tuple], int, int]], threshold: float = 0.6, chunk: int = 1024) -> List[List[Tuple[float, int, int]]]:
+    """
+    批量版 fuzzy_substring_search_constrained：一次计算多个 (热词, 输入窗口) 组合
 
-    for j in range(1, m + 1):
-        # 约束：终点必须是词边界
-        if not input_info[j-1][3]:  # is_word_end
-            continue
+    各组合补齐到相同尺寸后叠成一批，按反对角线推进 DP：同一反对角线上的格子
+    互不依赖，整条对角线连同整批组合用 numpy 一次算完。每格的加法与取舍顺序
+    与逐格实现相同，分数逐位一致。
 
-        dist = dp[n][j]
-        # 针对末尾差异做极简优化：如果是英文且差值只是一个音素，且该音素分值较低
-        # (如 Claude 多出来的空音素)，则稍微给予补偿
-        if n > 1 and dist > 0.5:
-             # 如果最后一个音素不匹配，且它在输入中是边界结束
-             pass # 未来可加入更精细的补偿
-             
-        if dist >= n * 0.8: continue  # 距离太大，强制过滤
+    参数:
+        input_info: 输入文本音素 info 元组列表
+        tasks: [(热词音素 info 元组列表, 窗口起点, 窗口终点), ...]，
+               在 input_info[窗口起点:窗口终点] 中搜索该热词
+        threshold: 相似度阈值
+        chunk: 每批最多计算的组合数，限制内存占用
 
-        score = 1.0 - (dist / n)
-        if score >= threshold:
-            start_idx = path[n][j][1]
-            end_idx = j # 它是 input 中的第 j 个，索引是 j-1
-            
-            # 返回音素层级的索引，不要在核心算法里死磕 char 索引
-            results.append((score, start_idx, end_idx))
+    返回:
+        与 tasks 一一对应的匹配结果列表，索引相对各自窗口，格式同 fuzzy_substring_search_constrained
+    """
+    results: List[List[Tuple[float, int, int]]] = [[] for _ in tasks]
+    live = [k for k, (hw, start, end) in enumerate(tasks) if hw and end > start]
+    if not live:
+        return results
+
+    input_ids = np.array(_COST_TABLE.encode(input_info), dtype=np.int64)
+    input_starts = np.array([bool(t[2]) for t in input_info])
+    input_ends = np.array([bool(t[3]) for t in input_info])
+    encoded = {}   # 同一热词序列在多个窗口中搜索时只编码一次
+    for k in live:
+        hw = tasks[k][0]
+        if id(hw) not in encoded:
+            encoded[id(hw)] = _COST_TABLE.encode(hw)
+    costs = _COST_TABLE.costs()
+
+    for c in range(0, len(live), chunk):
+        batch = live[c:c + chunk]
+        B = len(batch)
+        n = np.array([len(tasks[k][0]) for k in batch])
+        start = np.array([tasks[k][1] for k in batch])
+        m = np.array([tasks[k][2] for k in batch]) - start
+        N, M = int(n.max()), int(m.max())
+        D = N + M + 1
+
+        # 补齐热词与窗口（补齐部分只会影响更靠右、靠下的格子，不影响结果）
+        hw_ids = np.array([encoded[id(tasks[k][0])] + [0] * (N - len(tasks[k][0])) for k in batch], dtype=np.int64)
+        in_window = np.arange(M) < m[:, None]
+        pos = np.where(in_window, start[:, None] + np.arange(M), 0)
+        cost = costs[hw_ids[:, :, None], input_ids[pos][:, None, :]]
+
+        # 按 (行 i, 反对角线 d = i + j) 存放 DP，对角线即一列，邻格都是切片
+        dp = np.full((B, N + 1, D), np.inf)
+        origin = np.zeros((B, N + 1, D), dtype=np.int64)   # 匹配片段的起点
+        skewed = np.zeros((B, N + 1, D))
+        for i in range(1, N + 1):
+            skewed[:, i, i + 1:i + M + 1] = cost[:, i - 1, :]
+
+        # 第一行：允许从窗口开头或任何词起始边界开始匹配
+        can_start = np.zeros((B, M + 1), dtype=bool)
+        can_start[:, 0] = True
+        can_start[:, 1:M] = in_window[:, 1:] & input_starts[pos[:, 1:]]
+        dp[:, 0, :M + 1] = np.where(can_start, 0.0, np.inf)
+        origin[:, 0, :M + 1] = np.where(can_start, np.arange(M + 1), 0)
+
+        for d in range(2, D):
+            hi = min(N, d - 1)
+            dist_match = dp[:, 0:hi, d - 2] + skewed[:, 1:hi + 1, d]
+            dist_del = dp[:, 0:hi, d - 1] + 1.0
+            dist_ins = dp[:, 1:hi + 1, d - 1] + 1.0
+
+            # 取舍顺序同逐格实现：匹配 <= 删除 <= 插入
+            take_match = (dist_match <= dist_del) & (dist_match <= dist_ins)
+            take_del = ~take_match & (dist_del <= dist_ins)
+            dp[:, 1:hi + 1, d] = np.where(take_match, dist_match, np.where(take_del, dist_del, dist_ins))
+            origin[:, 1:hi + 1, d] = np.where(
+                take_match, origin[:, 0:hi, d - 2],
+                np.where(take_del, origin[:, 0:hi, d - 1], origin[:, 1:hi + 1, d - 1])
+            )
 
-    # 按得分降序
-    results.sort(key=lambda x: x[0], reverse=True)
-    
-    # 区间排重（如果同一结束点有多个起始点，只留最优）
-    final_res = []
-    used_ends = {}
-    for score, s, e in results:
-        if e not in used_ends or score > used_ends[e][0]:
-            used_ends[e] = (score, s, e)
-    
-    return sorted(used_ends.values(), key=lambda x: x[0], reverse=True)
+        # 收集结果：取各组合第 n 行，终点必须是词结束边界
+        rows = np.arange(B)[:, None]
+        cols = n[:, None] + 1 + np.arange(M)
+        dists = dp[rows, n[:, None], np.minimum(cols, D - 1)]
+        scores = 1.0 - (dists / n[:, None])
+        hit = in_window & input_ends[pos] & (dists < n[:, None] * 0.8) & (scores >= threshold)
+        hit_b, hit_j = np.nonzero(hit)
+        hit_start = origin[rows, n[:, None], np.minimum(cols, D - 1)][hit_b, hit_j]
+        for b, j, score, s in zip(hit_b.tolist(), hit_j.tolist(), scores[hit_b, hit_j].tolist(), hit_start.tolist()):
+            results[batch[b]].append((score, s, j + 1))
+
+    # 每个终点只有一个结果，按得分降序（同分按终点先后）
+    for found in results:
+        if len(found) > 1:
+            found.sort(key=lambda x: x[0], reverse=True)
+    return results
 
 
 def _lcs_length(s1: str, s2: str) -> int:
@@ -13,9 +13,9 @@ from typing import List, Tuple, Dict, Set, Optional, NamedTuple
 from collections import defaultdict
 from pathlib import Path
 
-from .algo_phoneme import get_phoneme_info, Phoneme
+from .algo_phoneme import get_phoneme_info, Phoneme, PhonemeCache
 from .rag_fast import FastRAG
-from .algo_calc import fast_substring_score, fuzzy_substring_score, fuzzy_substring_search_constrained
+from .algo_calc import fast_substring_score, fuzzy_substring_score, fuzzy_substring_search_batch
 
 # 使用统一的 logger（从 __init__.py 导入）
 from . import logger
@@ -52,9 +52,14 @@ class PhonemeCorrector:
     并将相似度超过阈值的片段替换为热词。
     """
 
-    def __init__(self, threshold: float = 0.7, similar_threshold: float = None):
+    def __init__(self, threshold: float = 0.7, similar_threshold: float = None, cache_path: Optional[Path] = None):
         """
         初始化拼音纠错器
+
+        Args:
+            threshold: 替换阈值
+            similar_threshold: 相似热词阈值
+            cache_path: 热词音素缓存文件路径，None 表示只缓存在内存中
         """
         self.threshold = threshold
         self.similar_threshold = similar_threshold if similar_threshold is not None else threshold - 0.2
@@ -64,55 +69,79 @@ class PhonemeCorrector:
         
         self.hotwords: Dict[str, List[Phoneme]] = {}
         self.fast_rag = FastRAG(threshold=min(self.threshold, self.similar_threshold) - 0.1)
+        self.phoneme_cache = PhonemeCache(cache_path)
+        self._ranks: Dict[str, int] = {}    # {热词: 在热词列表中的次序}
         self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
 
     def update_hotwords(self, hotwords: List[str]) -> int:
-        """更新纠错热词库 (线程安全)"""
+        """
+        更新纠错热词库 (线程安全)
+
+        与上次的热词集合比对，只为新增热词取音素（取自音素缓存），
+        FastRAG 只移除、添加有变化的热词，不整体重建索引。
+        """
         start_time = time.time()
         
-        new_hotwords = {}
-        for hw in hotwords:
-            hw = hw.strip()
-            if not hw:
-                continue
-                
-            phons = get_phoneme_info(hw)
-            if phons:
-                new_hotwords[hw] = phons
-        
-        with self._lock:
-            self.hotwords = new_hotwords
-            self.fast_rag = FastRAG(threshold=min(self.threshold, self.similar_threshold) - 0.1)
-            self.fast_rag.add_hotwords(new_hotwords)
+        ordered = [hw for hw in map(str.strip, hotwords) if hw]
+        texts = set(ordered)
+        with self._update_lock:
+            removed = self.hotwords.keys() - texts
+            added = {}
+            for hw in texts.difference(self.hotwords):
+                phons = self.phoneme_cache.get(hw)
+                if phons:
+                    added[hw] = phons
+
+            if len(self.phoneme_cache.entries) > 2 * len(texts) + 1024:
+                # 缓存中不再使用的条目过多，清理后重写缓存文件
+                self.phoneme_cache.prune(texts)
+            self.phoneme_cache.save()
+
+            with self._lock:
+                for hw in removed:
+                    del self.hotwords[hw]
+                self.hotwords.update(added)
+                # 热词首次出现的次序，倒序建表使重复热词保留最靠前的次序
+                self._ranks = dict(zip(reversed(ordered), range(len(ordered) - 1, -1, -1)))
+                self.fast_rag.remove_hotwords(removed)
+                self.fast_rag.add_hotwords(added)
+            num = len(self.hotwords)
         
-        logger.debug(f"PhonemeCorrector 已更新 {len(new_hotwords)} 个热词，耗时 {time.time() - start_time:.3f}s")
-        return len(new_hotwords)
+        logger.debug(
+            f"PhonemeCorrector 已更新 {num} 个热词（新增 {len(added)}，移除 {len(removed)}），"
+            f"耗时 {time.time() - start_time:.3f}s"
+        )
+        return num
 
     def _find_matches(self, text: str, fast_results: List, input_processed: List[Tuple]) -> Tuple[List[MatchResult], List[Tuple[str, str, float]]]:
         """精细匹配逻辑：边界约束的模糊搜索"""
         matches = []
         similars = []
         
-        # 预先根据相似度阈值过滤 fast_results，减少重复计算
+        # 为 Similar 列表使用更宽松的 initial 阈值，确保能抓到压线匹配
+        search_threshold = min(self.threshold, self.similar_threshold) - 0.1
+
+        # 收集 (热词, 搜索窗口) 组合
+        tasks = []  # [(hw, window_start, window_end), ...]
+        hw_compares = {}
         for hw, fast_score, approx_end_idx in fast_results:
-            hw_phonemes = self.hotwords[hw]
-            hw_compare = [p.info[:5] for p in hw_phonemes]
-            
-            # 使用新算法：在输入序列中一站式搜索所有符合边界的最优区域
-            # 为 Similar 列表使用更宽松的 initial 阈值，确保能抓到压线匹配
-            search_threshold = min(self.threshold, self.similar_threshold) - 0.1
-            
+            if hw not in hw_compares:
+                hw_compares[hw] = [p.info[:5] for p in self.hotwords[hw]]
+
             # [性能优化] 仅在 FastRAG 预测的结束位置附近进行搜索
             # 窗口大小：热词长度 + 左右各 5 个音素的缓冲
-            window_size = len(hw_compare) + 10
+            window_size = len(hw_compares[hw]) + 10
             window_start = max(0, approx_end_idx - window_size)
             window_end = min(len(input_processed), approx_end_idx + 5)
-            
-            local_input = input_processed[window_start:window_end]
-            
-            # 搜索匹配
-            found_segments = fuzzy_substring_search_constrained(hw_compare, local_input, threshold=search_threshold)
-            
+            tasks.append((hw, window_start, window_end))
+
+        # 使用新算法：所有组合一次批量搜索符合边界的最优区域
+        found = fuzzy_substring_search_batch(
+            input_processed, [(hw_compares[hw], start, end) for hw, start, end in tasks], threshold=search_threshold
+        )
+
+        for (hw, window_start, _), found_segments in zip(tasks, found):
             for score, start_phon_idx, end_phon_idx in found_segments:
                 # 转换回全局索引
                 global_start_idx = window_start + start_phon_idx
@@ -148,10 +177,10 @@ class PhonemeCorrector:
                 
         return matches, final_similars
 
-    def _resolve_and_replace(self, text: str, matches: List[MatchResult]) -> Tuple[str, List[Tuple[str, float]], List[Tuple[str, float]]]:
+    def _resolve_and_replace(self, text: str, matches: List[MatchResult], ranks: Dict[str, int]) -> Tuple[str, List[Tuple[str, float]], List[Tuple[str, float]]]:
         """冲突去重与文本替换"""
-        # 分数优先 > 长度优先
-        matches.sort(key=lambda x: (x.score, x.end - x.start), reverse=True)
+        # 分数优先 > 长度优先 > 热词在列表中靠前优先
+        matches.sort(key=lambda x: (-x.score, x.start - x.end, ranks[x.hotword]))
         
         final_matches = []
         all_matched_info = []
@@ -215,9 +244,10 @@ class PhonemeCorrector:
 
             # 精筛
             matches, similars = self._find_matches(text, fast_results, input_processed)
+            ranks = {m.hotword: self._ranks[m.hotword] for m in matches}
 
         # 3. 冲突解决与替换
-        new_text, final_hw_info, all_hw_info = self._resolve_and_replace(text, matches)
+        new_text, final_hw_info, all_hw_info = self._resolve_and_replace(text, matches, ranks)
         
         # similars 已经是 [(origin, hw, score), ...] 的元组列表
         return CorrectionResult(text=new_text, matchs=final_hw_info, similars=similars[:k])
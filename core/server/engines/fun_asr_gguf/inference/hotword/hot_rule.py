@@ -5,6 +5,13 @@
 基于正则表达式的精确规则替换。
 适用于固定格式的替换（单位、符号、格式等）。
 
+规则在加载时一次性编译，替换时按原顺序逐组执行：
+1. 相邻的纯文本规则，若彼此互不干扰（模式之间不重叠、前面的替换结果不会
+   构成后面的模式），合并成一组，按首字符定位后查表，一次扫描完成整组替换
+2. 正则规则按顺序分块，预先算出每条规则可能的首字符，文本中不含这些字符时整块跳过
+
+结果与逐条 re.sub 完全一致。
+
 使用方法示例：
 ```python
 corrector = RuleCorrector()
@@ -12,17 +19,233 @@ corrector.update_rules('''
     毫安时  =  mAh
     伏特   =   V
     赫兹   =   Hz
-    (艾特)\\s*(\\w+)\\s*(点)\\s*(\\w+)    =    @$2.$4
+    (艾特)\\s*(\\w+)\\s*(点)\\s*(\\w+)    =    @\\2.\\4
 ''')
 
-corrector.correct('这款手机有5000毫安时的大电池')  # 输出：这款手机有5000mAh的大电池
-corrector.correct('国内交流电一般是50赫兹')       # 输出：国内交流电一般是50Hz
+corrector.substitute('这款手机有5000毫安时的大电池')  # 输出：这款手机有5000mAh的大电池
+corrector.substitute('国内交流电一般是50赫兹')       # 输出：国内交流电一般是50Hz
 ```
 """
 
 import re
+from functools import partial
 from threading import Lock
-from typing import Dict
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+
+# 一块规则：(首字符预判正则，文本中无匹配时整块跳过；None 表示不预判, [替换函数, ...])
+Block = Tuple[Optional['re.Pattern'], List[Callable[[str], str]]]
+
+REGEX_BLOCK = 16        # 每块正则规则的条数，整块共用一次首字符预判
+MERGE_CHECK_LIMIT = 256 # 合并纯文本规则时，单条规则最多与组内多少条做重叠检查，超出则另起一组
+RANGE_LIMIT = 64        # 字符区间不超过此宽度时才展开为首字符集合
+
+
+def _literal(pattern: str) -> Optional[str]:
+    """若模式只由普通字符组成，返回它所匹配的字符串，否则返回 None"""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return None
+    if parsed.state.flags & ~sre_parse.SRE_FLAG_UNICODE or not len(parsed):
+        return None
+    chars = []
+    for op, av in parsed:
+        if op is not sre_parse.LITERAL:
+            return None
+        chars.append(chr(av))
+    return ''.join(chars)
+
+
+def _first_chars(items) -> Optional[FrozenSet[str]]:
+    """
+    计算一段正则可能匹配的首字符集合
+
+    零宽断言不消耗字符，直接跳过；遇到无法枚举的元素（\\w、.、反向引用等）
+    或可能匹配空串时返回 None。
+    """
+    items = list(items)
+    for i, (op, av) in enumerate(items):
+        if op is sre_parse.LITERAL:
+            return frozenset(chr(av))
+        if op is sre_parse.IN:
+            chars = set()
+            for o, a in av:
+                if o is sre_parse.LITERAL:
+                    chars.add(chr(a))
+                elif o is sre_parse.RANGE and a[1] - a[0] <= RANGE_LIMIT:
+                    chars.update(map(chr, range(a[0], a[1] + 1)))
+                else:
+                    return None
+            return frozenset(chars)
+        if op is sre_parse.SUBPATTERN:
+            if av[1] or av[2]:  # 局部标志 (?i:...) 等
+                return None
+            return _first_chars(av[-1])
+        if op is sre_parse.BRANCH:
+            chars = set()
+            for branch in av[1]:
+                first = _first_chars(list(branch) + items[i + 1:])
+                if first is None:
+                    return None
+                chars |= first
+            return frozenset(chars)
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None)):
+            low, _, sub = av
+            if low:
+                return _first_chars(sub)
+            first, rest = _first_chars(sub), _first_chars(items[i + 1:])
+            return None if first is None or rest is None else first | rest
+        if op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            continue
+        return None
+    return None
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """两个字符串能否在同一段文本中重叠出现（包含关系或首尾相接重叠）"""
+    if a in b or b in a:
+        return True
+    for k in range(1, min(len(a), len(b))):
+        if a.endswith(b[:k]) or b.endswith(a[:k]):
+            return True
+    return False
+
+
+def _char_class(chars) -> 're.Pattern':
+    """由字符集合构造单字符匹配的正则"""
+    return re.compile('[' + ''.join(re.escape(c) for c in sorted(chars)) + ']')
+
+
+class _LiteralGroup:
+    """
+    一组可以一次扫描完成的纯文本规则
+
+    逐条替换与一次扫描等价的条件：组内模式两两不重叠（任一位置至多一条规则匹配，
+    且不会互相抢占），前面规则的替换文本非空且不与后面的模式重叠（替换结果
+    不会构成或拼接出后面的模式）。扫描时先用首字符找出候选位置，
+    再按该首字符下出现过的模式长度查表。
+    """
+
+    def __init__(self):
+        self.table: Dict[str, str] = {}
+        self.closed = False
+        self._patterns: Dict[str, List[str]] = {}      # 字符 -> 组内含该字符的模式
+        self._replacements: Dict[str, List[str]] = {}  # 字符 -> 组内含该字符的替换文本
+
+    def try_add(self, literal: str, replacement: str) -> bool:
+        if self.closed:
+            return False
+        if self.table:
+            patterns = {p for c in set(literal) for p in self._patterns.get(c, ())}
+            replacements = {r for c in set(literal) for r in self._replacements.get(c, ())}
+            if len(patterns) + len(replacements) > MERGE_CHECK_LIMIT:
+                return False
+            if any(_overlaps(literal, p) for p in patterns):
+                return False
+            if any(_overlaps(literal, r) for r in replacements):
+                return False
+        self.table[literal] = replacement
+        for c in set(literal):
+            self._patterns.setdefault(c, []).append(literal)
+        for c in set(replacement):
+            self._replacements.setdefault(c, []).append(replacement)
+        # 删除式替换会让两侧文本拼接，可能拼出后面的模式，此后不再并入
+        self.closed = not replacement
+        return True
+
+    def compile(self) -> Callable[[str], str]:
+        """返回执行整组替换的函数"""
+        table = self.table
+        if len(table) == 1:
+            (literal, replacement), = table.items()
+            return partial(re.compile(re.escape(literal)).sub, replacement)
+
+        lengths: Dict[str, set] = {}
+        for word in table:
+            lengths.setdefault(word[0], set()).add(len(word))
+        lengths = {c: sorted(ls) for c, ls in lengths.items()}
+        starts = _char_class(lengths)
+        get = table.get
+
+        def substitute(text: str) -> str:
+            out = []
+            pos = 0
+            for m in starts.finditer(text):
+                i = m.start()
+                if i < pos:
+                    continue
+                for n in lengths[m.group()]:
+                    replacement = get(text[i:i + n])
+                    if replacement is not None:
+                        out.append(text[pos:i])
+                        out.append(replacement)
+                        pos = i + n
+                        break
+            if not pos:
+                return text
+            out.append(text[pos:])
+            return ''.join(out)
+
+        return substitute
+
+
+def compile_rules(patterns: Dict[str, str]) -> List[Block]:
+    """
+    按顺序编译规则，返回 [(整块首字符预判正则, [替换函数, ...]), ...]
+
+    无效的正则或替换式在此处丢弃，与逐条 re.sub 时忽略异常的效果相同。
+    """
+    blocks: List[Block] = []
+    group: Optional[_LiteralGroup] = None
+    pending: List[Tuple[FrozenSet[str], Callable[[str], str]]] = []
+
+    def flush_regex():
+        if pending:
+            blocks.append((_char_class(frozenset().union(*(first for first, _ in pending))), [sub for _, sub in pending]))
+            pending.clear()
+
+    def flush_group():
+        nonlocal group
+        if group is not None:
+            blocks.append((None, [group.compile()]))
+            group = None
+
+    for pattern, replacement in patterns.items():
+        try:
+            regex = re.compile(pattern)
+            regex.sub(replacement, '')  # 替换式中的分组引用错误在编译模板时即抛出
+        except Exception:
+            continue
+
+        literal = _literal(pattern)
+        if literal is not None and '\\' not in replacement:
+            flush_regex()
+            if group is None or not group.try_add(literal, replacement):
+                flush_group()
+                group = _LiteralGroup()
+                group.try_add(literal, replacement)
+            continue
+
+        flush_group()
+        sub = partial(regex.sub, replacement)
+        first = None if regex.flags & re.IGNORECASE else _first_chars(sre_parse.parse(pattern))
+        if first is None:
+            flush_regex()
+            blocks.append((None, [sub]))
+            continue
+        pending.append((first, sub))
+        if len(pending) >= REGEX_BLOCK:
+            flush_regex()
+
+    flush_group()
+    flush_regex()
+    return blocks
 
 
 class RuleCorrector:
@@ -30,6 +253,7 @@ class RuleCorrector:
 
     def __init__(self):
         self.patterns: Dict[str, str] = {}
+        self._blocks: List[Block] = []
         self._lock = Lock()
 
     def update_rules(self, rule_text: str) -> int:
@@ -54,8 +278,11 @@ class RuleCorrector:
                 replacement = parts[1].strip()
                 new_patterns[pattern] = replacement
 
+        blocks = compile_rules(new_patterns)
+
         with self._lock:
             self.patterns = new_patterns
+            self._blocks = blocks
 
         return len(new_patterns)
 
@@ -69,53 +296,90 @@ class RuleCorrector:
         Returns:
             替换后的文本
         """
-        if not text or not self.patterns:
+        if not text:
             return text
 
-        result = text
-
         with self._lock:
-            patterns = self.patterns.copy()
+            blocks = self._blocks
 
-        for pattern, replacement in patterns.items():
-            try:
-                result = re.sub(pattern, replacement, result)
-            except Exception:
-                # 忽略无效的正则表达式
-                pass
+        result = text
+        for prefilter, subs in blocks:
+            if prefilter is not None and prefilter.search(result) is None:
+                continue
+            for sub in subs:
+                try:
+                    result = sub(result)
+                except Exception:
+                    # 忽略运行时出错的规则
+                    pass
 
         return result
 
 
 if __name__ == '__main__':
+    import random
+    import time
+
     print('-------------规则纠错器测试---------------')
 
     rules = '''
         毫安时  =  mAh
         伏特   =   V
         赫兹   =   Hz
-        (艾特)\\s*(\\w+)\\s*(点)\\s*(\\w+)    =    @$2.$4
+        (艾特)\\s*(\\w+)\\s*(点)\\s*(\\w+)    =    @\\2.\\4
     '''
 
-    # 新接口
-    corrector = CorrectorRule()
+    corrector = RuleCorrector()
     corrector.update_rules(rules)
 
-    print("\n=== 新接口测试 ===")
-    print(f"输入: '这款手机有5000毫安时的大电池'")
-    print(f"输出: {corrector.correct('这款手机有5000毫安时的大电池')}")
+    for sentence in ('这款手机有5000毫安时的大电池', '国内交流电一般是50赫兹', '邮箱是 艾特 gmail 点 com'):
+        print(f"输入: '{sentence}'")
+        print(f"输出: {corrector.substitute(sentence)}\n")
+
+    # 性能基准：9 成纯文本规则在前、1 成正则规则在后（与 hot-rule.txt 的组织方式相同），对比逐条 re.sub
+    print('-------------规则替换性能（10000 字文本）---------------')
+    random.seed(0)
+    pool = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+    text_pool = pool[:600] + list('，。的了是在和有')
+
+    def old_substitute(patterns: Dict[str, str], text: str) -> str:
+        for pattern, replacement in patterns.items():
+            try:
+                text = re.sub(pattern, replacement, text)
+            except Exception:
+                pass
+        return text
+
+    for n_rules in (10, 500, 5000):
+        lines = []
+        for i in range(n_rules):
+            word = ''.join(random.choices(pool, k=random.randint(2, 4)))
+            if i >= n_rules * 9 // 10:
+                lines.append(f'{word[0]}\\s*{word[1:]}(\\d+) = R{i}-\\1')
+            else:
+                lines.append(f'{word} = R{i}')
+        corrector = RuleCorrector()
+        t0 = time.perf_counter()
+        corrector.update_rules('\n'.join(lines))
+        t_load = time.perf_counter() - t0
 
-    print(f"\n输入: '国内交流电一般是50赫兹'")
-    print(f"输出: {corrector.correct('国内交流电一般是50赫兹')}")
+        words = [line.split(' = ')[0].replace('\\s*', '').replace('(\\d+)', '12') for line in lines]
+        chunks = []
+        while sum(map(len, chunks)) < 10000:
+            chunks.append(random.choice(words) if random.random() < 0.1 else ''.join(random.choices(text_pool, k=8)))
+        text = ''.join(chunks)[:10000]
 
-    # 旧接口（向后兼容）
-    print("\n=== 旧接口测试（向后兼容）===")
-    更新热词词典(rules)
+        expected = old_substitute(corrector.patterns, text)
+        t0 = time.perf_counter()
+        old_substitute(corrector.patterns, text)
+        t_old = time.perf_counter() - t0
 
-    res = 热词替换('这款手机有5000毫安时的大电池')
-    print(f"输入: '这款手机有5000毫安时的大电池'")
-    print(f"输出: {res}")
+        result = corrector.substitute(text)
+        t0 = time.perf_counter()
+        for _ in range(10):
+            corrector.substitute(text)
+        t_new = (time.perf_counter() - t0) / 10
 
-    res2 = 热词替换('国内交流电一般是50赫兹')
-    print(f"输入: '国内交流电一般是50赫兹'")
-    print(f"输出: {res2}")
+        print(f'  {n_rules:>5} 条规则: 编译 {t_load * 1000:7.1f}ms ({len(corrector._blocks)} 块), '
+              f'逐条 re.sub {t_old * 1000:8.1f}ms, 单次扫描 {t_new * 1000:6.2f}ms, '
+              f'结果一致: {result == expected}')
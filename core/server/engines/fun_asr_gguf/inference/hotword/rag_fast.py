@@ -4,14 +4,17 @@
 
 使用以下技术优化检索性能：
 1. 锚点搜索 (Anchor Scanning) 缩小搜索范围
-2. 首音素倒排索引极速过滤
+2. 音素三元组倒排索引，按长度与共有三元组数剪枝
 3. 纯 Python 极限循环优化 (属性提取与剪枝)
 """
 
 # 彻底移除 Numba 兼容逻辑，保持代码清晰
-from typing import List, Dict, Tuple, Set, Union
+from typing import Iterable, List, Dict, Optional, Tuple, Set, Union
 from collections import defaultdict
+from array import array
+import sys
 import time
+import numpy as np
 from . import logger
 
 HAS_NUMBA = False
@@ -24,6 +27,27 @@ HAS_NUMBA = False
 from .algo_phoneme import Phoneme
 from .algo_calc import SIMILAR_PHONEMES
 
+
+def _similar_classes() -> Dict[str, str]:
+    """相似音素集合按传递关系合并成类：{音素: 所在类的代表音素}"""
+    parent = {}
+
+    def find(p):
+        while parent.setdefault(p, p) != p:
+            p = parent[p]
+        return p
+
+    for s_set in SIMILAR_PHONEMES:
+        first, *rest = sorted(s_set)
+        for p in rest:
+            parent[find(p)] = find(first)
+    return {p: find(p) for p in parent}
+
+
+SIMILAR_CLASSES = _similar_classes()
+TONES = {'1', '2', '3', '4', '5'}   # 声调音素（数字音素与之同形，一并视为声调）
+
+
 class PhonemeEncoder:
     """将音素字符串编码为整数，加速比较效率"""
     
@@ -31,17 +55,43 @@ class PhonemeEncoder:
         self.phoneme_to_code: Dict[str, int] = {}
         self.code_to_phoneme: Dict[int, str] = {}
         self.next_code = 1  # 0 保留
+        self.class_codes: Dict[int, int] = {}  # {音素编码: 相似音素类编码}
+        self.tone_codes: Set[int] = set()
         
     def encode(self, phoneme: str) -> int:
         if phoneme not in self.phoneme_to_code:
             self.phoneme_to_code[phoneme] = self.next_code
             self.code_to_phoneme[self.next_code] = phoneme
+            if phoneme in TONES:
+                self.tone_codes.add(self.next_code)
             self.next_code += 1
         return self.phoneme_to_code[phoneme]
     
     def encode_sequence(self, phonemes: List[str]) -> List[int]:
         """将音素序列编码为整数列表"""
-        return [self.encode(p) for p in phonemes]
+        codes = self.phoneme_to_code
+        return [codes[p] if p in codes else self.encode(p) for p in phonemes]
+
+    def normalize_sequence(self, codes: List[int]) -> List[int]:
+        """将音素编码换成所在相似音素类的编码（不属于任何相似集合的音素保持不变）"""
+        classes = self.class_codes
+        return [classes[c] if c in classes else self._encode_class(c) for c in codes]
+
+    def key_sequence(self, codes: List[int]) -> List[int]:
+        """
+        倒排索引键使用的音素类序列：相似音素合并为一类并去掉声调
+
+        同音字、近音字的识别错误多只改变声调或相似音素，去掉后不会打断三元组。
+        去掉声调后不足三个音素时保留声调。
+        """
+        norm = self.normalize_sequence(codes)
+        toneless = [c for c in norm if c not in self.tone_codes]
+        return toneless if len(toneless) >= 3 else norm
+
+    def _encode_class(self, code: int) -> int:
+        rep = SIMILAR_CLASSES.get(self.code_to_phoneme[code])
+        self.class_codes[code] = class_code = self.encode(rep) if rep else code
+        return class_code
 
     def get_similar_codes(self, code: int) -> List[int]:
         """获取相似音素的编码列表"""
@@ -62,46 +112,186 @@ class PhonemeEncoder:
 
 class PhonemeIndex:
     """
-    多音素倒排索引
-    
-    按热词前几个音素分桶，检索时只匹配音素在输入中出现过的热词，减少计算量。
-    - 中文：索引前两个音素（声母+韵母，即第一个字的完整拼音）
-    - 英文：索引前两个音素（容错首音素识别错误，如 klaude -> Claude）
+    音素三元组倒排索引
+
+    以相邻三个音素为键，倒排表按位置记录包含该三元组的序列编号。检索时统计每条序列
+    与输入共有的三元组位置数，按长度与共有数剪枝，只对剩余候选打分。
+    - 键取相似音素类并去掉声调（见 PhonemeEncoder.key_sequence），同音、近音错误不会打断三元组
+    - 不足三个音素的短序列改用单音素键
+    - 一个汉字至多对应两个键音素，改错一个字会打断至多 NGRAM+1 个三元组。三元组不多于此数的
+      短热词可能一个也不剩，另按原首音素索引的规则（前两个音素）放入锚点桶，这部分召回与原实现一致
+    - 序列与倒排表存放在紧凑数组中；移除时只打标记，失效序列过多时整体压缩
     """
-    
+
+    NGRAM = 3
+    KEY_BITS = 20   # 多个音素类编码拼成一个整数键
+    ANCHOR_GRAMS = NGRAM + 1    # 三元组数不超过此值的序列同时放入锚点桶
+
     def __init__(self):
         self.encoder = PhonemeEncoder()
-        # {音素编码: [(热词原文, 整数列表), ...]}
-        self.index: Dict[int, List[Tuple[str, List[int]]]] = defaultdict(list)
-        self.all_hotwords: List[Tuple[str, List[int]]] = []
-        
+        self._reset()
+
+    def _reset(self):
+        # {n-gram 键: 序列编号数组}
+        self.postings: Dict[int, array] = {}
+        # 锚点桶 {前两个音素之一的编码: 序列编号数组}，只收短热词
+        self.anchor_postings: Dict[int, array] = {}
+        # 全部序列的音素编码首尾相接，第 i 条为 codes[offsets[i]:offsets[i+1]]
+        self.codes = array('i')
+        self.offsets = array('q', [0])
+        self.key_lengths = array('i')   # 各序列键音素序列的长度
+        # 序列编号 -> 热词原文（已移除为 None），以及有效标记
+        self.hotwords: List[Optional[str]] = []
+        self.alive = bytearray()
+        # {热词原文: [序列编号, ...]}，用于原地移除
+        self.hotword_ids: Dict[str, List[int]] = defaultdict(list)
+        self.n_short = 0      # 使用单音素键的有效序列数
+        self.n_toned = 0      # 键中保留了声调的有效序列数
+        self.n_removed = 0    # 已打标记、尚未压缩的序列数
+
     def add(self, hotword: str, phonemes: List[Phoneme]):
-        """添加热词到索引，内部自动决定索引哪些位置"""
+        """添加热词的一条音素序列"""
         if not phonemes:
             return
-        
-        # 将音素对象编码为整数 ID 序列
-        phoneme_strs = [p.value for p in phonemes]
-        codes = self.encoder.encode_sequence(phoneme_strs)
-        
-        # 索引策略：统一索引前两个音素
-        # - 中文：声母+韵母（第一个字的完整拼音）
-        # - 英文：前两个音素（容错首音素识别错误，如 klaude -> Claude）
-        limit = min(len(codes), 2)
-        indices = list(range(limit))
-            
-        # 收集去重后的 target_codes
-        target_codes = {codes[i] for i in indices if i < len(codes)}
-        
-        for code in target_codes:
-            self.index[code].append((hotword, codes))
-            
-        self.all_hotwords.append((hotword, codes))
-        
-    def get_candidates(self, input_codes: List[int]) -> List[Tuple[str, List[int], List[int]]]:
+        self.add_codes(hotword, self.encoder.encode_sequence([p.value for p in phonemes]))
+
+    def add_codes(self, hotword: str, codes: List[int]):
+        """添加已编码的音素序列"""
+        seq_id = len(self.hotwords)
+        self.hotwords.append(hotword)
+        self.alive.append(1)
+        self.codes.extend(codes)
+        self.offsets.append(len(self.codes))
+        self.hotword_ids[hotword].append(seq_id)
+
+        key_seq = self.encoder.key_sequence(codes)
+        self.key_lengths.append(len(key_seq))
+        self._count(key_seq, 1)
+        for key in self._gram_keys(key_seq, self.NGRAM if len(key_seq) >= self.NGRAM else 1):
+            self._append(self.postings, key, seq_id)
+        if len(key_seq) - self.NGRAM + 1 <= self.ANCHOR_GRAMS:
+            for code in set(codes[:2]):
+                self._append(self.anchor_postings, code, seq_id)
+
+    @staticmethod
+    def _append(postings: Dict[int, array], key: int, seq_id: int):
+        posting = postings.get(key)
+        if posting is None:
+            postings[key] = array('i', (seq_id,))
+        else:
+            posting.append(seq_id)
+
+    def _count(self, key_seq: List[int], delta: int):
+        """维护各类键的有效序列数，检索时只查询用得到的键"""
+        if len(key_seq) < self.NGRAM:
+            self.n_short += delta
+        elif not self.encoder.tone_codes.isdisjoint(key_seq):
+            self.n_toned += delta
+
+    def remove(self, hotwords: Set[str]) -> int:
+        """从索引中移除热词的全部音素序列，返回移除的序列数"""
+        removed = 0
+        for hw in hotwords:
+            for seq_id in self.hotword_ids.pop(hw, ()):
+                self.hotwords[seq_id] = None
+                self.alive[seq_id] = 0
+                self._count(self.encoder.key_sequence(self.sequence(seq_id)), -1)
+                removed += 1
+
+        self.n_removed += removed
+        if self.n_removed > max(1024, len(self.hotwords) - self.n_removed):
+            self._compact()
+        return removed
+
+    def _compact(self):
+        """丢弃已移除的序列并重建倒排表（保持添加顺序）"""
+        live = [(hw, self.sequence(i)) for i, hw in enumerate(self.hotwords) if hw is not None]
+        self._reset()
+        for hw, codes in live:
+            self.add_codes(hw, codes)
+
+    def sequence(self, seq_id: int) -> List[int]:
+        """取出序列的音素编码"""
+        return self.codes[self.offsets[seq_id]:self.offsets[seq_id + 1]].tolist()
+
+    def _gram_keys(self, key_seq: List[int], n: int) -> List[int]:
+        """把相邻 n 个音素类编码拼成整数键"""
+        keys = key_seq[:max(0, len(key_seq) - n + 1)]
+        for j in range(1, n):
+            keys = [k | c << (self.KEY_BITS * j) for k, c in zip(keys, key_seq[j:])]
+        return keys
+
+    def candidate_ids(self, input_codes: List[int], threshold: float, transpositions: bool = False, limit: int = 0) -> List[int]:
+        """
+        按长度与共有 n-gram 数筛选候选序列编号（升序，即添加顺序）
+
+        允许 k 次编辑时，每次编辑至多破坏 n 个 n-gram（计相邻交换时为 n+1），长 L 的键序列
+        至少还有 L-n+1-n*k 个位置的 n-gram 原样出现在输入中；该下限不足 1 时仍要求至少共有 1 个。
+        编辑距离不小于长度差，比输入长出 k 个音素以上的序列直接剔除。
+        锚点桶中前两个音素（或其相似音素）出现在输入里的短热词全部保留，不受上述下限与 limit 影响。
+
+        Args:
+            input_codes: 输入音素编码
+            threshold: 相似度阈值，允许的编辑次数 k = floor(序列长度 * (1 - threshold))
+            transpositions: 打分是否把相邻交换算作一次编辑（OSA 距离）
+            limit: 三元组候选数上限（0 表示不限制），超出时只保留共有 n-gram 占比最高的，
+                   打分量随之封顶，但召回不再无损
+        """
+        norm = self.encoder.normalize_sequence(input_codes)
+        keys = set(self._gram_keys([c for c in norm if c not in self.encoder.tone_codes], self.NGRAM))
+        if self.n_toned:
+            keys.update(self._gram_keys(norm, self.NGRAM))
+        if self.n_short:
+            keys.update(norm)
+        postings = [np.frombuffer(self.postings[k], dtype=np.int32) for k in keys if k in self.postings]
+        anchored = self._anchor_ids(input_codes)
+        if not postings and not anchored.size:
+            return []
+        ids, shared = np.unique(np.concatenate(postings or [anchored[:0]]), return_counts=True)
+        del postings
+
+        offsets = np.frombuffer(self.offsets, dtype=np.int64)
+        alive = np.frombuffer(self.alive, dtype=np.bool_)
+
+        def admissible(seq_ids):
+            """长度差不超过允许编辑次数的有效序列"""
+            lengths = offsets[seq_ids + 1] - offsets[seq_ids]
+            max_edits = np.floor(lengths * (1.0 - threshold) + 1e-9)
+            return (lengths - len(input_codes) <= max_edits) & alive[seq_ids], max_edits
+
+        keep, max_edits = admissible(ids)
+        key_lengths = np.frombuffer(self.key_lengths, dtype=np.int32)[ids]
+        n = np.where(key_lengths < self.NGRAM, 1, self.NGRAM)
+        span = n + (n > 1) if transpositions else n
+        keep &= shared >= np.maximum(1, key_lengths - n + 1 - span * max_edits)
+        if limit and np.count_nonzero(keep) > limit:
+            coverage = np.where(keep, shared / (key_lengths - n + 1), -1.0)
+            keep = np.zeros_like(keep)
+            keep[np.argsort(-coverage, kind='stable')[:limit]] = True
+
+        anchored = anchored[admissible(anchored)[0]]
+        return np.union1d(ids[keep], anchored).tolist()
+
+    def _anchor_ids(self, input_codes: List[int]) -> np.ndarray:
+        """锚点桶中前两个音素（或其相似音素）在输入中出现过的序列编号"""
+        if not self.anchor_postings:
+            return np.empty(0, dtype=np.int32)
+        codes = set(input_codes)
+        for code in list(codes):
+            codes.update(self.encoder.get_similar_codes(code))
+        postings = [np.frombuffer(self.anchor_postings[c], dtype=np.int32) for c in codes if c in self.anchor_postings]
+        return np.unique(np.concatenate(postings)) if postings else np.empty(0, dtype=np.int32)
+
+    def get_candidates(self, input_codes: List[int], threshold: float, transpositions: bool = False, limit: int = 0) -> List[Tuple[str, List[int], List[int]]]:
         """
         获取候选热词及其在输入中出现的索引位置 (锚点)
+
+        候选先经 candidate_ids 剪枝；锚点为热词前两个音素（或其相似音素）在输入中的位置。
         """
+        seq_ids = self.candidate_ids(input_codes, threshold, transpositions, limit)
+        if not seq_ids:
+            return []
+
         # 收集输入中音素出现的全部位置 {code: [idx1, idx2, ...]}
         code_positions = defaultdict(list)
         for idx, code in enumerate(input_codes):
@@ -109,23 +299,39 @@ class PhonemeIndex:
             # [性能优化] 同时将相似音素的位置也统计进来，增加召回鲁棒性
             for sim_code in self.encoder.get_similar_codes(code):
                 code_positions[sim_code].append(idx)
-            
+
         # 收集候选与其锚点位置
-        candidate_data = {} # {hw: (codes, [positions])}
-        for code, positions in code_positions.items():
-            for hw, codes in self.index.get(code, []):
-                if hw not in candidate_data:
-                    candidate_data[hw] = (codes, [])
-                candidate_data[hw][1].extend(positions)
-
-        # 格式化输出 [(hw, codes, [pos1, ...]), ...]
-        return [(hw, data[0], sorted(list(set(data[1])))) for hw, data in candidate_data.items()]
+        candidates = []
+        seen = set()
+        for seq_id in seq_ids:
+            hw, codes = self.hotwords[seq_id], self.sequence(seq_id)
+            if hw in seen:
+                continue
+            seen.add(hw)
+            anchors = set(code_positions.get(codes[0], ()))
+            if len(codes) > 1:
+                anchors.update(code_positions.get(codes[1], ()))
+            if anchors:
+                candidates.append((hw, codes, sorted(anchors)))
+        return candidates
+
+    def memory_usage(self) -> int:
+        """索引占用的内存字节数（倒排表、序列数组与编号映射，不含热词字符串本身）"""
+        size = sum(map(sys.getsizeof, (
+            self.postings, self.anchor_postings, self.codes, self.offsets, self.key_lengths,
+            self.hotwords, self.alive, self.hotword_ids,
+        )))
+        for postings in (self.postings, self.anchor_postings):
+            size += sum(sys.getsizeof(k) + sys.getsizeof(p) for k, p in postings.items())
+        size += sum(map(sys.getsizeof, self.hotword_ids.values()))
+        return size
     
     def encode_input(self, phonemes: List[Phoneme]) -> List[int]:
         """编码输入序列"""
         return [self.encoder.encode(p.value) for p in phonemes]
 
 
+
 # =============================================================================
 # 高性能 RAG 检索器
 # =============================================================================
@@ -135,13 +341,20 @@ class FastRAG:
     高性能 RAG 检索器
     
     特点：
-    1. 纯 Python 实现，易于维护与部署
-    2. 基于锚点的局部扫描算法
+    1. 三元组倒排索引按长度与共有三元组数剪枝，短热词经锚点桶无损召回
+    2. 基于锚点的局部扫描算法，全部窗口用 numpy 批量计算
     3. 长度过滤与 DP 剪枝
     """
     
-    def __init__(self, threshold: float = 0.6):
+    def __init__(self, threshold: float = 0.6, max_candidates: int = 0):
+        """
+        Args:
+            threshold: 相似度阈值
+            max_candidates: 每次检索精确打分的三元组候选数上限（0 表示不限制）。
+                设置后长热词的召回可能低于原实现，锚点桶中的短热词不受影响
+        """
         self.threshold = threshold
+        self.max_candidates = max_candidates
         self.index = PhonemeIndex()
         self.hotword_count = 0
         
@@ -157,6 +370,15 @@ class FastRAG:
                 self.index.add(hw, phonemes)
                 self.hotword_count += 1
                 
+    def remove_hotwords(self, hotwords: Iterable[str]):
+        """
+        批量移除热词（同一热词的全部音素序列一并移除）
+
+        Args:
+            hotwords: 热词原文
+        """
+        self.hotword_count -= self.index.remove(set(hotwords))
+
     def search(self, input_phonemes: List[Phoneme], top_k: int = 10) -> List[Tuple[str, float]]:
         """
         检索相关热词（高层编排）
@@ -165,7 +387,7 @@ class FastRAG:
 
         # 1. 编码输入并获取候选
         input_codes = self.index.encode_input(input_phonemes)
-        candidates = self.index.get_candidates(input_codes)
+        candidates = self.index.get_candidates(input_codes, self.threshold, limit=self.max_candidates)
 
         # 2. 遍历打分与过滤
         results = self._score_candidates(input_codes, candidates)
@@ -176,74 +398,89 @@ class FastRAG:
 
     def _score_candidates(self, input_list: List[int], candidates: List[Tuple[str, List[int], List[int]]]) -> List[Tuple[str, float, int]]:
         """对候选列表进行局部扫描打分"""
-        results = []
         input_len = len(input_list)
-        
+
+        # [深度优化] 锚点扫描：不再全量扫描，只在索引命中的位置附近开窗
+        # 每个热词可能在多个位置命中索引（例如“的”出现多次），全部窗口一次批量计算
+        windows = []
         for hw, hw_list, anchors in candidates:
             hw_len = len(hw_list)
-            
-            best_score = -1.0
-            best_end_pos = -1
-            
-            # [深度优化] 锚点扫描：不再全量扫描，只在索引命中的位置附近开窗
-            # 每个热词可能在多个位置命中索引（例如“的”出现多次）
             for anchor in anchors:
                 # 窗口范围：锚点是第一个音素匹配的位置
                 # 扫描范围：[anchor, anchor + hw_len + buffer]
                 # 加一个小的 buffer (如 3) 以容纳轻微的插入错误
                 scan_start = max(0, anchor - 2)
                 scan_end = min(input_len, anchor + hw_len + 3)
-                
-                local_input = input_list[scan_start:scan_end]
-                if not local_input: continue
-                
-                # 计算局部距离
-                dist, local_end = self._python_distance_simple(local_input, hw_list)
-                
-                score = 1.0 - (dist / hw_len)
+                windows.append((hw_list, scan_start, scan_end))
+        if not windows:
+            return []
+        dists, local_ends = self._batch_distance_simple(input_list, windows)
+        dists, local_ends = dists.tolist(), local_ends.tolist()
+
+        results = []
+        w = 0
+        for hw, hw_list, anchors in candidates:
+            hw_len = len(hw_list)
+
+            best_score = -1.0
+            best_end_pos = -1
+            for _ in anchors:
+                score = 1.0 - (dists[w] / hw_len)
                 if score > best_score:
                     best_score = score
-                    best_end_pos = scan_start + local_end
-            
+                    best_end_pos = windows[w][1] + local_ends[w]
+                w += 1
+
             if best_score >= self.threshold:
                 results.append((hw, round(best_score, 3), best_end_pos))
         return results
 
-    def _python_distance_simple(self, main_list: List[int], sub_list: List[int]) -> Tuple[float, int]:
-        """局部扫描专用的简化版编辑距离，不需要 curr[0]=0 的逻辑"""
-        n = len(sub_list)
-        m = len(main_list)
-        
-        # 局部窗口已经对齐起始，所以使用标准编辑距离初始化
-        prev = [float(i) for i in range(n + 1)]
-        curr = [0.0] * (n + 1)
-        
-        best_dist = float('inf')
-        best_pos = 0
-        
-        for j in range(1, m + 1):
-            curr[0] = float(j) # 标准编辑距离，左边是插入成本
-            m_val = main_list[j-1]
-            for i in range(1, n + 1):
-                cost = 0.0 if sub_list[i-1] == m_val else 1.0
-                d_del = prev[i] + 1.0
-                d_ins = curr[i-1] + 1.0
-                d_match = prev[i-1] + cost
-                
-                if d_del < d_ins:
-                    if d_del < d_match: curr[i] = d_del
-                    else: curr[i] = d_match
-                else:
-                    if d_ins < d_match: curr[i] = d_ins
-                    else: curr[i] = d_match
-            
+    def _batch_distance_simple(self, input_list: List[int], windows: List[Tuple[List[int], int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        局部扫描专用的简化版编辑距离，所有窗口一次批量计算
+
+        热词序列与输入窗口 input_list[起点:终点] 均从窗口开头对齐（标准编辑距离初始化），
+        返回各窗口的最小距离及其结束位置（同距离取最靠后的位置）。
+        逐列推进 DP：先算匹配与删除，插入沿列方向传递，等价于对「值 - 行号」求前缀最小值，
+        每列对全部窗口只需几次 numpy 运算，结果与逐格计算一致。
+
+        Args:
+            input_list: 输入音素编码
+            windows: [(热词音素编码, 窗口起点, 窗口终点), ...]
+        """
+        W = len(windows)
+        n = np.array([len(w[0]) for w in windows])
+        starts = np.array([w[1] for w in windows])
+        m = np.array([w[2] for w in windows]) - starts
+        N, M = int(n.max()), int(m.max())
+
+        sub = np.full((W, N), -1, dtype=np.int32)
+        for row, (hw_list, _, _) in zip(sub, windows):
+            row[:len(hw_list)] = hw_list
+        main = np.asarray(input_list, dtype=np.int32)[np.minimum(starts[:, None] + np.arange(M), len(input_list) - 1)]
+
+        # 距离都是小整数，用 int16 计算以减少内存访问
+        ramp = np.arange(N + 1, dtype=np.int16)
+        prev = np.tile(ramp, (W, 1))
+        step = np.empty_like(prev)
+        rows = np.arange(W)
+        best_dist = np.full(W, np.iinfo(np.int16).max, dtype=np.int16)
+        best_pos = np.zeros(W, dtype=np.int64)
+
+        for j in range(1, M + 1):
+            cost = sub != main[:, j - 1:j]
+            step[:, 0] = j
+            np.minimum(prev[:, 1:] + 1, prev[:, :-1] + cost, out=step[:, 1:])
+            curr = np.minimum.accumulate(step - ramp, axis=1) + ramp
+
             # 记录窗口内的最佳结束位置
-            if curr[n] <= best_dist:
-                best_dist = curr[n]
-                best_pos = j
-            prev[:] = curr[:]
-            
-        return best_dist, best_pos
+            dist = curr[rows, n]
+            better = (j <= m) & (dist <= best_dist)
+            best_dist[better] = dist[better]
+            best_pos[better] = j
+            prev = curr
+
+        return best_dist.astype(np.float64), best_pos
 
     def _python_distance(self, main_list: List[int], sub_list: List[int]) -> float:
         """标准模糊子串距离计算 (纯 Python)"""
@@ -273,6 +510,7 @@ class FastRAG:
 if __name__ == "__main__":
     import random
     from .algo_phoneme import get_phoneme_seq
+    import logging
     
     logging.basicConfig(level=logging.INFO)
     
@@ -315,5 +553,23 @@ if __name__ == "__main__":
     
     print(f"  检索耗时: {elapsed:.3f}s")
     print(f"  热词总数: {rag.hotword_count}")
-    print(f"  候选数量: {len(rag.index.get_candidates(input_phonemes))}")
+    print(f"  候选数量: {len(rag.index.get_candidates(rag.index.encode_input(input_phonemes), rag.threshold, limit=rag.max_candidates))}")
+    print(f"  索引内存: {rag.index.memory_usage() / 1024 / 1024:.2f}MB")
     print(f"  结果: {results[:5]}")
+
+    # 规模扩展：热词数增长时检索耗时应远低于线性增长
+    print("\n规模扩展测试...")
+    for n in (1000, 10000, 50000, 200000):
+        rag = FastRAG(threshold=0.6)
+        words = {}
+        while len(words) < n:
+            word = ''.join(random.choice(chinese_chars) for _ in range(random.randint(2, 6)))
+            words[word] = get_phoneme_seq(word)
+        rag.add_hotwords(words)
+        rag.search(input_phonemes, top_k=10)
+        start = time.time()
+        for _ in range(10):
+            rag.search(input_phonemes, top_k=10)
+        elapsed = (time.time() - start) / 10
+        mb = rag.index.memory_usage() / 1024 / 1024
+        print(f"  {n:>6} 热词: 检索 {elapsed * 1000:7.2f}ms, 索引 {mb:6.2f}MB ({mb * 10000 / n:.2f}MB/万词)")
@@ -4,7 +4,7 @@ import ctypes
 import codecs
 import struct
 import time
-from collections import deque, Counter
+from collections import deque, Counter, OrderedDict
 import numpy as np
 import gguf
 from gguf.constants import GGML_QUANT_SIZES, GGMLQuantizationType
@@ -26,6 +26,9 @@ llama_token = ctypes.c_int32
 llama_pos = ctypes.c_int32
 llama_seq_id = ctypes.c_int32
 
+# ggml_abort_callback: 返回 True 时中止当前计算图
+ABORT_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_bool, ctypes.c_void_p)
+
 class llama_model_params(ctypes.Structure):
     _fields_ = [
         ("devices", ctypes.POINTER(ctypes.c_void_p)),
@@ -125,6 +128,7 @@ llama_model_get_vocab = None
 llama_context_default_params = None
 llama_init_from_model = None
 llama_free = None
+llama_set_abort_callback = None
 llama_batch_init = None
 llama_batch_free = None
 llama_decode = None
@@ -137,6 +141,10 @@ llama_vocab_eos = None
 llama_token_to_piece = None
 llama_get_memory = None
 llama_memory_clear = None
+llama_memory_seq_rm = None
+llama_memory_seq_cp = None
+llama_memory_seq_keep = None
+llama_memory_seq_pos_max = None
 llama_model_n_embd = None
 
 # Sampler
@@ -196,10 +204,11 @@ def bind_llama_lib():
     global llama, ggml, ggml_base
     global llama_log_set, llama_backend_init, llama_backend_free
     global llama_model_default_params, llama_model_load_from_file, llama_model_free, llama_model_get_vocab
-    global llama_context_default_params, llama_init_from_model, llama_free
+    global llama_context_default_params, llama_init_from_model, llama_free, llama_set_abort_callback
     global llama_batch_init, llama_batch_free, llama_batch_get_one
     global llama_decode, llama_get_logits, llama_get_logits_ith, llama_get_embeddings, llama_tokenize
     global llama_get_memory, llama_memory_clear, llama_model_n_embd
+    global llama_memory_seq_rm, llama_memory_seq_cp, llama_memory_seq_keep, llama_memory_seq_pos_max
     global llama_vocab_n_tokens, llama_vocab_eos, llama_token_to_piece
     global llama_sampler_chain_default_params, llama_sampler_chain_init, llama_sampler_chain_add
     global llama_sampler_init_greedy, llama_sampler_init_dist, llama_sampler_init_temp
@@ -288,6 +297,10 @@ def bind_llama_lib():
     llama_free.argtypes = [ctypes.c_void_p]
     llama_free.restype = None
 
+    llama_set_abort_callback = llama.llama_set_abort_callback
+    llama_set_abort_callback.argtypes = [ctypes.c_void_p, ABORT_CALLBACK, ctypes.c_void_p]
+    llama_set_abort_callback.restype = None
+
     # Batch
     llama_batch_init = llama.llama_batch_init
     llama_batch_init.argtypes = [ctypes.c_int32, ctypes.c_int32, ctypes.c_int32]
@@ -350,6 +363,22 @@ def bind_llama_lib():
     llama_memory_clear.argtypes = [ctypes.c_void_p, ctypes.c_bool]
     llama_memory_clear.restype = None
 
+    llama_memory_seq_rm = llama.llama_memory_seq_rm
+    llama_memory_seq_rm.argtypes = [ctypes.c_void_p, llama_seq_id, llama_pos, llama_pos]
+    llama_memory_seq_rm.restype = ctypes.c_bool
+
+    llama_memory_seq_cp = llama.llama_memory_seq_cp
+    llama_memory_seq_cp.argtypes = [ctypes.c_void_p, llama_seq_id, llama_seq_id, llama_pos, llama_pos]
+    llama_memory_seq_cp.restype = None
+
+    llama_memory_seq_keep = llama.llama_memory_seq_keep
+    llama_memory_seq_keep.argtypes = [ctypes.c_void_p, llama_seq_id]
+    llama_memory_seq_keep.restype = None
+
+    llama_memory_seq_pos_max = llama.llama_memory_seq_pos_max
+    llama_memory_seq_pos_max.argtypes = [ctypes.c_void_p, llama_seq_id]
+    llama_memory_seq_pos_max.restype = llama_pos
+
     # Sampler
     llama_sampler_chain_default_params = llama.llama_sampler_chain_default_params
     llama_sampler_chain_default_params.argtypes = []
@@ -443,9 +472,18 @@ class LlamaModel:
     def __init__(self, path, n_gpu_layers=-1, use_gpu=1):
         self.ptr = self.load_model(path, n_gpu_layers=n_gpu_layers, use_gpu=use_gpu)
             
+        self.path = path
         self.vocab = llama_model_get_vocab(self.ptr)
         self.n_embd = llama_model_n_embd(self.ptr)
         self.eos_token = llama_vocab_eos(self.vocab)
+        self._vocab_bytes = None
+
+    @property
+    def vocab_bytes(self) -> 'VocabBytes':
+        """词表字节表（首次访问时构建或从磁盘缓存读取）"""
+        if self._vocab_bytes is None:
+            self._vocab_bytes = VocabBytes.load(self.path, self.vocab)
+        return self._vocab_bytes
 
     def load_model(self, model_path: str, n_gpu_layers: int = -1, use_gpu: bool = 0):
         """
@@ -485,12 +523,11 @@ class LlamaModel:
     def detokenize(self, tokens: List[int]) -> str:
         """(Native) Token ID 列表转文本"""
         if tokens is None or len(tokens) == 0: return ""
-        all_bytes = b"".join([self.token_to_bytes(tid) for tid in tokens])
-        return all_bytes.decode('utf-8', errors='replace')
+        return self.vocab_bytes.join(tokens).decode('utf-8', errors='replace')
 
     def token_to_bytes(self, token_id: int) -> bytes:
-        """(Native) 单个 Token 转字节"""
-        return token_to_bytes(self.vocab, token_id)
+        """单个 Token 转字节（查词表字节表）"""
+        return self.vocab_bytes.get(token_id)
         
     def token_to_piece(self, token_id: int) -> str:
         """(Native) 单个 Token 转字符串 Piece"""
@@ -517,18 +554,27 @@ class LlamaContext:
     """上下文的面向对象封装"""
     def __init__(self, model, n_ctx=2048, n_batch=2048, n_ubatch=512, n_seq_max=1, 
                  embeddings=False, pooling_type=0, flash_attn=True, 
-                 offload_kqv=True, no_perf=True, n_threads=None, n_threads_batch=None):
+                 offload_kqv=True, no_perf=True, n_threads=None, n_threads_batch=None,
+                 kv_unified=False):
+        """
+        kv_unified: 多序列共用一块 n_ctx 大小的 KV 缓存（否则每个序列只分到 n_ctx / n_seq_max）
+        """
         self.model = model # 保持模型引用防止被释放
+        self.abort_flag = None # 中止标志，需提供 is_set()，见 abortable()
+        self._abort_cb = ABORT_CALLBACK(self._should_abort) # 保持回调引用防止被回收
         params = llama_context_default_params()
         params.n_ctx = n_ctx
         params.n_batch = n_batch
         params.n_ubatch = n_ubatch
         params.n_seq_max = n_seq_max
+        params.kv_unified = kv_unified
         params.embeddings = embeddings
         params.pooling_type = pooling_type
         params.flash_attn_type = 1 if flash_attn else 0
         params.offload_kqv = offload_kqv
         params.no_perf = no_perf
+        params.abort_callback = None # 默认不挂回调，避免每个计算节点都回调 Python
+        params.abort_callback_data = None
         
         # 线程配置
         cpu_count = os.cpu_count() or 4
@@ -546,6 +592,24 @@ class LlamaContext:
         if not self.ptr:
             raise RuntimeError("上下文初始化失败")
 
+    def _should_abort(self, _data):
+        flag = self.abort_flag
+        return bool(flag is not None and flag.is_set())
+
+    def abortable(self, flag):
+        """
+        挂载/卸载中止标志
+
+        挂载后 llama.cpp 在计算图的节点之间轮询 flag.is_set()，返回 True 时
+        llama_decode 提前返回 2（已中止）。轮询发生在 CPU 后端，GPU 后端只在
+        图提交前后检查，因此生成循环中仍需逐 token 检查。传入 None 卸载。
+        """
+        self.abort_flag = flag
+        if flag is None:
+            llama_set_abort_callback(self.ptr, ABORT_CALLBACK(), None)
+        else:
+            llama_set_abort_callback(self.ptr, self._abort_cb, None)
+
     def decode(self, batch):
         struct = batch.struct if hasattr(batch, 'struct') else batch
         return llama_decode(self.ptr, struct)
@@ -571,16 +635,67 @@ class LlamaContext:
         mem = llama_get_memory(self.ptr)
         llama_memory_clear(mem, True)
 
+    def seq_rm(self, seq_id: int, p0: int, p1: int = -1) -> bool:
+        """删除序列 seq_id 在位置 [p0, p1) 的 KV（p1 < 0 表示到末尾），失败返回 False"""
+        return llama_memory_seq_rm(llama_get_memory(self.ptr), seq_id, p0, p1)
+
+    def seq_cp(self, src: int, dst: int, p0: int = -1, p1: int = -1):
+        """把序列 src 在 [p0, p1) 的 KV 共享给序列 dst（不拷贝数据）"""
+        llama_memory_seq_cp(llama_get_memory(self.ptr), src, dst, p0, p1)
+
+    def seq_keep(self, seq_id: int):
+        """只保留序列 seq_id，删除其余所有序列的 KV"""
+        llama_memory_seq_keep(llama_get_memory(self.ptr), seq_id)
+
+    def seq_pos_max(self, seq_id: int) -> int:
+        """序列 seq_id 当前最大位置，空序列返回 -1"""
+        return llama_memory_seq_pos_max(llama_get_memory(self.ptr), seq_id)
+
     def __del__(self):
         if hasattr(self, 'ptr') and self.ptr:
             llama_free(self.ptr)
             self.ptr = None
 
 class LlamaBatch:
-    """Batch 的面向对象封装，支持直接属性访问"""
-    def __init__(self, n_tokens, embd_dim=0, n_seq_max=1):
+    """
+    Batch 的面向对象封装，支持直接属性访问
+
+    原生缓冲通过 numpy 视图整体写入（Embedding/Token、位置、序列 ID、logits 标志），
+    不再逐 token 经由 ctypes 指针赋值。
+    pos_planes > 1 时位置缓冲按 n_tokens * pos_planes 单独分配（Qwen3 的多平面位置编码），
+    Embedding 缓冲仍只按 n_tokens 分配。
+    """
+    def __init__(self, n_tokens, embd_dim=0, n_seq_max=1, pos_planes=1):
         self.struct = llama_batch_init(n_tokens, embd_dim, n_seq_max)
         self.n_tokens_max = n_tokens
+        self.embd_dim = embd_dim
+        self.n_seq_max = n_seq_max
+        self.pos_planes = pos_planes
+        s = self.struct
+
+        # numpy 视图（不拷贝，直接映射原生缓冲）
+        self._embd = np.ctypeslib.as_array(s.embd, shape=(n_tokens, embd_dim)) if embd_dim else None
+        self._token = None if embd_dim else np.ctypeslib.as_array(s.token, shape=(n_tokens,))
+        self._n_seq_id = np.ctypeslib.as_array(s.n_seq_id, shape=(n_tokens,))
+        self._logits = np.ctypeslib.as_array(s.logits, shape=(n_tokens,))
+
+        # seq_id 是逐 token 分配的指针数组：改指向一块连续缓冲以便整体写入，释放前还原
+        self._seq_ptrs = np.ctypeslib.as_array(
+            ctypes.cast(s.seq_id, ctypes.POINTER(ctypes.c_size_t)), shape=(n_tokens,)
+        )
+        self._seq_ptrs_orig = self._seq_ptrs.copy()
+        self._seq_ids = np.zeros((n_tokens, n_seq_max), dtype=np.int32)
+        stride = self._seq_ids.strides[0]
+        self._seq_ptrs[:] = self._seq_ids.ctypes.data + np.arange(n_tokens, dtype=np.uint64) * stride
+
+        # 多平面位置：使用 numpy 自有缓冲，释放前还原原生指针
+        self._pos_orig = None
+        if pos_planes > 1:
+            self._pos_buf = np.zeros(n_tokens * pos_planes, dtype=np.int32)
+            # 字段返回的指针对象与结构体共享内存，须保存地址值而非指针对象
+            self._pos_orig = ctypes.addressof(s.pos.contents)
+            s.pos = self._pos_buf.ctypes.data_as(ctypes.POINTER(llama_pos))
+        self._pos = np.ctypeslib.as_array(s.pos, shape=(n_tokens * pos_planes,))
 
     @property
     def n_tokens(self): return self.struct.n_tokens
@@ -600,7 +715,29 @@ class LlamaBatch:
     @property
     def logits(self): return self.struct.logits
 
-    def set_embd(self, data: np.ndarray, pos: Union[np.ndarray, int] = 0, seq_id: int = 0):
+    def _set_pos(self, pos: Union[np.ndarray, int], n_tokens: int):
+        if isinstance(pos, (int, np.integer)):
+            self._pos[:n_tokens] = np.arange(pos, pos + n_tokens, dtype=np.int32)
+        elif isinstance(pos, np.ndarray):
+            # 外部提供的复杂位置 (如 Qwen3 的多平面位置，长度为 n_tokens 的整数倍)
+            if pos.size > self._pos.size:
+                raise ValueError(f"位置缓冲不足: {pos.size} > {self._pos.size}")
+            self._pos[:pos.size] = pos.ravel()
+        else:
+            raise TypeError(f"Unsupported pos type: {type(pos)}")
+
+    def _set_meta(self, n_tokens: int, seq_id, logits_all: bool, logits=None):
+        self.n_tokens = n_tokens
+        self._n_seq_id[:n_tokens] = 1
+        self._seq_ids[:n_tokens, 0] = seq_id
+        if logits is not None:
+            self._logits[:n_tokens] = 0
+            self._logits[logits] = 1
+        else:
+            self._logits[:n_tokens] = 1 if logits_all else 0
+            self._logits[n_tokens - 1] = 1
+
+    def set_embd(self, data: np.ndarray, pos: Union[np.ndarray, int] = 0, seq_id=0, logits=None):
         """
         高阶接口：直接注入 Embedding 数据并初始化位置信息
         
@@ -609,49 +746,70 @@ class LlamaBatch:
             pos: 位置信息。
                  - 若为 int，则视为起始偏移量，自动生成 [offset, offset+1, ...]
                  - 若为 np.ndarray，则直接拷贝到 pos buffer (支持 Qwen3 等复杂位置编码)
-            seq_id: 序列 ID
+            seq_id: 序列 ID，多序列批次传入逐 token 的数组
+            logits: 需要输出 logits 的 token 下标（默认只输出最后一个）
         """
         n_tokens = data.shape[0]
         if n_tokens > self.n_tokens_max:
             raise ValueError(f"Batch 空间不足: {n_tokens} > {self.n_tokens_max}")
         
-        # 1. 内存移动 (Embedding)
-        if not data.flags['C_CONTIGUOUS']:
-            data = np.ascontiguousarray(data)
-        ctypes.memmove(self.embd, data.ctypes.data, data.nbytes)
-        
-        # 2. 位置信息处理 (Position)
-        if isinstance(pos, int):
-            # 自动生成线性位置
-            pos_offset = pos
-            for i in range(n_tokens):
-                self.pos[i] = pos_offset + i
-        elif isinstance(pos, np.ndarray):
-            # 外部提供的复杂位置 (如 Qwen3 的多平面位置)
-            # 注意：不检查 pos 长度是否等于 n_tokens，因为可能有 stride (Qwen3 case)
-            # 但必须确保不超过 batch capacity
-            if not pos.flags['C_CONTIGUOUS']:
-                pos = np.ascontiguousarray(pos)
-            
-            # 使用 memmove 直接拷贝
-            # self.pos 是 ctypes 指针，可以直接操作
-            ctypes.memmove(self.pos, pos.ctypes.data, pos.nbytes)
-        else:
-            raise TypeError(f"Unsupported pos type: {type(pos)}")
+        self._embd[:n_tokens] = data
+        self._set_pos(pos, n_tokens)
+        self._set_meta(n_tokens, seq_id, logits_all=False, logits=logits)
+        return self
 
-        # 3. 设置其他元数据
-        self.n_tokens = n_tokens
-        for i in range(n_tokens):
-            self.n_seq_id[i] = 1
-            self.seq_id[i][0] = seq_id
-            self.logits[i] = 1 if i == n_tokens - 1 else 0
-        
+    def set_tokens(self, tokens, pos: Union[np.ndarray, int] = 0, seq_id=0, logits_all: bool = False):
+        """
+        高阶接口：注入 Token 序列并初始化位置信息
+
+        Args:
+            tokens: Token ID 序列
+            pos: 同 set_embd
+            seq_id: 同 set_embd
+            logits_all: 是否为每个 token 输出 logits（默认只输出最后一个）
+        """
+        tokens = np.asarray(tokens, dtype=np.int32)
+        n_tokens = tokens.shape[0]
+        if n_tokens > self.n_tokens_max:
+            raise ValueError(f"Batch 空间不足: {n_tokens} > {self.n_tokens_max}")
+
+        self._token[:n_tokens] = tokens
+        self._set_pos(pos, n_tokens)
+        self._set_meta(n_tokens, seq_id, logits_all)
         return self
 
     def __del__(self):
         if hasattr(self, 'struct'):
+            # 还原被替换的原生指针，交由 llama_batch_free 释放
+            if hasattr(self, '_seq_ptrs_orig'):
+                self._seq_ptrs[:] = self._seq_ptrs_orig
+            if getattr(self, '_pos_orig', None) is not None:
+                self.struct.pos = ctypes.cast(self._pos_orig, ctypes.POINTER(llama_pos))
             llama_batch_free(self.struct)
 
+class LlamaBatchPool:
+    """
+    LlamaBatch 复用池（由引擎持有，单线程使用）
+
+    按 (embd_dim, n_seq_max, pos_planes) 各保留一个批次，默认容量与上下文长度一致，
+    请求超出容量时按需扩容，避免每次预填充都重新分配、释放原生缓冲。
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._batches = {}
+
+    def get(self, n_tokens: int, embd_dim: int = 0, n_seq_max: int = 1, pos_planes: int = 1) -> LlamaBatch:
+        key = (embd_dim, n_seq_max, pos_planes)
+        batch = self._batches.get(key)
+        if batch is None or batch.n_tokens_max < n_tokens:
+            capacity = max(n_tokens, self.capacity, batch.n_tokens_max * 2 if batch else 0)
+            batch = LlamaBatch(capacity, embd_dim, n_seq_max, pos_planes)
+            self._batches[key] = batch
+        return batch
+
+    def clear(self):
+        self._batches.clear()
+
 def get_one_batch(token_id: int):
     """
     底层极限优化：用于单 Token 生成的无分配 Batch 构造。
@@ -766,21 +924,147 @@ class LlamaSampler:
         self.free()
 
 
+class VocabBytes:
+    """
+    词表字节表：所有 token 的字节串拼接为一块连续缓冲区，按偏移数组 O(1) 查表
+
+    构建时对每个 token 调用一次 llama_token_to_piece，结果缓存到 GGUF 旁的
+    <模型文件名>.vocab.npz，以词表大小和模型文件的大小、修改时间校验是否过期。
+    """
+    def __init__(self, data: bytes, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        self._offs = offsets.tolist()   # Python 列表下标比 numpy 标量快
+        self._n = len(offsets) - 1
+        self._texts = {}                # token -> 单独解码的文本（不是完整 UTF-8 时为 None）
+
+    def __len__(self):
+        return self._n
+
+    def get(self, token_id: int) -> bytes:
+        """单个 Token 的字节串，越界时返回空字节串"""
+        if 0 <= token_id < self._n:
+            return self.data[self._offs[token_id] : self._offs[token_id + 1]]
+        return b""
+
+    def join(self, tokens) -> bytes:
+        return b"".join([self.get(t) for t in tokens])
+
+    def text(self, token_id: int) -> Optional[str]:
+        """Token 自身构成完整 UTF-8 时返回解码文本，否则返回 None"""
+        try:
+            return self._texts[token_id]
+        except KeyError:
+            try:
+                piece = self.get(token_id).decode('utf-8')
+            except UnicodeDecodeError:
+                piece = None
+            self._texts[token_id] = piece
+            return piece
+
+    @classmethod
+    def build(cls, vocab) -> 'VocabBytes':
+        """逐个 token 调用 llama_token_to_piece 构建"""
+        pieces = [token_to_bytes(vocab, t) for t in range(llama_vocab_n_tokens(vocab))]
+        offsets = np.zeros(len(pieces) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in pieces], out=offsets[1:])
+        return cls(b"".join(pieces), offsets)
+
+    @classmethod
+    def load(cls, model_path, vocab) -> 'VocabBytes':
+        """优先读取模型旁的磁盘缓存，缺失或过期时重新构建并写回"""
+        model_path = Path(model_path)
+        cache_path = model_path.with_name(model_path.name + '.vocab.npz')
+        stat = model_path.stat()
+        key = np.array([llama_vocab_n_tokens(vocab), stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+        if cache_path.exists():
+            try:
+                with np.load(cache_path) as f:
+                    if np.array_equal(f['key'], key):
+                        return cls(f['data'].tobytes(), f['offsets'])
+            except Exception as e:
+                logger.warning(f"词表缓存读取失败，重新构建: {e}")
+
+        t0 = time.time()
+        table = cls.build(vocab)
+        tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, key=key, data=np.frombuffer(table.data, dtype=np.uint8), offsets=table.offsets)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"词表缓存写入失败（不影响使用）: {e}")
+        logger.info(f"构建词表字节表：{len(table)} tokens，耗时 {time.time() - t0:.2f}s")
+        return table
+
+
+class TokenTextDecoder:
+    """
+    逐 token 增量解码为文本
+
+    没有残留的半个 UTF-8 字符时，直接使用词表字节表中预先解码好的文本；
+    只有跨 token 的多字节字符才经过 codecs 增量解码器，结果与全程使用增量解码器一致。
+    """
+    def __init__(self, vocab_bytes: VocabBytes):
+        self.vocab_bytes = vocab_bytes
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._pending = False
+
+    def decode(self, token_id: int) -> str:
+        if not self._pending:
+            piece = self.vocab_bytes.text(token_id)
+            if piece is not None:
+                return piece
+        piece = self._decoder.decode(self.vocab_bytes.get(token_id))
+        self._pending = bool(self._decoder.getstate()[0])
+        return piece
+
+    def flush(self) -> str:
+        """清空残余字节"""
+        self._pending = False
+        return self._decoder.decode(b"", final=True)
+
+
+class RepeatWindow:
+    """滑动窗口内不同元素的计数，每次推入 O(1) 更新（用于重复循环熔断）"""
+    def __init__(self, size: int):
+        self.size = size
+        self._items = deque()
+        self._counts = Counter()
+
+    def push(self, item) -> None:
+        self._items.append(item)
+        self._counts[item] += 1
+        if len(self._items) > self.size:
+            old = self._items.popleft()
+            if self._counts[old] == 1:
+                del self._counts[old]
+            else:
+                self._counts[old] -= 1
+
+    @property
+    def distinct(self) -> int:
+        return len(self._counts)
+
+
 class ASRStreamDecoder:
     """ASR 专属流式解码器，集成字节解码与 ASRReporter 交互"""
-    def __init__(self, vocab, reporter=None):
-        self.vocab = vocab
+    REPEAT_WINDOW = 30
+
+    def __init__(self, vocab_bytes: VocabBytes, reporter=None):
         self.reporter = reporter
-        self.byte_decoder = codecs.getincrementaldecoder("utf-8")(errors='replace')
+        self.text_decoder = TokenTextDecoder(vocab_bytes)
+        self.recent = RepeatWindow(self.REPEAT_WINDOW)   # 最近 30 个文字片段
         self.generated_text = ""
         self.tokens_generated = 0
         self.tokens = []
 
     def push(self, token_id: int):
         """推入 Token，返回新解码的文字片段"""
-        raw_bytes = token_to_bytes(self.vocab, token_id)
-        text_piece = self.byte_decoder.decode(raw_bytes, final=False)
+        text_piece = self.text_decoder.decode(token_id)
         self.tokens.append(text_piece)
+        self.recent.push(text_piece)
         self.tokens_generated += 1
         
         self.generated_text += text_piece
@@ -792,7 +1076,7 @@ class ASRStreamDecoder:
 
     def flush(self):
         """清空残余字节并返回"""
-        remaining = self.byte_decoder.decode(b"", final=True)
+        remaining = self.text_decoder.flush()
         self.tokens.append(remaining)
         self.generated_text += remaining
         return remaining
@@ -808,24 +1092,115 @@ class ASRStreamDecoder:
 
 
 class LlamaEmbeddingTable:
-    """动态反量化 Embedding 表，支持 table[ids] 语法"""
-    def __init__(self, raw_data, qtype):
+    """
+    动态反量化 Embedding 表，支持 table[ids] 语法
+
+    量化表按行 LRU 缓存反量化后的 float32 向量：提示词中的特殊 token、固定模板文字
+    每个片段都会用到，命中后不再重复反量化。也可以把整张表一次性反量化为 fp16，
+    写入模型旁的内存映射文件，之后启动直接映射。
+
+    Args:
+        raw_data: 原始权重视图，(vocab, n_embd) 浮点或 (vocab, bytes_per_row) 量化字节
+        qtype: 量化格式
+        n_embd: 特征维度
+        cache_mb: 行缓存的内存预算（MB），0 表示不缓存
+    """
+    def __init__(self, raw_data, qtype, n_embd: int = 0, cache_mb: float = 64):
         self.raw_data = raw_data
         self.qtype = qtype
+        self.n_embd = n_embd or raw_data.shape[1]
+        self.capacity = int(cache_mb * 2**20) // (self.n_embd * 4)   # 可缓存的行数
+        self.full = None            # 整表 fp16 内存映射（load_fp16_table 之后）
+        self._rows = OrderedDict()  # token -> float32 行，按最近使用排序
+        self.n_hit = 0
+        self.n_miss = 0
         
     def __len__(self):
         return self.raw_data.shape[0]
 
     def __getitem__(self, tokens):
-        from gguf.quants import dequantize
-        
-        # 如果是原生 float 类型，直接返回
+        # 整表 fp16 映射或原生 float 类型，直接切片返回
+        if self.full is not None:
+            return self.full[tokens].astype(np.float32)
         if self.raw_data.dtype in (np.float32, np.float16):
             return self.raw_data[tokens].astype(np.float32)
-            
+        if self.capacity <= 0:
+            return self._dequantize(tokens)
+
+        ids = np.asarray(tokens, dtype=np.int64)
+        flat = ids.reshape(-1).tolist()
+        rows, found, missing = self._rows, {}, []
+        for t in dict.fromkeys(flat):
+            row = rows.get(t)
+            if row is None:
+                missing.append(t)
+            else:
+                rows.move_to_end(t)
+                found[t] = row
+
+        # 未命中的行合并为一次反量化，先放入本次结果再按 LRU 淘汰
+        if missing:
+            for t, row in zip(missing, self._dequantize(missing)):
+                rows[t] = found[t] = row
+            while len(rows) > self.capacity:
+                rows.popitem(last=False)
+            missing = set(missing)
+            n_miss = sum(1 for t in flat if t in missing)
+        else:
+            n_miss = 0
+        self.n_hit += len(flat) - n_miss
+        self.n_miss += n_miss
+        if not flat:
+            return np.zeros(ids.shape + (self.n_embd,), dtype=np.float32)
+        return np.stack([found[t] for t in flat]).reshape(ids.shape + (self.n_embd,))
+
+    def _dequantize(self, tokens) -> np.ndarray:
+        from gguf.quants import dequantize
         # 调用官方库进行高性能反量化
         return dequantize(self.raw_data[tokens], self.qtype.value)
 
+    def load_fp16_table(self, path, model_path=None) -> None:
+        """
+        把整张表反量化为 fp16 并写入内存映射文件，之后查表直接读取映射
+
+        path 已存在、形状一致且不早于 model_path 时直接映射，否则重新生成
+        """
+        path = Path(path)
+        shape = (len(self), self.n_embd)
+        fresh = path.exists() and (
+            model_path is None or path.stat().st_mtime_ns >= Path(model_path).stat().st_mtime_ns
+        )
+        if fresh:
+            try:
+                table = np.load(path, mmap_mode='r')
+                if table.shape == shape and table.dtype == np.float16:
+                    self.full = table
+                    return
+            except Exception as e:
+                logger.warning(f"fp16 Embedding 表读取失败，重新生成: {e}")
+
+        t0 = time.time()
+        tmp_path = path.with_name(path.name + '.tmp')
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float16, shape=shape)
+        for start in range(0, shape[0], 4096):
+            out[start : start + 4096] = self._dequantize(slice(start, start + 4096))
+        out.flush()
+        del out
+        os.replace(tmp_path, path)
+        self.full = np.load(path, mmap_mode='r')
+        logger.info(f"已生成 fp16 Embedding 表：{path.name} ({time.time() - t0:.1f}s)")
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.n_hit + self.n_miss
+        return self.n_hit / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"Embedding 行缓存命中 {self.n_hit}/{self.n_hit + self.n_miss} ({self.hit_rate:.1%}), "
+            f"已缓存 {len(self._rows)}/{self.capacity} 行"
+        )
+
 def _skip_gguf_value(mm, offs, v_type):
     # UINT8=0, INT8=1, UINT16=2, INT16=3, UINT32=4, INT32=5, FLOAT32=6, BOOL=7, STRING=8, ARRAY=9, UINT64=10, INT64=11, FLOAT64=12
     fixed = [1, 1, 2, 2, 4, 4, 4, 1, -1, -2, 8, 8, 8]
@@ -850,10 +1225,13 @@ def _skip_gguf_value(mm, offs, v_type):
                 raise ValueError("Nested arrays or unknown type not supported in fast skip")
         return offs
 
-def get_token_embeddings_gguf(model_path, target_tensor="token_embd.weight"):
+def get_token_embeddings_gguf(model_path, target_tensor="token_embd.weight", cache_mb=64, fp16_table=False):
     """
     超极速 GGUF Embedding 提取 (直接二进制寻址)
     避免加载整个模型、避免解析包含 15 万词条的 tokenizer 对象。耗时降至 < 50ms。
+
+    cache_mb: 量化表反量化结果的行缓存预算（MB）
+    fp16_table: 预先把整表反量化为 fp16，存为模型旁的 <模型文件名>.embd_f16.npy 并内存映射
     """
     t_start = time.time()
     mm = np.memmap(model_path, mode='r')
@@ -955,7 +1333,11 @@ def get_token_embeddings_gguf(model_path, target_tensor="token_embd.weight"):
     logger.info(f"--- [QwenASR] 已极速载入 Embedding 视图 ({total_time*1000:.1f}ms) ---")
     logger.info(f"    - 量化格式: {qtype.name} ({n_embd} dims, {vocab_size} tokens)")
     
-    return LlamaEmbeddingTable(raw_data, qtype)
+    table = LlamaEmbeddingTable(raw_data, qtype, n_embd=n_embd, cache_mb=cache_mb)
+    if fp16_table and raw_data.dtype not in (np.float32, np.float16):
+        model_path = Path(model_path)
+        table.load_fp16_table(model_path.with_name(model_path.name + '.embd_f16.npy'), model_path)
+    return table
 
 
 
@@ -974,4 +1356,112 @@ def text_to_tokens(vocab, text, add_special=False, parse_special=True):
 def token_to_bytes(vocab, token_id):
     buf = ctypes.create_string_buffer(256)
     n = llama_token_to_piece(vocab, token_id, buf, ctypes.sizeof(buf), 0, True)
-    return buf.raw[:n] if n > 0 else b""
\ No newline at end of file
+    return buf.raw[:n] if n > 0 else b""
+
+if __name__ == '__main__':
+    # 微基准：1000 token 提示词的预填充批次准备耗时（分配 + 填充，不含 llama_decode）
+    # 用法：python -m core.server.engines.<引擎>.inference.llama
+    import timeit
+    bind_llama_lib()
+
+    N_TOKENS, N_EMBD, PLANES, REPEAT = 1000, 2048, 4, 50
+    embd = np.random.rand(N_TOKENS, N_EMBD).astype(np.float32)
+    pos_base = np.arange(N_TOKENS, dtype=np.int32)
+    pos_arr = np.concatenate([pos_base, pos_base, pos_base, np.zeros(N_TOKENS, dtype=np.int32)])
+
+    def legacy_fill(batch):
+        """旧实现：逐 token 经 ctypes 指针填充元数据"""
+        ctypes.memmove(batch.embd, embd.ctypes.data, embd.nbytes)
+        ctypes.memmove(batch.pos, pos_arr.ctypes.data, pos_arr.nbytes)
+        batch.n_tokens = N_TOKENS
+        for i in range(N_TOKENS):
+            batch.n_seq_id[i] = 1
+            batch.seq_id[i][0] = 0
+            batch.logits[i] = 1 if i == N_TOKENS - 1 else 0
+
+    def legacy_setup():
+        """旧实现：每次调用分配 max(n * 4, 8192) 的批次并释放"""
+        batch = llama_batch_init(max(N_TOKENS * PLANES, 8192), N_EMBD, 1)
+        legacy_fill(batch)
+        llama_batch_free(batch)
+
+    legacy_batch = llama_batch_init(N_TOKENS * PLANES, N_EMBD, 1)
+    pool = LlamaBatchPool(2048)
+
+    def pooled_setup():
+        pool.get(N_TOKENS, N_EMBD, pos_planes=PLANES).set_embd(embd, pos=pos_arr)
+
+    cases = [
+        ('旧实现：分配 + 逐 token 填充', legacy_setup),
+        ('旧实现：仅逐 token 填充', lambda: legacy_fill(legacy_batch)),
+        ('批次池 + numpy 整体填充', pooled_setup),
+    ]
+    print(f'--- 预填充批次准备耗时 [{__spec__.name if __spec__ else __file__}] ---')
+    print(f'    {N_TOKENS} tokens, n_embd={N_EMBD}, 位置平面={PLANES}, 重复 {REPEAT} 次')
+    for label, fn in cases:
+        fn()  # 预热（批次池首次分配）
+        t = min(timeit.repeat(fn, number=REPEAT, repeat=3)) / REPEAT
+        print(f'    {label:<24}: {t * 1000:8.3f} ms')
+    llama_batch_free(legacy_batch)
+
+    # 微基准：生成循环中每个 token 的去词元化开销（字节查询 + UTF-8 增量解码 + 重复检测，不含 llama_decode）
+    # 用法：python -m core.server.engines.<引擎>.inference.llama <模型.gguf>
+    if len(sys.argv) > 1:
+        model = LlamaModel(sys.argv[1], use_gpu=False)
+        t0 = time.perf_counter()
+        table = VocabBytes.build(model.vocab)
+        t_build = time.perf_counter() - t0
+        model.vocab_bytes   # 写入或校验磁盘缓存
+        t0 = time.perf_counter()
+        VocabBytes.load(model.path, model.vocab)
+        t_load = time.perf_counter() - t0
+        print(f'--- 词表字节表：{len(table)} tokens, {len(table.data) / 1024:.0f} KB ---')
+        print(f'    构建 {t_build * 1000:.1f} ms, 读取磁盘缓存 {t_load * 1000:.1f} ms')
+
+        text = '今天天气不错，我们去公园散步吧。The quick brown fox jumps over the lazy dog. 😀🎉'
+        tokens = model.tokenize(text * 40)
+
+        def legacy_loop():
+            """旧实现：逐 token ctypes 调用 + codecs 增量解码 + 列表切片去重"""
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            stable, out = [], ''
+            for t in tokens:
+                stable.append(t)
+                out += decoder.decode(token_to_bytes(model.vocab, t))
+                if len(stable) > 15 and len(set(stable[-15:])) <= 3:
+                    break
+            return out
+
+        def table_loop():
+            """新实现：字节表查询 + 预解码文本 + 滑动窗口计数"""
+            decoder, window = TokenTextDecoder(model.vocab_bytes), RepeatWindow(15)
+            n, out = 0, ''
+            for t in tokens:
+                n += 1
+                out += decoder.decode(t)
+                window.push(t)
+                if n > 15 and window.distinct <= 3:
+                    break
+            return out
+
+        assert legacy_loop() == table_loop()
+        print(f'--- 每 token 去词元化开销（{len(tokens)} tokens）---')
+        for label, fn in [('旧实现：ctypes + codecs', legacy_loop), ('词表字节表', table_loop)]:
+            t = min(timeit.repeat(fn, number=REPEAT, repeat=3)) / REPEAT
+            print(f'    {label:<24}: {t * 1e6 / len(tokens):8.3f} us/token')
+
+        # 微基准：每个片段的提示词 Embedding 构建耗时（Qwen3-ASR 模板的前缀与后缀）
+        prompt = (
+            '<|im_start|>system\nYou are a helpful assistant.<|im_end|><|im_start|>user\n<|audio_start|>',
+            '<|audio_end|><|im_end|><|im_start|>assistant\n',
+        )
+        prompt_tokens = [model.tokenize(t) for t in prompt]
+        print(f'--- 提示词 Embedding 构建耗时（{sum(map(len, prompt_tokens))} tokens）---')
+        for label, kwargs in [('逐次反量化', dict(cache_mb=0)), ('行 LRU 缓存', {}), ('fp16 整表映射', dict(fp16_table=True))]:
+            t0 = time.perf_counter()
+            table = get_token_embeddings_gguf(model.path, **kwargs)
+            t_load = time.perf_counter() - t0
+            t = min(timeit.repeat(lambda: [table[ids] for ids in prompt_tokens], number=REPEAT, repeat=3)) / REPEAT
+            print(f'    {label:<24}: {t * 1000:8.3f} ms (载入 {t_load * 1000:.1f} ms)')
+            if kwargs == {}:
+                print(f'    {table}')
@@ -1,19 +1,33 @@
 import time
 import re
-import ctypes
 import numpy as np
-from typing import Optional
+from typing import Callable, List, Optional
 
 from . import llama
 from .schema import LLMDecodeResult
 from .display import DisplayReporter
+from .speculative import CTCDraft
 
 class LLMDecoder:
     """组件：负责 LLM 推理循环与熔断机制"""
+
+    GEN_RESERVE = 128   # 批量解码时为每个序列预留的生成 KV 位置数（不足时该序列回退为单序列解码）
+
     def __init__(self, models):
         self.models = models
         self.stop_tokens = [151643, 151645]
 
+    def _should_abort(self, asr_decoder: 'llama.ASRStreamDecoder') -> bool:
+        """熔断性检查：长期重复，或前 30 个 token 没有任何标点"""
+        if len(asr_decoder.tokens) >= 30:
+            # 长期重复熔断
+            if asr_decoder.recent.distinct <= 3:
+                return True
+            # 30个token无标点熔断
+            if len(asr_decoder.tokens) == 30 and not re.search(r'[，。？！、；：,\.?!;:]', asr_decoder.generated_text):
+                return True
+        return False
+
     def decode(
         self,
         full_embd: np.ndarray,
@@ -23,53 +37,289 @@ class LLMDecoder:
         reporter: Optional[DisplayReporter] = None,
         temperature: float = 0.3,
         top_p: float = 1.0,
-        top_k: int = 50
+        top_k: int = 50,
+        on_partial: Optional[Callable[[str], None]] = None,
+        cancel=None,
+        draft: Optional[CTCDraft] = None,
     ) -> LLMDecodeResult:
+        """
+        执行一次 LLM 生成
+
+        on_partial: 每生成一个 token，以当前累计文本回调（用于推送中间结果）
+        cancel: 取消标志（提供 is_set()），置位后中止注入与生成，结果标记 is_cancelled
+        draft: CTC 草稿，提供时以投机解码生成（每次前向验证多个草稿 token）
+        """
         res = LLMDecodeResult()
         t_inject_start = time.perf_counter()
         
         # 1. Inject (Context & Embeddings)
         self.models.ctx.clear_kv_cache()
-        batch_embd = llama.LlamaBatch(n_input_tokens, full_embd.shape[1], 1)
+        batch_embd = self.models.batch_pool.get(n_input_tokens, full_embd.shape[1])
         batch_embd.set_embd(full_embd)
-        batch_embd.struct.token = ctypes.cast(None, ctypes.POINTER(llama.llama_token))
         
-        if self.models.ctx.decode(batch_embd) != 0: 
+        # 注入阶段挂载中止标志，长 prompt 可在计算图节点之间中止
+        if cancel is not None:
+            self.models.ctx.abortable(cancel)
+        try:
+            ret = self.models.ctx.decode(batch_embd)
+        finally:
+            if cancel is not None:
+                self.models.ctx.abortable(None)
+        if cancel is not None and cancel.is_set():
+            res.is_cancelled = True
+            res.t_inject = time.perf_counter() - t_inject_start
+            return res
+        if ret != 0:
             raise RuntimeError("Decode failed")
             
         res.t_inject = time.perf_counter() - t_inject_start
 
         # 2. Generation Loop
         t_gen_start = time.perf_counter()
-        asr_decoder = llama.ASRStreamDecoder(self.models.vocab, reporter if stream_output else None)
+        asr_decoder = llama.ASRStreamDecoder(self.models.vocab_bytes, reporter if stream_output else None)
         seed = int(np.random.randint(0, 2**31 - 1))
         
         with llama.LlamaSampler(temperature=temperature, top_k=top_k, top_p=top_p, seed=seed) as smpl:
-            for _ in range(n_predict):
-                token_id = smpl.sample(self.models.ctx, -1)
-                
-                if self.models.ctx.decode_token(token_id) != 0: 
-                    break
-                    
-                if token_id == self.models.eos_token or token_id in self.stop_tokens: 
-                    break
-                
-                asr_decoder.push(token_id)
-                
-                # 熔断性检查
-                if len(asr_decoder.tokens) >= 30:
-                    # 长期重复熔断
-                    if len(set(asr_decoder.tokens[-30:])) <= 3:
-                        res.is_aborted = True
-                        break
-                    # 30个token无标点熔断
-                    if len(asr_decoder.tokens) == 30 and not re.search(r'[，。？！、；：,\.?!;:]', asr_decoder.generated_text):
-                        res.is_aborted = True
-                        break
+            if draft is not None:
+                self._generate_speculative(
+                    smpl, asr_decoder, draft, n_input_tokens, n_predict, on_partial, cancel, res
+                )
+            else:
+                self._generate(smpl, asr_decoder, n_predict, on_partial, cancel, res)
         
         asr_decoder.flush()
         res.text = asr_decoder.generated_text
         res.n_gen = asr_decoder.tokens_generated
         res.t_gen = time.perf_counter() - t_gen_start
+        res.speculative.n_tokens = res.n_gen
+        if draft is None:
+            res.speculative.n_passes = res.n_gen
         
         return res
+
+    def _generate(self, smpl, asr_decoder, n_predict, on_partial, cancel, res: LLMDecodeResult):
+        """逐 token 生成"""
+        for _ in range(n_predict):
+            # 逐 token 检查取消（单 token 计算图很短，不挂中止回调）
+            if cancel is not None and cancel.is_set():
+                res.is_cancelled = True
+                break
+
+            token_id = smpl.sample(self.models.ctx, -1)
+            
+            if self.models.ctx.decode_token(token_id) != 0:
+                # 解码失败时 logits 无效，不能把截断的文本当作正常结果返回
+                raise RuntimeError("Decode failed")
+                
+            if token_id == self.models.eos_token or token_id in self.stop_tokens: 
+                break
+            
+            if asr_decoder.push(token_id) and on_partial:
+                on_partial(asr_decoder.generated_text)
+            
+            # 熔断性检查
+            if self._should_abort(asr_decoder):
+                res.is_aborted = True
+                break
+
+    def _generate_speculative(
+        self, smpl, asr_decoder, draft: CTCDraft, n_past: int, n_predict: int,
+        on_partial, cancel, res: LLMDecodeResult,
+    ):
+        """
+        以 CTC 草稿投机生成
+
+        每次前向输入「上一步采样的 token + 至多 draft_chunk 个草稿 token」并取全部 logits，
+        依次在各位置采样：与草稿相同则接受并继续验证下一位，
+        不同则以该采样结果作为下一步的 token，删除其后草稿写入的 KV。
+        草稿批次解码失败时回退为 _generate 逐 token 生成余下部分，逐 token 也失败则抛出 RuntimeError。
+        """
+        ctx = self.models.ctx
+        chunk = max(1, self.models.config.draft_chunk)
+        stats = res.speculative
+
+        def accept(token_id: int) -> bool:
+            """接受一个 token，返回是否继续生成"""
+            if token_id == self.models.eos_token or token_id in self.stop_tokens:
+                return False
+            piece = asr_decoder.push(token_id)
+            draft.advance(piece)
+            if piece and on_partial:
+                on_partial(asr_decoder.generated_text)
+            if self._should_abort(asr_decoder):
+                res.is_aborted = True
+                return False
+            return asr_decoder.tokens_generated < n_predict
+
+        token_id = smpl.sample(ctx, -1)
+        while True:
+            if cancel is not None and cancel.is_set():
+                res.is_cancelled = True
+                break
+            if not accept(token_id):
+                break
+
+            proposal = draft.propose(min(chunk, n_predict - asr_decoder.tokens_generated))
+            batch = self.models.batch_pool.get(len(proposal) + 1)
+            batch.set_tokens([token_id] + proposal, pos=n_past, logits_all=True)
+            if ctx.decode(batch) != 0:
+                # 草稿批次解码失败（如 KV 空间不足）：丢弃其可能写入的 KV，余下部分改为逐 token 生成
+                ctx.seq_rm(0, n_past, -1)
+                if ctx.decode_token(token_id) != 0:
+                    raise RuntimeError("Decode failed")
+                n_gen = asr_decoder.tokens_generated
+                self._generate(smpl, asr_decoder, n_predict - n_gen, on_partial, cancel, res)
+                stats.n_passes += 1 + asr_decoder.tokens_generated - n_gen
+                break
+            stats.n_passes += 1
+            stats.n_draft += len(proposal)
+
+            # 逐位验证：位置 i 的 logits 给出草稿第 i 个 token 处的采样
+            n_ok, running = 0, True
+            token_id = smpl.sample(ctx, 0)
+            while n_ok < len(proposal) and token_id == proposal[n_ok]:
+                n_ok += 1
+                if not accept(token_id):
+                    running = False
+                    break
+                token_id = smpl.sample(ctx, n_ok)
+            stats.n_accepted += n_ok
+            n_past += 1 + n_ok
+            if not running:
+                break
+            if n_ok < len(proposal):
+                ctx.seq_rm(0, n_past, -1)
+
+    def pack(self, lengths: List[int]) -> List[List[int]]:
+        """按序列数、n_batch 与 n_ctx 把待解码序列分组（保持原顺序），返回各组的下标"""
+        n_seq_max = max(1, self.models.config.n_seq_max)
+        n_ctx = self.models.n_ctx
+        groups, group, n_kv = [], [], 0
+        for i, n in enumerate(lengths):
+            need = n + self.GEN_RESERVE
+            if group and (len(group) >= n_seq_max or n_kv + need > n_ctx):
+                groups.append(group)
+                group, n_kv = [], 0
+            group.append(i)
+            n_kv += need
+        if group:
+            groups.append(group)
+        return groups
+
+    def decode_batch(
+        self,
+        full_embds: List[np.ndarray],
+        n_predict: int,
+        temperature: float = 0.3,
+        top_p: float = 1.0,
+        top_k: int = 50,
+        on_partials: Optional[List[Optional[Callable[[str], None]]]] = None,
+        cancels: Optional[list] = None,
+    ) -> List[Optional[LLMDecodeResult]]:
+        """
+        多个相互独立的序列在同一次 llama_decode 中注入、逐步生成
+
+        第 i 个序列使用 seq_id = i，位置各自从 0 开始；每一步把所有未结束序列的
+        下一个 token 拼成一个批次解码，各序列独立采样、独立判断停止与熔断。
+        单条序列的取消只让该序列退出，不影响批次中的其它序列。
+
+        Returns:
+            与 full_embds 一一对应；注入失败或生成中途 KV 空间不足时对应项为 None，
+            由调用方按单序列重新解码
+        """
+        ctx = self.models.ctx
+        n_seqs = len(full_embds)
+        on_partials = on_partials or [None] * n_seqs
+        cancels = cancels or [None] * n_seqs
+        results: List[Optional[LLMDecodeResult]] = [LLMDecodeResult() for _ in range(n_seqs)]
+        t_inject_start = time.perf_counter()
+
+        # 1. Inject：各序列拼成一个批次，只在每个序列的最后一个位置输出 logits
+        #    （任一序列取消不应中止其它序列，批量注入不挂中止回调）
+        ctx.clear_kv_cache()
+        lens = np.array([e.shape[0] for e in full_embds], dtype=np.int32)
+        n_total = int(lens.sum())
+        last_idx = np.cumsum(lens) - 1
+        batch_embd = self.models.batch_pool.get(n_total, full_embds[0].shape[1])
+        batch_embd.set_embd(
+            np.concatenate(full_embds, axis=0),
+            pos=np.concatenate([np.arange(n, dtype=np.int32) for n in lens]),
+            seq_id=np.repeat(np.arange(n_seqs, dtype=np.int32), lens),
+            logits=last_idx,
+        )
+        if ctx.decode(batch_embd) != 0:
+            ctx.clear_kv_cache()
+            return [None] * n_seqs
+        t_inject = time.perf_counter() - t_inject_start
+
+        # 2. Generation Loop：每个序列独立的采样器（各自的随机种子）与流式解码器
+        t_gen_start = time.perf_counter()
+        decoders = [llama.ASRStreamDecoder(self.models.vocab_bytes) for _ in range(n_seqs)]
+        samplers = [
+            llama.LlamaSampler(temperature=temperature, top_k=top_k, top_p=top_p,
+                               seed=int(np.random.randint(0, 2**31 - 1)))
+            for _ in range(n_seqs)
+        ]
+        logit_idx = [int(i) for i in last_idx]
+        n_past = lens.copy()
+        t_done = [0.0] * n_seqs
+        tokens = [0] * n_seqs
+        step_batch = self.models.batch_pool.get(n_seqs)
+
+        active = list(range(n_seqs))
+        for _ in range(n_predict):
+            # 采样各序列的下一个 token，结束（停止符 / 取消）的序列退出批次
+            running = []
+            for i in active:
+                if cancels[i] is not None and cancels[i].is_set():
+                    results[i].is_cancelled = True
+                else:
+                    token_id = samplers[i].sample(ctx, logit_idx[i])
+                    if token_id != self.models.eos_token and token_id not in self.stop_tokens:
+                        tokens[i] = token_id
+                        running.append(i)
+                        continue
+                t_done[i] = time.perf_counter()
+            active = running
+            if not active:
+                break
+
+            step_batch.set_tokens(
+                [tokens[i] for i in active], pos=n_past[active],
+                seq_id=np.array(active, dtype=np.int32), logits_all=True,
+            )
+            if ctx.decode(step_batch) != 0:
+                # KV 空间不足：仍在生成的序列交由调用方按单序列重解
+                for i in active:
+                    results[i] = None
+                active = []
+                break
+
+            running = []
+            for j, i in enumerate(active):
+                logit_idx[i] = j
+                n_past[i] += 1
+                if decoders[i].push(tokens[i]) and on_partials[i]:
+                    on_partials[i](decoders[i].generated_text)
+                if self._should_abort(decoders[i]):
+                    results[i].is_aborted = True
+                    t_done[i] = time.perf_counter()
+                    continue
+                running.append(i)
+            active = running
+
+        for i in active:
+            t_done[i] = time.perf_counter()
+        for smpl in samplers:
+            smpl.free()
+        ctx.clear_kv_cache()
+
+        for i, res in enumerate(results):
+            if res is None:
+                continue
+            decoders[i].flush()
+            res.text = decoders[i].generated_text
+            res.n_gen = decoders[i].tokens_generated
+            res.t_inject = t_inject
+            res.t_gen = t_done[i] - t_gen_start
+        return results
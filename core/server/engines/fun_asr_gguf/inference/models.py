@@ -24,6 +24,7 @@ class Models:
         self.model = None
         self.ctx = None
         self.vocab = None
+        self.vocab_bytes = None
         self.eos_token = None
         self.embedding_table = None
         
@@ -69,27 +70,38 @@ class Models:
             os.environ["GGML_VK_DISABLE_F16"] = "1" 
         self.model = llama.LlamaModel(self.config.decoder_gguf_path, use_gpu=self.config.llm_use_gpu)
         self.vocab = self.model.vocab
+        self.vocab_bytes = self.model.vocab_bytes   # 词表字节表，生成时 O(1) 查询 token 字节
         self.eos_token = self.model.eos_token
 
         # 4. Embeddings
         vprint("[4/6] 加载 Embedding 权重...", verbose)
-        self.embedding_table = llama.get_token_embeddings_gguf(self.config.decoder_gguf_path)
+        self.embedding_table = llama.get_token_embeddings_gguf(
+            self.config.decoder_gguf_path,
+            cache_mb=self.config.embd_cache_mb,
+            fp16_table=self.config.embd_fp16_table,
+        )
         
         # 5. LLM Context
         vprint("[5/6] 创建 LLM 上下文...", verbose)
+        n_ctx = self.config.n_ctx
+        self.n_ctx = n_ctx
         self.ctx = llama.LlamaContext(
             self.model,
-            n_ctx=2048,
-            n_batch=2048,
+            n_ctx=n_ctx,
+            n_batch=n_ctx,
             n_ubatch=self.config.n_ubatch,
+            n_seq_max=max(1, self.config.n_seq_max),
+            kv_unified=True,    # 多序列批量解码时各序列共用 n_ctx
             n_threads=self.config.n_threads,
         )
+        self.batch_pool = llama.LlamaBatchPool(n_ctx)   # 预填充批次复用，容量与上下文一致
         
         # 6. Prompt构建器
         vprint("[6/6] 初始化 Prompt 构建器器...", verbose)
         self.prompt_builder = PromptBuilder(self.vocab, self.embedding_table)
 
     def cleanup(self):
+        self.batch_pool = None
         self.ctx = None
         self.model = None
         self.encoder = None
@@ -2,21 +2,41 @@ import time
 import re
 import ctypes
 import numpy as np
-from typing import List, Tuple, Optional, Dict, Any
+from dataclasses import dataclass, field
+from typing import Callable, List, Tuple, Optional, Dict, Any
 
 from . import logger
 from . import llama
 from .ctc_decoder import CTCDecoder
 from .utils import vprint, timer
-from .schema import DecodeResult, Timings, RecognitionStream, LLMDecodeResult
+from .schema import DecodeResult, Timings, RecognitionStream, LLMDecodeResult, SpeculativeStats
 from .display import DisplayReporter
 from .models import Models
 from .ctc_aligner import CTCAligner
 from .llm_decoder import LLMDecoder
+from .speculative import CTCDraft
 
 # 全局静默 Reporter，用于默认参数，避免重复创建线程
 _SILENT_REPORTER = DisplayReporter(verbose=False)
 
+
+@dataclass
+class _LLMInput:
+    """编码、CTC 与 Prompt 构建完成后，等待 LLM 解码的中间结果"""
+    full_embd: np.ndarray
+    audio_embd: np.ndarray
+    ctc_results: List
+    hotwords: List[str]
+    n_prefix: int
+    n_suffix: int
+    timings: Timings = field(default_factory=Timings)
+
+    @property
+    def draft_text(self) -> str:
+        """CTC 识别文本，作为投机解码的草稿"""
+        return "".join(r.text for r in self.ctc_results)
+
+
 class InferencePipeline:
     """ASR 核心指挥者 (Conductor)：负责调度音频编码、CTC 解码、Prompt 构建及 LLM 推理等细粒度组件"""
     def __init__(self, models: Models):
@@ -37,10 +57,102 @@ class InferencePipeline:
         temperature: float = 0.3,
         top_p: float = 1.0,
         top_k: int = 50,
-        timestamp_offset: float = -0.24
+        timestamp_offset: float = -0.24,
+        on_partial: Optional[Callable[[str], None]] = None,
+        cancel=None,
     ) -> DecodeResult:
-        
+        """
+        执行完整识别流程并写入 stream.result
+
+        cancel: 取消标志（提供 is_set()），在各阶段之间及 LLM 解码中检查，
+                置位后返回 is_cancelled=True 的结果，不更新识别流
+        """
         reporter = reporter or _SILENT_REPORTER
+        inp = self._prepare(stream, language, context, reporter, cancel)
+        if isinstance(inp, DecodeResult):
+            return inp
+
+        # 5. LLM 解码循环：若熔断则加温重试（总共最多解码7次，最后的温度是2.1）
+        llm_res = self._decode_llm(
+            inp.full_embd, verbose, reporter, temperature, top_p, top_k, on_partial, cancel,
+            draft_text=inp.draft_text,
+        )
+        return self._finish(stream, inp, llm_res, reporter, timestamp_offset)
+
+    def decode_streams(
+        self,
+        streams: List[RecognitionStream],
+        languages: List[Optional[str]],
+        contexts: List[Optional[str]],
+        temperature: float = 0.3,
+        top_p: float = 1.0,
+        top_k: int = 50,
+        timestamp_offset: float = -0.24,
+        on_partials: Optional[List[Optional[Callable[[str], None]]]] = None,
+        cancels: Optional[list] = None,
+    ) -> List[DecodeResult]:
+        """
+        批量识别多个相互独立的识别流（静默模式）
+
+        编码与 CTC 逐个执行，LLM 按上下文容量分组，每组在同一次 llama_decode 中
+        多序列预填充、逐步生成；批量未完成或触发熔断的序列回退为单序列解码重试。
+        """
+        n = len(streams)
+        on_partials = on_partials or [None] * n
+        cancels = cancels or [None] * n
+        reporter = _SILENT_REPORTER
+
+        outputs: List[Optional[DecodeResult]] = [None] * n
+        prepared = []
+        for i, stream in enumerate(streams):
+            inp = self._prepare(stream, languages[i], contexts[i], reporter, cancels[i])
+            if isinstance(inp, DecodeResult):
+                outputs[i] = inp
+            else:
+                prepared.append((i, inp))
+
+        for group in self.llm_decoder.pack([inp.full_embd.shape[0] for _, inp in prepared]):
+            items = [prepared[k] for k in group]
+            idx = [i for i, _ in items]
+            if len(items) > 1:
+                llm_results = self.llm_decoder.decode_batch(
+                    [inp.full_embd for _, inp in items], self.models.config.n_predict,
+                    temperature=temperature, top_p=top_p, top_k=top_k,
+                    on_partials=[on_partials[i] for i in idx], cancels=[cancels[i] for i in idx],
+                )
+            else:
+                llm_results = [None]
+
+            for (i, inp), llm_res in zip(items, llm_results):
+                if llm_res is None:
+                    # 单独成组，或批量未完成：按单序列解码
+                    llm_res = self._decode_llm(
+                        inp.full_embd, False, reporter, temperature, top_p, top_k, on_partials[i], cancels[i],
+                        draft_text=inp.draft_text,
+                    )
+                elif llm_res.is_aborted and not llm_res.is_cancelled:
+                    llm_res = self._decode_llm(
+                        inp.full_embd, False, reporter, temperature, top_p, top_k, on_partials[i], cancels[i],
+                        first_retry=1, draft_text=inp.draft_text,
+                    )
+                outputs[i] = self._finish(streams[i], inp, llm_res, reporter, timestamp_offset)
+        return outputs
+
+    def _prepare(
+        self,
+        stream: RecognitionStream,
+        language: Optional[str],
+        context: Optional[str],
+        reporter: DisplayReporter,
+        cancel=None,
+    ):
+        """
+        编码、CTC 解码并构建 Prompt
+
+        Returns:
+            _LLMInput；空音频或任务已取消时直接返回最终的 DecodeResult
+        """
+        cancelled = lambda: cancel is not None and cancel.is_set()
         timings = Timings()
 
         # 0. 检查原始音频数据长度，空音频防御
@@ -51,6 +163,8 @@ class InferencePipeline:
         reporter.print("\n[2] 音频编码...")
         (audio_embd, enc_output), timings.encode = timer(self.models.encoder.encode, stream.audio_data)
         reporter.print(f"    耗时: {timings.encode*1000:.2f}ms")
+        if cancelled():
+            return DecodeResult(timings=timings, is_cancelled=True)
 
         # 2. CTC Decoding
         reporter.print("\n[3] CTC 解码...")
@@ -65,6 +179,8 @@ class InferencePipeline:
         reporter.print(f"    热词: {hotwords}")
         t_detail = " | ".join([f"{k}:{v*1000:.1f}ms" for k, v in ctc_times.items() if v > 0])
         reporter.print(f"    耗时: {timings.ctc*1000:.2f}ms ({t_detail})")
+        if cancelled():
+            return DecodeResult(timings=timings, hotwords=hotwords, is_cancelled=True)
 
         # 3. Prompt Builder
         reporter.print("\n[4] 准备 Prompt...")
@@ -80,27 +196,73 @@ class InferencePipeline:
         reporter.print("\n[5] LLM 解码...")
         reporter.print("=" * 70)
         full_embd = np.concatenate([p_embd, audio_embd.astype(np.float32), s_embd], axis=0)
-        n_input_tokens = full_embd.shape[0]
+        return _LLMInput(
+            full_embd=full_embd, audio_embd=audio_embd, ctc_results=ctc_results,
+            hotwords=hotwords, n_prefix=n_p, n_suffix=n_s, timings=timings,
+        )
 
-        # 5. LLM 解码循环：若熔断则加温重试（总共最多解码7次，最后的温度是2.1）
+    def _decode_llm(
+        self,
+        full_embd: np.ndarray,
+        verbose: bool,
+        reporter: DisplayReporter,
+        temperature: float,
+        top_p: float,
+        top_k: int,
+        on_partial: Optional[Callable[[str], None]] = None,
+        cancel=None,
+        first_retry: int = 0,
+        draft_text: str = "",
+    ) -> LLMDecodeResult:
+        """
+        单序列 LLM 解码：若熔断则加温重试（总共最多解码7次，最后的温度是2.1）
+
+        启用 speculative 且有 CTC 文本时，以 draft_text 为草稿投机解码；
+        结果中的投机统计累计了所有重试。
+        """
+        config = self.models.config
         llm_res = None
-        current_temp = temperature
-        for retry_idx in range(7):
+        spec = SpeculativeStats()
+        current_temp = temperature + 0.3 * first_retry
+        for retry_idx in range(first_retry, 7):
             if retry_idx > 0:
                 print(f"\033[0G[!] 解码有误，熔断重试 (温度设为 {current_temp:.1f}, retry: {retry_idx})")
+            draft = None
+            if config.speculative and draft_text.strip():
+                draft = CTCDraft(draft_text, self.models.model.tokenize)
             llm_res = self.llm_decoder.decode(
-                full_embd, n_input_tokens, self.models.config.n_predict, 
+                full_embd, full_embd.shape[0], config.n_predict, 
                 stream_output=verbose, reporter=reporter,
-                temperature=current_temp, top_p=top_p, top_k=top_k
+                temperature=current_temp, top_p=top_p, top_k=top_k,
+                on_partial=on_partial, cancel=cancel, draft=draft
             )
+            spec += llm_res.speculative
+            llm_res.speculative = spec
+            if llm_res.is_cancelled: break
             if not llm_res.is_aborted: break    # 正常解码就跳出循环
             llm_res.text += "====解码有误，强制熔断===="
             current_temp += 0.3
-        text = llm_res.text.strip()
+        return llm_res
+
+    def _finish(
+        self,
+        stream: RecognitionStream,
+        inp: _LLMInput,
+        llm_res: LLMDecodeResult,
+        reporter: DisplayReporter,
+        timestamp_offset: float,
+    ) -> DecodeResult:
+        """CTC 时间戳对齐并写入 stream.result（任务已取消时不更新识别流）"""
+        timings, hotwords, ctc_results = inp.timings, inp.hotwords, inp.ctc_results
         timings.inject = llm_res.t_inject
         timings.llm_generate = llm_res.t_gen
+        if llm_res.is_cancelled:
+            return DecodeResult(timings=timings, hotwords=hotwords, is_cancelled=True)
+        text = llm_res.text.strip()
         
         if reporter: reporter.print("\n" + "=" * 70)
+        if llm_res.speculative.n_draft:
+            reporter.print(f"    投机解码: {llm_res.speculative}")
 
         # 6. Timestamp Alignment
         reporter.print("\n[6] 时间戳对齐")
@@ -118,9 +280,49 @@ class InferencePipeline:
         
         return DecodeResult(
             text=text, ctc_results=ctc_results, aligned=aligned,
-            audio_embd=audio_embd, n_prefix=n_p, n_suffix=n_s,
+            audio_embd=inp.audio_embd, n_prefix=inp.n_prefix, n_suffix=inp.n_suffix,
             n_gen=llm_res.n_gen, timings=timings, hotwords=hotwords,
-            is_aborted=llm_res.is_aborted
+            is_aborted=llm_res.is_aborted, speculative=llm_res.speculative
         )
 
 
+
+
+if __name__ == '__main__':
+    # 多序列批量解码基准：python -m core.server.engines.fun_asr_gguf.inference.pipeline <音频文件>
+    import sys
+    from config_server import FunASRNanoGGUFArgs as Args
+    from .schema import ASREngineConfig
+    from .audio import load_audio
+
+    print('-------------多序列批量解码基准 (CPU)---------------')
+    if len(sys.argv) < 2:
+        sys.exit('用法: python -m core.server.engines.fun_asr_gguf.inference.pipeline <音频文件> [时长秒数]')
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    cfg = {k: v for k, v in Args.__dict__.items() if not k.startswith('_')}
+    cfg.update(onnx_provider='CPU', llm_use_gpu=False, n_ctx=8192, n_seq_max=8, verbose=False)
+    pipeline = InferencePipeline(Models(ASREngineConfig(**cfg)))
+    n_predict = pipeline.models.config.n_predict
+
+    stream = pipeline.create_stream()
+    stream.accept_waveform(16000, load_audio(sys.argv[1], duration=seconds))
+    inp = pipeline._prepare(stream, None, None, _SILENT_REPORTER)
+    print(f'音频 {seconds:.1f}s，每个序列输入 {inp.full_embd.shape[0]} tokens')
+    pipeline.llm_decoder.decode(inp.full_embd, inp.full_embd.shape[0], n_predict)    # 预热
+
+    for n in (1, 2, 4, 8):
+        t0 = time.perf_counter()
+        if n == 1:
+            results = [pipeline.llm_decoder.decode(inp.full_embd, inp.full_embd.shape[0], n_predict)]
+        else:
+            results = pipeline.llm_decoder.decode_batch([inp.full_embd] * n, n_predict)
+        wall = time.perf_counter() - t0
+        done = [r for r in results if r is not None]
+        n_gen = sum(r.n_gen for r in done)
+        latency = [r.t_inject + r.t_gen for r in done]
+        print(
+            f'  {n} 序列: 生成 {n_gen:4d} tokens, 吞吐 {n_gen / wall:6.1f} tokens/s, '
+            f'单请求时延 平均 {np.mean(latency):.2f}s / 最大 {max(latency):.2f}s'
+            + (f', {n - len(done)} 个序列未完成' if len(done) < n else '')
+        )
@@ -2,10 +2,61 @@ import re
 import numpy as np
 import time
 
-class HotwordTrieNode:
-    def __init__(self):
-        self.children = {}
-        self.word_indices = [] # 记录在此节点结束的热词索引
+class HotwordTrie:
+    """
+    热词字符 Trie，节点以整数编号，按编号存放在列表中
+
+    除字符级子节点外还记录「消耗整个 token 后到达的节点」：根节点对整个词表的转移在加载热词时
+    预先算成 numpy 数组，扫描时一次查表即可找出所有帧上能开启匹配的候选；其余节点的转移
+    首次用到时计算并缓存，之后推进部分匹配只需一次字典查询，不再逐字符遍历。
+    """
+    def __init__(self, vocab_lower):
+        self.vocab_lower = vocab_lower
+        self.vocab_first = [tc[:1] for tc in vocab_lower]   # token 首字符，用于快速排除
+        self.children = [{}]        # 节点 -> {字符: 子节点}
+        self.word_indices = [[]]    # 节点 -> 在此结束的热词索引
+        self._trans = [{}]          # 节点 -> {token id: 到达的节点，-1 表示失配}
+
+    def insert(self, word, idx):
+        node = 0
+        for char in word:
+            child = self.children[node].get(char)
+            if child is None:
+                child = len(self.children)
+                self.children[node][char] = child
+                self.children.append({})
+                self.word_indices.append([])
+                self._trans.append({})
+            node = child
+        self.word_indices[node].append(idx)
+
+    def walk(self, node, text):
+        """从 node 出发逐字符消耗 text，返回到达的节点，失配返回 -1"""
+        for char in text:
+            node = self.children[node].get(char, -1)
+            if node < 0:
+                break
+        return node
+
+    def step(self, node, tid):
+        """从 node 出发消耗整个 token，返回到达的节点，失配或空 token 返回 -1"""
+        trans = self._trans[node]
+        nxt = trans.get(tid)
+        if nxt is None:
+            tc = self.vocab_lower[tid]
+            nxt = self.walk(node, tc) if tc else -1
+            trans[tid] = nxt
+        return nxt
+
+    def root_table(self):
+        """整个词表从根节点出发的转移，(vocab,) int32，失配为 -1"""
+        table = np.full(len(self.vocab_lower), -1, dtype=np.int32)
+        root = self.children[0]
+        for tid, tc in enumerate(self.vocab_lower):
+            if tc and tc[0] in root:
+                table[tid] = self.walk(0, tc)
+        return table
+
 
 class HotwordRadar:
     """
@@ -13,25 +64,33 @@ class HotwordRadar:
     
     优化核心：
     1. 字符级 Trie 树：合并所有热词的前缀，CapsWriter 和 CapsWriter-Offline 只需搜索一次前缀。
-    2. 全局状态记忆化：缓存 (frame, trie_node)，消除重复路径搜索。
-    3. 极速剪枝：基于 Trie 节点的子节点字典，快速过滤 Top-K 中无关的 Token。
+    2. 全局状态记忆化：缓存 (frame, trie_node)，整次扫描内共享，消除重复路径搜索。
+    3. Token 转移表：根节点转移预先算成数组，所有帧的起始候选一次查表得到；
+       其余节点按 token id 缓存转移，推进匹配无需逐字符遍历。
     """
     def __init__(self, hotwords, tokenizer):
         self.tokenizer = tokenizer
         
-        # 1. 预计算全量词表的小写映射
+        # 1. 预计算全量词表的小写映射、词边界标记，以及小写文本的编号（同帧内按文本去重）
         self.vocab_lower = []
+        boundary = []
+        text_ids = {}
         for i in range(tokenizer.get_piece_size()):
             piece = tokenizer.id_to_piece(i)
-            self.vocab_lower.append(piece.lower().replace('\u2581', '').strip())
+            tc = piece.lower().replace('\u2581', '').strip()
+            self.vocab_lower.append(tc)
+            boundary.append(piece.startswith('\u2581'))
+            text_ids.setdefault(tc, len(text_ids))
+        self.vocab_boundary = boundary
+        self.vocab_text_id = [text_ids[tc] for tc in self.vocab_lower]
         
         # 2. 初始化热词
         self.update_hotwords(hotwords)
 
     def update_hotwords(self, hotwords):
-        """动态更新热词列表并重构 Trie 树"""
+        """动态更新热词列表并重构 Trie 树与根节点转移表"""
         self.hotwords = hotwords
-        self.trie = HotwordTrieNode()
+        self.trie = HotwordTrie(self.vocab_lower)
         self.search_hotwords = [re.sub(r'[^\w\s]+', ' ', w) for w in hotwords]
         self.hotword_lower_strings = []
         
@@ -39,14 +98,9 @@ class HotwordRadar:
             clean = re.sub(r'\s+', '', sw).lower()
             self.hotword_lower_strings.append(clean)
             if not clean: continue
-            
-            # 插入 Trie
-            node = self.trie
-            for char in clean:
-                if char not in node.children:
-                    node.children[char] = HotwordTrieNode()
-                node = node.children[char]
-            node.word_indices.append(idx)
+            self.trie.insert(clean, idx)
+
+        self.root_next = self.trie.root_table()
 
     def scan(self, full_ids, full_probs, top_k=5, blank_id=0, max_lookahead=15, verbose=False):
         """
@@ -67,147 +121,112 @@ class HotwordRadar:
             
         T, K = full_ids.shape
         hits = []
+        if T == 0 or not self.hotwords:
+            return []
 
-        for t in range(T):
-            if top1_indices[t] == blank_id:
-                continue
-            
-            t_frame_start = time.perf_counter()
-            
-            # 触发：检查当前帧 Top-K 中有哪些 Token 是 Trie 的根起始
-            seen_tokens = set()
-            for k in range(K):
-                tid = int(full_ids[t, k])
-                tc = self.vocab_lower[tid]
-                if not tc or tc in seen_tokens: continue
-                seen_tokens.add(tc)
-                
-                # 如果 Token 首字符在 Trie 根部，启动批量 DFS
-                if tc[0] in self.trie.children:
-                    # 获取首 Piece 的词边界标记
-                    original_piece = self.tokenizer.id_to_piece(tid)
-                    has_boundary = original_piece.startswith('\u2581')
-                    
-                    # 尝试消耗此 Token 在 Trie 上的路径
-                    node = self.trie
-                    match_possible = True
-                    for char in tc:
-                        if char in node.children:
-                            node = node.children[char]
-                        else:
-                            match_possible = False
-                            break
-                    
-                    if match_possible:
-                        # 启动集中式 DFS，从 node 节点继续往后找
-                        frame_hits = self._dfs_trie(
-                            t, k, node, full_ids, full_probs, top1_indices, 
-                            blank_id, max_lookahead, {}, verbose=verbose
-                        )
-                        for h in frame_hits:
-                            h["has_word_boundary"] = has_boundary
-                            hits.append(h)
+        # 触发：Top-1 非空帧上，Top-K 中能从 Trie 根部完整消耗的 Token（一次查表）
+        nonblank = top1_indices != blank_id
+        start_nodes = self.root_next[full_ids]
+        starts = np.argwhere((start_nodes >= 0) & nonblank[:, None])
+
+        # 每帧起（含自身）的第一个 Top-1 非空帧，决定 DFS 能跨过的空帧范围
+        frames = np.where(nonblank, np.arange(T), T)
+        next_nonblank = np.append(np.minimum.accumulate(frames[::-1])[::-1], T).tolist()
 
-            t_frame_end = time.perf_counter()
-            if verbose and (t_frame_end - t_frame_start) > 0.0001: # 仅打印有实际计算的帧
-                print(f"[Radar Profile] 帧 {t:3d} 匹配耗时: {(t_frame_end - t_frame_start)*1000:7.3f} ms")
+        ctx = (full_ids.tolist(), full_probs.tolist(), next_nonblank, max_lookahead, {})
+        ids = ctx[0]
+        seen = set()
+        for t, k in starts.tolist():
+            tid = ids[t][k]
+            # 同一帧内小写文本相同的 Token 只取第一个
+            key = (t, self.vocab_text_id[tid])
+            if key in seen: continue
+            seen.add(key)
+
+            for h in self._match(t, k, int(start_nodes[t, k]), ctx):
+                h["has_word_boundary"] = self.vocab_boundary[tid]
+                hits.append(h)
 
         t_scan_total = (time.perf_counter() - t_scan_start) * 1000
 
-        if verbose: print(f"[Radar Profile] 扫描总耗时: {t_scan_total:.3f} ms")
+        if verbose: print(f"[Radar Profile] 扫描总耗时: {t_scan_total:.3f} ms ({len(seen)} 个起点, {len(ctx[4])} 个搜索状态)")
 
         return self._post_process(hits, top1_indices, blank_id)
 
-    def _dfs_trie(self, t_curr, k_curr, start_node, topk_ids, topk_probs, top1_indices, blank_id, max_lookahead, memo, verbose=False):
-        """
-        基于 Trie 树的深度优先集中搜索
-        memo: (frame_idx, node_id) -> Dict[word_idx: best_match_from_here]
-        """
-        T, K = topk_ids.shape
-        p_start = float(topk_probs[t_curr, k_curr])
-        t1 = self.vocab_lower[topk_ids[t_curr, k_curr]]
-        
-        # 定义内部递归
-        def search(f_prev, node):
-            state = (f_prev, id(node))
-            if state in memo: return memo[state]
-            
-            # 使用字典存储：word_idx -> 该节点往后能找到的最佳完成路径
-            # 这样对于同一个 Trie 节点，同样的词只需要保留概率最高的一个分支
-            best_results = {}
-            
-            # A. 检查当前节点是否是热词终点
-            for w_idx in node.word_indices:
-                res = {
-                    "word_idx": w_idx,
-                    "end_frame": f_prev,
-                    "prob_sum": 0.0, # 这里的 prob_sum 只存后续的，t_curr 在最外层加
-                    "count": 0,
-                    "frame_indices": [],
-                    "matched_tokens": []
-                }
-                best_results[w_idx] = res
-                if verbose:
-                    print(f"      [Match End] Word: {self.hotwords[w_idx]:<15} | Path: {t1} + {' '.join(res['matched_tokens'])}")
-            
-            # B. 继续往后搜索
-            search_end = min(f_prev + 1 + max_lookahead, T)
-            for f in range(f_prev + 1, search_end):
-                if f > f_prev + 1 and np.any(top1_indices[f_prev+1:f] != blank_id):
-                    break
-                
-                for k in range(K):
-                    tc = self.vocab_lower[topk_ids[f, k]]
-                    if not tc: continue
-                    
-                    temp_node = node
-                    match_ok = True
-                    for char in tc:
-                        if char in temp_node.children:
-                            temp_node = temp_node.children[char]
-                        else:
-                            match_ok = False
-                            break
-                    
-                    if match_ok:
-                        sub_matches = search(f, temp_node)
-                        if sub_matches:
-                            p_curr = float(topk_probs[f, k])
-                            for w_idx, sr in sub_matches.items():
-                                new_prob_sum = sr["prob_sum"] + p_curr
-                                new_count = sr["count"] + 1
-                                avg_prob = new_prob_sum / new_count
-                                
-                                # 更新在该 (f_prev, node) 下，到达 w_idx 的最优后缀
-                                if w_idx not in best_results or avg_prob > (best_results[w_idx]["prob_sum"] / max(1, best_results[w_idx]["count"])):
-                                    best_results[w_idx] = {
-                                        "word_idx": w_idx,
-                                        "end_frame": sr["end_frame"],
-                                        "prob_sum": new_prob_sum,
-                                        "count": new_count,
-                                        "frame_indices": [f] + sr["frame_indices"],
-                                        "matched_tokens": [tc] + sr["matched_tokens"]
-                                    }
-
-            memo[state] = best_results
-            return best_results
+    def _match(self, t_curr, k_curr, start_node, ctx):
+        """从 (t_curr, k_curr) 开启的匹配：每个可达热词取后缀平均概率最高的路径"""
+        ids, probs = ctx[0], ctx[1]
+        p_start = probs[t_curr][k_curr]
+        t1 = self.vocab_lower[ids[t_curr][k_curr]]
 
-        # 启动递归
-        all_best_suffixes = search(t_curr, start_node)
-        
-        # 组装最终结果
         final_matches = []
-        for w_idx, sr in all_best_suffixes.items():
+        for w_idx, (prob_sum, count, end_frame, path) in self._search(t_curr, start_node, ctx).items():
+            frame_indices, matched_tokens = [t_curr], [t1]
+            while path is not None:
+                f, tc, path = path
+                frame_indices.append(f)
+                matched_tokens.append(tc)
             final_matches.append({
                 "word_idx": w_idx,
                 "start_frame": t_curr,
-                "end_frame": sr["end_frame"],
-                "prob": (sr["prob_sum"] + p_start) / (sr["count"] + 1),
-                "frame_indices": [t_curr] + sr["frame_indices"],
-                "matched_tokens": [t1] + sr["matched_tokens"]
+                "end_frame": end_frame,
+                "prob": (prob_sum + p_start) / (count + 1),
+                "frame_indices": frame_indices,
+                "matched_tokens": matched_tokens
             })
         return final_matches
 
+    def _search(self, f_prev, node, ctx):
+        """
+        基于 Trie 树的深度优先集中搜索
+        返回 word_idx -> (后缀概率和, 后缀 token 数, 结束帧, 路径链表 (帧, token, 后续))
+        memo: (frame_idx, node) -> 上述字典，整次扫描共享
+        """
+        ids, probs, next_nonblank, max_lookahead, memo = ctx
+        state = (f_prev, node)
+        best_results = memo.get(state)
+        if best_results is not None:
+            return best_results
+
+        # 使用字典存储：word_idx -> 该节点往后能找到的最佳完成路径
+        # 这样对于同一个 Trie 节点，同样的词只需要保留概率最高的一个分支
+        best_results = {}
+
+        # A. 检查当前节点是否是热词终点
+        for w_idx in self.trie.word_indices[node]:
+            best_results[w_idx] = (0.0, 0, f_prev, None)
+
+        # B. 继续往后搜索：下一帧，以及中间全是 Top-1 空帧时更远的帧
+        search_end = min(f_prev + 1 + max_lookahead, len(ids), next_nonblank[f_prev + 1] + 1)
+        trie = self.trie
+        children, trans, first = trie.children[node], trie._trans[node], trie.vocab_first
+        for f in range(f_prev + 1, search_end):
+            row_ids, row_probs = ids[f], probs[f]
+            for k, tid in enumerate(row_ids):
+                # 首字符不是当前节点的子节点时直接跳过，否则查转移缓存
+                if first[tid] not in children: continue
+                temp_node = trans.get(tid)
+                if temp_node is None:
+                    temp_node = trie.step(node, tid)
+                if temp_node < 0: continue
+
+                sub_matches = self._search(f, temp_node, ctx)
+                if not sub_matches: continue
+                p_curr = row_probs[k]
+                for w_idx, (prob_sum, count, end_frame, path) in sub_matches.items():
+                    new_prob_sum = prob_sum + p_curr
+                    new_count = count + 1
+
+                    # 更新在该 (f_prev, node) 下，到达 w_idx 的最优后缀
+                    best = best_results.get(w_idx)
+                    if best is None or new_prob_sum / new_count > best[0] / max(1, best[1]):
+                        best_results[w_idx] = (
+                            new_prob_sum, new_count, end_frame, (f, self.vocab_lower[tid], path)
+                        )
+
+        memo[state] = best_results
+        return best_results
+
 
     def _post_process(self, hits, top1_indices, blank_id):
         if not hits: return []
@@ -276,3 +295,48 @@ class HotwordRadar:
             })
         return final
 
+
+
+if __name__ == '__main__':
+    # 雷达扫描基准（合成 CTC Top-K）：python -m core.server.engines.fun_asr_gguf.inference.radar
+    import random
+
+    rng = random.Random(0)
+    chars = [chr(0x4e00 + i) for i in range(3000)]
+    vocab = ['<blank>'] + chars + ['▁' + w for w in ('caps', 'writer', 'off', 'line', 'hello')] + ['，', '。']
+
+    class _Tokenizer:
+        def get_piece_size(self): return len(vocab)
+        def id_to_piece(self, i): return vocab[i]
+
+    def make_hotwords(n):
+        words = set()
+        while len(words) < n:
+            words.add(''.join(rng.choice(chars) for _ in range(rng.randint(2, 5))))
+        return sorted(words)
+
+    def make_logits(T, hotwords):
+        """Top-1 约一半为空帧，Top-K 其余位置随机，每隔若干帧把一个热词逐字放进 Top-K"""
+        ids = np.array([rng.sample(range(1, len(vocab)), 100) for _ in range(T)], dtype=np.int64)
+        ids[np.array([rng.random() < 0.5 for _ in range(T)]), 0] = 0
+        probs = np.sort(np.random.default_rng(0).random((T, 100)).astype(np.float32), axis=1)[:, ::-1] / 3
+        t = 0
+        while t < T - 10:
+            for j, c in enumerate(rng.choice(hotwords)):
+                ids[t + j, rng.randint(0, 4)] = vocab.index(c)
+            t += rng.randint(6, 30)
+        return ids, probs
+
+    print('-------------热词雷达扫描基准 (1000 帧, Top-K=10)---------------')
+    tokenizer = _Tokenizer()
+    radar = HotwordRadar([], tokenizer)
+    for n in (10, 1000, 20000):
+        hotwords = make_hotwords(n)
+        t0 = time.perf_counter()
+        radar.update_hotwords(hotwords)
+        t_load = time.perf_counter() - t0
+        ids, probs = make_logits(1000, hotwords)
+        t0 = time.perf_counter()
+        hits = radar.scan(ids, probs, top_k=10)
+        t_scan = time.perf_counter() - t0
+        print(f'  {n:6d} 个热词: 加载 {t_load * 1000:7.1f} ms, 扫描 {t_scan * 1000:7.1f} ms, 命中 {len(hits)}')
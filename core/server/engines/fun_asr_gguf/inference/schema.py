@@ -118,12 +118,14 @@ class TranscriptionResult:
         ctc_text: CTC 识别结果
         hotwords: 检测到的热词列表
         timings: 各阶段耗时统计
+        speculative: 投机解码统计（未启用时全为 0）
     """
     text: str = ""
     segments: List[Dict[str, Any]] = field(default_factory=list)
     ctc_text: str = ""
     hotwords: List[str] = field(default_factory=list)
     timings: Timings = field(default_factory=Timings)
+    speculative: 'SpeculativeStats' = field(default_factory=lambda: SpeculativeStats())
 
 
 # ==================== 引擎配置相关 ====================
@@ -144,6 +146,12 @@ class ASREngineConfig:
         n_threads: 线程数（None 表示自动）
         n_threads_batch: 批处理线程数（None 表示自动）
         n_ubatch: llama.cpp 内部物理 batch 大小
+        n_ctx: LLM 上下文长度（多序列批量解码时各序列共用）
+        n_seq_max: 多序列批量解码时同时生成的最大序列数（1 表示不批量）
+        speculative: 是否以 CTC 识别文本为草稿进行投机解码（需启用 CTC）
+        draft_chunk: 投机解码每次前向验证的最大草稿 token 数
+        embd_cache_mb: 提示词 Embedding 反量化结果的行缓存预算（MB），0 表示不缓存
+        embd_fp16_table: 预先把整张 Embedding 表反量化为 fp16 并内存映射
         similar_threshold: 热词相似度阈值
         max_hotwords: 召回并发送给 LLM 的最大热词数
         sample_rate: 音频采样率
@@ -161,6 +169,12 @@ class ASREngineConfig:
     n_threads: Optional[int] = None
     n_threads_batch: Optional[int] = None
     n_ubatch: int = 512
+    n_ctx: int = 2048
+    n_seq_max: int = 1
+    speculative: bool = False
+    draft_chunk: int = 8
+    embd_cache_mb: float = 64
+    embd_fp16_table: bool = False
     similar_threshold: float = 0.6
     max_hotwords: int = 10
     sample_rate: int = 16000
@@ -192,6 +206,46 @@ class CTCResult:
 
 # ==================== 统计信息相关 ====================
 
+@dataclass
+class SpeculativeStats:
+    """
+    投机解码统计
+
+    Attributes:
+        n_draft: 送去验证的草稿 token 数
+        n_accepted: 被接受的草稿 token 数
+        n_passes: 生成阶段的前向次数
+        n_tokens: 生成的 token 数
+    """
+    n_draft: int = 0
+    n_accepted: int = 0
+    n_passes: int = 0
+    n_tokens: int = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        """草稿接受率"""
+        return self.n_accepted / self.n_draft if self.n_draft else 0.0
+
+    @property
+    def tokens_per_pass(self) -> float:
+        """平均每次前向得到的 token 数"""
+        return self.n_tokens / self.n_passes if self.n_passes else 0.0
+
+    def __iadd__(self, other: 'SpeculativeStats') -> 'SpeculativeStats':
+        self.n_draft += other.n_draft
+        self.n_accepted += other.n_accepted
+        self.n_passes += other.n_passes
+        self.n_tokens += other.n_tokens
+        return self
+
+    def __str__(self) -> str:
+        return (
+            f"草稿接受率 {self.acceptance_rate:.1%} ({self.n_accepted}/{self.n_draft}), "
+            f"每次前向 {self.tokens_per_pass:.2f} tokens ({self.n_tokens}/{self.n_passes})"
+        )
+
+
 @dataclass
 class Statistics:
     """
@@ -242,6 +296,9 @@ class DecodeResult:
         n_gen: 生成 token 数
         timings: 各阶段耗时
         hotwords: 热词列表
+        is_aborted: 是否触发熔断
+        is_cancelled: 是否因任务取消而中止（此时不更新识别流结果）
+        speculative: 投机解码统计（未启用时全为 0）
     """
     text: str = ""
     ctc_results: List = field(default_factory=list)
@@ -253,6 +310,8 @@ class DecodeResult:
     timings: Timings = field(default_factory=Timings)
     hotwords: List[str] = field(default_factory=list)
     is_aborted: bool = False
+    is_cancelled: bool = False
+    speculative: SpeculativeStats = field(default_factory=SpeculativeStats)
 
 @dataclass
 class LLMDecodeResult:
@@ -265,12 +324,16 @@ class LLMDecodeResult:
         t_inject: 注入耗时
         t_gen: 生成耗时
         is_aborted: 是否触发熔断
+        is_cancelled: 是否因任务取消而中止
+        speculative: 投机解码统计（未启用时全为 0）
     """
     text: str = ""
     n_gen: int = 0
     t_inject: float = 0.0
     t_gen: float = 0.0
     is_aborted: bool = False
+    is_cancelled: bool = False
+    speculative: SpeculativeStats = field(default_factory=SpeculativeStats)
 
 
 # ==================== 导出列表 ====================
@@ -294,4 +357,5 @@ __all__ = [
 
     # 统计
     'Statistics',
+    'SpeculativeStats',
 ]
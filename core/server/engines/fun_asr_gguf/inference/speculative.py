@@ -0,0 +1,105 @@
+"""
+CTC 草稿投机解码
+
+LLM 生成之前，CTC 贪婪解码已经给出一份基本正确的转录（缺少标点，偶有错字）。
+投机模式把它当作草稿：每次前向把「当前 token + 随后的若干草稿 token」放进同一个批次，
+逐位采样验证，接受与草稿一致的最长前缀，在第一个不一致处改用模型自己的采样结果，
+并丢弃其后草稿的 KV。每个位置仍按模型的条件分布采样，输出分布与逐 token 生成相同，
+只是减少了前向次数。
+
+模型插入标点、纠正错字后，草稿游标按已生成的文字重新对齐，随后继续从 CTC 文本起草。
+"""
+
+import re
+from typing import Callable, List
+
+# 模型会插入、CTC 草稿中没有的字符（标点与空白）
+_INSERTED = re.compile(r'[\s，。？！、；：,.?!;:"\'“”‘’（）()《》…\-]')
+
+
+class CTCDraft:
+    """
+    以 CTC 识别文本为草稿的 token 提议器
+
+    Args:
+        text: CTC 识别文本
+        tokenize: LLM 分词函数（文本 → token ID 列表）
+        lookahead: 重新对齐时，在游标前方查找当前字符的范围
+    """
+
+    def __init__(self, text: str, tokenize: Callable[[str], List[int]], lookahead: int = 3):
+        self.text = re.sub(r'\s+', ' ', text.replace('▁', ' ')).strip()
+        self.tokenize = tokenize
+        self.lookahead = lookahead
+        self.cursor = 0
+
+    def advance(self, piece: str) -> None:
+        """按模型已生成的文字推进草稿游标"""
+        text = self.text
+        for ch in piece:
+            if self.cursor >= len(text):
+                return
+            c = ch.lower()
+            if c == text[self.cursor].lower():
+                self.cursor += 1
+            elif not _INSERTED.match(ch):
+                # 在游标前方几个字符内找到：CTC 多出了字符，跳过它们；否则视为模型纠正的错字
+                k = text[self.cursor:self.cursor + self.lookahead + 1].lower().find(c)
+                self.cursor += k + 1 if k >= 0 else 1
+
+    def propose(self, n_tokens: int) -> List[int]:
+        """从游标处起草至多 n_tokens 个 token，草稿用尽时返回空列表"""
+        if n_tokens <= 0 or self.cursor >= len(self.text):
+            return []
+        # 一个 token 通常不超过 4 个字符；截断处的最后一个 token 可能只是半个词，不作提议
+        end = self.cursor + n_tokens * 4
+        tokens = self.tokenize(self.text[self.cursor:end])
+        if end < len(self.text) and len(tokens) > 1:
+            tokens = tokens[:-1]
+        return tokens[:n_tokens]
+
+
+if __name__ == '__main__':
+    # 投机解码基准：python -m core.server.engines.fun_asr_gguf.inference.speculative <音频文件> [时长秒数]
+    import sys
+    import time
+    from config_server import FunASRNanoGGUFArgs as Args
+    from .schema import ASREngineConfig, SpeculativeStats
+    from .models import Models
+    from .pipeline import InferencePipeline
+    from .audio import load_audio
+
+    print('-------------CTC 草稿投机解码基准---------------')
+    if len(sys.argv) < 2:
+        sys.exit('用法: python -m core.server.engines.fun_asr_gguf.inference.speculative <音频文件> [时长秒数]')
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 30.0
+    audio = load_audio(sys.argv[1], duration=seconds)
+    audio_seconds = len(audio) / 16000
+
+    cfg = {k: v for k, v in Args.__dict__.items() if not k.startswith('_')}
+    cfg.update(verbose=False)
+    pipeline = InferencePipeline(Models(ASREngineConfig(**cfg)))
+    config = pipeline.models.config
+
+    def run(speculative: bool, repeat: int = 3):
+        config.speculative = speculative
+        stats, t_gen, t_total, text = SpeculativeStats(), 0.0, 0.0, ''
+        for _ in range(repeat):
+            stream = pipeline.create_stream()
+            stream.accept_waveform(16000, audio)
+            t0 = time.perf_counter()
+            res = pipeline.decode_stream(stream, verbose=False, temperature=0.0)
+            t_total += time.perf_counter() - t0
+            t_gen += res.timings.llm_generate
+            stats += res.speculative
+            text = res.text
+        return stats, t_gen / repeat, t_total / repeat, text
+
+    run(False, repeat=1)    # 预热
+    for speculative in (False, True):
+        stats, t_gen, t_total, text = run(speculative)
+        print(
+            f'  投机{"开" if speculative else "关"}: 生成 {t_gen:.2f}s, 端到端 {t_total:.2f}s, '
+            f'RTF {t_total / audio_seconds:.3f}, {stats}'
+        )
+    print(f'  结果: {text[:60]}')
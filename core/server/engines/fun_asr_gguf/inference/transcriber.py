@@ -57,7 +57,7 @@ class AudioTranscriber:
                 base_offset, temperature=temperature, top_p=top_p, top_k=top_k
             )
 
-            self._print_stats(reporter, result)
+            self._print_stats(reporter, result, audio_duration)
 
             # 3. Export SRT
             if srt and result.segments:
@@ -115,6 +115,7 @@ class AudioTranscriber:
             
             # Accumulate timings
             result.timings += d_res.timings
+            result.speculative += d_res.speculative
 
         # 结果收尾与合并
         if len(segments_info) > 1:
@@ -155,10 +156,15 @@ class AudioTranscriber:
         reporter.print(f"处理音频: {os.path.basename(audio_path)}", force=True)
         reporter.print(f"{line}", force=True)
 
-    def _print_stats(self, reporter, result):
+    def _print_stats(self, reporter, result, audio_duration):
         reporter.print(f"\n[转录耗时]")
         reporter.print(f"  - 音频编码： {result.timings.encode*1000:5.0f}ms")
         reporter.print(f"  - CTC解码：  {result.timings.ctc*1000:5.0f}ms")
         reporter.print(f"  - LLM读取：  {result.timings.inject*1000:5.0f}ms")
         reporter.print(f"  - LLM生成：  {result.timings.llm_generate*1000:5.0f}ms")
-        reporter.print(f"  - 总耗时：   {result.timings.total:5.2f}s\n")
+        reporter.print(f"  - 总耗时：   {result.timings.total:5.2f}s")
+        if audio_duration > 0:
+            reporter.print(f"  - RTF：      {result.timings.total / audio_duration:5.3f}")
+        if result.speculative.n_draft:
+            reporter.print(f"  - 投机解码： {result.speculative}")
+        reporter.print("")
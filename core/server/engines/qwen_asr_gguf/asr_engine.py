@@ -1,10 +1,10 @@
 # coding=utf-8
 import os
 import numpy as np
-from typing import Optional, List
+from typing import Any, Callable, Dict, Optional, List
 from .inference.asr import QwenASREngine as QwenInternalEngine
 from .inference.schema import ASREngineConfig, MsgType, StreamingMessage
-from ..base import BaseASREngine, RecognitionStream, EngineCapabilities, RecognitionResult
+from ..base import BaseASREngine, RecognitionStream, EngineCapabilities, RecognitionResult, TaskCancelled
 from ..language import get_language, ENGINE_QWEN_ASR
 
 
@@ -22,6 +22,9 @@ class QwenASRStream(RecognitionStream):
 class QwenASREngine(BaseASREngine):
     """Qwen-ASR 推理引擎适配器，实现与 FunASREngine 类似的接口"""
 
+    N_BATCH = 4096          # 内部 LLM 上下文的 n_batch，批量预填充的 token 总数上限
+    GEN_RESERVE = 128       # 批量解码时为每个序列预留的生成 KV 位置数（不足时该序列回退为逐条解码）
+
     def __init__(self, config: ASREngineConfig):
         super().__init__(config)
         self.engine = QwenInternalEngine(config)
@@ -29,10 +32,17 @@ class QwenASREngine(BaseASREngine):
     @property
     def capabilities(self) -> List[EngineCapabilities]:
         """声明具备的能力"""
-        return [
+        caps = [
             EngineCapabilities.ASR, 
             EngineCapabilities.PUNC
         ]
+        if self.max_batch_size > 1:
+            caps.append(EngineCapabilities.BATCHING)
+        return caps
+
+    @property
+    def max_batch_size(self) -> int:
+        return max(1, self.config.n_seq_max)
 
     def create_stream(self, hotwords: Optional[str] = None) -> QwenASRStream:
         """创建识别流"""
@@ -44,13 +54,105 @@ class QwenASREngine(BaseASREngine):
         context: Optional[str] = None,
         language: Optional[str] = None,
         temperature: float = 0.4,
+        on_partial: Optional[Callable[[str], None]] = None,
+        cancel=None,
         **kwargs
     ):
         """
         解码识别流
+
+        on_partial: 解码过程中的中间结果回调，参数为当前已稳定的文本
+        cancel: 取消标志（提供 is_set()），置位后中止解码并抛出 TaskCancelled
+        """
+        full_embd = self._prepare(stream, context, language, cancel)
+        if full_embd is not None:
+            self._decode_one(stream, full_embd, temperature, on_partial, cancel)
+
+    def _decode_one(self, stream: QwenASRStream, full_embd: np.ndarray, temperature: float = 0.4,
+                    on_partial: Optional[Callable[[str], None]] = None, cancel=None):
+        """单序列解码（保留前缀 KV 复用）并更新识别流"""
+        res = self.engine._safe_decode(
+            full_embd, 
+            prefix_text="", 
+            rollback_num=5, 
+            is_last_chunk=True, 
+            temperature=temperature, 
+            streaming=False, 
+            on_partial=on_partial,
+            cancel=cancel,
+        )
+        if res.is_cancelled:
+            raise TaskCancelled("解码中任务已取消")
+
+        stream.result.text = res.text
+        # Qwen 纯 ASR 模式下暂不支持 token 级时间戳，由 server_recognize 自动补齐
+
+    def decode_streams(self, streams: List[QwenASRStream], requests: List[Dict[str, Any]]) -> List[Optional[TaskCancelled]]:
+        """
+        批量解码多个识别流：逐个编码音频，LLM 部分按上下文容量分组，每组一次多序列解码
+
+        单个识别流成组时按单序列解码（保留前缀 KV 复用）。
         """
+        errors: List[Optional[TaskCancelled]] = [None] * len(streams)
+        prepared = []
+        for i, (stream, kwargs) in enumerate(zip(streams, requests)):
+            try:
+                full_embd = self._prepare(stream, kwargs.get('context'), kwargs.get('language'), kwargs.get('cancel'))
+            except TaskCancelled as e:
+                errors[i] = e
+                continue
+            if full_embd is not None:
+                prepared.append((i, full_embd))
+
+        for group in self._pack(prepared):
+            if len(group) == 1:
+                i, full_embd = group[0]
+                kwargs = requests[i]
+                try:
+                    self._decode_one(
+                        streams[i], full_embd, kwargs.get('temperature', 0.4),
+                        kwargs.get('on_partial'), kwargs.get('cancel')
+                    )
+                except TaskCancelled as e:
+                    errors[i] = e
+                continue
+            idx = [i for i, _ in group]
+            results = self.engine._safe_decode_batch(
+                [embd for _, embd in group],
+                rollback_num=5,
+                is_last_chunk=True,
+                temperature=requests[idx[0]].get('temperature', 0.4),
+                on_partials=[requests[i].get('on_partial') for i in idx],
+                cancels=[requests[i].get('cancel') for i in idx],
+            )
+            for i, res in zip(idx, results):
+                if res.is_cancelled:
+                    errors[i] = TaskCancelled("解码中任务已取消")
+                else:
+                    streams[i].result.text = res.text
+        return errors
+
+    def _pack(self, prepared: list) -> List[list]:
+        """按序列数、n_batch 与 n_ctx 把待解码序列分组（保持原顺序）"""
+        groups, group, n_input, n_kv = [], [], 0, 0
+        for item in prepared:
+            n = item[1].shape[0]
+            if group and (len(group) >= self.max_batch_size
+                          or n_input + n > self.N_BATCH
+                          or n_kv + n + self.GEN_RESERVE > self.config.n_ctx):
+                groups.append(group)
+                group, n_input, n_kv = [], 0, 0
+            group.append(item)
+            n_input += n
+            n_kv += n + self.GEN_RESERVE
+        if group:
+            groups.append(group)
+        return groups
+
+    def _prepare(self, stream: QwenASRStream, context: Optional[str], language: Optional[str], cancel=None) -> Optional[np.ndarray]:
+        """编码音频并构造 LLM 输入 Embedding，没有音频时返回 None"""
         if stream.audio_data is None:
-            return
+            return None
 
         sr = 16000
         audio_data = stream.audio_data
@@ -62,30 +164,18 @@ class QwenASREngine(BaseASREngine):
 
         # 1. 提交编码任务（同步调用）
         audio_embd, enc_time = self.engine.encoder.encode(audio_data)
+        if cancel is not None and cancel.is_set():
+            raise TaskCancelled("编码后任务已取消")
         
         # 3. 构造 Prompt 并解码（语言映射：统一代码 → Qwen3 英文明称）
         mapped_lang = get_language(ENGINE_QWEN_ASR, language) if language else None
-        full_embd = self.engine._build_prompt_embd(
+        return self.engine._build_prompt_embd(
             audio_embd=audio_embd,
             prefix_text="", # 这里的 prefix_text 是 Assistant 已说的内容，流式分段时通常为空或使用 context
             context=context,
             language=mapped_lang
         )
 
-        # 4. 执行解码
-        res = self.engine._safe_decode(
-            full_embd, 
-            prefix_text="", 
-            rollback_num=5, 
-            is_last_chunk=True, 
-            temperature=temperature, 
-            streaming=False, 
-        )
-
-        # 5. 更新结果
-        stream.result.text = res.text
-        # Qwen 纯 ASR 模式下暂不支持 token 级时间戳，由 server_recognize 自动补齐
-
     def update_hotwords(self, hotwords: List[str]):
         """Qwen 暂不支持热词动态更新"""
         pass
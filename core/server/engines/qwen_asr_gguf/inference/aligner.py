@@ -238,6 +238,7 @@ class QwenForcedAligner:
         self.model = llama.LlamaModel(llm_gguf, n_gpu_layers=-1, use_gpu=config.llm_use_gpu)
         self.embedding_table = llama.get_token_embeddings_gguf(llm_gguf)
         self.ctx = llama.LlamaContext(self.model, n_ctx=config.n_ctx, n_batch=2048, embeddings=False)
+        self.batch_pool = llama.LlamaBatchPool(config.n_ctx)  # 批次复用，容量与上下文一致
         
         self.processor = AlignerProcessor()
         self.ID_AUDIO_START = self.model.token_to_id("<|audio_start|>")
@@ -294,7 +295,7 @@ class QwenForcedAligner:
         t_dec_start = time.time()
         pos_base = np.arange(n_total, dtype=np.int32)
         pos_arr = np.concatenate([pos_base, pos_base, pos_base, np.zeros(n_total, dtype=np.int32)])
-        batch = llama.LlamaBatch(n_total * 4, embd_dim=1024)
+        batch = self.batch_pool.get(n_total, self.model.n_embd, pos_planes=4)
         batch.set_embd(full_embd, pos=pos_arr)
         for idx in ts_positions: batch.logits[idx] = 1 # 只计算 timestamp 处的 logits 以提速
         
@@ -2,17 +2,18 @@
 import os
 import time
 import re
-import codecs
 import dataclasses
 import numpy as np
 import multiprocessing as mp
 from pathlib import Path
 from collections import deque
-from typing import Optional, List
+from typing import Callable, Optional, List
 
 from .schema import MsgType, StreamingMessage, DecodeResult, ASREngineConfig, TranscribeResult, ForcedAlignItem, ForcedAlignResult
 from .utils import normalize_language_name, validate_language
 from .encoder import QwenAudioEncoder
+from .kv_cache import PromptKVCache
+from .asr_worker import HelperThread, do_encode_task, do_align_task
 from . import llama
 
 @dataclasses.dataclass
@@ -24,8 +25,58 @@ class ASRS_Segment:
     text: str = ""
     items: List[ForcedAlignItem] = None   
 
+
+class _RollbackText:
+    """
+    单条生成序列的回滚显示状态（单序列与多序列批量解码共用）
+
+    最近 rollback_num 个 token 暂存在显示队列中，之后才转为稳定文本；
+    稳定 token 的最近 15 个中只有不超过 3 种时判定为重复循环。
+    """
+
+    def __init__(self, model, rollback_num: int, streaming: bool = False,
+                 on_partial: Optional[Callable[[str], None]] = None):
+        self.model = model
+        self.rollback_num = rollback_num
+        self.streaming = streaming
+        self.on_partial = on_partial
+        self.display_queue = deque()
+        self.stable_tokens = []
+        self.text = ""
+        self._decoder = llama.TokenTextDecoder(model.vocab_bytes)
+        self._recent = llama.RepeatWindow(15)
+
+    def _emit(self, token: int) -> str:
+        self.stable_tokens.append(token)
+        self._recent.push(token)
+        piece = self._decoder.decode(token)
+        if piece:
+            if self.streaming: print(re.sub(r'([，。？！：,\.])', r'\1\n', piece), end='', flush=True)
+            self.text += piece
+        return piece
+
+    def push(self, token: int) -> bool:
+        """推入一个已解码的 token，返回是否检测到重复循环（需熔断）"""
+        self.display_queue.append(token)
+        if len(self.display_queue) > self.rollback_num:
+            if self._emit(self.display_queue.popleft()) and self.on_partial:
+                self.on_partial(self.text)
+        return len(self.stable_tokens) > 15 and self._recent.distinct <= 3
+
+    def flush(self) -> None:
+        """最后一片：把显示队列中的 token 全部转为稳定文本"""
+        while self.display_queue:
+            self._emit(self.display_queue.popleft())
+        final_p = self._decoder.flush()
+        if final_p:
+            if self.streaming: print(final_p, end='', flush=True)
+            self.text += final_p
+
+
 class QwenASREngine:
-    """Qwen3-ASR 流式转录引擎 (GGUF 后端) - 统一辅助进程架构"""
+    """Qwen3-ASR 流式转录引擎 (GGUF 后端) - 编码/对齐辅助线程流水线"""
+    PREFETCH = 2    # 流水线模式下编码预取、对齐积压的最大片段数
+
     def __init__(self, config: ASREngineConfig):
         self.config = config
         self.verbose = config.verbose
@@ -53,8 +104,17 @@ class QwenASREngine:
         
         # 3. 加载识别 LLM
         self.model = llama.LlamaModel(llm_gguf, use_gpu=config.llm_use_gpu)
-        self.embedding_table = llama.get_token_embeddings_gguf(llm_gguf)
-        self.ctx = llama.LlamaContext(self.model, n_ctx=config.n_ctx, n_batch=4096, embeddings=False)
+        self.embedding_table = llama.get_token_embeddings_gguf(
+            llm_gguf, cache_mb=config.embd_cache_mb, fp16_table=config.embd_fp16_table
+        )
+        self.model.vocab_bytes  # 预先构建（或读取缓存）词表字节表，避免首个请求承担
+        # 多序列批量解码时各序列共用一块 KV 缓存（单序列解码不受影响）
+        self.ctx = llama.LlamaContext(
+            self.model, n_ctx=config.n_ctx, n_batch=4096, n_seq_max=config.n_seq_max,
+            kv_unified=True, embeddings=False
+        )
+        self.kv_cache = PromptKVCache(self.ctx, enabled=config.kv_reuse)
+        self.batch_pool = llama.LlamaBatchPool(config.n_ctx)  # 预填充批次复用，容量与上下文一致
 
         # 缓存 Token ID
         self.ID_IM_START = self.model.token_to_id("<|im_start|>")
@@ -100,29 +160,51 @@ class QwenASREngine:
         is_last_chunk: bool = False, 
         temperature: float = 0.4, 
         streaming: bool = True, 
+        on_partial: Optional[Callable[[str], None]] = None,
+        cancel=None,
     ) -> DecodeResult:
-        """底层方法：执行单次 LLM 生成循环（物理推理）"""
+        """底层方法：执行单次 LLM 生成循环（物理推理）
+
+        on_partial: 每当有新的稳定文字时，以当前累计的稳定文本回调
+        cancel: 取消标志（提供 is_set()），置位后中止预填充与生成，结果标记 is_cancelled
+        """
         result = DecodeResult()
         
+        # 1. Prefill：与上次请求相同的前缀（system/context、重复的音频记忆）直接复用 KV，
+        #    只从第一个不同的位置开始预填充（挂载中止标志，长 prompt 可在计算图节点之间中止）
         total_len = full_embd.shape[0]
-        pos_base = np.arange(0, total_len, dtype=np.int32)
-        pos_arr = np.concatenate([pos_base, pos_base, pos_base, np.zeros(total_len, dtype=np.int32)])
-        batch = llama.LlamaBatch(max(total_len * 4, 8192), self.model.n_embd, 1)
-        batch.set_embd(full_embd, pos=pos_arr)
+        n_keep = self.kv_cache.prepare(full_embd)
+        n_new = total_len - n_keep
+        pos_base = np.arange(n_keep, total_len, dtype=np.int32)
+        pos_arr = np.concatenate([pos_base, pos_base, pos_base, np.zeros(n_new, dtype=np.int32)])
+        batch = self.batch_pool.get(n_new, self.model.n_embd, pos_planes=4)
+        batch.set_embd(full_embd[n_keep:], pos=pos_arr)
         
-        # 1. Prefill
-        self.ctx.clear_kv_cache()
         t_pre_start = time.time()
-        self.ctx.decode(batch)
+        if cancel is not None:
+            self.ctx.abortable(cancel)
+        try:
+            ret = self.ctx.decode(batch)
+        finally:
+            if cancel is not None:
+                self.ctx.abortable(None)
         prefill_time = time.time() - t_pre_start
-        
+        if ret != 0:
+            self.kv_cache.invalidate()
+        else:
+            self.kv_cache.commit(full_embd)
+        if cancel is not None and cancel.is_set():
+            result.is_cancelled = True
+            result.t_prefill = prefill_time
+            return result
+        if ret != 0:
+            # 预填充失败时 logits 无效，不能进入采样
+            raise RuntimeError(f"Prefill decode failed (ret={ret})")
+
         # 2. Generation Loop（使用新采样器和随机种子）
         t_gen_start = time.time()
         n_gen_tokens = 0
-        display_queue = deque()
-        stable_tokens = []
-        stable_text_acc = ""
-        text_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        text = _RollbackText(self.model, rollback_num, streaming, on_partial)
         
         # 每次解码使用新的随机种子
         seed = int(np.random.randint(0, 2**31 - 1))
@@ -131,24 +213,20 @@ class QwenASREngine:
         for _ in range(512): # Max new tokens per chunk
             if last_sampled_token in [self.model.eos_token, self.ID_IM_END]:
                 break
+
+            # 生成阶段逐 token 检查取消（单 token 计算图很短，不挂中止回调）
+            if cancel is not None and cancel.is_set():
+                result.is_cancelled = True
+                break
             
             if self.ctx.decode_token(last_sampled_token) != 0:
-                    break
-            
-            display_queue.append(last_sampled_token)
-            if len(display_queue) > rollback_num:
-                ready_token = display_queue.popleft()
-                stable_tokens.append(ready_token)
-                piece = text_decoder.decode(self.model.token_to_bytes(ready_token))
-                if piece:
-                    if streaming: print(re.sub(r'([，。？！：,\.])', r'\1\n', piece), end='', flush=True)
-                    stable_text_acc += piece
+                self.kv_cache.invalidate()
+                break
             
             # 熔断检查：检测重复循环
-            if len(stable_tokens) > 15:
-                if len(set(stable_tokens[-15:])) <= 3:
-                    result.is_aborted = True
-                    break
+            if text.push(last_sampled_token):
+                result.is_aborted = True
+                break
             
             last_sampled_token = sampler.sample(self.ctx.ptr)
             n_gen_tokens += 1
@@ -157,26 +235,16 @@ class QwenASREngine:
         del sampler  # 释放采样器资源
         del batch
             
-        if is_last_chunk and not result.is_aborted:
-            while display_queue:
-                t = display_queue.popleft()
-                stable_tokens.append(t)
-                piece = text_decoder.decode(self.model.token_to_bytes(t))
-                if piece:
-                    if streaming: print(re.sub(r'([，。？！：,\.])', r'\1\n', piece), end="", flush=True)
-                    stable_text_acc += piece
-            final_p = text_decoder.decode(b"", final=True)
-            if final_p: 
-                if streaming: print(final_p, end='', flush=True)
-                stable_text_acc += final_p
+        if is_last_chunk and not result.is_aborted and not result.is_cancelled:
+            text.flush()
         
         # 填充结果（内核输出标准化）
-        result.text = stable_text_acc
-        result.stable_tokens = stable_tokens
+        result.text = text.text
+        result.stable_tokens = text.stable_tokens
         result.t_prefill = prefill_time
         result.t_generate = gen_time
-        result.n_prefill = total_len
-        result.n_generate = n_gen_tokens
+        result.n_prefill = n_new
+        result.n_reused = n_keep
         result.n_generate = n_gen_tokens
         return result
 
@@ -188,17 +256,176 @@ class QwenASREngine:
         is_last_chunk: bool, 
         temperature: float, 
         streaming: bool = True, 
+        on_partial: Optional[Callable[[str], None]] = None,
+        cancel=None,
     ) -> DecodeResult:
-        """带熔断加温重试的高层推理封装"""
+        """带熔断加温重试的高层推理封装（任务取消时不再重试）
+
+        重试时输入序列不变，提示词与音频的 KV 全部复用，只回滚已生成的 token。
+        """
         for i in range(4):
-            res = self._decode(full_embd, prefix_text, rollback_num, is_last_chunk, temperature, streaming=streaming)
-            if not res.is_aborted:
+            res = self._decode(
+                full_embd, prefix_text, rollback_num, is_last_chunk, temperature,
+                streaming=streaming, on_partial=on_partial, cancel=cancel
+            )
+            if not res.is_aborted or res.is_cancelled:
                 break
             temperature += 0.3
             res.text += "====解码有误，强制熔断===="
             print(f"\n\n[!] 触发重试 (Temp -> {temperature:.1f})\n")
         return res 
 
+    def _decode_batch(
+        self,
+        full_embds: List[np.ndarray],
+        rollback_num: int,
+        is_last_chunk: bool = True,
+        temperature: float = 0.4,
+        on_partials: Optional[List[Optional[Callable[[str], None]]]] = None,
+        cancels: Optional[list] = None,
+    ) -> List[Optional[DecodeResult]]:
+        """底层方法：多个相互独立的输入序列在同一次 llama_decode 中预填充、逐步生成
+
+        第 i 个序列使用 seq_id = i，位置各自从 0 开始；每一步把所有未结束序列的
+        下一个 token 拼成一个批次解码，各序列独立采样、独立判断停止与熔断。
+        单条序列的取消只让该序列退出，不影响批次中的其它序列。
+
+        Returns:
+            与 full_embds 一一对应；预填充失败或生成中途 KV 空间不足时对应项为 None，
+            由调用方逐条重新解码
+        """
+        n_seqs = len(full_embds)
+        on_partials = on_partials or [None] * n_seqs
+        cancels = cancels or [None] * n_seqs
+        results: List[Optional[DecodeResult]] = [DecodeResult() for _ in range(n_seqs)]
+
+        # 1. Prefill：各序列拼成一个批次，只在每个序列的最后一个位置输出 logits
+        #    （批量解码会覆盖序列 0 的 KV，单序列前缀缓存随之失效）
+        self.kv_cache.invalidate()
+        lens = np.array([e.shape[0] for e in full_embds], dtype=np.int32)
+        n_total = int(lens.sum())
+        last_idx = np.cumsum(lens) - 1
+        pos_base = np.concatenate([np.arange(n, dtype=np.int32) for n in lens])
+        pos_arr = np.concatenate([pos_base, pos_base, pos_base, np.zeros(n_total, dtype=np.int32)])
+        seq_ids = np.repeat(np.arange(n_seqs, dtype=np.int32), lens)
+        batch = self.batch_pool.get(n_total, self.model.n_embd, pos_planes=4)
+        batch.set_embd(np.concatenate(full_embds, axis=0), pos=pos_arr, seq_id=seq_ids, logits=last_idx)
+
+        # 任一序列取消不应中止其它序列，批量预填充不挂中止回调
+        t_pre_start = time.time()
+        ret = self.ctx.decode(batch)
+        prefill_time = time.time() - t_pre_start
+        if ret != 0:
+            self.ctx.clear_kv_cache()
+            return [None] * n_seqs
+
+        # 2. Generation Loop：每个序列独立的采样器（各自的随机种子）与回滚显示状态
+        t_gen_start = time.time()
+        texts = [_RollbackText(self.model, rollback_num, False, cb) for cb in on_partials]
+        samplers = [
+            llama.LlamaSampler(temperature=temperature, seed=int(np.random.randint(0, 2**31 - 1)))
+            for _ in range(n_seqs)
+        ]
+        tokens = [samplers[i].sample(self.ctx.ptr, int(last_idx[i])) for i in range(n_seqs)]
+        n_past = lens.copy()
+        n_gen = [0] * n_seqs
+        t_done = [0.0] * n_seqs
+        stop_tokens = (self.model.eos_token, self.ID_IM_END)
+        step_batch = self.batch_pool.get(n_seqs, 0, pos_planes=4)
+
+        active = list(range(n_seqs))
+        for _ in range(512): # Max new tokens per chunk
+            # 结束（停止符 / 取消 / 熔断）的序列退出批次
+            running = []
+            for i in active:
+                if tokens[i] in stop_tokens:
+                    pass
+                elif cancels[i] is not None and cancels[i].is_set():
+                    results[i].is_cancelled = True
+                else:
+                    running.append(i)
+                    continue
+                t_done[i] = time.time()
+            active = running
+            if not active:
+                break
+
+            # 各序列的下一个 token 拼成一个批次，位置为各自已有长度
+            step_pos = n_past[active]
+            step_batch.set_tokens(
+                [tokens[i] for i in active],
+                pos=np.concatenate([step_pos, step_pos, step_pos, np.zeros(len(active), dtype=np.int32)]),
+                seq_id=np.array(active, dtype=np.int32),
+                logits_all=True,
+            )
+            if self.ctx.decode(step_batch) != 0:
+                # KV 空间不足：仍在生成的序列交由调用方逐条重解
+                for i in active:
+                    results[i] = None
+                active = []
+                break
+
+            running = []
+            for j, i in enumerate(active):
+                n_past[i] += 1
+                if texts[i].push(tokens[i]):
+                    results[i].is_aborted = True
+                    t_done[i] = time.time()
+                    continue
+                tokens[i] = samplers[i].sample(self.ctx.ptr, j)
+                n_gen[i] += 1
+                running.append(i)
+            active = running
+
+        for i in active:
+            t_done[i] = time.time()
+        for sampler in samplers:
+            sampler.free()
+        self.ctx.clear_kv_cache()
+
+        for i, result in enumerate(results):
+            if result is None:
+                continue
+            if is_last_chunk and not result.is_aborted and not result.is_cancelled:
+                texts[i].flush()
+            result.text = texts[i].text
+            result.stable_tokens = texts[i].stable_tokens
+            result.t_prefill = prefill_time
+            result.t_generate = t_done[i] - t_gen_start
+            result.n_prefill = int(lens[i])
+            result.n_generate = n_gen[i]
+        return results
+
+    def _safe_decode_batch(
+        self,
+        full_embds: List[np.ndarray],
+        rollback_num: int,
+        is_last_chunk: bool,
+        temperature: float,
+        on_partials: Optional[List[Optional[Callable[[str], None]]]] = None,
+        cancels: Optional[list] = None,
+    ) -> List[DecodeResult]:
+        """多序列批量解码的高层封装
+
+        批量解码未完成的序列以原温度逐条重解，触发熔断的序列加温后逐条重试。
+        """
+        n_seqs = len(full_embds)
+        on_partials = on_partials or [None] * n_seqs
+        cancels = cancels or [None] * n_seqs
+        results = self._decode_batch(full_embds, rollback_num, is_last_chunk, temperature, on_partials, cancels)
+        for i, res in enumerate(results):
+            if res is not None and (not res.is_aborted or res.is_cancelled):
+                continue
+            temp = temperature
+            if res is not None:
+                temp += 0.3
+                print(f"\n\n[!] 批量解码序列 {i} 触发重试 (Temp -> {temp:.1f})\n")
+            results[i] = self._safe_decode(
+                full_embds[i], "", rollback_num, is_last_chunk, temp,
+                streaming=False, on_partial=on_partials[i], cancel=cancels[i]
+            )
+        return results
+
     def _print_stats(self, stats: dict, audio_duration: float, t_total: float):
         """打印转录过程的性能统计指标"""
         rtf = t_total / audio_duration if audio_duration > 0 else 0
@@ -213,6 +440,8 @@ class QwenASREngine:
             print(f"  🔹 对齐耗时    : {stats['align_time']:.3f} 秒")
         print(f"  🔹 编码耗时    : {stats['encode_time']:.3f} 秒")
         print(f"  🔹 LLM 预填充  : {stats['prefill_time']:.3f} 秒 ({stats['prefill_tokens']} tokens, {pre_speed:.1f} tokens/s)")
+        if stats.get("reused_tokens"):
+            print(f"  🔹 KV 复用     : {stats['reused_tokens']} tokens")
         print(f"  🔹 LLM 生成    : {stats['decode_time']:.3f} 秒 ({stats['decode_tokens']} tokens, {gen_speed:.1f} tokens/s)")
 
     def transcribe(
@@ -247,9 +476,17 @@ class QwenASREngine:
         chunk_size_sec: float = 40.0,
         memory_chunks: int = 2,
         temperature: float = 0.4,
-        rollback_num: int = 5
+        rollback_num: int = 5,
+        pipelined: Optional[bool] = None
     ) -> TranscribeResult:
-        """运行完整转录流水线 (三级流水线：i+1 预取, i 识别, i-1 对齐)"""
+        """
+        运行完整转录流水线 (三级流水线：i+1 预取, i 识别, i-1 对齐)
+
+        pipelined: 编码与对齐是否在辅助线程中与 LLM 解码并行，None 时取配置 pipeline；
+                   否则三个阶段在当前线程中顺序执行，结果与流水线模式一致
+        """
+        if pipelined is None:
+            pipelined = self.config.pipeline
         # 语言归一化与校验
         if language:
             language = normalize_language_name(language)
@@ -276,56 +513,84 @@ class QwenASREngine:
         # 统计指标
         stats = {
             "prefill_time": 0.0, "decode_time": 0.0,
-            "prefill_tokens": 0, "decode_tokens": 0,
+            "prefill_tokens": 0, "decode_tokens": 0, "reused_tokens": 0,
             "encode_time": 0.0, "align_time": 0.0,
         }
         t_main_start = time.time()
 
-        # --- 顺序同步处理循环 ---
-        for i in range(num_chunks):
-            # 1. 编码第 i 片段
+        def encode_request(i: int) -> StreamingMessage:
             s, e = i * samples_per_chunk, min((i + 1) * samples_per_chunk, total_len)
             chunk_data = audio[s:e]
             if len(chunk_data) < samples_per_chunk: 
                 chunk_data = np.pad(chunk_data, (0, samples_per_chunk - len(chunk_data)))
-            
-            audio_feature, enc_time = self.encoder.encode(chunk_data)
-            stats["encode_time"] += enc_time
-            was_last = (i == num_chunks - 1)
-
-            # 2. 识别第 i 片段文字
-            prefix_text = "".join([m[1] for m in asr_memory])
-            combined_audio = np.concatenate([m[0] for m in asr_memory] + [audio_feature], axis=0)
-            full_embd = self._build_prompt_embd(combined_audio, prefix_text, context, language)
-            
-            # 带熔断加温重试的解码调用
-            res = self._safe_decode(full_embd, prefix_text, rollback_num, was_last, temperature)
+            return StreamingMessage(MsgType.CMD_ENCODE, data=chunk_data, idx=i, is_last=(i == num_chunks - 1))
 
-            # 更新记忆与统计
-            all_segments[i].text = res.text
-            asr_memory.append((audio_feature, res.text))
-            
-            total_full_text += res.text
-            stats["prefill_tokens"] += res.n_prefill; stats["prefill_time"] += res.t_prefill
-            stats["decode_tokens"] += res.n_generate; stats["decode_time"] += res.t_generate
-
-            # 3. 对齐第 i 片段 (同步)
-            if self.aligner and res.text.strip():
-                t_align_start = time.time()
-                # 计算偏移（同步版本逻辑简化：直接使用片起点，不考虑前片动态边界）
-                offset_sec = all_segments[i].audio_start
-                s_smpl, e_smpl = int(offset_sec * sr), int(all_segments[i].audio_end * sr)
-                audio_slice = audio[s_smpl:e_smpl]
+        def collect_alignment(msg: StreamingMessage):
+            all_segments[msg.idx].items = msg.data.items
+            all_aligned_items.extend(msg.data.items)
+            stats["align_time"] += msg.align_time
+
+        # 流水线模式下编码与对齐在辅助线程中进行，主线程只做 LLM 解码
+        encode_stage = align_stage = None
+        if pipelined:
+            encode_stage = HelperThread('qwen-asr-encode', lambda m: do_encode_task(m, self.encoder), self.PREFETCH)
+            for i in range(min(self.PREFETCH, num_chunks)):
+                encode_stage.submit(encode_request(i))
+            if self.aligner:
+                align_stage = HelperThread('qwen-asr-align', lambda m: do_align_task(m, self.aligner), self.PREFETCH)
+        n_align = 0
+
+        try:
+            for i in range(num_chunks):
+                # 1. 取得第 i 片段的编码（流水线模式下同时提交第 i+PREFETCH 片段）
+                if encode_stage:
+                    enc = encode_stage.receive()
+                    if i + self.PREFETCH < num_chunks:
+                        encode_stage.submit(encode_request(i + self.PREFETCH))
+                else:
+                    enc = do_encode_task(encode_request(i), self.encoder)
+                audio_feature = enc.data
+                stats["encode_time"] += enc.encode_time
+                was_last = enc.is_last
+
+                # 2. 识别第 i 片段文字
+                prefix_text = "".join([m[1] for m in asr_memory])
+                combined_audio = np.concatenate([m[0] for m in asr_memory] + [audio_feature], axis=0)
+                full_embd = self._build_prompt_embd(combined_audio, prefix_text, context, language)
+                
+                # 带熔断加温重试的解码调用
+                res = self._safe_decode(full_embd, prefix_text, rollback_num, was_last, temperature)
+
+                # 更新记忆与统计
+                all_segments[i].text = res.text
+                asr_memory.append((audio_feature, res.text))
                 
-                align_res = self.aligner.align(
-                    audio_slice, 
-                    res.text, 
-                    language=language, 
-                    offset_sec=float(offset_sec)
-                )
-                all_segments[i].items = align_res.items
-                all_aligned_items.extend(align_res.items)
-                stats["align_time"] += (time.time() - t_align_start)
+                total_full_text += res.text
+                stats["prefill_tokens"] += res.n_prefill; stats["prefill_time"] += res.t_prefill
+                stats["reused_tokens"] += res.n_reused
+                stats["decode_tokens"] += res.n_generate; stats["decode_time"] += res.t_generate
+
+                # 3. 对齐第 i 片段（流水线模式下与第 i+1 片段的解码并行）
+                if self.aligner and res.text.strip():
+                    # 计算偏移（直接使用片起点，不考虑前片动态边界）
+                    offset_sec = all_segments[i].audio_start
+                    s_smpl, e_smpl = int(offset_sec * sr), int(all_segments[i].audio_end * sr)
+                    request = StreamingMessage(
+                        MsgType.CMD_ALIGN, data=audio[s_smpl:e_smpl], text=res.text,
+                        offset_sec=float(offset_sec), language=language, idx=i, is_last=was_last,
+                    )
+                    if align_stage:
+                        align_stage.submit(request)
+                        n_align += 1
+                    else:
+                        collect_alignment(do_align_task(request, self.aligner))
+
+            for _ in range(n_align):
+                collect_alignment(align_stage.receive())
+        finally:
+            for stage in (encode_stage, align_stage):
+                if stage:
+                    stage.stop(discard=True)
 
         # 4. 结果整理
         all_aligned_items.sort(key=lambda x: x.start_time)
@@ -337,3 +602,41 @@ class QwenASREngine:
             alignment=ForcedAlignResult(items=all_aligned_items) if all_aligned_items else None,
             performance=stats
         )
+
+
+if __name__ == '__main__':
+    # 多序列批量解码基准：python -m core.server.engines.qwen_asr_gguf.inference.asr <音频文件>
+    import sys
+    from config_server import Qwen3ASRGGUFArgs as Args
+    from .audio import load_audio
+
+    print('-------------多序列批量解码基准 (CPU)---------------')
+    if len(sys.argv) < 2:
+        sys.exit('用法: python -m core.server.engines.qwen_asr_gguf.inference.asr <音频文件> [时长秒数]')
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    cfg = {k: v for k, v in Args.__dict__.items() if not k.startswith('_')}
+    cfg.update(onnx_provider='CPU', llm_use_gpu=False, kv_reuse=False, n_ctx=8192, n_seq_max=8, verbose=False)
+    engine = QwenASREngine(ASREngineConfig(**cfg))
+
+    audio = load_audio(sys.argv[1], duration=seconds)
+    audio_embd, _ = engine.encoder.encode(audio)
+    full_embd = engine._build_prompt_embd(audio_embd, "", None, None)
+    print(f'音频 {seconds:.1f}s，每个序列输入 {full_embd.shape[0]} tokens')
+    engine._decode(full_embd, "", 5, True, streaming=False)    # 预热
+
+    for n in (1, 2, 4, 8):
+        t0 = time.time()
+        if n == 1:
+            results = [engine._decode(full_embd, "", 5, True, streaming=False)]
+        else:
+            results = engine._decode_batch([full_embd] * n, 5, True)
+        wall = time.time() - t0
+        done = [r for r in results if r is not None]
+        n_gen = sum(r.n_generate for r in done)
+        latency = [r.t_prefill + r.t_generate for r in done]
+        print(
+            f'  {n} 序列: 生成 {n_gen:4d} tokens, 吞吐 {n_gen / wall:6.1f} tokens/s, '
+            f'单请求时延 平均 {np.mean(latency):.2f}s / 最大 {max(latency):.2f}s'
+            + (f', {n - len(done)} 个序列未完成' if len(done) < n else '')
+        )
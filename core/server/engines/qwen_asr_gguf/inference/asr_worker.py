@@ -1,84 +1,134 @@
 # coding=utf-8
-import os
-from .. import logger
-from .schema import MsgType, StreamingMessage, ASREngineConfig
-from .encoder import QwenAudioEncoder
-from .aligner import QwenForcedAligner
+"""
+asr_worker.py - 长音频转录流水线的辅助线程
 
-def do_encode_task(msg, encoder, from_enc_q):
+编码与对齐各占一个后台线程，与主线程的 LLM 解码并行：第 i 片段解码时，
+Encoder 预取第 i+1 片段，Aligner 对齐第 i-1 片段。ONNX Runtime 与 llama.cpp
+推理期间释放 GIL，Encoder、Aligner 与识别 LLM 各自持有独立的会话与上下文。
+
+主线程与辅助线程之间以 StreamingMessage 通信，请求队列有界，限制预取与积压的片段数。
+"""
+import queue
+import threading
+import time
+from typing import Callable
+
+from .schema import MsgType, StreamingMessage
+
+
+def do_encode_task(msg: StreamingMessage, encoder) -> StreamingMessage:
     """处理音频编码任务"""
-    audio_embd, encode_time, = encoder.encode(msg.data)
-    from_enc_q.put(StreamingMessage(
-        msg_type=MsgType.MSG_EMBD, 
-        data=audio_embd, 
-        is_last=msg.is_last, 
+    audio_embd, encode_time = encoder.encode(msg.data)
+    return StreamingMessage(
+        msg_type=MsgType.MSG_EMBD,
+        data=audio_embd,
+        idx=msg.idx,
+        is_last=msg.is_last,
         encode_time=encode_time,
-    ))
+    )
+
 
-def do_align_task(msg, aligner, from_align_q):
+def do_align_task(msg: StreamingMessage, aligner) -> StreamingMessage:
     """处理时间戳对齐任务"""
-    if aligner is None:
-        from_align_q.put(StreamingMessage(MsgType.MSG_ALIGN, data=None))
-        return
-
-    try:
-        res = aligner.align(
-            msg.data, 
-            msg.text, 
-            language=msg.language, 
-            offset_sec=msg.offset_sec
+    t0 = time.time()
+    res = aligner.align(
+        msg.data,
+        msg.text,
+        language=msg.language,
+        offset_sec=msg.offset_sec
+    )
+    return StreamingMessage(
+        msg_type=MsgType.MSG_ALIGN,
+        data=res,
+        idx=msg.idx,
+        is_last=msg.is_last,
+        align_time=time.time() - t0,
+    )
+
+
+class HelperThread:
+    """
+    流水线的一个阶段：后台线程按提交顺序逐条处理请求
+
+    Args:
+        name: 线程名
+        handler: 处理函数，接收请求消息并返回结果消息
+        depth: 请求队列容量，队列满时 submit 阻塞
+    """
+
+    def __init__(self, name: str, handler: Callable[[StreamingMessage], StreamingMessage], depth: int = 2):
+        self.handler = handler
+        self.in_q = queue.Queue(maxsize=depth)
+        self.out_q = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            msg: StreamingMessage = self.in_q.get()
+            if msg.msg_type == MsgType.CMD_STOP:
+                self.out_q.put(StreamingMessage(MsgType.MSG_DONE))
+                break
+            try:
+                reply = self.handler(msg)
+            except Exception as e:
+                reply = StreamingMessage(MsgType.MSG_ERROR, data=e, idx=msg.idx)
+            self.out_q.put(reply)
+
+    def submit(self, msg: StreamingMessage) -> None:
+        self.in_q.put(msg)
+
+    def receive(self) -> StreamingMessage:
+        """取下一条结果，阶段内出错时在调用方重新抛出"""
+        msg = self.out_q.get()
+        if msg.msg_type == MsgType.MSG_ERROR:
+            raise msg.data
+        return msg
+
+    def stop(self, discard: bool = False) -> None:
+        """停止线程；discard=True 时丢弃尚未开始的请求（出错退出时使用）"""
+        if discard:
+            try:
+                while True:
+                    self.in_q.get_nowait()
+            except queue.Empty:
+                pass
+        self.in_q.put(StreamingMessage(MsgType.CMD_STOP))
+        self.thread.join()
+
+
+if __name__ == '__main__':
+    # 长音频流水线基准：python -m core.server.engines.qwen_asr_gguf.inference.asr_worker <音频文件> [时长秒数]
+    import sys
+    from config_server import Qwen3ASRGGUFArgs as Args
+    from .asr import QwenASREngine
+    from .audio import load_audio
+    from .schema import ASREngineConfig
+
+    print('-------------长音频转录流水线基准 (CPU)---------------')
+    if len(sys.argv) < 2:
+        sys.exit('用法: python -m core.server.engines.qwen_asr_gguf.inference.asr_worker <音频文件> [时长秒数]')
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 1800.0
+
+    cfg = {k: v for k, v in Args.__dict__.items() if not k.startswith('_')}
+    # 音频每秒 13 个 token：80 秒分段连同 1 段记忆超过 2048 的上下文，基准按 40 秒分段
+    cfg.update(onnx_provider='CPU', llm_use_gpu=False, enable_aligner=True, chunk_size=40.0, verbose=False)
+    engine = QwenASREngine(ASREngineConfig(**cfg))
+
+    audio = load_audio(sys.argv[1], duration=seconds)
+    duration = len(audio) / 16000
+    print(f'音频 {duration:.1f}s，分段 {engine.config.chunk_size:.0f}s，记忆 {engine.config.memory_num} 段')
+    for pipelined in (False, True):
+        t0 = time.time()
+        res = engine.asr(
+            audio, context="", language=None,
+            chunk_size_sec=engine.config.chunk_size, memory_chunks=engine.config.memory_num,
+            temperature=0.0, pipelined=pipelined,
         )
-        from_align_q.put(StreamingMessage(
-            msg_type=MsgType.MSG_ALIGN, 
-            data=res, 
-            is_last=msg.is_last
-        ))
-    except Exception as e:
-        print(f"[ASRWorker] 对齐出错: {e}")
-        from_align_q.put(StreamingMessage(MsgType.MSG_ALIGN, data=None))
-
-def asr_helper_worker_proc(to_worker_q, from_enc_q, from_align_q, config: ASREngineConfig):
-    """ASR 辅助进程：同步处理任务，但分流结果回复 (一进两出架构)"""
-    
-    # 1. 资源初始化
-    try:
-        # Split Model Paths
-        frontend_path = os.path.join(config.model_dir, config.encoder_frontend_fn)
-        backend_path = os.path.join(config.model_dir, config.encoder_backend_fn)
-        
-        # 初始化 Split Encoder
-        encoder = QwenAudioEncoder(
-            frontend_path=frontend_path,
-            backend_path=backend_path,
-            use_dml=config.use_dml,
-            pad_to=config.pad_to,
-            verbose=config.verbose
+        wall = time.time() - t0
+        perf = res.performance
+        print(
+            f'  {"流水线" if pipelined else "顺序执行"}: 总耗时 {wall:7.1f}s, RTF {wall / duration:.3f} '
+            f'(编码 {perf["encode_time"]:.1f}s, 对齐 {perf["align_time"]:.1f}s, '
+            f'生成 {perf["decode_time"]:.1f}s), {len(res.text)} 字'
         )
-        
-        aligner = None
-        if config.enable_aligner and config.align_config:
-            from .aligner import QwenForcedAligner
-            aligner = QwenForcedAligner(
-                config.align_config
-            )
-            
-        from_enc_q.put(StreamingMessage(MsgType.MSG_READY))
-    except Exception as e:
-        logger.error(f"[ASRWorker] 模型加载出错：\n{e}")
-        from_enc_q.put(StreamingMessage(MsgType.MSG_ERROR, data=e))
-        return
-
-    # 2. 统一任务循环
-    while True:
-        msg: StreamingMessage = to_worker_q.get()
-        
-        if msg.msg_type == MsgType.CMD_STOP:
-            from_enc_q.put(StreamingMessage(MsgType.MSG_DONE))
-            from_align_q.put(StreamingMessage(MsgType.MSG_DONE))
-            break
-            
-        if msg.msg_type == MsgType.CMD_ENCODE:
-            do_encode_task(msg, encoder, from_enc_q)
-            
-        elif msg.msg_type == MsgType.CMD_ALIGN:
-            do_align_task(msg, aligner, from_align_q)
@@ -0,0 +1,85 @@
+# coding=utf-8
+"""
+提示词前缀 KV 缓存复用
+
+每次解码的输入序列为：
+    [system + user 头] + [音频] + [assistant 头 + 已识别前缀文本]
+其中 system/context 前缀在各次请求之间通常完全相同，
+分片转录时上一片的音频记忆也会原样出现在下一次请求中。
+
+PromptKVCache 记录上下文中已驻留的输入 Embedding（序列 0），
+新请求只需从第一个不同的位置开始预填充，之前的 KV 原地保留；
+熔断重试时输入序列不变，只回滚生成的 token，重算最后一个位置即可得到新的 logits。
+"""
+
+import numpy as np
+
+from . import llama
+
+
+class PromptKVCache:
+    """
+    LLM 上下文中单序列的输入 KV 复用管理
+
+    以 Embedding 行逐位比较判断可复用的长度（文本 token 与音频帧统一处理），
+    任何解码失败或中止都会清空缓存，保证驻留的 KV 与记录一致。
+    """
+
+    SEQ_ID = 0
+
+    def __init__(self, ctx: 'llama.LlamaContext', enabled: bool = True):
+        self.ctx = ctx
+        self.enabled = enabled
+        self._resident = None       # 已驻留 KV 对应的输入 Embedding [n, dim]
+        self.n_reused = 0           # 累计复用的位置数
+        self.n_prefilled = 0        # 累计预填充的位置数
+
+    def prepare(self, full_embd: np.ndarray) -> int:
+        """
+        为新的输入序列准备 KV：保留与上次相同的前缀，删除其余部分
+
+        Returns:
+            可复用的位置数 n_keep，调用方只需预填充 full_embd[n_keep:]
+        """
+        n_total = full_embd.shape[0]
+        n_keep = self._common_prefix(full_embd) if self.enabled else 0
+
+        # 至少重算最后一个位置，以得到采样所需的 logits
+        n_keep = min(n_keep, n_total - 1)
+        if n_keep <= 0 or not self.ctx.seq_rm(self.SEQ_ID, n_keep, -1):
+            self.ctx.clear_kv_cache()
+            n_keep = 0
+        else:
+            self.ctx.seq_keep(self.SEQ_ID)
+
+        self._resident = None
+        self.n_reused += n_keep
+        self.n_prefilled += n_total - n_keep
+        return n_keep
+
+    def commit(self, full_embd: np.ndarray) -> None:
+        """预填充成功后登记驻留的输入序列（生成的 token 不计入，下次请求时删除）"""
+        if self.enabled:
+            self._resident = full_embd
+
+    def invalidate(self) -> None:
+        """丢弃缓存（解码失败或被中止后调用）"""
+        self._resident = None
+        self.ctx.clear_kv_cache()
+
+    def _common_prefix(self, full_embd: np.ndarray) -> int:
+        resident = self._resident
+        if resident is None or resident.shape[1] != full_embd.shape[1]:
+            return 0
+        n = min(resident.shape[0], full_embd.shape[0])
+        if n == 0:
+            return 0
+        diff = np.any(resident[:n] != full_embd[:n], axis=1)
+        first = int(np.argmax(diff))
+        return first if diff[first] else n
+
+    @property
+    def hit_rate(self) -> float:
+        """累计复用的位置占比"""
+        total = self.n_reused + self.n_prefilled
+        return self.n_reused / total if total else 0.0
@@ -5,25 +5,27 @@ from typing import Any, List, Optional
 import numpy as np
 
 class MsgType(Enum):
-    CMD_ENCODE = auto()   # 主进程 -> Encoder: 编码请求
-    CMD_ALIGN = auto()    # 主进程 -> Aligner: 对齐请求
-    CMD_STOP = auto()     # 主进程 -> Worker: 停止请求
-    MSG_EMBD = auto()     # Worker -> 主进程: 返回特征 (Encoder)
-    MSG_ALIGN = auto()    # Worker -> 主进程: 返回对齐结果 (Aligner)
-    MSG_READY = auto()    # Worker -> 主进程: 就绪信号
-    MSG_DONE = auto()     # Worker -> 主进程: 已退出信号
-    MSG_ERROR = auto()    # Worker -> 主进程: 错误信号
+    CMD_ENCODE = auto()   # 主线程 -> Encoder: 编码请求
+    CMD_ALIGN = auto()    # 主线程 -> Aligner: 对齐请求
+    CMD_STOP = auto()     # 主线程 -> Worker: 停止请求
+    MSG_EMBD = auto()     # Worker -> 主线程: 返回特征 (Encoder)
+    MSG_ALIGN = auto()    # Worker -> 主线程: 返回对齐结果 (Aligner)
+    MSG_READY = auto()    # Worker -> 主线程: 就绪信号
+    MSG_DONE = auto()     # Worker -> 主线程: 已退出信号
+    MSG_ERROR = auto()    # Worker -> 主线程: 错误信号
 
 @dataclass
 class StreamingMessage:
-    """音频编码/对齐进程通用通信协议"""
+    """音频编码/对齐辅助线程通用通信协议"""
     msg_type: MsgType
     data: Any = None         # 存放音频 chunk 或 embedding/align 结果
     text: Optional[str] = None # 用于对齐的文本
     offset_sec: float = 0.0  # 对齐的时间轴偏移
     language: Optional[str] = None # 语言
     is_last: bool = False    # 标记是否为最后一段音频
+    idx: int = 0             # 片段序号
     encode_time: float = 0.0 # 耗时统计
+    align_time: float = 0.0  # 对齐耗时统计
 
 @dataclass
 class DecodeResult:
@@ -33,9 +35,11 @@ class DecodeResult:
     stable_tokens: List[int] = field(default_factory=list)
     t_prefill: float = 0.0   # 预填充耗时 (ms)
     t_generate: float = 0.0  # 生成耗时 (ms)
-    n_prefill: int = 0       # 预填充 token 数
+    n_prefill: int = 0       # 预填充 token 数（不含复用的部分）
+    n_reused: int = 0        # 复用 KV 缓存的 token 数
     n_generate: int = 0      # 生成 token 数
     is_aborted: bool = False # 是否因重复或其他原因熔断中断
+    is_cancelled: bool = False # 是否因任务取消而中止
 
 @dataclass(frozen=True)
 class ForcedAlignItem:
@@ -85,8 +89,13 @@ class ASREngineConfig:
     llm_use_gpu: bool = True
     dml_pad_to: int = 40        # 使用 DirectML 加速 onnx 时，Encoder 填充时长
     n_ctx: int = 2048           # 对于 ASR Decoder，每秒音频+文字，约占 20 个 token
+    kv_reuse: bool = True       # 复用与上次请求相同的提示词前缀 KV，只预填充不同的部分
+    n_seq_max: int = 1          # 多序列批量解码时同时生成的最大序列数（1 表示不批量），各序列共用 n_ctx
+    embd_cache_mb: float = 64   # 提示词 Embedding 反量化结果的行缓存预算（MB），0 表示不缓存
+    embd_fp16_table: bool = False  # 预先把整张 Embedding 表反量化为 fp16 并内存映射（模型旁生成 .embd_f16.npy）
     chunk_size: float = 40.0    # 每个片段 40s，对应 800 个 token
     memory_num: int = 1         # 记忆一个片段，转录一个片段，对应 1600 个 token
+    pipeline: bool = True       # 长音频转录时，编码下一片段、对齐上一片段与当前片段的 LLM 解码并行
     verbose: bool = True
     enable_aligner: bool = False
     align_config: Optional[AlignerConfig] = None
@@ -3,23 +3,12 @@ import math
 import shutil
 import subprocess
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 import soundfile as sf
 from pathlib import Path
 
-def numpy_resample_poly(x, up, down, window_size=10):
-    """
-    纯 numpy 实现的 resample_poly
-    算法精准复刻 scipy.signal.resample_poly，与 scipy 相似度达 0.99999998
-    """
-    # 1. 约分
-    g = math.gcd(up, down)
-    up //= g
-    down //= g
-
-    if up == down:
-        return x.copy()
-
-    # 2. 设计 FIR 滤波器 (与 scipy.signal.firwin 对齐)
+def design_resample_filter(up, down, window_size=10):
+    """设计抗混叠 FIR 低通滤波器 (与 scipy.signal.firwin + Kaiser 窗对齐)，up/down 需已约分"""
     max_rate = max(up, down)
     f_c = 1.0 / max_rate  
     half_len = window_size * max_rate
@@ -29,24 +18,122 @@ def numpy_resample_poly(x, up, down, window_size=10):
     h = np.sinc(f_c * t)
     
     # 使用 Kaiser 窗 (beta=5.0)
+    # np.i0 是修饰过的第一类修正贝塞尔函数，与 scipy.special.i0 一致
     beta = 5.0
     kaiser_win = np.i0(beta * np.sqrt(1 - (2 * t / (n_taps - 1))**2)) / np.i0(beta)
     h = h * kaiser_win
-    h = h * (up / np.sum(h))
+    return h * (up / np.sum(h))
 
-    # 3. 多相滤波 (复刻 upfirdn 逻辑)
-    length_in = len(x)
-    length_out = int(math.ceil(length_in * up / down))
-    
-    x_up = np.zeros(length_in * up + n_taps, dtype=np.float32)
-    x_up[:length_in * up:up] = x
-    
-    y_full = np.convolve(x_up, h, mode='full')
-    
-    offset = (n_taps - 1) // 2
-    y = y_full[offset : offset + length_in * up : down]
-    
-    return y[:length_out].astype(np.float32)
+
+class PolyphaseResampler:
+    """
+    多相重采样器，可分块流式输入
+
+    等价于「插零上采样 -> FIR 卷积 -> 抽取」，但只计算保留下来的输出点：
+    第 m 个输出对应上采样序列的位置 n = half_len + m * down，只有相位 n % up 的
+    那一组滤波系数会乘到非零输入上，每个输出只需 ceil(n_taps / up) 次乘加。
+
+    分块输入时保留滤波器需要的输入尾部，输出与一次性处理一致。
+
+    Args:
+        up: 上采样倍数
+        down: 下采样倍数
+        window_size: 滤波器半长（以 max(up, down) 为单位）
+    """
+
+    def __init__(self, up, down, window_size=10):
+        g = math.gcd(up, down)
+        self.up, self.down = up // g, down // g
+        self.passthrough = self.up == self.down
+        if self.passthrough:
+            return
+
+        h = design_resample_filter(self.up, self.down, window_size)
+        self.half_len = (len(h) - 1) // 2
+        self.n_phase_taps = -(-len(h) // self.up)
+
+        # taps[p, i] = h[p + (L-1-i) * up]：倒序后与按时间顺序排列的输入窗口做点积
+        padded = np.zeros(self.up * self.n_phase_taps)
+        padded[:len(h)] = h
+        self.taps = np.ascontiguousarray(padded.reshape(self.n_phase_taps, self.up).T[:, ::-1], dtype=np.float32)
+
+        self.reset()
+
+    def reset(self):
+        """清空流式状态，开始处理新的音频"""
+        if self.passthrough:
+            return
+        L = self.n_phase_taps
+        self._buf = np.zeros(L - 1, dtype=np.float32)   # 输入缓冲，起始处为 L-1 个零（左侧填充）
+        self._buf_start = -(L - 1)                      # _buf[0] 对应的输入下标
+        self._n_in = 0
+        self._n_out = 0
+
+    def process(self, x, final=False):
+        """
+        输入一块音频，返回这块新增的可确定输出
+
+        final=True 表示输入结束：按零填充补齐尾部，总输出长度为 ceil(N_in * up / down)
+        """
+        if self.passthrough:
+            return np.asarray(x, dtype=np.float32).copy()
+
+        x = np.asarray(x, dtype=np.float32)
+        self._buf = np.concatenate([self._buf, x]) if len(x) else self._buf
+        self._n_in += len(x)
+
+        if final:
+            target = int(math.ceil(self._n_in * self.up / self.down))
+        else:
+            # 只输出所需输入都已到达的点：n // up <= N_in - 1
+            target = (self._n_in * self.up - 1 - self.half_len) // self.down + 1
+        target = max(target, self._n_out)
+
+        y = self._compute(self._n_out, target)
+        self._n_out = target
+
+        # 丢弃后续输出用不到的输入
+        keep_from = (self.half_len + target * self.down) // self.up - (self.n_phase_taps - 1)
+        drop = min(max(0, keep_from - self._buf_start), len(self._buf))
+        if drop:
+            self._buf = self._buf[drop:]
+            self._buf_start += drop
+
+        if final:
+            self.reset()
+        return y
+
+    def _compute(self, m_start, m_end):
+        """计算第 [m_start, m_end) 个输出点"""
+        L = self.n_phase_taps
+        y = np.empty(m_end - m_start, dtype=np.float32)
+        if m_end <= m_start:
+            return y
+
+        # 流结束时最后几个输出需要的输入超出缓冲区，右侧补零
+        last = (self.half_len + (m_end - 1) * self.down) // self.up - self._buf_start + 1
+        buf = self._buf
+        if last > len(buf):
+            buf = np.concatenate([buf, np.zeros(last - len(buf), dtype=np.float32)])
+
+        # 每隔 up 个输出相位重复一次，输入窗口前进 down 个采样：
+        # 同相位的输出共用一组系数，输入窗口是缓冲区上的跨步视图，一次矩阵乘完成
+        step = buf.strides[0]
+        for m0 in range(m_start, min(m_start + self.up, m_end)):
+            n0 = self.half_len + m0 * self.down
+            k0 = n0 // self.up - (L - 1) - self._buf_start
+            rows = (m_end - m0 - 1) // self.up + 1
+            frames = as_strided(buf[k0:], shape=(rows, L), strides=(self.down * step, step), writeable=False)
+            y[m0 - m_start :: self.up] = frames @ self.taps[n0 % self.up]
+        return y
+
+
+def numpy_resample_poly(x, up, down, window_size=10):
+    """
+    纯 numpy 实现的 resample_poly
+    算法精准复刻 scipy.signal.resample_poly，与 scipy 相似度达 0.99999998
+    """
+    return PolyphaseResampler(up, down, window_size).process(x, final=True)
 
 
 def resample_audio(audio, sr, target_sr):
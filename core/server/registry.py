@@ -0,0 +1,129 @@
+# coding: utf-8
+"""
+连接登记表 (ConnectionRegistry)
+
+主进程把客户端的连接/断开事件推送到识别子进程，
+子进程在本地维护在线 socket_id 集合，热循环中只做本地集合查询，
+不再经由 Manager 服务进程做跨进程访问。
+
+每个识别子进程通过 subscribe() 获得独立的事件通道，
+主进程的每个事件都会广播到所有通道。
+
+除连接事件外，客户端取消的任务（cancel 消息）也经由同一通道广播，
+子进程据此丢弃缓冲任务、中止正在进行的解码。
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from multiprocessing import SimpleQueue
+from typing import List, Optional, Set
+
+# 事件类型
+EVENT_CONNECT = 'connect'
+EVENT_DISCONNECT = 'disconnect'
+EVENT_CANCEL = 'cancel'
+
+MAX_CANCELLED = 1024    # 子进程保留的已取消 task_id 上限
+
+
+class ConnectionRegistry:
+    """
+    跨进程的在线连接登记表
+
+    - 主进程：connect() / disconnect() / cancel() 广播事件，subscribe() 为子进程创建通道
+    - 子进程：sync() 批量应用事件，`socket_id in registry` 查询本地集合，
+      is_cancelled() 查询任务是否已被取消
+
+    事件通道使用 SimpleQueue（put 直接写入管道，无后台线程），
+    因此主进程先登记连接、再提交任务时，子进程收到任务时事件一定已可读。
+    """
+
+    def __init__(self):
+        self._channels: List[SimpleQueue] = []  # 主进程：各子进程的事件通道
+        self._events: Optional[SimpleQueue] = None  # 子进程：本进程的事件通道
+        self._live: Set[str] = set()
+        self._cancelled: OrderedDict[str, None] = OrderedDict()  # 子进程：已取消的 task_id
+
+    def __getstate__(self) -> dict:
+        return {'events': self._events}
+
+    def __setstate__(self, state: dict) -> None:
+        self._channels = []
+        self._events = state['events']
+        self._live = set()
+        self._cancelled = OrderedDict()
+
+    def subscribe(self) -> ConnectionRegistry:
+        """
+        为一个识别子进程创建事件通道（主进程调用）
+
+        新通道会预先写入当前所有在线连接，重新拉起的子进程也能得到完整的连接集合。
+
+        Returns:
+            绑定到新通道的登记表，作为参数传给子进程
+        """
+        channel = SimpleQueue()
+        for socket_id in self._live:
+            channel.put((EVENT_CONNECT, socket_id))
+        self._channels.append(channel)
+
+        view = ConnectionRegistry()
+        view._events = channel
+        return view
+
+    def unsubscribe(self, view: ConnectionRegistry) -> None:
+        """停止向某个子进程的通道广播事件（主进程调用）"""
+        if view._events in self._channels:
+            self._channels.remove(view._events)
+
+    def connect(self, socket_id: str) -> None:
+        """登记新连接（主进程调用）"""
+        self._live.add(socket_id)
+        self._broadcast(EVENT_CONNECT, socket_id)
+
+    def disconnect(self, socket_id: str) -> None:
+        """登记连接断开（主进程调用）"""
+        self._live.discard(socket_id)
+        self._broadcast(EVENT_DISCONNECT, socket_id)
+
+    def cancel(self, task_id: str) -> None:
+        """登记任务取消（主进程调用）"""
+        self._broadcast(EVENT_CANCEL, task_id)
+
+    def _broadcast(self, kind: str, key: str) -> None:
+        for channel in self._channels:
+            channel.put((kind, key))
+
+    def sync(self) -> None:
+        """应用所有待处理的连接事件（子进程调用）"""
+        events = self._events
+        if events is None:
+            return
+        live = self._live
+        cancelled = self._cancelled
+        while not events.empty():
+            kind, key = events.get()
+            if kind == EVENT_CONNECT:
+                live.add(key)
+            elif kind == EVENT_DISCONNECT:
+                live.discard(key)
+            elif kind == EVENT_CANCEL:
+                cancelled[key] = None
+                if len(cancelled) > MAX_CANCELLED:
+                    cancelled.popitem(last=False)
+
+    def is_cancelled(self, task_id: str) -> bool:
+        """查询任务是否已被客户端取消（子进程调用，先同步事件）"""
+        self.sync()
+        return task_id in self._cancelled
+
+    def __contains__(self, socket_id: str) -> bool:
+        """查询连接是否在线，未命中时先同步事件再查一次"""
+        if socket_id in self._live:
+            return True
+        self.sync()
+        return socket_id in self._live
+
+    def __len__(self) -> int:
+        return len(self._live)
@@ -9,6 +9,8 @@
 from dataclasses import dataclass, field
 from typing import List, Optional
 
+from core.server.audio_pool import AudioHandle
+
 
 @dataclass
 class Task:
@@ -19,7 +21,7 @@ class Task:
 
     Attributes:
         type: 任务类型 ('mic' 麦克风, 'file' 文件, 'cmd' 命令)
-        data: 原始音频数据 (float32, 16kHz, mono)
+        data: 原始音频数据 (float32, 16kHz, mono)，使用共享内存时为空
         offset: 当前片段在整段音频中的时间偏移（秒）
         overlap: 片段重叠时间（秒），用于去重
         task_id: 任务唯一标识
@@ -28,6 +30,7 @@ class Task:
         time_start: 录音/音频开始时间戳
         time_submit: 任务提交时间戳
         samplerate: 采样率，默认 16000 Hz
+        shm: 音频在共享内存池中的句柄，为 None 时音频内联在 data 中
     """
     type: str
     data: bytes
@@ -42,6 +45,13 @@ class Task:
     language: str = 'auto'
     samplerate: int = 16000
     command: str = ''           # 特殊命令，如 'gpu_boost' / 'gpu_unboost'
+    shm: Optional[AudioHandle] = None
+
+    @property
+    def duration(self) -> float:
+        """任务携带的音频时长（秒）"""
+        length = self.shm.length if self.shm is not None else len(self.data)
+        return length / (4 * self.samplerate)
 
 
 @dataclass
@@ -66,6 +76,8 @@ class Result:
         timestamps: 字级时间戳列表（秒）
         
         is_final: 是否已完成所有片段识别
+        is_partial: 是否为解码过程中的中间结果（文本可能被后续结果修正）
+        error: 识别失败原因（如识别子进程崩溃），为空表示正常
     """
     task_id: str
     socket_id: str
@@ -85,6 +97,8 @@ class Result:
     timestamps: List[float] = field(default_factory=list)
     
     is_final: bool = False
+    is_partial: bool = False
+    error: str = ''
 
 @dataclass
 class RecognitionSession:
@@ -95,4 +109,5 @@ class RecognitionSession:
     """
     task_id: str
     result: Result
+    first_char_latency: float = 0.0     # 首个中间结果相对提交时间的时延（秒），0 表示未记录
     # 未来可在此扩展会话级状态，如 N-best 假设、中间特征缓存等
@@ -7,14 +7,19 @@
 
 from __future__ import annotations
 from dataclasses import dataclass, field
-from multiprocessing import Queue, Process
-from multiprocessing.managers import ListProxy
+from multiprocessing import Queue
 from typing import TYPE_CHECKING, Dict, Optional
 
 import websockets
 from rich.console import Console
 
 from core.server.schema import Result, RecognitionSession
+from core.server.audio_pool import AudioSlabPool
+from core.server.registry import ConnectionRegistry
+from core.server.dispatcher import TaskDispatcher
+from core.server.connection.flow_control import FlowController
+from core.protocol import DeltaEncoder
+from config_server import ServerConfig as Config
 
 if TYPE_CHECKING:
     from .app import CapsWriterServer
@@ -30,25 +35,33 @@ class ServerState:
     
     存储服务端主进程运行时的共享状态：
     - sockets: WebSocket 连接字典，以 socket_id 为键
-    - sockets_id: 跨进程的 socket ID 列表（由 Manager 创建）
-    - queue_in: 任务输入队列（主进程 -> 识别进程）
-    - queue_out: 结果输出队列（识别进程 -> 主进程）
-    - recognize_process: 识别子进程句柄
+    - connections: 跨进程的在线连接登记表（连接/断开事件广播给各识别进程）
+    - dispatcher: 任务分发器（主进程 -> 各识别进程，同一会话固定派发到同一进程）
+    - queue_out: 结果输出队列（各识别进程 -> 主进程）
+    - audio_pool: 共享内存音频池（主进程写入，识别进程读取）
+    - delta_encoders: 请求增量结果的任务的编码器，以 task_id 为键
+    - flow: 文件任务的发送额度管理器（记录每个任务的积压时长）
     """
     app: Optional[CapsWriterServer] = None
 
     # WebSocket 连接池
     sockets: Dict[str, websockets.WebSocketServerProtocol] = field(default_factory=dict)
     
-    # 跨进程共享的 socket ID 列表（需要用 Manager().list() 初始化）
-    sockets_id: Optional[ListProxy] = None
+    # 跨进程的在线连接登记表
+    connections: ConnectionRegistry = field(default_factory=ConnectionRegistry)
     
-    # 消息队列
-    queue_in: Queue = field(default_factory=Queue)
+    # 任务分发与结果队列
+    dispatcher: TaskDispatcher = field(default_factory=TaskDispatcher)
     queue_out: Queue = field(default_factory=Queue)
 
-    # 识别子进程
-    recognize_process: Optional[Process] = None
+    # 共享内存音频池（由 ProcessManager 创建，禁用时为 None）
+    audio_pool: Optional[AudioSlabPool] = None
+
+    # 增量结果编码器（由 ws_recv 登记，ws_send 使用）
+    delta_encoders: Dict[str, DeltaEncoder] = field(default_factory=dict)
+
+    # 文件上传流控（由 ws_recv 登记，ws_send 推进额度）
+    flow: FlowController = field(default_factory=lambda: FlowController(Config.file_credit_window))
 
 
 
@@ -74,11 +87,12 @@ class WorkerState:
             self.sessions[task_id] = RecognitionSession(task_id=task_id, result=result)
         return self.sessions[task_id]
     
-    def cleanup_sessions(self, sockets_id: ListProxy) -> int:
-        """清理已断开连接的客户端 session"""
+    def cleanup_sessions(self, connections: ConnectionRegistry) -> int:
+        """清理已断开连接或已被客户端取消的 session"""
+        connections.sync()
         stale_ids = [
             sid for sid, session in list(self.sessions.items())
-            if session.result.socket_id not in sockets_id
+            if session.result.socket_id not in connections or connections.is_cancelled(sid)
         ]
         for sid in stale_ids:
             self.sessions.pop(sid, None)
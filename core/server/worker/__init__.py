@@ -6,13 +6,17 @@
 """
 
 from multiprocessing import Queue
-from multiprocessing.managers import ListProxy
+from multiprocessing.synchronize import Event
+from typing import Optional
 from .. import logger
+from ..audio_pool import AudioSlabPool
+from ..registry import ConnectionRegistry
 from .worker import RecognizerWorker
 
-def start_worker(queue_in: Queue, queue_out: Queue, sockets_id: ListProxy, stdin_fn: int):
+def start_worker(queue_in: Queue, queue_out: Queue, connections: ConnectionRegistry, stdin_fn: int,
+                 audio_pool: Optional[AudioSlabPool] = None, ready: Optional[Event] = None):
     """识别子进程启动入口"""
-    worker = RecognizerWorker(queue_in, queue_out, sockets_id, stdin_fn)
+    worker = RecognizerWorker(queue_in, queue_out, connections, stdin_fn, audio_pool, ready)
     worker.run()
 
 __all__ = ['RecognizerWorker', 'start_worker']
@@ -0,0 +1,42 @@
+# coding: utf-8
+"""
+任务取消标志
+
+识别子进程为每个正在处理的任务创建一个 CancelToken，交给识别流水线和引擎。
+客户端发送 cancel 消息或断开连接后，is_set() 返回 True，
+引擎据此中止 llama.cpp 计算图与 token 生成循环，尽快释放子进程。
+"""
+
+import time
+
+from ..registry import ConnectionRegistry
+
+
+class CancelToken:
+    """
+    单个任务的取消标志
+
+    is_set() 会在 llama.cpp 的中止回调和生成循环中被高频调用，
+    因此按最小间隔节流地同步连接事件；一旦置位不再复位。
+    """
+
+    def __init__(self, task_id: str, socket_id: str, connections: ConnectionRegistry, interval: float = 0.05):
+        self.task_id = task_id
+        self.socket_id = socket_id
+        self.connections = connections
+        self.interval = interval
+        self._cancelled = False
+        self._last_check = 0.0
+
+    def is_set(self) -> bool:
+        if self._cancelled:
+            return True
+        now = time.monotonic()
+        if now - self._last_check < self.interval:
+            return False
+        self._last_check = now
+        self._cancelled = (
+            self.connections.is_cancelled(self.task_id)
+            or self.socket_id not in self.connections
+        )
+        return self._cancelled
@@ -9,12 +9,14 @@
 
 import re
 import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
 from core.server.state import WorkerState, console
 from core.server.schema import Task, Result
 from core.server.formatter import TextFormatter
 from config_server import ServerConfig as Config
 from core.tools.token_sync import sync_tokens_from_text
-from core.server.engines.base import EngineCapabilities
+from core.server.engines.base import EngineCapabilities, TaskCancelled
 from .audio import process_audio_task
 from . import logger
 
@@ -27,6 +29,85 @@ from core.server.merger import (
 )
 
 
+def _check_cancel(cancel, stage: str) -> None:
+    if cancel is not None and cancel.is_set():
+        raise TaskCancelled(f"{stage}前任务已取消")
+
+
+def clean_segment_text(text: str) -> str:
+    """清理模型输出的片段文本（去掉 BPE 连接符、压缩空白）"""
+    text = text.replace('@@', '').strip()
+    return re.sub(r'\s+', ' ', text)
+
+
+class PartialEmitter:
+    """
+    中间结果推送器
+
+    作为引擎的 on_partial 回调，接收解码过程中的片段文本，
+    与会话已拼接的文本合并后，作为中间结果发送给客户端。
+
+    首个非空文本立即发送（并记录首字时延），之后按最小间隔节流。
+    """
+
+    def __init__(self, task: Task, result: Result, emit: Callable[[Result], None], interval: float):
+        self.task = task
+        self.result = result
+        self.emit = emit
+        self.interval = interval
+        self.first_char_latency: Optional[float] = None
+        self._last_emit = 0.0
+        self._last_text = ''
+
+    def __call__(self, segment_text: str) -> None:
+        now = time.time()
+        if self.first_char_latency is None:
+            if not segment_text.strip():
+                return
+            self.first_char_latency = now - self.task.time_submit
+        elif now - self._last_emit < self.interval:
+            return
+
+        text = merge_by_text(self.result.text, clean_segment_text(segment_text))
+        if text == self._last_text:
+            return
+        self._last_text, self._last_emit = text, now
+
+        try:
+            self.emit(Result(
+                task_id=self.task.task_id,
+                socket_id=self.task.socket_id,
+                type=self.task.type,
+                duration=self.result.duration,
+                time_start=self.task.time_start,
+                time_submit=self.task.time_submit,
+                time_complete=now,
+                text=text,
+                is_partial=True,
+            ))
+        except Exception as e:
+            logger.warning(f"中间结果发送失败: {e}")
+
+
+@dataclass
+class _SegmentJob:
+    """单个片段在识别前后两个阶段之间传递的状态"""
+    task: Task
+    session: Any
+    result: Result
+    is_first_segment: bool
+    samples: Any = None
+    stream: Any = None      # 识别流；空音频或极短音频跳过推理时为 None
+    partial: Optional[PartialEmitter] = None
+
+    def request(self, cancel=None) -> Dict[str, Any]:
+        """decode_stream 的关键字参数"""
+        return dict(
+            context=self.task.context, language=self.task.language,
+            on_partial=self.partial, cancel=cancel,
+        )
+
+
 class TaskPipeline:
     """
     语音识别处理流水线
@@ -45,8 +126,7 @@ class TaskPipeline:
     def _process_simple_merge(self, result: Result, stream_result_text: str) -> None:
         """ 处理简单文本拼接（主要输出，用于语音输入） """
         try:
-            segment_text = stream_result_text.replace('@@', '').strip()
-            segment_text = re.sub(r'\s+', ' ', segment_text)
+            segment_text = clean_segment_text(stream_result_text)
             
             prev_len = len(result.text)
             result.text = merge_by_text(result.text, segment_text)
@@ -56,116 +136,206 @@ class TaskPipeline:
         except Exception as e:
             logger.warning(f"简单文本拼接失败: {e}")
 
-    def process(self, task: Task) -> Result:
+    def process(self, task: Task, emit_partial: Optional[Callable[[Result], None]] = None,
+                cancel=None) -> Result:
         """
         处理单个音频任务片段并返回识别结果
+
+        Args:
+            task: 识别任务
+            emit_partial: 中间结果发送函数，仅对麦克风任务生效
+            cancel: 取消标志（提供 is_set()），在各阶段之间检查并传给引擎
+
+        Raises:
+            TaskCancelled: 任务在识别过程中被取消
+        """
+        try:
+            job = self._begin(task, emit_partial)
+            if job.stream is None:
+                return job.result
+
+            _check_cancel(cancel, "识别")
+            self.recognizer.decode_stream(job.stream, **job.request(cancel))
+            return self._complete(job, cancel)
+
+        except TaskCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"推理管线错误: {e}", exc_info=True)
+            raise
+
+    def process_batch(self, tasks: List[Task], emit_partial: Optional[Callable[[Result], None]] = None,
+                      cancels: Optional[list] = None) -> List[Union[Result, TaskCancelled]]:
         """
+        批量处理多个会话的音频片段：识别阶段交给引擎的 decode_streams 合并推理
+
+        Args:
+            tasks: 识别任务（各属不同会话）
+            emit_partial: 同 process
+            cancels: 与 tasks 一一对应的取消标志
+
+        Returns:
+            与 tasks 一一对应，被取消的任务为 TaskCancelled，其余为识别结果
+        """
+        cancels = cancels or [None] * len(tasks)
+        outputs: List[Union[Result, TaskCancelled, None]] = [None] * len(tasks)
         try:
-            logger.info(f"任务 {task.task_id[:8]}, 语言={task.language}, 类型={task.type}")
-            is_first_segment = task.task_id not in self.state.sessions
-            session = self.state.get_session(task.task_id, task.socket_id, task.type)
-            result = session.result
-
-            # GPU 加速活跃时间更新（只要有任务进来就刷新）
-            if Config.gpu_boost_enabled and self.state.gpu_boosted:
-                self.state.gpu_last_active = time.time()
-
-            # 2. 预处理音频并获取采样点
-            samples = process_audio_task(task, result)
-
-            # 空音频或极短音频，跳过推理直接返回
-            if samples is None:
-                result.time_start, result.time_submit = task.time_start, task.time_submit
-                result.time_complete = time.time()
-                result.is_final = task.is_final
-                return result
-
-            # 3. 执行识别推理
-            stream = self.recognizer.create_stream()
-            stream.accept_waveform(task.samplerate, samples)
-            self.recognizer.decode_stream(stream, context=task.context, language=task.language)
-
-            # 更新基础时序
+            jobs = []
+            for i, task in enumerate(tasks):
+                job = self._begin(task, emit_partial)
+                if job.stream is None:
+                    outputs[i] = job.result
+                elif cancels[i] is not None and cancels[i].is_set():
+                    outputs[i] = TaskCancelled("识别前任务已取消")
+                else:
+                    jobs.append((i, job))
+
+            # 全部任务都已提前结束或取消时不调用引擎（否则会白白清空 KV 缓存）
+            if not jobs:
+                return outputs
+
+            t_start = time.time()
+            errors = self.recognizer.decode_streams(
+                [job.stream for _, job in jobs],
+                [job.request(cancels[i]) for i, job in jobs],
+            )
+            if len(jobs) > 1:
+                logger.debug(f"批量识别 {len(jobs)} 个片段，耗时 {time.time() - t_start:.3f}s")
+
+            for (i, job), error in zip(jobs, errors):
+                if error is not None:
+                    outputs[i] = error
+                    continue
+                try:
+                    outputs[i] = self._complete(job, cancels[i])
+                except TaskCancelled as e:
+                    outputs[i] = e
+            return outputs
+
+        except Exception as e:
+            logger.error(f"推理管线错误: {e}", exc_info=True)
+            raise
+
+    def _begin(self, task: Task, emit_partial: Optional[Callable[[Result], None]]) -> _SegmentJob:
+        """识别前的准备：取得会话、预处理音频、创建识别流（空音频或极短音频直接返回结果）"""
+        logger.info(f"任务 {task.task_id[:8]}, 语言={task.language}, 类型={task.type}")
+        is_first_segment = task.task_id not in self.state.sessions
+        session = self.state.get_session(task.task_id, task.socket_id, task.type)
+        result = session.result
+        job = _SegmentJob(task=task, session=session, result=result, is_first_segment=is_first_segment)
+
+        # GPU 加速活跃时间更新（只要有任务进来就刷新）
+        if Config.gpu_boost_enabled and self.state.gpu_boosted:
+            self.state.gpu_last_active = time.time()
+
+        # 2. 预处理音频并获取采样点
+        job.samples = process_audio_task(task, result)
+
+        # 空音频或极短音频，跳过推理直接返回
+        if job.samples is None:
             result.time_start, result.time_submit = task.time_start, task.time_submit
             result.time_complete = time.time()
+            result.is_final = task.is_final
+            return job
 
-            # 4. 路径 A: 简单文本拼接 (主要用于实时回显)
-            asr_raw_text = stream.result.text
-            logger.info(f'模型输出：{asr_raw_text}')
-            console.print(f'\033[0G  模型输出：[cyan]{asr_raw_text}', soft_wrap=True)
-            self._process_simple_merge(result, asr_raw_text)
-
-            # 5. 路径 B: 对齐增强 (仅针对文件任务)
-            # 门控：仅在“文件任务”且“引擎不支持时间戳”时，才调用外部 Aligner
-            caps = self.recognizer.capabilities
-            if (task.type == 'file'
-                and EngineCapabilities.TIMESTAMPS not in caps 
-                and self.aligner 
-                and stream.result.text.strip()):
-                
-                logger.debug(f"🚩 [Pipeline] 正在对文件分片执行对齐补齐...")
-                align_res = self.aligner.align(audio=samples, text=stream.result.text, language=task.language, offset_sec=0.0)
-                if align_res and align_res.items:
-                    stream.result.tokens = [it.text for it in align_res.items]
-                    stream.result.timestamps = [it.start_time for it in align_res.items]
-
-
-            # 6. 精确 Token 级拼接 (即便没有对齐器，原生支持时间戳的模型也会走这里)
-            new_tokens = process_tokens_safely(stream.result.tokens)
-            new_timestamps = list(stream.result.timestamps)
+        # 3. 执行识别推理（麦克风任务在解码过程中推送中间结果）
+        if emit_partial and task.type == 'mic' and Config.partial_results:
+            job.partial = PartialEmitter(task, result, emit_partial, Config.partial_interval)
+
+        job.stream = self.recognizer.create_stream()
+        job.stream.accept_waveform(task.samplerate, job.samples)
+        return job
+
+    def _complete(self, job: _SegmentJob, cancel=None) -> Result:
+        """识别后的处理：文本拼接、对齐补齐、时间戳拼接与最终格式化"""
+        task, session, result, stream = job.task, job.session, job.result, job.stream
+        partial, samples, is_first_segment = job.partial, job.samples, job.is_first_segment
+        if partial and partial.first_char_latency is not None:
+            session.first_char_latency = session.first_char_latency or partial.first_char_latency
+            logger.debug(f"片段首字时延: {partial.first_char_latency:.3f}s")
+
+        # 更新基础时序
+        result.time_start, result.time_submit = task.time_start, task.time_submit
+        result.time_complete = time.time()
+
+        # 4. 路径 A: 简单文本拼接 (主要用于实时回显)
+        asr_raw_text = stream.result.text
+        logger.info(f'模型输出：{asr_raw_text}')
+        console.print(f'\033[0G  模型输出：[cyan]{asr_raw_text}', soft_wrap=True)
+        self._process_simple_merge(result, asr_raw_text)
+
+        # 5. 路径 B: 对齐增强 (仅针对文件任务)
+        # 门控：仅在“文件任务”且“引擎不支持时间戳”时，才调用外部 Aligner
+        caps = self.recognizer.capabilities
+        if (task.type == 'file'
+            and EngineCapabilities.TIMESTAMPS not in caps 
+            and self.aligner 
+            and stream.result.text.strip()):
             
-            result.tokens, result.timestamps = merge_tokens_by_sequence_matcher(
-                prev_tokens=result.tokens,
-                prev_timestamps=result.timestamps,
-                new_tokens=new_tokens,
-                new_timestamps=new_timestamps,
-                offset=task.offset,
-                overlap=task.overlap,
-                is_first_segment=is_first_segment
+            _check_cancel(cancel, "对齐")
+            logger.debug(f"🚩 [Pipeline] 正在对文件分片执行对齐补齐...")
+            align_res = self.aligner.align(
+                audio=samples, text=stream.result.text, language=task.language, offset_sec=0.0, cancel=cancel
             )
-            
-            # 7. 生成精确文本结果 (text_accu)
-            result.text_accu = tokens_to_text(result.tokens)
-
-            # 8. 最终阶段处理 (任务结束时的格式化)
-            if not task.is_final:
-                return result
-
-            # 任务结束清理与最终格式化
-            raw_text = result.text
-            result.text = self.formatter.format(result.text)
-            result.text_accu = self.formatter.format(result.text_accu)
-            console.print(f'  片段拼接：[purple]{raw_text}', soft_wrap=True)
-            console.print(f'  格式化后：[green]{result.text}\n', soft_wrap=True)
-
-            logger.debug(f'格式调整：{raw_text} --> {result.text}')
-
-            # 将格式化引入的标点同步回 token 序列
-            if result.tokens and result.text_accu:
-                result.tokens, result.timestamps = sync_tokens_from_text(
-                    result.tokens, result.timestamps, result.text_accu
-                )
-            
-            # 如果依然没有 tokens (麦克风跳过了对齐)，则用 text 回退
-            if not result.tokens and result.text:
-                result.text_accu = result.text
-                chars = list(result.text_accu.replace(' ', ''))
-                if chars and result.duration > 0:
-                    t_per_char = result.duration / len(chars)
-                    result.tokens, result.timestamps = chars, [i * t_per_char for i in range(len(chars))]
-            
-            result.is_final = True
-            
-            # 打印统计
-            process_time = result.time_complete - task.time_submit
-            rtf = process_time / result.duration if result.duration > 0 else 0
-            logger.info(f"任务完成: {task.task_id[:8]}, 时长={result.duration:.2f}s, 耗时={process_time:.3f}s, RTF={rtf:.3f}")
+            if align_res and align_res.items:
+                stream.result.tokens = [it.text for it in align_res.items]
+                stream.result.timestamps = [it.start_time for it in align_res.items]
+
 
+        # 6. 精确 Token 级拼接 (即便没有对齐器，原生支持时间戳的模型也会走这里)
+        new_tokens = process_tokens_safely(stream.result.tokens)
+        new_timestamps = list(stream.result.timestamps)
+        
+        result.tokens, result.timestamps = merge_tokens_by_sequence_matcher(
+            prev_tokens=result.tokens,
+            prev_timestamps=result.timestamps,
+            new_tokens=new_tokens,
+            new_timestamps=new_timestamps,
+            offset=task.offset,
+            overlap=task.overlap,
+            is_first_segment=is_first_segment
+        )
+        
+        # 7. 生成精确文本结果 (text_accu)
+        result.text_accu = tokens_to_text(result.tokens)
+
+        # 8. 最终阶段处理 (任务结束时的格式化)
+        if not task.is_final:
             return result
 
-        except Exception as e:
-            logger.error(f"推理管线错误: {e}", exc_info=True)
-            raise
+        # 任务结束清理与最终格式化
+        _check_cancel(cancel, "格式化")
+        raw_text = result.text
+        result.text = self.formatter.format(result.text)
+        result.text_accu = self.formatter.format(result.text_accu)
+        console.print(f'  片段拼接：[purple]{raw_text}', soft_wrap=True)
+        console.print(f'  格式化后：[green]{result.text}\n', soft_wrap=True)
 
+        logger.debug(f'格式调整：{raw_text} --> {result.text}')
 
+        # 将格式化引入的标点同步回 token 序列
+        if result.tokens and result.text_accu:
+            result.tokens, result.timestamps = sync_tokens_from_text(
+                result.tokens, result.timestamps, result.text_accu
+            )
+        
+        # 如果依然没有 tokens (麦克风跳过了对齐)，则用 text 回退
+        if not result.tokens and result.text:
+            result.text_accu = result.text
+            chars = list(result.text_accu.replace(' ', ''))
+            if chars and result.duration > 0:
+                t_per_char = result.duration / len(chars)
+                result.tokens, result.timestamps = chars, [i * t_per_char for i in range(len(chars))]
+        
+        result.is_final = True
+        
+        # 打印统计
+        process_time = result.time_complete - task.time_submit
+        rtf = process_time / result.duration if result.duration > 0 else 0
+        first_char = f", 首字={session.first_char_latency:.3f}s" if session.first_char_latency else ''
+        logger.info(
+            f"任务完成: {task.task_id[:8]}, 时长={result.duration:.2f}s, "
+            f"耗时={process_time:.3f}s, RTF={rtf:.3f}{first_char}"
+        )
 
+        return result
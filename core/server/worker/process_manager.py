@@ -2,14 +2,21 @@
 """
 识别子进程管理器 (ProcessManager)
 
-负责维护单机识别进程的生命周期，包括启动、模型加载监控、异常退出捕获。
+负责维护识别进程池的生命周期，包括启动、模型加载监控、异常退出捕获。
+进程数由 Config.recognizer_workers 决定，运行期间某个进程崩溃时，
+只有派发到它的会话失败，随后该进程会被重新拉起。
 """
 from __future__ import annotations
 import sys
 import os
-import queue
-from multiprocessing import Process, Manager
+import time
+import asyncio
+from multiprocessing import Process
 from typing import TYPE_CHECKING
+from config_server import ServerConfig as Config
+from core.constants import AudioFormat
+from ..audio_pool import AudioSlabPool
+from ..dispatcher import WorkerSlot
 from ..state import console
 from . import start_worker
 from .check_model import check_model
@@ -24,17 +31,20 @@ class ProcessManager:
     
     由 CapsWriterServer 调用，专注于进程层级的控制。
     """
+    MAX_RESTARTS = 3    # 单个槽位崩溃后最多重新拉起的次数
+
     def __init__(self, app: CapsWriterServer):
-        self._process = None
         self.app = app
         self.is_alive = False
+        self._stdin_fn = None
+
+    @property
+    def dispatcher(self):
+        return self.app.state.dispatcher
 
     def start(self):
         """
-        启动识别子进程并等待模型加载完成
-        
-        Returns:
-            Process: 启动成功的子进程对象
+        启动识别子进程池并等待模型加载完成
         """
         # 防连续触发
         if self.is_alive: return
@@ -44,65 +54,112 @@ class ProcessManager:
         check_model()
 
         # 2. 初始化共享资源
-        # 使用 Manager 管理共享列表，用于追踪活动连接
         state = self.app.state
-        state.sockets_id = Manager().list()
+
+        # 共享内存音频池，用于向子进程传递音频片段
+        if Config.shm_audio_slabs > 0:
+            state.audio_pool = AudioSlabPool(
+                n_slabs=Config.shm_audio_slabs,
+                slab_size=AudioFormat.seconds_to_bytes(Config.shm_audio_slab_seconds),
+            )
+            logger.debug(f"共享内存音频池已创建: {state.audio_pool.name}, 槽位数: {Config.shm_audio_slabs}")
+        self.dispatcher.audio_pool = state.audio_pool
         
         # 获取标准输入文件描述符，用于 Windows 下的信号传递补丁
-        stdin_fn = sys.stdin.fileno()
+        self._stdin_fn = sys.stdin.fileno()
         
-        # 3. 创建并启动进程
-        self._process = Process(
+        # 3. 创建并启动进程池
+        n_workers = max(1, Config.recognizer_workers)
+        for _ in range(n_workers):
+            self._spawn(self.dispatcher.add_slot())
+
+        # 4. 等待模型加载完成 (轮询方式)
+        self._wait_for_models()
+
+    def _spawn(self, slot: WorkerSlot):
+        """为槽位拉起一个识别子进程"""
+        state = self.app.state
+        if slot.connections is not None:
+            state.connections.unsubscribe(slot.connections)
+        slot.connections = state.connections.subscribe()
+
+        slot.process = Process(
             target=start_worker,
-            args=(state.queue_in,
+            args=(slot.queue_in,
                   state.queue_out,
-                  state.sockets_id, 
-                  stdin_fn),
+                  slot.connections,
+                  self._stdin_fn,
+                  state.audio_pool,
+                  slot.ready),
             daemon=True
         )
-        self._process.start()
-        
-        # 存入状态以便其他模块引用
-        state.recognize_process = self._process
-        logger.info(f"识别子进程已拉起 (PID: {self._process.pid})")
-
-        # 4. 等待模型加载完成 (轮询方式)
-        self._wait_for_models()
-        
-        return self._process
+        slot.process.start()
+        logger.info(f"识别子进程 #{slot.index} 已拉起 (PID: {slot.process.pid})")
 
     def _wait_for_models(self):
-        """轮询队列直到收到模型加载成功 (True) 或发生错误"""
+        """轮询直到所有子进程模型加载成功或发生错误"""
         logger.info("正在等待子进程加载模型...")
         
+        slots = self.dispatcher.slots
         while self.is_alive:
-            try:
-                # 阻塞最多 100ms
-                status = self.app.state.queue_out.get(timeout=0.1)
-                if status is True:
-                    # 收到 True 说明模型加载成功
-                    break
-            except (queue.Empty, OSError):
-                if self._process and not self._process.is_alive():
-                    self._handle_unexpected_exit()
+            if all(slot.ready.is_set() for slot in slots):
+                break
+            for slot in slots:
+                if not slot.is_alive:
+                    self._handle_unexpected_exit(slot)
                     return
-                continue
+            time.sleep(0.1)
             
         if not self.is_alive: return
-        logger.info("模型加载完成，ASR 服务就绪")
+        logger.info(f"模型加载完成，ASR 服务就绪 (识别进程数: {len(slots)})")
         console.rule('[green3]开始服务')
         console.line()
 
-    def _handle_unexpected_exit(self):
+    def _handle_unexpected_exit(self, slot: WorkerSlot):
         """处理子进程加载模型时的意外退出"""
-        exit_code = self._process.exitcode
+        exit_code = slot.process.exitcode
         if exit_code != 0:
-            logger.error(f"识别子进程意外退出! ExitCode: {exit_code}")
+            logger.error(f"识别子进程 #{slot.index} 意外退出! ExitCode: {exit_code}")
             logger.error("这通常是由于模型损坏、底层库冲突或系统资源不足导致的。")
         
         # 请求主系统同步退出
         self.app.stop()
 
+    async def monitor(self, interval: float = 1.0):
+        """
+        运行期间巡检子进程 (Coroutine)
+
+        子进程崩溃时：派发到它的会话以失败结果结束，其余会话不受影响；
+        随后重新拉起该槽位，超过重启上限后不再拉起，全部槽位失效时退出服务。
+        """
+        state = self.app.state
+        while self.is_alive:
+            await asyncio.sleep(interval)
+            for slot in self.dispatcher.slots:
+                if not self.is_alive:
+                    return
+                if slot.process is None or slot.is_alive:
+                    continue
+
+                logger.error(
+                    f"识别子进程 #{slot.index} 意外退出 (ExitCode: {slot.process.exitcode})，"
+                    f"中止其上的 {len(slot.task_ids)} 个会话"
+                )
+                for result in self.dispatcher.fail_slot(slot):
+                    state.queue_out.put(result)
+
+                if slot.restarts >= self.MAX_RESTARTS:
+                    logger.error(f"识别子进程 #{slot.index} 重启次数已达上限，不再拉起")
+                    slot.process = None
+                    continue
+                slot.restarts += 1
+                self._spawn(slot)
+
+            if all(slot.process is None for slot in self.dispatcher.slots):
+                logger.error("所有识别子进程均已失效，服务退出")
+                self.app.stop()
+                return
+
     def stop(self):
         """停止子进程"""
 
@@ -110,15 +167,20 @@ class ProcessManager:
         if not self.is_alive: return
         self.is_alive = False
 
-        if self._process and self._process.is_alive():
-            logger.info(f"正在终止识别子进程 (PID: {self._process.pid})...")
-            # 发送 None 任务通知优雅退出 (作为兜底)
+        # 发送 None 任务通知优雅退出 (作为兜底)
+        self.dispatcher.stop()
+        for slot in self.dispatcher.slots:
+            if not slot.is_alive:
+                continue
+            logger.info(f"正在终止识别子进程 #{slot.index} (PID: {slot.process.pid})...")
 
-            self.app.state.queue_in.put(None)
-            
             # 如果 2 秒内没退，则强制 kill
-            self._process.join(timeout=2)
-            if self._process.is_alive():
+            slot.process.join(timeout=2)
+            if slot.process.is_alive():
                 logger.debug("子进程未响应优雅退出，执行强制终止")
-                self._process.terminate()
+                slot.process.terminate()
+
+        # 销毁共享内存音频池
+        if self.app.state.audio_pool is not None:
+            self.app.state.audio_pool.close()
             
\ No newline at end of file
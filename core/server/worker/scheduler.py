@@ -0,0 +1,356 @@
+# coding: utf-8
+"""
+识别任务调度策略
+
+TaskBuffer 把缓冲的任务交给调度策略决定出队顺序，策略可插拔：
+
+- DeadlineFairPolicy（默认）：
+    麦克风/命令任务严格优先，按截止时间（提交时间 + mic_deadline）最早者先出队；
+    文件任务之间按加权公平队列（WFQ）分配剩余算力，片段代价为音频秒数 / 权重，
+    等待越久的片段虚拟完成时间越靠前（老化），避免长期饥饿。
+- LatestSessionPolicy：旧版行为，总是处理最新创建的 session。
+
+所有策略都保证同一 task_id 内部 FIFO（片段必须按顺序识别）。
+pop_batchable() 为多序列批量解码取出其它会话已就绪的麦克风片段（每个会话最多一个）。
+SchedulerStats 记录每种任务类型的排队等待时间，定期输出到日志。
+"""
+
+from __future__ import annotations
+
+import math
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set
+
+from ..schema import Task
+
+
+def percentile(values: List[float], q: float) -> float:
+    """计算分位数（最近秩法），空列表返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+@dataclass
+class _Entry:
+    """调度队列中的任务条目"""
+    task: Task
+    key: float          # 麦克风：截止时间；文件：WFQ 虚拟完成时间
+    start: float = 0.0  # 文件：WFQ 虚拟开始时间
+    enqueued: float = 0.0
+
+
+class SchedulePolicy:
+    """
+    调度策略基类
+
+    子类实现 push / pop / remove，按 task_id 分组保存任务。
+    """
+    name = 'base'
+
+    def push(self, task: Task, now: float) -> None:
+        raise NotImplementedError
+
+    def pop(self, now: float) -> Optional[Task]:
+        raise NotImplementedError
+
+    def pop_batchable(self, now: float, exclude: Set[str]) -> Optional[Task]:
+        """取出一个可与当前片段合并解码的麦克风片段（task_id 不在 exclude 中），没有则返回 None"""
+        return None
+
+    def remove(self, task_id: str) -> List[Task]:
+        """移除某个 task_id 的全部缓冲任务并返回"""
+        raise NotImplementedError
+
+    def task_ids(self) -> List[str]:
+        """当前有缓冲任务的 task_id"""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class LatestSessionPolicy(SchedulePolicy):
+    """旧版策略：总是处理最新创建的 session"""
+    name = 'latest'
+
+    def __init__(self):
+        self._buffers: OrderedDict[str, deque] = OrderedDict()
+
+    def push(self, task: Task, now: float) -> None:
+        self._buffers.setdefault(task.task_id, deque()).append(task)
+
+    def pop(self, now: float) -> Optional[Task]:
+        if not self._buffers:
+            return None
+        tid, buf = next(reversed(self._buffers.items()))
+        task = buf.popleft()
+        if not buf:
+            del self._buffers[tid]
+        return task
+
+    def pop_batchable(self, now: float, exclude: Set[str]) -> Optional[Task]:
+        for tid in reversed(self._buffers):
+            buf = self._buffers[tid]
+            if tid not in exclude and buf[0].type == 'mic':
+                task = buf.popleft()
+                if not buf:
+                    del self._buffers[tid]
+                return task
+        return None
+
+    def remove(self, task_id: str) -> List[Task]:
+        return list(self._buffers.pop(task_id, ()))
+
+    def task_ids(self) -> List[str]:
+        return list(self._buffers)
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+
+class DeadlineFairPolicy(SchedulePolicy):
+    """
+    截止时间优先 + 加权公平队列
+
+    Args:
+        mic_deadline: 麦克风片段允许的排队时长（秒）
+        aging: 文件片段每等待 1 秒，虚拟完成时间提前的量
+    """
+    name = 'deadline_fair'
+
+    def __init__(self, mic_deadline: float = 1.0, aging: float = 0.5):
+        self.mic_deadline = mic_deadline
+        self.aging = aging
+        self._urgent: OrderedDict[str, Deque[_Entry]] = OrderedDict()
+        self._fair: OrderedDict[str, Deque[_Entry]] = OrderedDict()
+        self._finish: Dict[str, float] = {}     # 各文件 session 最后一个片段的虚拟完成时间
+        self._weights: Dict[str, float] = {}
+        self._vtime = 0.0                       # WFQ 系统虚拟时间
+
+    def set_weight(self, task_id: str, weight: float) -> None:
+        """设置文件 session 的权重（默认 1.0，越大分得的算力越多）"""
+        self._weights[task_id] = max(weight, 1e-3)
+
+    def push(self, task: Task, now: float) -> None:
+        tid = task.task_id
+        if task.type == 'file':
+            cost = max(task.duration, 1.0) / self._weights.get(tid, 1.0)
+            start = max(self._vtime, self._finish.get(tid, 0.0))
+            finish = start + cost
+            self._finish[tid] = finish
+            entry = _Entry(task, key=finish, start=start, enqueued=now)
+            self._fair.setdefault(tid, deque()).append(entry)
+        else:
+            entry = _Entry(task, key=task.time_submit + self.mic_deadline, enqueued=now)
+            self._urgent.setdefault(tid, deque()).append(entry)
+
+    def pop(self, now: float) -> Optional[Task]:
+        # 1. 麦克风/命令：最早截止时间优先
+        if self._urgent:
+            tid = min(self._urgent, key=lambda t: self._urgent[t][0].key)
+            return self._take(self._urgent, tid).task
+
+        # 2. 文件：虚拟完成时间最小者优先，等待时间越长越靠前
+        if self._fair:
+            aging = self.aging
+            tid = min(
+                self._fair,
+                key=lambda t: self._fair[t][0].key - aging * (now - self._fair[t][0].enqueued),
+            )
+            entry = self._take(self._fair, tid)
+            self._vtime = max(self._vtime, entry.start)
+            if entry.task.is_final:
+                self._finish.pop(tid, None)
+                self._weights.pop(tid, None)
+            return entry.task
+
+        return None
+
+    def pop_batchable(self, now: float, exclude: Set[str]) -> Optional[Task]:
+        candidates = [
+            tid for tid, buf in self._urgent.items()
+            if tid not in exclude and buf[0].task.type == 'mic'
+        ]
+        if not candidates:
+            return None
+        tid = min(candidates, key=lambda t: self._urgent[t][0].key)
+        return self._take(self._urgent, tid).task
+
+    @staticmethod
+    def _take(buffers: OrderedDict, tid: str) -> _Entry:
+        buf = buffers[tid]
+        entry = buf.popleft()
+        if not buf:
+            del buffers[tid]
+        return entry
+
+    def remove(self, task_id: str) -> List[Task]:
+        self._finish.pop(task_id, None)
+        self._weights.pop(task_id, None)
+        entries = list(self._urgent.pop(task_id, ())) + list(self._fair.pop(task_id, ()))
+        return [e.task for e in entries]
+
+    def task_ids(self) -> List[str]:
+        return list(self._urgent) + list(self._fair)
+
+    def __len__(self) -> int:
+        return len(self._urgent) + len(self._fair)
+
+
+class SchedulerStats:
+    """
+    调度观测指标：按任务类型统计排队等待时间
+
+    等待时间 = 出队时刻 - 主进程提交时刻（Task.time_submit），
+    包含跨进程队列传输与缓冲区排队。
+    """
+
+    def __init__(self, mic_deadline: float = 1.0, window: int = 1000):
+        self.mic_deadline = mic_deadline
+        self.window = window
+        self._waits: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._misses = 0
+
+    def record(self, task: Task, now: float) -> float:
+        """记录一次出队，返回该任务的等待时间"""
+        wait = max(0.0, now - task.time_submit)
+        self._waits.setdefault(task.type, deque(maxlen=self.window)).append(wait)
+        self._counts[task.type] = self._counts.get(task.type, 0) + 1
+        if task.type == 'mic' and wait > self.mic_deadline:
+            self._misses += 1
+        return wait
+
+    def snapshot(self) -> Dict[str, dict]:
+        """各类型的等待时间指标（最近 window 个任务）"""
+        stats = {}
+        for kind, waits in self._waits.items():
+            values = list(waits)
+            stats[kind] = {
+                'count': self._counts[kind],
+                'p50': percentile(values, 50),
+                'p99': percentile(values, 99),
+                'max': max(values) if values else 0.0,
+            }
+        if 'mic' in stats:
+            stats['mic']['deadline_miss'] = self._misses
+        return stats
+
+    def format(self) -> str:
+        """格式化为单行日志"""
+        parts = []
+        for kind, s in self.snapshot().items():
+            part = f"{kind}: n={s['count']} p50={s['p50']:.2f}s p99={s['p99']:.2f}s max={s['max']:.2f}s"
+            if 'deadline_miss' in s:
+                part += f" 超时={s['deadline_miss']}"
+            parts.append(part)
+        return ' | '.join(parts)
+
+
+def create_policy(name: str, mic_deadline: float = 1.0, aging: float = 0.5) -> SchedulePolicy:
+    """按名称创建调度策略"""
+    if name == LatestSessionPolicy.name:
+        return LatestSessionPolicy()
+    if name == DeadlineFairPolicy.name:
+        return DeadlineFairPolicy(mic_deadline=mic_deadline, aging=aging)
+    raise ValueError(f"未知的调度策略: {name}")
+
+
+if __name__ == '__main__':
+    import random
+    from ..audio_pool import AudioHandle
+
+    print('-------------任务调度仿真---------------')
+
+    RTF = 0.08              # 识别实时率
+    OVERHEAD = 0.15         # 每个片段的固定开销（秒）
+    FILE_STRIDE = 60        # 文件分段步长
+    FILE_SEG = 60 + 4 * 2   # 文件片段时长（分段 + 重叠）
+    FILE_WINDOW = 4         # 流控窗口内每个文件最多积压的片段数
+    SIM_SECONDS = 1800
+
+    def make_task(kind: str, task_id: str, seconds: float, submit: float, is_final: bool) -> Task:
+        return Task(
+            type=kind, data=b'', offset=0, overlap=0,
+            task_id=task_id, socket_id='sim', is_final=is_final,
+            time_start=submit, time_submit=submit,
+            shm=AudioHandle(0, 0, int(seconds * 16000 * 4)),
+        )
+
+    def simulate(policy: SchedulePolicy, seed: int = 0) -> dict:
+        """单服务器、不可抢占的离散事件仿真"""
+        rng = random.Random(seed)
+
+        # 麦克风：泊松到达，平均间隔 6 秒，每段 1~10 秒
+        arrivals = []
+        t = 0.0
+        n = 0
+        while t < SIM_SECONDS:
+            t += rng.expovariate(1 / 6)
+            arrivals.append((t, make_task('mic', f'mic-{n}', rng.uniform(1, 10), t, True)))
+            n += 1
+
+        # 文件：3 个长文件先后开始，流控下每个最多积压 FILE_WINDOW 个片段
+        files = {f'file-{i}': {'start': i * 200.0, 'left': 60, 'inflight': 0} for i in range(3)}
+        for fid, f in files.items():
+            for _ in range(FILE_WINDOW):
+                f['left'] -= 1
+                f['inflight'] += 1
+                arrivals.append((f['start'], make_task('file', fid, FILE_SEG, f['start'], f['left'] == 0)))
+        arrivals.sort(key=lambda a: a[0])
+
+        stats = SchedulerStats()
+        clock = 0.0
+        mic_latency = []
+        file_audio = 0.0
+        file_done = {}
+        pending = deque(arrivals)
+
+        while clock < SIM_SECONDS:
+            while pending and pending[0][0] <= clock:
+                policy.push(pending.popleft()[1], clock)
+            task = policy.pop(clock)
+            if task is None:
+                if not pending:
+                    break
+                clock = pending[0][0]
+                continue
+
+            stats.record(task, clock)
+            clock += task.duration * RTF + OVERHEAD
+            if task.type == 'mic':
+                mic_latency.append(clock - task.time_submit)
+                continue
+
+            # 文件片段完成：推进流控，补充下一个片段
+            file_audio += FILE_STRIDE
+            f = files[task.task_id]
+            f['inflight'] -= 1
+            if task.is_final:
+                file_done[task.task_id] = clock
+            elif f['left'] > 0:
+                f['left'] -= 1
+                f['inflight'] += 1
+                new = make_task('file', task.task_id, FILE_SEG, clock, f['left'] == 0)
+                pending.appendleft((clock, new))
+
+        return {
+            'mic_p50': percentile(mic_latency, 50),
+            'mic_p99': percentile(mic_latency, 99),
+            'file_throughput': file_audio / clock,
+            'file_done': file_done,
+            'stats': stats.format(),
+        }
+
+    for policy in (LatestSessionPolicy(), DeadlineFairPolicy()):
+        r = simulate(policy)
+        done = ', '.join(f'{k}@{v:.0f}s' for k, v in sorted(r['file_done'].items())) or '无'
+        print(f'\n策略: {policy.name}')
+        print(f'  麦克风延迟    : p50={r["mic_p50"]:.2f}s  p99={r["mic_p99"]:.2f}s')
+        print(f'  文件吞吐      : {r["file_throughput"]:.1f} 秒音频/秒')
+        print(f'  文件完成时刻  : {done}')
+        print(f'  排队等待      : {r["stats"]}')
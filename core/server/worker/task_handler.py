@@ -4,58 +4,85 @@
 
 负责监听任务队列、执行识别流水线并将结果返回主进程。
 
-公平调度：从不同客户端（socket）轮转取任务处理，防止文件转录淹没队列。
-同 socket 内保持 FIFO 顺序，跨 socket 间轮转调度。
+调度：任务按 task_id 分组缓冲，出队顺序由可插拔的调度策略决定（见 scheduler.py），
+默认麦克风任务按截止时间严格优先，文件任务之间加权公平分配。
+同 task_id 内保持 FIFO 顺序。
+
+批量：引擎支持多序列批量解码时，取出一个麦克风片段后在短窗口内收集其它会话的
+就绪片段（每个会话最多一个），交给 TaskPipeline.process_batch 合并推理。
 """
 
-from collections import OrderedDict, deque
+import time
 from multiprocessing import Queue
-from multiprocessing.managers import ListProxy
 import queue
+from typing import List, Optional, Set
+from config_server import ServerConfig as Config
 from .pipeline import TaskPipeline
+from .scheduler import SchedulePolicy, SchedulerStats, create_policy
+from .cancel import CancelToken
 from ..state import WorkerState
+from ..audio_pool import AudioSlabPool
+from ..registry import ConnectionRegistry
+from ..engines.base import EngineCapabilities, TaskCancelled
 from .gpu_boost import GpuBoostManager
 from . import logger
 
 
 class TaskBuffer:
-    """按 task_id 分组缓冲，支持跨 session 轮转出队。"""
-    def __init__(self, state: WorkerState):
+    """按 task_id 分组缓冲，出队顺序由调度策略决定，并统计排队等待时间。"""
+    def __init__(self, state: WorkerState, policy: Optional[SchedulePolicy] = None):
         self.state = state
-        self._buffers: OrderedDict[str, deque] = OrderedDict()
+        self.policy = policy or create_policy(
+            Config.scheduler_policy, mic_deadline=Config.mic_deadline, aging=Config.file_aging
+        )
+        self.stats = SchedulerStats(mic_deadline=Config.mic_deadline)
+        self._last_report = time.time()
 
     def enqueue(self, task):
-        """将任务放入对应 task_id 的缓冲尾部（同 session 内 FIFO）。
+        """将任务交给调度策略（同 session 内 FIFO）。
         首次遇到新 task_id 时预创建 session。"""
-        tid = task.task_id
-        if tid not in self._buffers:
-            self._buffers[tid] = deque()
-            self.state.get_session(tid, task.socket_id, task.type)
-        self._buffers[tid].append(task)
+        self.state.get_session(task.task_id, task.socket_id, task.type)
+        self.policy.push(task, time.time())
 
     def pop(self):
-        """取出最新 session 的下一个任务。没有待处理任务时返回 None。"""
-        if not self._buffers:
+        """按调度策略取出下一个任务。没有待处理任务时返回 None。"""
+        now = time.time()
+        task = self.policy.pop(now)
+        if task is None:
             return None
+        return self._record(task, now)
 
-        tid, buf = next(reversed(self._buffers.items()))
-        task = buf.popleft()
+    def pop_batchable(self, exclude: Set[str]):
+        """取出一个可合并解码的其它会话麦克风片段。没有时返回 None。"""
+        now = time.time()
+        task = self.policy.pop_batchable(now, exclude)
+        if task is None:
+            return None
+        return self._record(task, now)
 
-        if not buf:
-            del self._buffers[tid]
+    def _record(self, task, now: float):
+        # 命令任务没有有效的提交时间，不计入等待统计
+        if task.type != 'cmd':
+            wait = self.stats.record(task, now)
+            logger.debug(f"调度出队: {task.type} {task.task_id[:8]}, 排队 {wait:.2f}s")
+        if now - self._last_report >= Config.scheduler_report_interval:
+            self._last_report = now
+            logger.info(f"调度统计 ({self.policy.name}): {self.stats.format()}")
 
         return task
 
-    def cleanup_tasks(self):
-        """清理已断开连接的 session 的缓冲任务。"""
-        for tid in list(self._buffers):
+    def cleanup_tasks(self) -> List:
+        """清理已断开连接或已取消的 session 的缓冲任务。Returns: 被丢弃的任务。"""
+        dropped = []
+        for tid in self.policy.task_ids():
             if tid not in self.state.sessions:
-                logger.debug(f"清理断开连接的 session: {tid[:8]}")
-                del self._buffers[tid]
+                logger.debug(f"清理失效的 session: {tid[:8]}")
+                dropped.extend(self.policy.remove(tid))
+        return dropped
 
     @property
     def is_empty(self) -> bool:
-        return len(self._buffers) == 0
+        return len(self.policy) == 0
 
 
 class TaskHandler:
@@ -63,13 +90,15 @@ class TaskHandler:
     任务处理器
 
     协调输入输出队列与识别引擎之间的任务流。
-    支持跨 socket 公平轮转调度。
+    出队顺序由 TaskBuffer 的调度策略决定。
     """
-    def __init__(self, queue_in: Queue, queue_out: Queue, sockets_id: ListProxy, state: WorkerState):
+    def __init__(self, queue_in: Queue, queue_out: Queue, connections: ConnectionRegistry, state: WorkerState,
+                 audio_pool: Optional[AudioSlabPool] = None):
         self.queue_in = queue_in
         self.queue_out = queue_out
-        self.sockets_id = sockets_id
+        self.connections = connections
         self.state = state
+        self.audio_pool = audio_pool
 
         self.recognizer = None
         self.punc_model = None
@@ -78,6 +107,7 @@ class TaskHandler:
 
         self.buffer = TaskBuffer(state)
         self.gpu_boost = GpuBoostManager(state)
+        self._stopping = False  # 批量收集窗口中收到了退出信号
 
     def set_engine(self, recognizer, punc_model=None, aligner=None):
         """注入识别引擎实例并初始化管线"""
@@ -108,18 +138,37 @@ class TaskHandler:
             if task is None:
                 return False
 
-            # 跳过已断开连接客户端的任务
-            if task.socket_id not in self.sockets_id:
-                logger.debug(f"跳过断连客户端任务: {task.task_id[:8]}")
-                continue
+            self.admit(task)
+
+    def admit(self, task):
+        """跳过已断连或已取消的任务，其余进入缓冲区。"""
+        # 跳过已断开连接客户端的任务
+        if task.socket_id not in self.connections:
+            logger.debug(f"跳过断连客户端任务: {task.task_id[:8]}")
+            self.release_audio(task)
+            return
+
+        # 跳过已被客户端取消的任务
+        if task.type != 'cmd' and self.connections.is_cancelled(task.task_id):
+            logger.debug(f"跳过已取消任务: {task.task_id[:8]}")
+            self.release_audio(task)
+            return
 
-            # 任务进入缓冲区
-            self.buffer.enqueue(task)
+        # 任务进入缓冲区
+        self.buffer.enqueue(task)
 
     def cleanup(self):
-        """清理断连 socket 的缓冲任务和 session。"""
-        self.state.cleanup_sessions(self.sockets_id)
-        self.buffer.cleanup_tasks()
+        """清理断连 socket / 已取消任务的缓冲任务和 session。"""
+        self.state.cleanup_sessions(self.connections)
+        for task in self.buffer.cleanup_tasks():
+            self.release_audio(task)
+
+    def release_audio(self, task):
+        """归还任务占用的共享内存槽位。"""
+        if task.shm is not None and self.audio_pool is not None:
+            self.audio_pool.release(task.shm)
+            task.shm = None
+        task.data = b''
 
     def cleanup_engines(self):
         """闲置资源清理：对齐器卸载 + GPU 加速取消。"""
@@ -132,19 +181,98 @@ class TaskHandler:
         self.gpu_boost.handle_command(task)
 
     def handle_audio_task(self, task):
-        """处理音频识别任务。"""
-        result = self.pipeline.process(task)
+        """处理音频识别任务。客户端取消或断开时中止识别，不返回结果。"""
+        cancel = CancelToken(task.task_id, task.socket_id, self.connections)
+        try:
+            # 共享内存中的音频以只读视图交给流水线，不做拷贝
+            if task.shm is not None:
+                task.data = self.audio_pool.view(task.shm)
+            result = self.pipeline.process(task, emit_partial=self.queue_out.put, cancel=cancel)
+        except TaskCancelled as e:
+            self.on_cancelled(task, e)
+            return
+        finally:
+            self.release_audio(task)
+        self.on_result(task, result)
+
+    def handle_audio_batch(self, tasks):
+        """合并处理多个会话的麦克风片段。被取消的片段不返回结果。"""
+        cancels = [CancelToken(t.task_id, t.socket_id, self.connections) for t in tasks]
+        try:
+            for task in tasks:
+                if task.shm is not None:
+                    task.data = self.audio_pool.view(task.shm)
+            outputs = self.pipeline.process_batch(tasks, emit_partial=self.queue_out.put, cancels=cancels)
+        finally:
+            for task in tasks:
+                self.release_audio(task)
+        for task, output in zip(tasks, outputs):
+            if isinstance(output, TaskCancelled):
+                self.on_cancelled(task, output)
+            else:
+                self.on_result(task, output)
+
+    def on_result(self, task, result):
+        """返回识别结果，最终结果后释放 session。"""
         self.queue_out.put(result)
         if result.is_final:
             self.state.sessions.pop(task.task_id, None)
 
+    def on_cancelled(self, task, reason: TaskCancelled):
+        """任务中止：释放 session，不返回结果。"""
+        logger.info(f"任务已中止: {task.task_id[:8]}, {reason}, 耗时 {time.time() - task.time_submit:.2f}s")
+        self.state.sessions.pop(task.task_id, None)
+
+    def collect_batch(self, first) -> List:
+        """
+        批量收集：以 first 为首，取出其它会话已就绪的麦克风片段（每个会话最多一个）
+
+        仍有其它麦克风会话在进行、但它们的片段尚未到达时，最多等待 Config.batch_window 秒；
+        引擎不支持批量（n_seq_max = 1 时不声明 BATCHING）时直接返回，不等待。
+        """
+        batch = [first]
+        if (first.type != 'mic' or self.recognizer is None
+                or EngineCapabilities.BATCHING not in self.recognizer.capabilities):
+            return batch
+
+        limit = self.recognizer.max_batch_size
+        deadline = time.time() + Config.batch_window
+        while len(batch) < limit:
+            exclude = {t.task_id for t in batch}
+            task = self.buffer.pop_batchable(exclude)
+            if task is not None:
+                batch.append(task)
+                continue
+
+            # 没有其它进行中的麦克风会话，不必等待
+            waiting = any(
+                tid not in exclude and s.result.type == 'mic' for tid, s in self.state.sessions.items()
+            )
+            remaining = deadline - time.time()
+            if not waiting or remaining <= 0 or self._stopping:
+                break
+            try:
+                task = self.queue_in.get(timeout=remaining)
+            except queue.Empty:
+                break
+            except InterruptedError:
+                continue
+            if task is None:
+                self._stopping = True
+                break
+            self.admit(task)
+
+        if len(batch) > 1:
+            logger.debug(f"批量解码 {len(batch)} 个会话: {', '.join(t.task_id[:8] for t in batch)}")
+        return batch
+
     def loop(self):
-        """核心任务循环：drain 队列 → 清理断连 → 轮转执行一个。"""
-        logger.info("TaskHandler 开始工作循环 (公平调度)")
+        """核心任务循环：drain 队列 → 清理断连 → 按调度策略执行一个。"""
+        logger.info(f"TaskHandler 开始工作循环 (调度策略: {self.buffer.policy.name})")
 
         while True:
             try:
-                if not self.drain_queue():
+                if self._stopping or not self.drain_queue():
                     break
 
                 task = self.buffer.pop()
@@ -155,7 +283,11 @@ class TaskHandler:
                 if task.type == 'cmd':
                     self.handle_command_task(task)
                 else:
-                    self.handle_audio_task(task)
+                    batch = self.collect_batch(task)
+                    if len(batch) > 1:
+                        self.handle_audio_batch(batch)
+                    else:
+                        self.handle_audio_task(task)
 
                 self.cleanup()
             except InterruptedError:
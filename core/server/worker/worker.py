@@ -11,12 +11,15 @@ import sys
 import signal
 import atexit
 from multiprocessing import Queue
-from multiprocessing.managers import ListProxy
+from multiprocessing.synchronize import Event
 from platform import system
+from typing import Optional
 
 from .model_loader import ModelLoader
 from .task_handler import TaskHandler
 from ..state import WorkerState
+from ..audio_pool import AudioSlabPool
+from ..registry import ConnectionRegistry
 from . import logger
 
 
@@ -26,16 +29,19 @@ class RecognizerWorker:
     
     统一调度模型加载器与任务处理器，负责识别进程的完整运行。
     """
-    def __init__(self, queue_in: Queue, queue_out: Queue, sockets_id: ListProxy, stdin_fn: int = None):
+    def __init__(self, queue_in: Queue, queue_out: Queue, connections: ConnectionRegistry, stdin_fn: int = None,
+                 audio_pool: Optional[AudioSlabPool] = None, ready: Optional[Event] = None):
         # 1. 初始化核心状态
         self.state = WorkerState()
         
         # 2. 初始化核心组件 (注入 state)
         self.loader = ModelLoader()
-        self.handler = TaskHandler(queue_in, queue_out, sockets_id, self.state)
+        self.audio_pool = audio_pool
+        self.handler = TaskHandler(queue_in, queue_out, connections, self.state, audio_pool)
         
         # 3. 状态追踪
         self.stdin_fn = stdin_fn
+        self.ready = ready
         self._is_running = False
 
     def _setup_environment(self):
@@ -78,7 +84,10 @@ class RecognizerWorker:
         )
         
         # 4. 通知主进程模型已加载成功
-        self.handler.queue_out.put(True)
+        if self.ready is not None:
+            self.ready.set()
+        else:
+            self.handler.queue_out.put(True)
         
         # 5. Windows 下物理内存清理 (优化项)
         if system() == 'Windows':
@@ -113,6 +122,8 @@ class RecognizerWorker:
 
         logger.info("正在停止 Worker 并回收资源...")
         self.loader.cleanup()
+        if self.audio_pool is not None:
+            self.audio_pool.close()
         logger.info("Worker 资源已完成回收")
 
 
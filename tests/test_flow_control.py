@@ -0,0 +1,91 @@
+# coding: utf-8
+"""
+文件上传流控测试
+
+覆盖 FlowController 的全局共用窗口：多个任务同时上传时积压合计不超过窗口，
+各任务按份额分配、窗口用尽时保有保底额度，非流控任务排队的音频占用窗口。
+"""
+
+import random
+
+from core.server.connection.flow_control import FlowController
+
+SEG, OVERLAP = 60.0, 4.0
+RESERVE = SEG + OVERLAP * 2 + 1.0
+
+
+def committed(flow: FlowController, queued: float = 0.0) -> float:
+    """各任务已授予但尚未识别的音频之和，加上其他任务排队的音频"""
+    return queued + sum(f.granted - f.processed for f in flow._flows.values())
+
+
+def test_single_task_gets_whole_window():
+    flow = FlowController(240)
+    credit = flow.open('a', 's', SEG, OVERLAP)
+    assert credit.granted == 240
+
+    credit = flow.on_result('a', SEG, False)
+    assert credit.granted == SEG + 240
+
+
+def test_window_is_shared_between_tasks():
+    flow = FlowController(240)
+    flow.open('a', 's', SEG, OVERLAP)
+    second = flow.open('b', 's', SEG, OVERLAP)
+    # 第一个任务已占满窗口，第二个任务只拿到保底额度
+    assert second.granted == RESERVE
+
+    # 先到的任务识别推进后只保留均分份额，让出的空间由另一个任务取得
+    assert flow.on_result('a', SEG, False) is None
+    assert flow.on_result('a', 2 * SEG, False) is None
+    assert flow.on_result('a', 3 * SEG, False).granted == 3 * SEG + 120
+    assert flow.on_result('b', SEG, False).granted == SEG + 120
+
+    flow.close('a')
+    credit = flow.on_result('b', 2 * SEG, False)
+    assert credit.granted == 2 * SEG + 240
+
+
+def test_queued_audio_of_other_tasks_counts_against_window():
+    flow = FlowController(240)
+    credit = flow.open('a', 's', SEG, OVERLAP, queued=100)
+    assert credit.granted == 140
+
+
+def test_many_uploads_stay_within_window():
+    """任务陆续加入、随机交错识别，积压合计不超过 窗口 + 保底额度之和，各任务识别一段后回落到 max(窗口, 保底额度之和)"""
+    rng = random.Random(0)
+    flow = FlowController(240)
+    tasks = [f't{i}' for i in range(20)]
+    processed = dict.fromkeys(tasks, 0.0)
+
+    def step(tid):
+        f = flow._flows[tid]
+        flow.on_receive(tid, f.granted - f.received)
+        processed[tid] = min(processed[tid] + SEG, f.received)
+        flow.on_result(tid, processed[tid], False)
+        # 每个任务都能切出下一个片段
+        assert f.granted - f.processed >= RESERVE
+
+    for i, tid in enumerate(tasks):
+        flow.open(tid, 's', SEG, OVERLAP)
+        assert committed(flow) <= 240 + RESERVE * i + 1e-6
+        for _ in range(3):
+            step(rng.choice(tasks[:i + 1]))
+            assert committed(flow) <= 240 + RESERVE * i + 1e-6
+
+    for tid in tasks:
+        step(tid)
+    for _ in range(500):
+        step(rng.choice(tasks))
+        assert committed(flow) <= max(240, RESERVE * len(tasks)) + 1e-6
+
+    assert sum(flow.backlogs().values()) == flow.total_backlog()
+
+
+def test_final_result_releases_window():
+    flow = FlowController(240)
+    flow.open('a', 's', SEG, OVERLAP)
+    assert flow.on_result('a', 120, True) is None
+    assert 'a' not in flow
+    assert flow.open('b', 's', SEG, OVERLAP).granted == 240
@@ -0,0 +1,239 @@
+# coding: utf-8
+"""
+识别任务调度策略测试
+
+覆盖 DeadlineFairPolicy 的麦克风截止时间优先（EDF）、文件任务加权公平分配、
+TaskBuffer.pop_batchable 的批量取片段规则，以及混合负载下的离散事件仿真。
+"""
+
+import random
+from collections import Counter, deque
+
+import pytest
+
+from core.server.audio_pool import AudioHandle
+from core.server.schema import Task
+from core.server.state import WorkerState
+from core.server.worker.scheduler import (
+    DeadlineFairPolicy, LatestSessionPolicy, SchedulePolicy, percentile,
+)
+from core.server.worker.task_handler import TaskBuffer
+
+
+def make_task(kind: str, task_id: str, seconds: float = 5.0, submit: float = 0.0,
+              is_final: bool = False) -> Task:
+    """构造不携带音频数据的任务，时长由共享内存句柄的字节数给出"""
+    return Task(
+        type=kind, data=b'', offset=0, overlap=0,
+        task_id=task_id, socket_id='test', is_final=is_final,
+        time_start=submit, time_submit=submit,
+        shm=AudioHandle(0, 0, int(seconds * 16000 * 4)),
+    )
+
+
+def drain(policy: SchedulePolicy, now: float = 0.0):
+    """按策略顺序取出全部任务"""
+    tasks = []
+    while (task := policy.pop(now)) is not None:
+        tasks.append(task)
+    return tasks
+
+
+# ==================== 麦克风：截止时间优先 ====================
+
+def test_mic_tasks_pop_in_deadline_order():
+    policy = DeadlineFairPolicy(mic_deadline=1.0)
+    for tid, submit in (('c', 3.0), ('a', 1.0), ('d', 4.0), ('b', 2.0)):
+        policy.push(make_task('mic', tid, submit=submit), now=5.0)
+
+    assert [t.task_id for t in drain(policy, 5.0)] == ['a', 'b', 'c', 'd']
+
+
+def test_mic_preempts_queued_file_segments():
+    policy = DeadlineFairPolicy()
+    for i in range(3):
+        policy.push(make_task('file', 'f', seconds=60, submit=0.0), now=0.0)
+    policy.push(make_task('mic', 'm', submit=10.0), now=10.0)
+
+    assert [t.type for t in drain(policy, 10.0)] == ['mic', 'file', 'file', 'file']
+
+
+def test_segments_of_one_session_stay_fifo():
+    policy = DeadlineFairPolicy()
+    # 同一会话后到的片段即使截止时间更早，也不能越过前面的片段
+    first = make_task('mic', 'm', submit=5.0)
+    second = make_task('mic', 'm', submit=1.0)
+    policy.push(first, now=5.0)
+    policy.push(second, now=5.0)
+    policy.push(make_task('mic', 'n', submit=3.0), now=5.0)
+
+    order = drain(policy, 5.0)
+    assert order.index(first) < order.index(second)
+
+
+# ==================== 文件：加权公平 ====================
+
+def test_file_sessions_share_equally_by_default():
+    policy = DeadlineFairPolicy(aging=0.0)
+    for _ in range(10):
+        policy.push(make_task('file', 'a', seconds=60), now=0.0)
+        policy.push(make_task('file', 'b', seconds=60), now=0.0)
+
+    first_half = [t.task_id for t in drain(policy)[:10]]
+    assert Counter(first_half) == {'a': 5, 'b': 5}
+
+
+def test_file_weight_scales_share():
+    policy = DeadlineFairPolicy(aging=0.0)
+    policy.set_weight('heavy', 2.0)
+    for _ in range(30):
+        policy.push(make_task('file', 'heavy', seconds=60), now=0.0)
+        policy.push(make_task('file', 'light', seconds=60), now=0.0)
+
+    counts = Counter(t.task_id for t in drain(policy)[:30])
+    assert counts['heavy'] == 20 and counts['light'] == 10
+
+
+def test_new_file_session_is_not_starved_by_backlog():
+    policy = DeadlineFairPolicy(aging=0.0)
+    for _ in range(20):
+        policy.push(make_task('file', 'old', seconds=60), now=0.0)
+    for _ in range(5):
+        policy.pop(0.0)
+
+    # 新会话从当前虚拟时间起步，不必等旧会话的积压全部处理完
+    policy.push(make_task('file', 'new', seconds=60), now=1.0)
+    next_two = [policy.pop(1.0).task_id for _ in range(2)]
+    assert 'new' in next_two
+
+
+def test_aging_promotes_long_waiting_file_segment():
+    policy = DeadlineFairPolicy(aging=0.5)
+    policy.set_weight('fast', 10.0)
+    policy.push(make_task('file', 'slow', seconds=60), now=0.0)
+    for _ in range(3):
+        policy.push(make_task('file', 'fast', seconds=60), now=200.0)
+
+    # 无老化时 fast 的虚拟完成时间（6、12…）都早于 slow（60），slow 等待 200 秒后先出队
+    assert policy.pop(200.0).task_id == 'slow'
+
+
+def test_remove_drops_all_buffered_segments():
+    policy = DeadlineFairPolicy()
+    policy.push(make_task('mic', 'm'), now=0.0)
+    policy.push(make_task('file', 'f'), now=0.0)
+    policy.push(make_task('file', 'f'), now=0.0)
+
+    assert len(policy.remove('f')) == 2
+    assert policy.task_ids() == ['m']
+
+
+# ==================== 批量解码取片段 ====================
+
+@pytest.fixture
+def buffer():
+    return TaskBuffer(WorkerState(), policy=DeadlineFairPolicy(mic_deadline=1.0))
+
+
+def test_pop_batchable_takes_one_mic_segment_per_other_session(buffer):
+    now_tasks = [
+        make_task('mic', 'a', submit=1.0), make_task('mic', 'a', submit=1.5),
+        make_task('mic', 'b', submit=3.0), make_task('mic', 'c', submit=2.0),
+        make_task('file', 'f', submit=0.0), make_task('cmd', 'x', submit=0.0),
+    ]
+    for task in now_tasks:
+        buffer.enqueue(task)
+
+    head = buffer.pop()
+    assert (head.type, head.task_id) == ('cmd', 'x')  # 命令提交时间为 0，截止时间最早
+
+    head = buffer.pop()
+    assert head.task_id == 'a'
+    exclude = {head.task_id}
+    picked = []
+    while (task := buffer.pop_batchable(exclude)) is not None:
+        picked.append(task)
+        exclude.add(task.task_id)
+
+    # 按截止时间取 c、b；a 的第二段与 head 同会话不能同批；文件片段不参与批量
+    assert [t.task_id for t in picked] == ['c', 'b']
+    assert [(t.type, t.task_id) for t in drain(buffer.policy)] == [('mic', 'a'), ('file', 'f')]
+
+
+def test_pop_batchable_ignores_non_mic_heads(buffer):
+    buffer.enqueue(make_task('file', 'f'))
+    buffer.enqueue(make_task('cmd', 'x'))
+    assert buffer.pop_batchable(set()) is None
+
+
+def test_pop_batchable_records_wait_stats(buffer):
+    buffer.enqueue(make_task('mic', 'a', submit=0.0))
+    buffer.enqueue(make_task('mic', 'b', submit=0.0))
+    buffer.pop()
+    buffer.pop_batchable({'a'})
+    assert buffer.stats.snapshot()['mic']['count'] == 2
+
+
+# ==================== 混合负载仿真 ====================
+
+RTF = 0.08
+OVERHEAD = 0.15
+FILE_SEG = 68.0
+FILE_WINDOW = 4
+FILE1_START = 50.0
+
+
+def simulate(policy: SchedulePolicy, seconds: float = 1200.0, seed: int = 0) -> dict:
+    """单服务器、不可抢占的离散事件仿真：泊松到达的麦克风片段 + 两个流控下的长文件"""
+    rng = random.Random(seed)
+    arrivals = []
+    t, n = 0.0, 0
+    while t < seconds:
+        t += rng.expovariate(1 / 6)
+        arrivals.append((t, make_task('mic', f'mic-{n}', rng.uniform(1, 10), t, True)))
+        n += 1
+
+    files = {'file-0': 40, 'file-1': 40}
+    for fid, start in (('file-0', 0.0), ('file-1', FILE1_START)):
+        for _ in range(FILE_WINDOW):
+            files[fid] -= 1
+            arrivals.append((start, make_task('file', fid, FILE_SEG, start, files[fid] == 0)))
+    arrivals.sort(key=lambda a: a[0])
+
+    clock = 0.0
+    mic_latency, file_done = [], {}
+    pending = deque(arrivals)
+    while pending or len(policy):
+        while pending and pending[0][0] <= clock:
+            policy.push(pending.popleft()[1], clock)
+        task = policy.pop(clock)
+        if task is None:
+            clock = pending[0][0]
+            continue
+        clock += task.duration * RTF + OVERHEAD
+        if task.type == 'mic':
+            mic_latency.append(clock - task.time_submit)
+        elif task.is_final:
+            file_done[task.task_id] = clock
+        elif files[task.task_id] > 0:
+            files[task.task_id] -= 1
+            pending.appendleft((clock, make_task('file', task.task_id, FILE_SEG, clock, files[task.task_id] == 0)))
+
+    return {'mic_p99': percentile(mic_latency, 99), 'file_done': file_done}
+
+
+def test_simulation_bounds_mic_latency_and_shares_files():
+    fair = simulate(DeadlineFairPolicy())
+    latest = simulate(LatestSessionPolicy())
+
+    # 不可抢占时，麦克风片段最多等一个文件片段与若干麦克风片段
+    file_service = FILE_SEG * RTF + OVERHEAD
+    assert fair['mic_p99'] < 2 * file_service
+    assert fair['mic_p99'] < latest['mic_p99']
+
+    # 两个文件都能完成，且交替推进：完成时刻之差约等于开始时刻之差；
+    # 旧策略下后开始的文件独占算力，先开始的文件最后才完成
+    done = fair['file_done']
+    assert set(done) == {'file-0', 'file-1'}
+    assert 0 < done['file-1'] - done['file-0'] < FILE1_START + 2 * file_service
+    assert latest['file_done']['file-1'] < latest['file_done']['file-0']